@@ -21,6 +21,7 @@
 # - Diff parsing is defensive (supports fenced ```diff blocks or plain unified diffs).
 # - The summary is guaranteed non-empty and UI-safe.
 # - LLM timeouts and transient errors are retried with jittered backoff.
+# - stream() yields the raw model output token-by-token for /ask/codex_stream.
 
 from __future__ import annotations
 
@@ -39,6 +40,10 @@ try:
     from services.openai_client import chat_complete  # async
 except Exception:  # pragma: no cover
     chat_complete = None  # type: ignore
+try:
+    from services import openai_client  # chat_stream / available
+except Exception:  # pragma: no cover
+    openai_client = None  # type: ignore
 
 
 # ------------------------------ Configuration ---------------------------------
@@ -46,6 +51,20 @@ except Exception:  # pragma: no cover
 # Allow overriding via environment, fall back to a small/cheap capable model
 CODEX_MODEL = os.getenv("CODEX_MODEL", "gpt-4o-mini")
 
+CODEX_SYSTEM = (
+    "You are Codex, a careful code editor.\n"
+    "Task: Propose the minimal, safe change.\n"
+    "Output STRICTLY in this form:\n"
+    "  Summary: <one-line action summary>\n"
+    "  ```diff\n"
+    "  <unified diff if needed; otherwise omit the fenced block>\n"
+    "  ```\n"
+    "Rules:\n"
+    " - No preambles, no explanations.\n"
+    " - Only include a diff if an actual code change is required.\n"
+    " - Keep the summary concise and human-readable."
+)
+
 # Safety caps
 MAX_SUMMARY_LEN = 200            # hard cap for UI summary text
 MAX_DIFF_CHARS = 50_000          # keep responses bounded
@@ -193,6 +212,19 @@ def _mk_summary(query: str, plan: Dict[str, Any], diff: Optional[str]) -> str:
     return "Proposed code action."
 
 
+def _codex_user(query: str, files: List[str], topics: List[str], context: str = "") -> str:
+    files_part = ", ".join(files[:8]) if files else "None"
+    topics_part = ", ".join(topics[:8]) if topics else "None"
+    user = (
+        f"{query.strip()}\n\n"
+        f"Files: {files_part}\n"
+        f"Topics: {topics_part}"
+    )
+    if context:
+        user += f"\n\nContext:\n{_cap(context, 12_000)}"
+    return user
+
+
 async def _codex_llm(
     query: str,
     files: List[str],
@@ -215,27 +247,8 @@ async def _codex_llm(
         return {"action": {"type": "plan", "summary": stub_summary}, "diff": None, "raw": None}
 
     # Compose concise prompt
-    sys = (
-        "You are Codex, a careful code editor.\n"
-        "Task: Propose the minimal, safe change.\n"
-        "Output STRICTLY in this form:\n"
-        "  Summary: <one-line action summary>\n"
-        "  ```diff\n"
-        "  <unified diff if needed; otherwise omit the fenced block>\n"
-        "  ```\n"
-        "Rules:\n"
-        " - No preambles, no explanations.\n"
-        " - Only include a diff if an actual code change is required.\n"
-        " - Keep the summary concise and human-readable."
-    )
-
-    files_part = ", ".join(files[:8]) if files else "None"
-    topics_part = ", ".join(topics[:8]) if topics else "None"
-    user = (
-        f"{query.strip()}\n\n"
-        f"Files: {files_part}\n"
-        f"Topics: {topics_part}"
-    )
+    sys = CODEX_SYSTEM
+    user = _codex_user(query, files, topics)
 
     attempts = 0
     last_err: Optional[str] = None
@@ -246,7 +259,8 @@ async def _codex_llm(
             # Use asyncio timeout (Python 3.11+)
             async with asyncio.timeout(timeout_s):
                 resp: Dict[str, Any] = await chat_complete(
-                    system=sys, user=user, model=model, timeout_s=timeout_s
+                    system=sys, user=user, model=model, timeout_s=timeout_s,
+                    temperature=0.0, cache="codex_patch",  # UI retries reuse the patch
                 )
 
             text_blob = _coerce_text(resp)
@@ -358,3 +372,40 @@ async def run(
                 "request_id": request_id,
             },
         }
+
+
+async def stream(
+    *,
+    query: str,
+    context: str = "",
+    user_id: Optional[str] = None,
+    corr_id: Optional[str] = None,
+    files: Optional[List[str]] = None,
+    topics: Optional[List[str]] = None,
+    timeout_s: int = 40,
+):
+    """
+    Streaming entry point for /ask/codex_stream: yields the model's raw
+    "Summary: ... ```diff ...```" output as it is generated. Without an LLM
+    (or on failure before the first token) it yields run()'s text once.
+    """
+    emitted = False
+    try:
+        if openai_client is not None and openai_client.available():
+            async for delta in openai_client.chat_stream(
+                system=CODEX_SYSTEM,
+                user=_codex_user(query, files or [], topics or [], context),
+                model=CODEX_MODEL,
+                timeout_s=timeout_s,
+            ):
+                emitted = True
+                yield delta
+            return
+    except Exception as ex:
+        log_event("codex_stream_error", {"request_id": corr_id, "error": str(ex), "emitted": emitted})
+        if emitted:
+            yield f"[Codex stream error: {ex}]"
+            return
+
+    res = await run(query=query, files=files, topics=topics, request_id=corr_id, timeout_s=timeout_s)
+    yield res.get("text") or ""
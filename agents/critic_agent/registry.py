@@ -0,0 +1,366 @@
+# File: registry.py
+# Directory: agents/critic_agent
+# Purpose: Hold the critic set once per process and evaluate plans against it
+#          concurrently, with per-critic timeouts, optional early exit and a
+#          plan-hash result cache.
+#
+# Upstream:
+#   - ENV: CRITIC_WORKERS (default 8), CRITIC_TIMEOUT_S (default 2.0), CRITIC_CACHE_MAX (default 256)
+#   - Imports: asyncio, collections, concurrent.futures, hashlib, json, threading, typing, and every critic module
+#
+# Downstream:
+#   - agents.critic_agent.run
+#
+# Contents:
+#   - CriticSpec
+#   - CriticRegistry (run / arun / stats / clear_cache)
+#   - plan_key()
+#   - get_registry()
+#
+# Notes:
+#   • Context-free critics are constructed once. Critics that take per-call
+#     context (query / prior_plans) are bound per call — their constructors
+#     only store arguments.
+#   • A critic whose evaluate() is a coroutine runs on the caller's loop in
+#     arun(); every other critic runs on the shared thread pool.
+#   • Each critic's timeout runs from when it starts, not from when the run
+#     was submitted, so critics queued behind a full pool get their whole
+#     budget. A run never waits past timeout × the number of pool "waves".
+#   • Timed-out threads cannot be killed; the runner stops waiting and reports
+#     the critic as failed. Timeouts, errors and early exits are never cached.
+#   • Results always follow registry order and length; critics skipped by a
+#     fail_fast exit come back as placeholders with skipped=True.
+
+import asyncio
+import collections
+import concurrent.futures
+import copy
+import hashlib
+import inspect
+import json
+import os
+import threading
+import time
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+from .structure_critic import StructureCritic
+from .logic_critic import LogicCritic
+from .safety_critic import SafetyCritic
+from .clarity_critic import ClarityCritic
+from .feasibility_critic import FeasibilityCritic
+from .impact_critic import ImpactCritic
+from .intent_critic import IntentCritic
+from .dependency_critic import DependencyCritic
+from .redundancy_critic import RedundancyCritic
+from .ethical_critic import EthicalCritic
+from .performance_critic import PerformanceCritic
+from .reflection_critic import ReflectionCritic
+from .consensus_critic import ConsensusCritic
+from .temporal_critic import TemporalCritic
+from .robustness_critic import RobustnessCritic
+
+
+class CriticSpec:
+    """
+    One registry entry.
+
+    needs:    constructor kwargs taken from the per-call context ("query", "prior_plans")
+    blocking: a failure from this critic can end the run early (fail_fast=True)
+    """
+
+    def __init__(self, factory: Callable[..., Any], *, needs: Tuple[str, ...] = (), blocking: bool = False):
+        self.factory = factory
+        self.name: str = getattr(factory, "name", factory.__name__)
+        self.needs = tuple(needs)
+        self.blocking = blocking
+
+
+DEFAULT_SPECS = (
+    CriticSpec(StructureCritic, blocking=True),
+    CriticSpec(LogicCritic),
+    CriticSpec(SafetyCritic, blocking=True),
+    CriticSpec(ClarityCritic),
+    CriticSpec(FeasibilityCritic),
+    CriticSpec(IntentCritic, needs=("query",)),
+    CriticSpec(DependencyCritic),
+    CriticSpec(RedundancyCritic, needs=("prior_plans",)),
+    CriticSpec(EthicalCritic, blocking=True),
+    CriticSpec(PerformanceCritic),
+    CriticSpec(ReflectionCritic),
+    CriticSpec(ConsensusCritic, needs=("prior_plans",)),
+    CriticSpec(TemporalCritic),
+    CriticSpec(RobustnessCritic),
+)
+
+
+def plan_key(plan: Dict, query: str = "", prior_plans: Optional[List[Dict]] = None) -> str:
+    """Canonical hash of everything a critic can see."""
+    blob = json.dumps(
+        {"plan": plan, "query": query or "", "prior": prior_plans or []},
+        sort_keys=True,
+        separators=(",", ":"),
+        default=str,
+    )
+    return hashlib.sha256(blob.encode("utf-8")).hexdigest()
+
+
+_POLL_S = 0.05  # re-check deadlines this often while some critic is still queued
+
+
+def _failed(name: str, message: str, ms: float) -> Dict:
+    return {"name": name, "passes": False, "issues": [message], "ms": round(ms, 2)}
+
+
+class CriticRegistry:
+    def __init__(
+        self,
+        specs: Iterable[CriticSpec] = DEFAULT_SPECS,
+        *,
+        max_workers: int = 8,
+        timeout_s: float = 2.0,
+        cache_size: int = 256,
+    ):
+        self.specs: List[CriticSpec] = list(specs)
+        self.timeout_s = float(timeout_s)
+        self.cache_size = max(0, int(cache_size))
+        self._instances = {s.name: s.factory() for s in self.specs if not s.needs}
+        self._impact = ImpactCritic()
+        self._workers = max(1, int(max_workers))
+        self._pool = concurrent.futures.ThreadPoolExecutor(max_workers=self._workers, thread_name_prefix="critic")
+        self._cache: "collections.OrderedDict[str, List[Dict]]" = collections.OrderedDict()
+        self._lock = threading.Lock()
+        self.counters = {"runs": 0, "cache_hits": 0, "timeouts": 0, "errors": 0, "early_exits": 0}
+
+    # ── public API ──────────────────────────────────────────────────────────
+
+    def run(
+        self,
+        plan: Dict,
+        *,
+        query: str = "",
+        prior_plans: Optional[List[Dict]] = None,
+        timeout_s: Optional[float] = None,
+        fail_fast: bool = False,
+    ) -> List[Dict]:
+        """Blocking evaluation; safe to call from any thread."""
+        key, hit = self._lookup(plan, query, prior_plans)
+        if hit is not None:
+            return hit
+        ctx = {"query": query, "prior_plans": prior_plans or []}
+        timeout = self.timeout_s if timeout_s is None else float(timeout_s)
+        cap_at = time.perf_counter() + self._max_wait(timeout)
+        started: Dict[str, float] = {}
+        futures = {self._pool.submit(self._evaluate_sync, spec, plan, ctx, started): spec for spec in self.specs}
+        results: Dict[str, Dict] = {}
+        pending = set(futures)
+        expired: set = set()
+        stopped = False
+        while pending and not stopped:
+            late, wait_s = self._deadlines(pending, futures, started, timeout, cap_at)
+            expired |= late
+            pending -= late
+            if not pending:
+                break
+            done, pending = concurrent.futures.wait(pending, timeout=wait_s, return_when=concurrent.futures.FIRST_COMPLETED)
+            for fut in done:
+                spec = futures[fut]
+                results[spec.name] = fut.result()
+                stopped = stopped or (fail_fast and self._blocks(spec, results[spec.name]))
+        for fut in pending | expired:
+            fut.cancel()
+        return self._finish(key, results, [futures[f] for f in expired], [futures[f] for f in pending], timeout)
+
+    async def arun(
+        self,
+        plan: Dict,
+        *,
+        query: str = "",
+        prior_plans: Optional[List[Dict]] = None,
+        timeout_s: Optional[float] = None,
+        fail_fast: bool = False,
+    ) -> List[Dict]:
+        """Async evaluation: coroutine critics on this loop, the rest on the pool."""
+        key, hit = self._lookup(plan, query, prior_plans)
+        if hit is not None:
+            return hit
+        ctx = {"query": query, "prior_plans": prior_plans or []}
+        timeout = self.timeout_s if timeout_s is None else float(timeout_s)
+        loop = asyncio.get_running_loop()
+        cap_at = time.perf_counter() + self._max_wait(timeout)
+        started: Dict[str, float] = {}
+        tasks: Dict[asyncio.Future, CriticSpec] = {}
+        for spec in self.specs:
+            critic = self._critic(spec, ctx)
+            if inspect.iscoroutinefunction(critic.evaluate):
+                fut = asyncio.ensure_future(self._evaluate_async(spec, critic, plan, started))
+            else:
+                fut = loop.run_in_executor(self._pool, self._evaluate_bound, spec, critic, plan, started)
+            tasks[fut] = spec
+        results: Dict[str, Dict] = {}
+        pending = set(tasks)
+        expired: set = set()
+        stopped = False
+        while pending and not stopped:
+            late, wait_s = self._deadlines(pending, tasks, started, timeout, cap_at)
+            expired |= late
+            pending -= late
+            if not pending:
+                break
+            done, pending = await asyncio.wait(pending, timeout=wait_s, return_when=asyncio.FIRST_COMPLETED)
+            for fut in done:
+                spec = tasks[fut]
+                results[spec.name] = fut.result()
+                stopped = stopped or (fail_fast and self._blocks(spec, results[spec.name]))
+        for fut in pending | expired:
+            fut.cancel()
+        return self._finish(key, results, [tasks[f] for f in expired], [tasks[f] for f in pending], timeout)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "critics": [s.name for s in self.specs],
+                "timeout_s": self.timeout_s,
+                "cache_entries": len(self._cache),
+                "cache_size": self.cache_size,
+                **self.counters,
+            }
+
+    def clear_cache(self) -> None:
+        with self._lock:
+            self._cache.clear()
+
+    # ── internals ───────────────────────────────────────────────────────────
+
+    def _critic(self, spec: CriticSpec, ctx: Dict[str, Any]) -> Any:
+        inst = self._instances.get(spec.name)
+        if inst is None:
+            inst = spec.factory(**{k: ctx[k] for k in spec.needs})
+        return inst
+
+    def _max_wait(self, timeout: float) -> float:
+        """Upper bound for one run: every critic gets *timeout* once a worker is free."""
+        return timeout * -(-len(self.specs) // self._workers)
+
+    @staticmethod
+    def _deadlines(pending, owner, started: Dict[str, float], timeout: float, cap_at: float):
+        """Split out futures past their own deadline; return (expired, seconds to wait next)."""
+        now = time.perf_counter()
+        expired, next_at = set(), cap_at
+        for fut in pending:
+            began = started.get(owner[fut].name)
+            if now >= cap_at or (began is not None and now - began >= timeout):
+                expired.add(fut)
+            elif began is None:
+                next_at = min(next_at, now + _POLL_S)  # still queued; its clock starts later
+            else:
+                next_at = min(next_at, began + timeout)
+        return expired, max(0.0, next_at - now)
+
+    def _evaluate_sync(self, spec: CriticSpec, plan: Dict, ctx: Dict[str, Any], started: Optional[Dict[str, float]] = None) -> Dict:
+        t0 = time.perf_counter()
+        if started is not None:
+            started[spec.name] = t0
+        try:
+            return self._evaluate_bound(spec, self._critic(spec, ctx), plan)
+        except Exception as e:
+            return self._error(spec, e, t0)
+
+    def _evaluate_bound(self, spec: CriticSpec, critic: Any, plan: Dict, started: Optional[Dict[str, float]] = None) -> Dict:
+        t0 = time.perf_counter()
+        if started is not None:
+            started.setdefault(spec.name, t0)
+        try:
+            result = critic.evaluate(plan)
+            if inspect.isawaitable(result):
+                result = asyncio.run(result)  # coroutine critic on the blocking path
+            return self._enrich(result, t0)
+        except Exception as e:
+            return self._error(spec, e, t0)
+
+    async def _evaluate_async(self, spec: CriticSpec, critic: Any, plan: Dict, started: Optional[Dict[str, float]] = None) -> Dict:
+        t0 = time.perf_counter()
+        if started is not None:
+            started[spec.name] = t0
+        try:
+            return self._enrich(await critic.evaluate(plan), t0)
+        except Exception as e:
+            return self._error(spec, e, t0)
+
+    def _enrich(self, result: Dict, t0: float) -> Dict:
+        out = self._impact.enrich(result)
+        out["ms"] = round((time.perf_counter() - t0) * 1000, 2)
+        return out
+
+    def _error(self, spec: CriticSpec, e: Exception, t0: float) -> Dict:
+        with self._lock:
+            self.counters["errors"] += 1
+        raw = {"name": spec.name, "passes": False, "issues": [f"Critic error: {str(e)}"]}
+        return self._enrich(raw, t0) | {"error": True}
+
+    @staticmethod
+    def _blocks(spec: CriticSpec, result: Dict) -> bool:
+        return spec.blocking and not result.get("passes", False)
+
+    def _lookup(self, plan: Dict, query: str, prior_plans: Optional[List[Dict]]) -> Tuple[Optional[str], Optional[List[Dict]]]:
+        with self._lock:
+            self.counters["runs"] += 1
+        if not self.cache_size:
+            return None, None
+        try:
+            key = plan_key(plan, query, prior_plans)
+        except (TypeError, ValueError):
+            return None, None
+        with self._lock:
+            hit = self._cache.get(key)
+            if hit is None:
+                return key, None
+            self._cache.move_to_end(key)
+            self.counters["cache_hits"] += 1
+        return key, [dict(copy.deepcopy(r), cached=True) for r in hit]
+
+    def _finish(
+        self,
+        key: Optional[str],
+        results: Dict[str, Dict],
+        timed_out: List[CriticSpec],
+        skipped: List[CriticSpec],
+        timeout: float,
+    ) -> List[Dict]:
+        ms = timeout * 1000
+        for spec in timed_out:
+            results[spec.name] = self._impact.enrich(
+                {"name": spec.name, "passes": False, "issues": [f"Critic timed out after {timeout:g}s"]}
+            ) | {"ms": round(ms, 2), "timed_out": True}
+        for spec in skipped:
+            # Still running when a blocking critic failed; the run stopped waiting.
+            results[spec.name] = {"name": spec.name, "passes": False, "issues": [], "ms": 0.0, "skipped": True}
+        with self._lock:
+            if skipped:
+                self.counters["early_exits"] += 1
+            self.counters["timeouts"] += len(timed_out)
+        # Registry order, not completion order — callers index by position.
+        ordered = [results[s.name] for s in self.specs]
+        clean = not skipped and not timed_out and not any(r.get("error") for r in ordered)
+        if key is not None and clean:
+            with self._lock:
+                self._cache[key] = copy.deepcopy(ordered)
+                self._cache.move_to_end(key)
+                while len(self._cache) > self.cache_size:
+                    self._cache.popitem(last=False)
+        return ordered
+
+
+_registry: Optional[CriticRegistry] = None
+_registry_lock = threading.Lock()
+
+
+def get_registry() -> CriticRegistry:
+    global _registry
+    with _registry_lock:
+        if _registry is None:
+            _registry = CriticRegistry(
+                max_workers=int(os.getenv("CRITIC_WORKERS", "8") or 8),
+                timeout_s=float(os.getenv("CRITIC_TIMEOUT_S", "2.0") or 2.0),
+                cache_size=int(os.getenv("CRITIC_CACHE_MAX", "256") or 256),
+            )
+        return _registry
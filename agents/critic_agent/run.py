@@ -4,7 +4,7 @@
 #
 # Upstream:
 #   - ENV: —
-#   - Imports: clarity_critic, consensus_critic, core.logging, dependency_critic, ethical_critic, feasibility_critic, impact_critic, intent_critic, json, logic_critic, performance_critic, redundancy_critic, reflection_critic, robustness_critic, safety_critic, structure_critic, temporal_critic, typing
+#   - Imports: core.logging, json, registry, typing
 #
 # Downstream:
 #   - agents.mcp_agent
@@ -12,6 +12,7 @@
 # Contents:
 #   - run()
 #   - run_critics()
+#   - arun_critics()
 
 
 
@@ -21,81 +22,52 @@
 
 
 
-from typing import List, Dict
+from typing import List, Dict, Optional
 
-# Import all 15 critics from their respective modules
-from .structure_critic import StructureCritic
-from .logic_critic import LogicCritic
-from .safety_critic import SafetyCritic
-from .clarity_critic import ClarityCritic
-from .feasibility_critic import FeasibilityCritic
-from .impact_critic import ImpactCritic  # Applied post-pass
-from .intent_critic import IntentCritic
-from .dependency_critic import DependencyCritic
-from .redundancy_critic import RedundancyCritic
-from .ethical_critic import EthicalCritic
-from .performance_critic import PerformanceCritic
-from .reflection_critic import ReflectionCritic
-from .consensus_critic import ConsensusCritic
-from .temporal_critic import TemporalCritic
-from .robustness_critic import RobustnessCritic
+from .registry import get_registry
 
 
-def run_critics(plan: Dict, query: str = "", prior_plans: List[Dict] = None) -> List[Dict]:
+def run_critics(
+    plan: Dict,
+    query: str = "",
+    prior_plans: List[Dict] = None,
+    *,
+    timeout_s: Optional[float] = None,
+    fail_fast: bool = False,
+) -> List[Dict]:
     """
-    Master critic runner. Evaluates a given plan using all 15 defined critics.
+    Master critic runner. Evaluates a given plan using all registered critics
+    (agents.critic_agent.registry), concurrently and with a per-plan cache.
 
     Args:
         plan (dict): The structured plan to be validated.
         query (str): The original user input. Required for IntentCritic.
         prior_plans (List[dict]): Optional list of historical plans for RedundancyCritic or ConsensusCritic.
+        timeout_s (float): Per-critic budget; defaults to CRITIC_TIMEOUT_S.
+        fail_fast (bool): Stop waiting once a blocking critic (structure, safety, ethical) fails.
 
     Returns:
         List[dict]: A list of critic result dictionaries. Each has:
             - name: str (critic name)
             - passes: bool
-            - issues: List[dict] or List[str] (optionally enriched with severity)
+            - issues: List[dict] (enriched with severity by ImpactCritic)
+            - ms: float (evaluation time of that critic)
     """
+    return get_registry().run(plan, query=query, prior_plans=prior_plans, timeout_s=timeout_s, fail_fast=fail_fast)
+
+
+async def arun_critics(
+    plan: Dict,
+    query: str = "",
+    prior_plans: List[Dict] = None,
+    *,
+    timeout_s: Optional[float] = None,
+    fail_fast: bool = False,
+) -> List[Dict]:
+    """Async twin of run_critics() for callers already on the event loop."""
+    return await get_registry().arun(plan, query=query, prior_plans=prior_plans, timeout_s=timeout_s, fail_fast=fail_fast)
+
 
-    if prior_plans is None:
-        prior_plans = []
-
-    core_critics = [
-        StructureCritic(),
-        LogicCritic(),
-        SafetyCritic(),
-        ClarityCritic(),
-        FeasibilityCritic(),
-        IntentCritic(query=query),
-        DependencyCritic(),
-        RedundancyCritic(prior_plans=prior_plans),
-        EthicalCritic(),
-        PerformanceCritic(),
-        ReflectionCritic(),
-        ConsensusCritic(prior_plans=prior_plans),
-        TemporalCritic(),
-        RobustnessCritic()
-    ]
-
-    results = []
-
-    # Evaluate plan using each critic
-    for critic in core_critics:
-        try:
-            result = critic.evaluate(plan)
-            results.append(result)
-        except Exception as e:
-            results.append({
-                "name": critic.name,
-                "passes": False,
-                "issues": [f"Critic error: {str(e)}"]
-            })
-
-    # Apply severity scoring to all results (post-pass ImpactCritic pass)
-    impact_enricher = ImpactCritic()
-    results = [impact_enricher.enrich(result) for result in results]
-
-    return results
 import json
 from core.logging import log_event
 
@@ -107,7 +79,7 @@ async def run(query: str, context: str, user_id: str = "system") -> List[Dict]:
     """
     try:
         plan = json.loads(context)
-        results = run_critics(plan, query=query)
+        results = await arun_critics(plan, query=query)
 
         log_event("critic_agent_result", {
             "user": user_id,
@@ -71,6 +71,8 @@ async def _summarize_llm(query: str, blobs: List[Dict[str, str]], timeout_s: int
                     user=user,
                     model=model,
                     timeout_s=timeout_s,
+                    temperature=0.0,
+                    cache="docs_summary",  # same snippets → same summary
                 )
             text = (resp.get("text") or "").strip() or "Summary not available."
             return {"summary": text, "sources": [b["source"] for b in blobs[:6]], "raw": resp.get("raw")}
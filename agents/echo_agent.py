@@ -16,6 +16,7 @@
 
 from __future__ import annotations
 
+import os
 import time
 from typing import Any, Dict, Optional
 
@@ -146,53 +147,53 @@ def invoke(
 
 # ──────────────────────────────────────────────────────────────────────────────
 # Streaming interface for /ask/stream endpoint
+# Tokens come straight from the LLM stream (services.openai_client.chat_stream);
+# without an SDK/key, or if the stream fails before its first token, the
+# deterministic answer() text is yielded once instead.
 # ──────────────────────────────────────────────────────────────────────────────
+STREAM_SYSTEM = (
+    "You are Echo, a concise assistant. Answer the user's question using the "
+    "provided context when it is relevant. Do not repeat the question; prefer "
+    "short paragraphs or 1-3 bullets."
+)
+
 async def stream(
     *,
     query: str,
     context: str = "",
     user_id: str = "anonymous",
     corr_id: Optional[str] = None,
+    model: Optional[str] = None,
+    timeout: int = 20,
     **kwargs,
 ):
     """
-    Async generator that yields streaming response chunks.
+    Async generator that yields answer text as the model produces it.
     Compatible with FastAPI StreamingResponse for /ask/stream endpoint.
     """
-    import asyncio
-
+    q = _s(query)
+    ctx = _s(context)
+    emitted = False
     try:
-        # Get the full response first
-        result = await answer(
-            query=query,
-            context=context,
-            corr_id=corr_id,
-            **kwargs
-        )
-        final_text = result.get("text", "") or result.get("answer", "")
-
-        if not final_text:
-            yield "No response generated."
+        from services import openai_client  # lazy: keeps SAFE-MODE import-light
+
+        if openai_client.available():
+            user = f"Question: {q}\n\nContext:\n{ctx[:12000] or '(none)'}"
+            async for delta in openai_client.chat_stream(
+                system=STREAM_SYSTEM,
+                user=user,
+                model=model or os.getenv("ECHO_STREAM_MODEL", DEFAULT_MODEL),
+                timeout_s=timeout,
+            ):
+                emitted = True
+                yield delta
             return
-
-        # Stream in word chunks for better UX
-        words = final_text.split()
-        chunk_size = 3  # 3 words per chunk
-
-        for i in range(0, len(words), chunk_size):
-            chunk = " ".join(words[i:i + chunk_size])
-            if i + chunk_size < len(words):
-                chunk += " "
-            yield chunk
-            # Small delay for streaming effect
-            await asyncio.sleep(0.05)
-
     except Exception as e:
-        log_event(
-            "echo_stream_error",
-            {
-                "corr_id": corr_id,
-                "error": str(e),
-            },
-        )
-        yield f"[Stream error: {str(e)}]"
+        log_event("echo_stream_error", {"corr_id": corr_id, "error": str(e), "emitted": emitted})
+        if emitted:
+            yield f"[Stream error: {str(e)}]"
+            return
+
+    # Deterministic fallback: one chunk, no artificial pacing
+    result = await answer(query=q, context=ctx, corr_id=corr_id, **kwargs)
+    yield result.get("text", "") or result.get("answer", "") or "No response generated."
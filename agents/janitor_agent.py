@@ -4,7 +4,7 @@
 #
 # Upstream:
 #   - ENV: —
-#   - Imports: json, os, pathlib, services.memory
+#   - Imports: services.session_store
 #
 # Downstream:
 #   - agents.mcp_agent
@@ -18,22 +18,19 @@ async def run(query: str, context: str, user_id: str = "system") -> dict:
     """
     Summarizes memory logs, detects duplicates, removes noise, and compresses the log footprint.
     """
-    from services.memory import summarize_memory_entry
-    import os, json
-    from pathlib import Path
+    from services.session_store import get_store
 
-    path = Path(f"./logs/sessions/{user_id}.jsonl")
-    if not path.exists():
+    store = get_store()
+    if not store.segments(user_id):
         return {"status": "no memory log found"}
 
-    lines = path.read_text().splitlines()
-    entries = [json.loads(line) for line in lines[-100:] if line.strip()]
-    
+    entries = store.tail(user_id, 100)
+
     seen = set()
     compressed = []
 
     for entry in entries:
-        key = (entry["query"], entry["summary"][:50])
+        key = (entry.get("query"), str(entry.get("summary", ""))[:50])
         if key not in seen:
             seen.add(key)
             compressed.append(entry)
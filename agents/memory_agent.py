@@ -4,7 +4,7 @@
 #
 # Upstream:
 #   - ENV: —
-#   - Imports: core.logging, datetime, json, os, pathlib, typing
+#   - Imports: core.logging, datetime, json, os, pathlib, services.session_store, typing
 #
 # Downstream:
 #   - agents.mcp_agent
@@ -30,25 +30,21 @@ from pathlib import Path
 from typing import List, Dict, Optional
 from datetime import datetime, timedelta
 from core.logging import log_event
+from services.session_store import SessionStore, get_store
 
 SESSION_DIR = "./logs/sessions"
 
 class MemoryAgent:
     def __init__(self, log_dir: str = SESSION_DIR):
         self.log_dir = Path(log_dir)
+        self.store = get_store() if log_dir == SESSION_DIR else SessionStore(self.log_dir)
 
     def _load_entries(self, user_id: str, limit: int = 10) -> List[Dict]:
         """
-        Load recent memory entries for the user.
+        Load recent memory entries for the user (tail read from EOF; O(limit)).
         """
-        path = self.log_dir / f"{user_id}.jsonl"
-        if not path.exists():
-            return []
-
         try:
-            lines = path.read_text(encoding="utf-8").splitlines()
-            entries = [json.loads(line) for line in lines if line.strip()]
-            return entries[-limit:]  # Most recent entries
+            return self.store.tail(user_id, limit)
         except Exception as e:
             log_event("memory_agent_load_error", {"error": str(e)})
             return []
@@ -0,0 +1,444 @@
+"""
+File  : backend/solark_browser/plant_flow_ingest.py
+Purpose: Long-running SolArk plant_flow ingester (batched, outage-tolerant).
+
+What it does
+────────────
+• Keeps one pooled Postgres connection open (reconnects with backoff).
+• Accumulates snapshots and flushes them in batches with execute_values.
+• If Postgres is unreachable, spools samples to an append-only JSONL file and
+  replays them in order (ahead of new samples) once the DB is back.
+• Rows Postgres rejects (DataError, IntegrityError, …) are isolated by
+  bisecting the batch and moved to <spool>.quarantine.jsonl, so one bad
+  sample cannot block the spool; the rest of the batch is still written.
+• Logs rows/s and flush latency after every flush.
+
+Run modes
+─────────
+• Library : PlantFlowIngester(...).add(snapshot) / .flush()
+            (poll_and_insert.py uses this for the one-shot cron path)
+• Service : python3 plant_flow_ingest.py [--interval 60] [--fetch-cmd "node fetch_plant_flow.js"]
+            Each tick optionally runs the fetch command, then ingests
+            plant_flow.json if its mtime changed.
+
+Env
+───
+• DATABASE_URL  -or-  PGHOST PGPORT PGUSER PGPASSWORD PGDATABASE
+• PLANT_ID                         e.g. 146453
+• INGEST_BATCH_SIZE=30             rows per flush
+• INGEST_FLUSH_INTERVAL_S=300      max age of the oldest buffered row
+• INGEST_SPOOL_PATH=spool/plant_flow.spool.jsonl
+• INGEST_ROLLUPS=1                 maintain 1m/15m/1h/1d rollups per batch
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import logging
+import os
+import subprocess
+import sys
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+
+import psycopg2
+from psycopg2 import pool as pg_pool
+from psycopg2.extras import Json, execute_values
+
+log = logging.getLogger("solark.ingest")
+
+# Errors that mean "Postgres is not reachable right now" → spool and retry later.
+# Any other psycopg2.Error is about the rows themselves → quarantine them.
+TRANSIENT_ERRORS = (psycopg2.OperationalError, psycopg2.InterfaceError)
+
+# ── Column mapping (SolArk JSON key → solark.plant_flow column) ─────────
+SNAPSHOT_COLUMNS: List[Tuple[str, str]] = [
+    ("pv_power", "pvPower"),
+    ("batt_power", "battPower"),
+    ("grid_power", "gridOrMeterPower"),
+    ("load_power", "loadOrEpsPower"),
+    ("gen_power", "genPower"),
+    ("min_power", "minPower"),
+    ("soc", "soc"),
+    ("pv_to", "pvTo"),
+    ("to_load", "toLoad"),
+    ("to_grid", "toGrid"),
+    ("to_bat", "toBat"),
+    ("bat_to", "batTo"),
+    ("grid_to", "gridTo"),
+    ("gen_to", "genTo"),
+    ("min_to", "minTo"),
+    ("exists_gen", "existsGen"),
+    ("exists_min", "existsMin"),
+    ("gen_on", "genOn"),
+    ("micro_on", "microOn"),
+    ("exists_meter", "existsMeter"),
+    ("bms_comm_fault_flag", "bmsCommFaultFlag"),
+    ("pv", "pv"),
+    ("exist_think_power", "existThinkPower"),
+]
+COLUMNS: List[str] = ["plant_id", "ts"] + [c for c, _ in SNAPSHOT_COLUMNS] + ["raw_json"]
+
+INSERT_SQL = f"INSERT INTO solark.plant_flow ({', '.join(COLUMNS)}) VALUES %s"
+
+
+def snapshot_to_row(plant_id: int, ts: datetime, snap: Dict[str, Any]) -> Tuple[Any, ...]:
+    """Build one INSERT tuple in COLUMNS order (raw_json as JSONB)."""
+    return (plant_id, ts, *[snap.get(key) for _, key in SNAPSHOT_COLUMNS], Json(snap))
+
+
+def connect_kwargs_from_env() -> Dict[str, Any]:
+    """DATABASE_URL wins; otherwise PG* parts. Raises KeyError if incomplete."""
+    dsn = os.environ.get("DATABASE_URL")
+    if dsn:
+        return {"dsn": dsn}
+    return dict(
+        host=os.environ["PGHOST"],
+        port=int(os.environ["PGPORT"]),
+        user=os.environ["PGUSER"],
+        password=os.environ["PGPASSWORD"],
+        dbname=os.environ["PGDATABASE"],
+    )
+
+
+def rollups_enabled() -> bool:
+    """INGEST_ROLLUPS=0 disables rollup maintenance (see plant_flow_rollups.py)."""
+    return os.getenv("INGEST_ROLLUPS", "1").lower() not in ("0", "false", "no")
+
+
+# ── Sample = (plant_id, ts, snapshot) ───────────────────────────────────
+Sample = Tuple[int, datetime, Dict[str, Any]]
+
+
+# ╔════════════════════════════════════════════════════════════════════╗
+# ║ Append-only spool                                                  ║
+# ╚════════════════════════════════════════════════════════════════════╝
+
+class Spool:
+    """
+    Append-only JSONL spool with a committed-offset sidecar.
+
+    Replay reads from the committed byte offset, so a crash mid-replay resumes
+    where it left off; once everything is replayed the spool is truncated.
+    """
+
+    def __init__(self, path: str | Path):
+        self.path = Path(path)
+        self.offset_path = self.path.with_suffix(self.path.suffix + ".offset")
+
+    def append(self, samples: List[Sample]) -> None:
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        with self.path.open("a", encoding="utf-8") as f:
+            for plant_id, ts, snap in samples:
+                f.write(json.dumps({"plant_id": plant_id, "ts": ts.isoformat(), "snap": snap}) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+
+    def _offset(self) -> int:
+        try:
+            return int(self.offset_path.read_text().strip() or 0)
+        except (OSError, ValueError):
+            return 0
+
+    def _commit_offset(self, offset: int) -> None:
+        tmp = self.offset_path.with_suffix(".tmp")
+        tmp.write_text(str(offset))
+        os.replace(tmp, self.offset_path)
+
+    def pending(self) -> bool:
+        try:
+            return self.path.stat().st_size > self._offset()
+        except OSError:
+            return False
+
+    def batches(self, size: int) -> Iterator[Tuple[List[Sample], int]]:
+        """Yield (samples, end_offset) in file order, starting at the committed offset."""
+        if not self.path.exists():
+            return
+        with self.path.open("rb") as f:
+            f.seek(self._offset())
+            batch: List[Sample] = []
+            for raw in iter(f.readline, b""):
+                if not raw.endswith(b"\n"):
+                    break  # torn tail from a crash mid-append; leave it
+                try:
+                    rec = json.loads(raw)
+                    batch.append((int(rec["plant_id"]), datetime.fromisoformat(rec["ts"]), rec["snap"]))
+                except (ValueError, KeyError, TypeError) as e:
+                    log.warning("skipping corrupt spool line: %s", e)
+                if len(batch) >= size:
+                    yield batch, f.tell()
+                    batch = []
+            if batch:
+                yield batch, f.tell()
+
+    def commit(self, end_offset: int) -> None:
+        """Mark everything before end_offset as durable in Postgres."""
+        if end_offset >= self.path.stat().st_size:
+            self.path.unlink(missing_ok=True)
+            self.offset_path.unlink(missing_ok=True)
+        else:
+            self._commit_offset(end_offset)
+
+
+# ╔════════════════════════════════════════════════════════════════════╗
+# ║ Ingester                                                           ║
+# ╚════════════════════════════════════════════════════════════════════╝
+
+class PlantFlowIngester:
+    """Batching writer for solark.plant_flow with spool-on-outage."""
+
+    def __init__(
+        self,
+        connect_kwargs: Dict[str, Any],
+        *,
+        batch_size: int = 30,
+        flush_interval_s: float = 300.0,
+        spool_path: str | Path = "spool/plant_flow.spool.jsonl",
+        reconnect_backoff_s: float = 30.0,
+    ):
+        self.connect_kwargs = connect_kwargs
+        self.batch_size = max(1, int(batch_size))
+        self.flush_interval_s = float(flush_interval_s)
+        self.spool = Spool(spool_path)
+        spool_path = Path(spool_path)
+        self.quarantine = Spool(spool_path.with_name(spool_path.stem + ".quarantine" + spool_path.suffix))
+        self.reconnect_backoff_s = float(reconnect_backoff_s)
+        self._pool: Optional[pg_pool.SimpleConnectionPool] = None
+        self._buffer: List[Sample] = []
+        self._oldest: Optional[float] = None
+        self._next_connect_at = 0.0
+        # Hook run inside the insert transaction with the flushed samples
+        # (e.g. rollup maintenance). Signature: (cursor, samples) -> None
+        self.after_insert: Optional[Callable[[Any, List[Sample]], None]] = None
+        # Stats
+        self.started = time.monotonic()
+        self.rows_written = 0
+        self.rows_spooled = 0
+        self.rows_replayed = 0
+        self.rows_quarantined = 0
+        self.flushes = 0
+        self.last_flush_ms = 0.0
+
+    # ── Connection handling ──────────────────────────────────────────
+    def _conn(self):
+        if self._pool is None:
+            if time.monotonic() < self._next_connect_at:
+                raise psycopg2.OperationalError("reconnect backoff in effect")
+            try:
+                self._pool = pg_pool.SimpleConnectionPool(1, 1, **self.connect_kwargs)
+            except psycopg2.Error:
+                self._next_connect_at = time.monotonic() + self.reconnect_backoff_s
+                raise
+        return self._pool.getconn()
+
+    def _release(self, conn, broken: bool) -> None:
+        if self._pool is None:
+            return
+        self._pool.putconn(conn, close=broken)
+        if broken:
+            self._pool.closeall()
+            self._pool = None
+            self._next_connect_at = time.monotonic() + self.reconnect_backoff_s
+
+    def close(self) -> None:
+        if self._pool is not None:
+            self._pool.closeall()
+            self._pool = None
+
+    # ── Write path ───────────────────────────────────────────────────
+    def _write_rows(self, cur, samples: List[Sample]) -> None:
+        rows = [snapshot_to_row(pid, ts, snap) for pid, ts, snap in samples]
+        execute_values(cur, INSERT_SQL, rows, page_size=self.batch_size)
+
+    def _insert(self, samples: List[Sample]) -> None:
+        """Insert samples in one transaction; rolls back and re-raises on any failure."""
+        conn = self._conn()
+        broken = False
+        try:
+            with conn.cursor() as cur:
+                self._write_rows(cur, samples)
+                if self.after_insert is not None:
+                    self.after_insert(cur, samples)
+            conn.commit()
+        except Exception:
+            broken = bool(getattr(conn, "closed", 0))
+            try:
+                conn.rollback()
+            except psycopg2.Error:
+                broken = True
+            raise
+        finally:
+            self._release(conn, broken)
+
+    def add(self, snap: Dict[str, Any], *, plant_id: int, ts: Optional[datetime] = None) -> None:
+        """Buffer one snapshot; flushes when the batch is full or old enough."""
+        self._buffer.append((plant_id, ts or datetime.now(timezone.utc), snap))
+        if self._oldest is None:
+            self._oldest = time.monotonic()
+        if self.due():
+            self.flush()
+
+    def due(self) -> bool:
+        if not self._buffer:
+            return False
+        if len(self._buffer) >= self.batch_size:
+            return True
+        return self._oldest is not None and (time.monotonic() - self._oldest) >= self.flush_interval_s
+
+    def _insert_or_quarantine(self, samples: List[Sample]) -> int:
+        """
+        Insert samples; if Postgres rejects the data, bisect down to the
+        offending rows and quarantine them. Returns rows written. Transient
+        (connection) errors propagate so the caller can spool.
+        """
+        try:
+            self._insert(samples)
+            return len(samples)
+        except TRANSIENT_ERRORS:
+            raise
+        except psycopg2.Error as e:
+            if len(samples) == 1:
+                pid, ts, _snap = samples[0]
+                self.quarantine.append(samples)
+                self.rows_quarantined += 1
+                log.warning("quarantined plant=%s ts=%s (%s) → %s",
+                            pid, ts.isoformat(), str(e).strip(), self.quarantine.path)
+                return 0
+            mid = len(samples) // 2
+            return self._insert_or_quarantine(samples[:mid]) + self._insert_or_quarantine(samples[mid:])
+
+    def replay_spool(self) -> bool:
+        """Drain the spool in order. Returns True if the spool is now empty."""
+        for samples, end in self.spool.batches(self.batch_size):
+            written = self._insert_or_quarantine(samples)
+            self.spool.commit(end)
+            self.rows_replayed += written
+            log.info("replayed %d spooled rows", written)
+        return not self.spool.pending()
+
+    def flush(self) -> Dict[str, Any]:
+        """
+        Write buffered samples. Spooled samples always go first so rows land
+        in arrival order. When Postgres is unreachable (or anything else
+        fails, e.g. the after_insert hook) the buffer is appended to the
+        spool; rows Postgres rejects are quarantined instead.
+        """
+        samples, self._buffer, self._oldest = self._buffer, [], None
+        if not samples and not self.spool.pending():
+            return self.stats()
+        t0 = time.perf_counter()
+        try:
+            if self.spool.pending():
+                self.replay_spool()
+            if samples:
+                self.rows_written += self._insert_or_quarantine(samples)
+        except Exception as e:
+            if samples:
+                self.spool.append(samples)
+                self.rows_spooled += len(samples)
+            if isinstance(e, TRANSIENT_ERRORS):
+                log.warning("Postgres unavailable (%s); spooled %d rows to %s",
+                            str(e).strip(), len(samples), self.spool.path)
+            else:
+                log.exception("flush failed; spooled %d rows to %s", len(samples), self.spool.path)
+            return self.stats()
+        self.flushes += 1
+        self.last_flush_ms = (time.perf_counter() - t0) * 1000.0
+        s = self.stats()
+        log.info("flushed rows=%d flush_ms=%.1f rows_per_s=%.3f replayed_total=%d",
+                 len(samples), self.last_flush_ms, s["rows_per_s"], self.rows_replayed)
+        return s
+
+    def stats(self) -> Dict[str, Any]:
+        elapsed = max(1e-9, time.monotonic() - self.started)
+        return {
+            "rows_written": self.rows_written,
+            "rows_replayed": self.rows_replayed,
+            "rows_spooled": self.rows_spooled,
+            "rows_quarantined": self.rows_quarantined,
+            "rows_per_s": (self.rows_written + self.rows_replayed) / elapsed,
+            "flushes": self.flushes,
+            "last_flush_ms": round(self.last_flush_ms, 2),
+            "buffered": len(self._buffer),
+            "spool_pending": self.spool.pending(),
+        }
+
+
+# ╔════════════════════════════════════════════════════════════════════╗
+# ║ Service loop                                                       ║
+# ╚════════════════════════════════════════════════════════════════════╝
+
+def _read_snapshot(path: Path) -> Optional[Dict[str, Any]]:
+    try:
+        with path.open("r") as f:
+            snap = json.load(f)
+        return snap if isinstance(snap, dict) else None
+    except (OSError, ValueError) as e:
+        log.warning("could not read %s: %s", path, e)
+        return None
+
+
+def run_forever(ingester: PlantFlowIngester, *, plant_id: int, snap_path: Path,
+                interval_s: float, fetch_cmd: Optional[str]) -> None:
+    last_mtime = None
+    while True:
+        tick = time.monotonic()
+        if fetch_cmd:
+            rc = subprocess.call(fetch_cmd, shell=True)
+            if rc != 0:
+                log.warning("fetch command exited %s", rc)
+        try:
+            mtime = snap_path.stat().st_mtime
+        except OSError:
+            mtime = None
+        if mtime is not None and mtime != last_mtime:
+            snap = _read_snapshot(snap_path)
+            if snap is not None:
+                ingester.add(snap, plant_id=plant_id)
+                last_mtime = mtime
+        elif ingester.due() or ingester.spool.pending():
+            ingester.flush()
+        time.sleep(max(0.0, interval_s - (time.monotonic() - tick)))
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
+    ap = argparse.ArgumentParser(description="Long-running SolArk plant_flow ingester")
+    ap.add_argument("--snapshot", default="plant_flow.json")
+    ap.add_argument("--interval", type=float, default=float(os.getenv("INGEST_POLL_INTERVAL_S", "60")))
+    ap.add_argument("--fetch-cmd", default=os.getenv("INGEST_FETCH_CMD"))
+    args = ap.parse_args(argv)
+
+    if "PLANT_ID" not in os.environ:
+        sys.exit("❌ Missing PLANT_ID env var")
+    try:
+        kwargs = connect_kwargs_from_env()
+    except KeyError:
+        sys.exit("❌ Missing Postgres connection vars: DATABASE_URL  or  PGHOST PGPORT PGUSER PGPASSWORD PGDATABASE")
+
+    ingester = PlantFlowIngester(
+        kwargs,
+        batch_size=int(os.getenv("INGEST_BATCH_SIZE", "30")),
+        flush_interval_s=float(os.getenv("INGEST_FLUSH_INTERVAL_S", "300")),
+        spool_path=os.getenv("INGEST_SPOOL_PATH", "spool/plant_flow.spool.jsonl"),
+    )
+    if rollups_enabled():
+        from plant_flow_rollups import apply_batch
+        ingester.after_insert = apply_batch
+    try:
+        run_forever(ingester, plant_id=int(os.environ["PLANT_ID"]), snap_path=Path(args.snapshot),
+                    interval_s=args.interval, fetch_cmd=args.fetch_cmd)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        ingester.flush()
+        ingester.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
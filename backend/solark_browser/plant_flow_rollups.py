@@ -0,0 +1,384 @@
+"""
+File  : backend/solark_browser/plant_flow_rollups.py
+Purpose: Incrementally maintained time-bucket rollups over solark.plant_flow.
+
+Tables (one per grain, same shape)
+──────────────────────────────────
+solark.plant_flow_1m / _15m / _1h / _1d   PRIMARY KEY (plant_id, bucket)
+
+  n, first_ts, last_ts
+  <m>_n, <m>_min, <m>_max, <m>_sum, <m>_last   for m in METRICS
+  <e>_wh                                       energy integral per power metric
+
+avg is <m>_sum / <m>_n at query time, so partial aggregates merge exactly.
+Buckets are UTC-aligned (daily buckets start at 00:00 UTC).
+
+How it is kept current
+──────────────────────
+PlantFlowIngester.after_insert = apply_batch  → runs in the same transaction
+as the raw INSERT. A batch that only extends a plant's history (the normal
+case) is aggregated in Python per grain and upserted with ON CONFLICT merges
+(LEAST/GREATEST/sum, newest-wins for *_last).
+
+A batch that lands before samples already stored for the plant (spool
+replay, late or duplicate delivery) cannot be merged: the stored successor's
+energy interval was computed against an older predecessor. For those plants
+the UTC days from the batch's first sample through that successor are
+deleted and rebuilt from the raw rows.
+
+Energy integrals use the left-open step rule: each sample's power is held
+for the interval since the previous sample of the same plant (capped at
+ROLLUP_MAX_GAP_S so outages don't invent energy) and credited to the bucket
+the sample lands in. Rebuilds and --backfill --since seed that interval with
+the last raw sample before the rebuilt range.
+
+CLI
+───
+python3 plant_flow_rollups.py --init               # create tables/indexes
+python3 plant_flow_rollups.py --backfill [--since 2025-01-01]
+"""
+
+from __future__ import annotations
+
+import argparse
+import logging
+import os
+import sys
+from datetime import datetime, timezone
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+log = logging.getLogger("solark.rollups")
+
+# grain name → bucket width (seconds)
+GRAINS: Dict[str, int] = {"1m": 60, "15m": 900, "1h": 3600, "1d": 86400}
+POWER_METRICS: Tuple[str, ...] = ("pv_power", "batt_power", "grid_power", "load_power", "gen_power")
+METRICS: Tuple[str, ...] = POWER_METRICS + ("soc",)
+ENERGY: Dict[str, str] = {m: m.replace("_power", "_wh") for m in POWER_METRICS}
+
+MAX_GAP_S = float(os.getenv("ROLLUP_MAX_GAP_S", "900"))
+
+# Column name → SolArk JSON key (subset of plant_flow_ingest.SNAPSHOT_COLUMNS)
+_JSON_KEYS = {
+    "pv_power": "pvPower",
+    "batt_power": "battPower",
+    "grid_power": "gridOrMeterPower",
+    "load_power": "loadOrEpsPower",
+    "gen_power": "genPower",
+    "soc": "soc",
+}
+
+
+def table_for(grain: str) -> str:
+    return f"solark.plant_flow_{grain}"
+
+
+def bucket_start(ts: datetime, width_s: int) -> datetime:
+    epoch = int(ts.timestamp())
+    return datetime.fromtimestamp(epoch - (epoch % width_s), tz=timezone.utc)
+
+
+def _num(v: Any) -> Optional[float]:
+    if v is None or isinstance(v, bool):
+        return None
+    try:
+        return float(v)
+    except (TypeError, ValueError):
+        return None
+
+
+# ╔════════════════════════════════════════════════════════════════════╗
+# ║ Pure aggregation                                                   ║
+# ╚════════════════════════════════════════════════════════════════════╝
+
+def _empty_agg() -> Dict[str, Any]:
+    agg: Dict[str, Any] = {"n": 0, "first_ts": None, "last_ts": None}
+    for m in METRICS:
+        agg.update({f"{m}_n": 0, f"{m}_min": None, f"{m}_max": None, f"{m}_sum": 0.0, f"{m}_last": None})
+    for e in ENERGY.values():
+        agg[e] = 0.0
+    return agg
+
+
+def aggregate(
+    samples: Iterable[Tuple[int, datetime, Dict[str, Any]]],
+    prev_ts: Optional[Dict[int, datetime]] = None,
+    *,
+    max_gap_s: float = MAX_GAP_S,
+) -> Dict[str, Dict[Tuple[int, datetime], Dict[str, Any]]]:
+    """
+    Fold (plant_id, ts, snapshot) samples into per-grain partial aggregates.
+
+    prev_ts maps plant_id → timestamp of the last sample already stored before
+    this batch (for the first energy interval). Returns
+    {grain: {(plant_id, bucket): agg}}.
+    """
+    prev = dict(prev_ts or {})
+    out: Dict[str, Dict[Tuple[int, datetime], Dict[str, Any]]] = {g: {} for g in GRAINS}
+    for plant_id, ts, snap in sorted(samples, key=lambda s: (s[0], s[1])):
+        values = {m: _num(snap.get(_JSON_KEYS[m])) for m in METRICS}
+        last = prev.get(plant_id)
+        dt_s = 0.0
+        if last is not None:
+            dt_s = min(max(0.0, (ts - last).total_seconds()), max_gap_s)
+        prev[plant_id] = ts
+
+        for grain, width in GRAINS.items():
+            key = (plant_id, bucket_start(ts, width))
+            agg = out[grain].get(key)
+            if agg is None:
+                agg = out[grain][key] = _empty_agg()
+            agg["n"] += 1
+            agg["first_ts"] = ts if agg["first_ts"] is None else min(agg["first_ts"], ts)
+            if agg["last_ts"] is None or ts >= agg["last_ts"]:
+                agg["last_ts"] = ts
+                for m in METRICS:
+                    agg[f"{m}_last"] = values[m]
+            for m, v in values.items():
+                if v is None:
+                    continue
+                agg[f"{m}_n"] += 1
+                agg[f"{m}_sum"] += v
+                agg[f"{m}_min"] = v if agg[f"{m}_min"] is None else min(agg[f"{m}_min"], v)
+                agg[f"{m}_max"] = v if agg[f"{m}_max"] is None else max(agg[f"{m}_max"], v)
+            for m, e in ENERGY.items():
+                if values[m] is not None:
+                    agg[e] += values[m] * dt_s / 3600.0
+    return out
+
+
+# ╔════════════════════════════════════════════════════════════════════╗
+# ║ SQL                                                                ║
+# ╚════════════════════════════════════════════════════════════════════╝
+
+def _agg_columns() -> List[str]:
+    cols = ["n", "first_ts", "last_ts"]
+    for m in METRICS:
+        cols += [f"{m}_n", f"{m}_min", f"{m}_max", f"{m}_sum", f"{m}_last"]
+    cols += list(ENERGY.values())
+    return cols
+
+
+AGG_COLUMNS = _agg_columns()
+
+
+def ddl() -> List[str]:
+    stmts = [
+        "CREATE SCHEMA IF NOT EXISTS solark",
+        # Needed for the previous-sample lookup and for backfill scans
+        "CREATE INDEX IF NOT EXISTS plant_flow_plant_ts ON solark.plant_flow (plant_id, ts)",
+    ]
+    body = ["plant_id BIGINT NOT NULL", "bucket TIMESTAMPTZ NOT NULL",
+            "n INTEGER NOT NULL", "first_ts TIMESTAMPTZ", "last_ts TIMESTAMPTZ"]
+    for m in METRICS:
+        body += [f"{m}_n INTEGER NOT NULL DEFAULT 0", f"{m}_min DOUBLE PRECISION",
+                 f"{m}_max DOUBLE PRECISION", f"{m}_sum DOUBLE PRECISION NOT NULL DEFAULT 0",
+                 f"{m}_last DOUBLE PRECISION"]
+    body += [f"{e} DOUBLE PRECISION NOT NULL DEFAULT 0" for e in ENERGY.values()]
+    body.append("PRIMARY KEY (plant_id, bucket)")
+    for grain in GRAINS:
+        stmts.append(f"CREATE TABLE IF NOT EXISTS {table_for(grain)} ({', '.join(body)})")
+    return stmts
+
+
+def upsert_sql(grain: str) -> str:
+    sets = [
+        "n = t.n + EXCLUDED.n",
+        "first_ts = LEAST(t.first_ts, EXCLUDED.first_ts)",
+        "last_ts = GREATEST(t.last_ts, EXCLUDED.last_ts)",
+    ]
+    newer = "EXCLUDED.last_ts >= t.last_ts"
+    for m in METRICS:
+        sets += [
+            f"{m}_n = t.{m}_n + EXCLUDED.{m}_n",
+            f"{m}_min = LEAST(t.{m}_min, EXCLUDED.{m}_min)",
+            f"{m}_max = GREATEST(t.{m}_max, EXCLUDED.{m}_max)",
+            f"{m}_sum = t.{m}_sum + EXCLUDED.{m}_sum",
+            f"{m}_last = CASE WHEN {newer} THEN EXCLUDED.{m}_last ELSE t.{m}_last END",
+        ]
+    sets += [f"{e} = t.{e} + EXCLUDED.{e}" for e in ENERGY.values()]
+    cols = ", ".join(["plant_id", "bucket"] + AGG_COLUMNS)
+    return (
+        f"INSERT INTO {table_for(grain)} AS t ({cols}) VALUES %s "
+        f"ON CONFLICT (plant_id, bucket) DO UPDATE SET {', '.join(sets)}"
+    )
+
+
+def ensure_schema(cur) -> None:
+    for stmt in ddl():
+        cur.execute(stmt)
+
+
+def _prev_sample_ts(cur, samples: List[Tuple[int, datetime, Dict[str, Any]]]) -> Dict[int, datetime]:
+    """Last stored ts per plant strictly before that plant's earliest batch sample."""
+    first: Dict[int, datetime] = {}
+    for pid, ts, _ in samples:
+        first[pid] = ts if pid not in first else min(first[pid], ts)
+    prev: Dict[int, datetime] = {}
+    for pid, ts in first.items():
+        cur.execute(
+            "SELECT ts FROM solark.plant_flow WHERE plant_id = %s AND ts < %s ORDER BY ts DESC LIMIT 1",
+            (pid, ts),
+        )
+        row = cur.fetchone()
+        if row:
+            prev[pid] = row[0]
+    return prev
+
+
+def _late_plants(cur, samples: List[Tuple[int, datetime, Dict[str, Any]]]) -> Dict[int, Tuple[datetime, datetime]]:
+    """
+    Plants whose batch is not a pure append, with the day-aligned [start, end)
+    range to rebuild. Runs after the raw INSERT, so stored rows include the batch.
+    """
+    per_plant: Dict[int, List[datetime]] = {}
+    for pid, ts, _ in samples:
+        per_plant.setdefault(pid, []).append(ts)
+    late: Dict[int, Tuple[datetime, datetime]] = {}
+    for pid, stamps in per_plant.items():
+        lo, hi = min(stamps), max(stamps)
+        cur.execute("SELECT count(*) FROM solark.plant_flow WHERE plant_id = %s AND ts >= %s", (pid, lo))
+        if cur.fetchone()[0] <= len(stamps):
+            continue  # nothing stored at/after the batch except the batch itself
+        cur.execute("SELECT min(ts) FROM solark.plant_flow WHERE plant_id = %s AND ts > %s", (pid, hi))
+        successor = cur.fetchone()[0] or hi
+        late[pid] = rebuild_range(lo, successor)
+    return late
+
+
+def rebuild_range(first: datetime, last: datetime) -> Tuple[datetime, datetime]:
+    """UTC-day-aligned [start, end) covering first..last; whole buckets of every grain."""
+    start = bucket_start(first, 86400)
+    end = datetime.fromtimestamp(bucket_start(last, 86400).timestamp() + 86400, tz=timezone.utc)
+    return start, end
+
+
+def _raw_sample(row) -> Tuple[int, datetime, Dict[str, Any]]:
+    return row[0], row[1], {_JSON_KEYS[c]: v for c, v in zip(_JSON_KEYS, row[2:])}
+
+
+def rebuild_plant_range(cur, plant_id: int, start: datetime, end: datetime) -> int:
+    """Replace one plant's rollup buckets in [start, end) with a re-aggregation of its raw rows."""
+    for grain in GRAINS:
+        cur.execute(f"DELETE FROM {table_for(grain)} WHERE plant_id = %s AND bucket >= %s AND bucket < %s",
+                    (plant_id, start, end))
+    cur.execute("SELECT ts FROM solark.plant_flow WHERE plant_id = %s AND ts < %s ORDER BY ts DESC LIMIT 1",
+                (plant_id, start))
+    row = cur.fetchone()
+    prev = {plant_id: row[0]} if row else {}
+    cols = ", ".join(_JSON_KEYS)
+    cur.execute(f"SELECT plant_id, ts, {cols} FROM solark.plant_flow "
+                f"WHERE plant_id = %s AND ts >= %s AND ts < %s ORDER BY ts", (plant_id, start, end))
+    samples = [_raw_sample(r) for r in cur.fetchall()]
+    write_aggregates(cur, aggregate(samples, prev))
+    return len(samples)
+
+
+def write_aggregates(cur, aggs: Dict[str, Dict[Tuple[int, datetime], Dict[str, Any]]]) -> int:
+    from psycopg2.extras import execute_values
+
+    written = 0
+    for grain, buckets in aggs.items():
+        if not buckets:
+            continue
+        rows = [(pid, bucket, *[a[c] for c in AGG_COLUMNS]) for (pid, bucket), a in buckets.items()]
+        execute_values(cur, upsert_sql(grain), rows)
+        written += len(rows)
+    return written
+
+
+_schema_ready = False
+
+
+def apply_batch(cur, samples: List[Tuple[int, datetime, Dict[str, Any]]]) -> None:
+    """
+    PlantFlowIngester.after_insert hook: fold a freshly inserted batch into the rollups.
+
+    Runs under a SAVEPOINT so a rollup failure never rolls back (and spools)
+    the raw rows; a later --backfill repairs the affected buckets.
+    """
+    global _schema_ready
+    if not samples:
+        return
+    import psycopg2
+
+    cur.execute("SAVEPOINT plant_flow_rollups")
+    try:
+        if not _schema_ready:
+            ensure_schema(cur)
+            _schema_ready = True
+        late = _late_plants(cur, samples)
+        appended = [s for s in samples if s[0] not in late]
+        if appended:
+            write_aggregates(cur, aggregate(appended, _prev_sample_ts(cur, appended)))
+        for pid, (start, end) in late.items():
+            n = rebuild_plant_range(cur, pid, start, end)
+            log.info("late samples for plant %s: rebuilt %s..%s from %d raw rows", pid, start, end, n)
+        cur.execute("RELEASE SAVEPOINT plant_flow_rollups")
+    except psycopg2.Error as e:
+        cur.execute("ROLLBACK TO SAVEPOINT plant_flow_rollups")
+        log.warning("rollup update skipped (%s); run --backfill to repair", str(e).strip())
+
+
+def backfill(conn, since: Optional[datetime] = None, chunk: int = 5000) -> int:
+    """Rebuild rollups from raw rows (truncate + replay). Returns raw rows scanned."""
+    with conn.cursor() as cur:
+        ensure_schema(cur)
+        for grain in GRAINS:
+            if since is None:
+                cur.execute(f"TRUNCATE {table_for(grain)}")
+            else:
+                cur.execute(f"DELETE FROM {table_for(grain)} WHERE bucket >= %s",
+                            (bucket_start(since, 86400),))
+    start = bucket_start(since, 86400) if since else None
+    scanned = 0
+    prev: Dict[int, datetime] = {}
+    if start is not None:
+        # Seed each plant's first energy interval with its last sample before the range.
+        with conn.cursor() as cur:
+            cur.execute("SELECT plant_id, max(ts) FROM solark.plant_flow WHERE ts < %s GROUP BY plant_id", (start,))
+            prev = {pid: ts for pid, ts in cur.fetchall()}
+    with conn.cursor(name="rollup_backfill") as raw, conn.cursor() as cur:
+        cols = ", ".join(_JSON_KEYS)
+        if start is None:
+            raw.execute(f"SELECT plant_id, ts, {cols} FROM solark.plant_flow ORDER BY plant_id, ts")
+        else:
+            raw.execute(f"SELECT plant_id, ts, {cols} FROM solark.plant_flow WHERE ts >= %s "
+                        f"ORDER BY plant_id, ts", (start,))
+        while True:
+            rows = raw.fetchmany(chunk)
+            if not rows:
+                break
+            samples = [_raw_sample(r) for r in rows]
+            write_aggregates(cur, aggregate(samples, prev))
+            for pid, ts, _ in samples:
+                prev[pid] = ts
+            scanned += len(rows)
+    conn.commit()
+    return scanned
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
+    ap = argparse.ArgumentParser(description="Maintain solark.plant_flow rollup tables")
+    ap.add_argument("--init", action="store_true", help="create rollup tables and indexes")
+    ap.add_argument("--backfill", action="store_true", help="rebuild rollups from raw rows")
+    ap.add_argument("--since", help="ISO date; backfill only from this day (UTC)")
+    args = ap.parse_args(argv)
+
+    import psycopg2
+    from plant_flow_ingest import connect_kwargs_from_env
+
+    with psycopg2.connect(**connect_kwargs_from_env()) as conn:
+        if args.init or not args.backfill:
+            with conn.cursor() as cur:
+                ensure_schema(cur)
+            conn.commit()
+            log.info("rollup schema ready")
+        if args.backfill:
+            since = datetime.fromisoformat(args.since).replace(tzinfo=timezone.utc) if args.since else None
+            log.info("backfilled rollups from %d raw rows", backfill(conn, since))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,6 +1,9 @@
 """
 File  : backend/solark_browser/poll_and_insert.py
 Purpose: Read SolArk plant_flow.json and INSERT into solark.plant_flow.
+         One-shot wrapper around plant_flow_ingest.PlantFlowIngester: if Postgres
+         is down the sample is spooled locally and replayed on the next run.
+         For continuous polling use `python3 plant_flow_ingest.py` instead.
 
 Works in three modes
 ────────────────────
@@ -15,13 +18,10 @@ Env required
 """
 
 from __future__ import annotations
-import json, os, sys, urllib.parse
+import json, os, sys
 from datetime import datetime, timezone
 from pathlib import Path
 
-import psycopg2
-from psycopg2.extras import Json
-
 # ── 0. Optional .env loader (ignored in prod image) ─────────────────────
 try:
     from dotenv import load_dotenv
@@ -50,16 +50,9 @@ if not DSN and not have_parts:
 PLANT_ID = int(os.environ["PLANT_ID"])
 
 # ── 2. Build connect parameters (DSN wins) ──────────────────────────────
-if DSN:
-    connect_kwargs: dict[str, object] = {"dsn": DSN}
-else:
-    connect_kwargs = dict(
-        host=os.environ["PGHOST"],
-        port=int(os.environ["PGPORT"]),
-        user=os.environ["PGUSER"],
-        password=os.environ["PGPASSWORD"],
-        dbname=os.environ["PGDATABASE"],
-    )
+from plant_flow_ingest import PlantFlowIngester, connect_kwargs_from_env, rollups_enabled  # noqa: E402
+
+connect_kwargs = connect_kwargs_from_env()
 
 # ── 3. Load snapshot JSON ───────────────────────────────────────────────
 SNAP_PATH = "plant_flow.json"
@@ -71,63 +64,24 @@ except FileNotFoundError:
 except Exception as e:
     sys.exit(f"❌ Could not parse {SNAP_PATH}: {e}")
 
-# ── 4. Assemble row dict ────────────────────────────────────────────────
+# ── 4. Insert (spooled rows from earlier outages are replayed first) ────
 now_utc = datetime.now(timezone.utc)
-row = {
-    "plant_id":            PLANT_ID,
-    "ts":                  now_utc,
-    "pv_power":            snap.get("pvPower"),
-    "batt_power":          snap.get("battPower"),
-    "grid_power":          snap.get("gridOrMeterPower"),
-    "load_power":          snap.get("loadOrEpsPower"),
-    "gen_power":           snap.get("genPower"),
-    "min_power":           snap.get("minPower"),
-    "soc":                 snap.get("soc"),
-    "pv_to":               snap.get("pvTo"),
-    "to_load":             snap.get("toLoad"),
-    "to_grid":             snap.get("toGrid"),
-    "to_bat":              snap.get("toBat"),
-    "bat_to":              snap.get("batTo"),
-    "grid_to":             snap.get("gridTo"),
-    "gen_to":              snap.get("genTo"),
-    "min_to":              snap.get("minTo"),
-    "exists_gen":          snap.get("existsGen"),
-    "exists_min":          snap.get("existsMin"),
-    "gen_on":              snap.get("genOn"),
-    "micro_on":            snap.get("microOn"),
-    "exists_meter":        snap.get("existsMeter"),
-    "bms_comm_fault_flag": snap.get("bmsCommFaultFlag"),
-    "pv":                  snap.get("pv"),
-    "exist_think_power":   snap.get("existThinkPower"),
-    "raw_json":            Json(snap),   # JSONB column
-}
-
-# ── 5. SQL (schema solark) ──────────────────────────────────────────────
-SQL = """
-INSERT INTO solark.plant_flow (
-    plant_id, ts,
-    pv_power, batt_power, grid_power, load_power,
-    gen_power, min_power, soc,
-    pv_to, to_load, to_grid, to_bat, bat_to, grid_to, gen_to, min_to,
-    exists_gen, exists_min, gen_on, micro_on, exists_meter, bms_comm_fault_flag,
-    pv, exist_think_power, raw_json
-) VALUES (
-    %(plant_id)s, %(ts)s,
-    %(pv_power)s, %(batt_power)s, %(grid_power)s, %(load_power)s,
-    %(gen_power)s, %(min_power)s, %(soc)s,
-    %(pv_to)s, %(to_load)s, %(to_grid)s, %(to_bat)s, %(bat_to)s,
-    %(grid_to)s, %(gen_to)s, %(min_to)s,
-    %(exists_gen)s, %(exists_min)s, %(gen_on)s, %(micro_on)s,
-    %(exists_meter)s, %(bms_comm_fault_flag)s,
-    %(pv)s, %(exist_think_power)s, %(raw_json)s
-);
-"""
-
-# ── 6. Execute insert ───────────────────────────────────────────────────
+ingester = PlantFlowIngester(
+    connect_kwargs,
+    batch_size=int(os.getenv("INGEST_BATCH_SIZE", "30")),
+    spool_path=os.getenv("INGEST_SPOOL_PATH", "spool/plant_flow.spool.jsonl"),
+)
+if rollups_enabled():
+    from plant_flow_rollups import apply_batch  # noqa: E402
+    ingester.after_insert = apply_batch
 try:
-    with psycopg2.connect(**connect_kwargs) as conn, conn.cursor() as cur:
-        cur.execute(SQL, row)
-        conn.commit()
-        print(f"✅ Inserted snapshot @ {now_utc.isoformat()}")
-except psycopg2.Error as err:
-    sys.exit(f"❌ Postgres error: {err}")
+    ingester.add(snap, plant_id=PLANT_ID, ts=now_utc)
+    stats = ingester.flush()
+finally:
+    ingester.close()
+
+if stats["spool_pending"]:
+    # Sample is safe on disk; the next run replays it in order.
+    print(f"⚠️  Postgres unreachable – snapshot @ {now_utc.isoformat()} spooled to {ingester.spool.path}")
+else:
+    print(f"✅ Inserted snapshot @ {now_utc.isoformat()} (replayed {stats['rows_replayed']} spooled rows)")
@@ -56,38 +56,74 @@ export default function MemoryPanel() {
 
   const [currentPage, setCurrentPage] = useState(1)
   const pageSize = 10
+  // The endpoint pages by cursor; hold only what has been viewed and fetch the next page on demand.
+  const [nextCursor, setNextCursor] = useState<string | null>(null)
+  const fetchLimit = 200
 
   useEffect(() => {
     fetchMemory()
-  }, [])
+  }, [filterDays])
+
+  async function fetchPage(cursor: string | null) {
+    const since = new Date(Date.now() - filterDays * 24 * 60 * 60 * 1000).toISOString()
+    const params = new URLSearchParams({ limit: String(fetchLimit), since })
+    if (cursor) params.set("cursor", cursor)
+    const res = await fetch(`${API_ROOT}/logs/sessions/all?${params}`, {
+      headers: { "X-API-Key": process.env.NEXT_PUBLIC_API_KEY || "" },
+    })
+    if (!res.ok) throw new Error(`Status ${res.status}`)
+    const data = await res.json()
+    const mapped: MemoryEntry[] = (data.entries || []).map((m: unknown) => {
+      const entry = m as MemoryEntry
+      return {
+        ...entry,
+        summary: toMDString(entry.summary),
+        agent_response: toMDString(entry.agent_response),
+      }
+    })
+    return { entries: mapped, next: (data.next_cursor as string | null) || null }
+  }
 
   async function fetchMemory() {
     const start = Date.now()
     setFetchInfo({ status: "loading", time: 0, error: undefined })
 
     try {
-      const res = await fetch(`${API_ROOT}/logs/sessions/all`, {
-        headers: { "X-API-Key": process.env.NEXT_PUBLIC_API_KEY || "" },
-      })
-      if (!res.ok) throw new Error(`Status ${res.status}`)
-      const data = await res.json()
-      const mapped = (data.entries || []).map((m: unknown) => {
-        const entry = m as Partial<MemoryEntry>
-        return {
-          ...entry,
-          summary: toMDString(entry.summary),
-          agent_response: toMDString(entry.agent_response),
-        }
-      })
-      setMemory(mapped)
+      const page = await fetchPage(null)
+      setMemory(page.entries)
+      setNextCursor(page.next)
+      setCurrentPage(1)
       setFetchInfo({ status: "success", time: Date.now() - start, error: "" })
     } catch (e: unknown) {
       const errorMsg = e instanceof Error ? e.message : String(e)
       setFetchInfo({ status: "error", time: Date.now() - start, error: errorMsg })
       setMemory([])
+      setNextCursor(null)
+    }
+  }
+
+  async function loadMore() {
+    if (!nextCursor || fetchInfo.status === "loading") return
+    const start = Date.now()
+    setFetchInfo({ status: "loading", time: 0, error: undefined })
+
+    try {
+      const page = await fetchPage(nextCursor)
+      setMemory(prev => [...prev, ...page.entries])
+      setNextCursor(page.next)
+      setFetchInfo({ status: "success", time: Date.now() - start, error: "" })
+    } catch (e: unknown) {
+      const errorMsg = e instanceof Error ? e.message : String(e)
+      setFetchInfo({ status: "error", time: Date.now() - start, error: errorMsg })
     }
   }
 
+  async function nextPage() {
+    // Past the last loaded entry: pull one more server page before turning.
+    if (currentPage * pageSize >= filtered.length && nextCursor) await loadMore()
+    setCurrentPage(p => p + 1)
+  }
+
   async function fetchContextFile(path: string) {
     try {
       const res = await fetch(`${API_ROOT}/files/context?path=${encodeURIComponent(path)}`, {
@@ -174,7 +210,7 @@ export default function MemoryPanel() {
     <div className="space-y-4">
       <div className="flex flex-wrap gap-4 text-xs text-gray-500 mb-2 items-center">
         <span>Fetch: <b>{fetchInfo.status}</b>{fetchInfo.time ? ` (${fetchInfo.time}ms)` : ""}</span>
-        <span>Total: <b>{memory.length}</b></span>
+        <span>Loaded: <b>{memory.length}</b>{nextCursor ? "+" : ""}</span>
         <span>Filtered: <b>{filtered.length}</b></span>
         <span>Users: <b>{users.length}</b></span>
         <span>Global: <b>{filtered.filter(m => m.used_global_context).length}</b></span>
@@ -323,7 +359,7 @@ export default function MemoryPanel() {
       ))}
 
       {/* Pagination controls */}
-      {filtered.length > pageSize && (
+      {(filtered.length > pageSize || nextCursor) && (
         <div className="flex gap-2 justify-center mt-4">
           <Button
             size="sm"
@@ -333,15 +369,22 @@ export default function MemoryPanel() {
           >
             ⬅ Prev
           </Button>
-          <span className="text-xs flex items-center">Page {currentPage} / {Math.ceil(filtered.length / pageSize)}</span>
+          <span className="text-xs flex items-center">
+            Page {currentPage} / {Math.max(1, Math.ceil(filtered.length / pageSize))}{nextCursor ? "+" : ""}
+          </span>
           <Button
             size="sm"
             variant="outline"
-            onClick={() => setCurrentPage(p => p + 1)}
-            disabled={currentPage * pageSize >= filtered.length}
+            onClick={nextPage}
+            disabled={(currentPage * pageSize >= filtered.length && !nextCursor) || fetchInfo.status === "loading"}
           >
             Next ➡
           </Button>
+          {nextCursor && (
+            <Button size="sm" variant="ghost" onClick={loadMore} disabled={fetchInfo.status === "loading"}>
+              Load more
+            </Button>
+          )}
         </div>
       )}
 
@@ -13,17 +13,27 @@
 #   • INDEX_ROOT defaults to ./data/index (created & probed for writability).
 #   • FRONTEND_ORIGINS must be set in prod; dev falls back to localhost:3000.
 #   • Keep this file small and boring; complex logic belongs in services/.
+#   • ROUTER_MOUNT=lazy mounts secondary/optional routers behind stub routes
+#     (imported on first use, or after warmup); /debug/startup reports
+#     per-module import times (STARTUP_PROFILE=1, default; the import hook is
+#     removed once warmup and router preload finish).
+#   • /ask, /mcp/run and /kb/search pass through services.admission: bounded
+#     concurrency + wait queue, 429 with Retry-After when saturated (ADMISSION=0
+#     disables).
+#   • /ask, /kb/search and /control are rate limited per authenticated caller
+#     (API key, with X-User-Id / body user_id as a sub-key; anon:<ip> without
+#     a key) by services.rate_limit, which also tags the request's LLM calls
+#     for the governor's per-user fair queue (RATE_LIMIT=0 tags only).
 # ──────────────────────────────────────────────────────────────────────────────
 
 from __future__ import annotations
 
 # ── Stdlib ---------------------------------------------------------------------
-import importlib
+import asyncio
 import logging
 import os
-import time
-import traceback
-import uuid
+import sys
+import threading
 from pathlib import Path
 from typing import Iterable, List, Optional
 
@@ -33,14 +43,23 @@ from dotenv import load_dotenv
 _env_path = Path(__file__).parent / ".env"
 load_dotenv(dotenv_path=_env_path, override=False)
 
+# ── Import-time profiling (must precede the heavy imports below) --------------
+from services.startup import LazyRouters, import_profiler, router_mount_mode
+if (os.getenv("STARTUP_PROFILE") or "1").strip().lower() in {"1", "true", "yes"}:
+    import_profiler.install()
+
 # ── Third-party ---------------------------------------------------------------
-import anyio
-from fastapi import APIRouter, FastAPI, Request, Response
+from fastapi import FastAPI, Request, Response
 from fastapi.middleware.cors import CORSMiddleware
-from starlette.middleware.base import BaseHTTPMiddleware
-from starlette.middleware.gzip import GZipMiddleware
 from starlette.requests import ClientDisconnect
 from utils.env import get_float, get_list
+from services import admission, rate_limit
+from services.http_middleware import (
+    AccessLogMiddleware,
+    CompressionMiddleware,
+    RequestIDMiddleware,
+    TimeoutMiddleware,
+)
 
 # ── Logging -------------------------------------------------------------------
 logger = logging.getLogger("relay.main")
@@ -66,25 +85,25 @@ LONG_OP_PATHS  = set(get_list("LONG_OP_PATHS",
 # ──────────────────────────────────────────────────────────────────────────────
 # LlamaIndex LLM defaults (chat model, retries, timeout)
 # Why: Avoid legacy gpt-3.5-turbo RPD caps; set sane retries/timeouts centrally
+# Runs from the lifespan (as the first warmup step), not at import time, so
+# importing main does not pay for llama_index.
 # ──────────────────────────────────────────────────────────────────────────────
-try:
+def _configure_llama_index() -> dict:
     from llama_index.core import Settings as LI_Settings  # type: ignore
     from llama_index.llms.openai import OpenAI as LI_OpenAI  # type: ignore
     from llama_index.embeddings.openai import OpenAIEmbedding  # type: ignore
-    import os
 
-    CHAT_MODEL = os.getenv("LLM_CHAT_MODEL", "gpt-4o-mini")
-    CHAT_MAX_RETRIES = int(os.getenv("LLM_CHAT_MAX_RETRIES", "1"))
-    CHAT_TIMEOUT_S = float(os.getenv("LLM_CHAT_TIMEOUT_S", "30"))
-    EMB_MODEL = os.getenv("EMBED_MODEL", "text-embedding-3-small")
+    chat_model = os.getenv("LLM_CHAT_MODEL", "gpt-4o-mini")
+    chat_max_retries = int(os.getenv("LLM_CHAT_MAX_RETRIES", "1"))
+    chat_timeout_s = float(os.getenv("LLM_CHAT_TIMEOUT_S", "30"))
+    emb_model = os.getenv("EMBED_MODEL", "text-embedding-3-small")
 
-    LI_Settings.llm = LI_OpenAI(model=CHAT_MODEL, max_retries=CHAT_MAX_RETRIES, timeout=CHAT_TIMEOUT_S)
+    LI_Settings.llm = LI_OpenAI(model=chat_model, max_retries=chat_max_retries, timeout=chat_timeout_s)
     # Keep current embedding model; this matches your services.kb logs
-    LI_Settings.embed_model = OpenAIEmbedding(model=EMB_MODEL)
+    LI_Settings.embed_model = OpenAIEmbedding(model=emb_model)
     logger.info("🔧 LlamaIndex configured llm=%s retries=%s timeout_s=%.1f embed=%s",
-                CHAT_MODEL, CHAT_MAX_RETRIES, CHAT_TIMEOUT_S, EMB_MODEL)
-except Exception as _e:
-    logger.warning("LlamaIndex not configured (%s)", _e)
+                chat_model, chat_max_retries, chat_timeout_s, emb_model)
+    return {"llm": chat_model, "embed": emb_model}
 
 # ╔══════════════════════════════════════════════════════════════════════════╗
 # ║ Environment Helpers                                                      ║
@@ -121,70 +140,19 @@ def _parse_origins(value: Optional[str]) -> List[str]:
 # ║ Middlewares                                                              ║
 # ╚══════════════════════════════════════════════════════════════════════════╝
 
-class RequestIDMiddleware(BaseHTTPMiddleware):
-    """
-    Attach a correlation ID to each request and echo it in the response headers.
-
-    Header: X-Corr-Id (in/out)
-    """
-    async def dispatch(self, request: Request, call_next):
-        cid = request.headers.get("x-corr-id") or f"{uuid.uuid4().hex[:8]}{int(time.time())%1000:03d}"
-        request.state.corr_id = cid
-        response = await call_next(request)
-        response.headers["x-corr-id"] = cid
-        return response
-
-
-class AccessLogMiddleware(BaseHTTPMiddleware):
-    """
-    Minimal structured access log. Always logs a line, even on exceptions.
-
-    Fields: method, path, cid, status, dur_ms
-    """
-    async def dispatch(self, request: Request, call_next):
-        t0 = time.perf_counter()
-        method = request.method
-        path = request.url.path
-        status = None
-        try:
-            response = await call_next(request)
-            status = response.status_code
-            return response
-        finally:
-            dur_ms = int((time.perf_counter() - t0) * 1000)
-            cid = getattr(getattr(request, "state", None), "corr_id", "-")
-            logger.info(
-                "req method=%s path=%s cid=%s status=%s dur_ms=%s",
-                method, path, cid, status if status is not None else "ERR", dur_ms
-            )
-
-
-class TimeoutMiddleware(BaseHTTPMiddleware):
-    """Per-request timeout with a longer budget for known long operations.
+# RequestIDMiddleware, AccessLogMiddleware and TimeoutMiddleware live in
+# services/http_middleware.py as pure ASGI callables (no BaseHTTPMiddleware
+# task/stream per layer; streaming responses pass straight through).
+# tools/bench_middleware.py measures the per-request overhead.
 
-    Default: 35s (HTTP_TIMEOUT_S). Long ops: LONG_OP_TIMEOUT_S (default 300s).
-    Long ops are matched by path startswith against LONG_OP_PATHS.
-    """
-    def __init__(self, app, timeout_s: float = 35.0):
-        super().__init__(app)
-        self.default_timeout = timeout_s
-        # Comma-separated, defaults cover our KB/docs heavy endpoints
-        paths = os.getenv(
-            "LONG_OP_PATHS",
-            "/docs/refresh_kb,/docs/sync,/docs/full_sync,/kb/reindex"
-        )
-        self.long_op_paths = tuple(p.strip() for p in paths.split(",") if p.strip())
-        self.long_timeout = float(os.getenv("LONG_OP_TIMEOUT_S", "300"))
 
-    async def dispatch(self, request: Request, call_next):
-        path = request.url.path
-        budget = self.long_timeout if path.startswith(self.long_op_paths) else self.default_timeout
-        response = None
-        with anyio.move_on_after(budget) as scope:
-            response = await call_next(request)
-        if scope.cancel_called or response is None:
-            return Response("Request timeout", status_code=504)
-        return response
+# Async shutdown hooks, run only for modules that were actually imported:
+# (module path, coroutine function name)
+_SHUTDOWN_HOOKS = (
+    ("routes.webhooks_github", "shutdown"),      # drain ingest queue, flush event log
+    ("services.github_client", "aclose_shared"),  # close pooled GitHub connections
+    ("services.kb_watcher", "shutdown"),          # stop KB filesystem watcher
+)
 
 
 # ╔══════════════════════════════════════════════════════════════════════════╗
@@ -198,7 +166,7 @@ def create_app() -> FastAPI:
     async def lifespan(app: FastAPI):
         """
         Startup: prepare directories, validate writability, print minimal inventory.
-        Shutdown: quiet.
+        Shutdown: quiet; drains background ingest queues (bounded).
         """
         def _prepare_paths() -> None:
             project_root = Path(__file__).resolve().parents[1]
@@ -256,6 +224,49 @@ def create_app() -> FastAPI:
         except Exception:
             pass
 
+        # KB filesystem watcher → incremental reindex (best-effort)
+        if (_env("KB_WATCH") or "1").strip().lower() in {"1", "true", "yes"}:
+            try:
+                from services.kb_watcher import get_watcher
+                get_watcher().start()
+                logger.info("👀 KB watcher started mode=%s", get_watcher().mode)
+            except Exception as e:
+                logger.warning("KB watcher not started: %s", e)
+
+        import_profiler.mark("lifespan_start")
+
+        # Background warmup of the /ask hot path; /readyz gates on its state
+        try:
+            from services.warmup import get_warmup
+            if (_env("WARMUP") or "1").strip().lower() in {"1", "true", "yes"}:
+                get_warmup().add_step("llm_settings", _configure_llama_index, first=True)
+                get_warmup().start()
+                logger.info("🔥 warmup started steps=%s", [n for n, _ in get_warmup().steps])
+            else:
+                get_warmup().skip()
+                try:
+                    _configure_llama_index()
+                except Exception as e:
+                    logger.warning("LlamaIndex not configured (%s)", e)
+        except Exception as e:
+            logger.warning("warmup not started: %s", e)
+
+        # Once the hot path is warm: import the remaining lazy routers off the
+        # loop, splice them in on the loop, then stop profiling imports.
+        preload = bool(_routers.pending()) and (_env("ROUTER_PRELOAD") or "1").strip().lower() in {"1", "true", "yes"}
+        loop = asyncio.get_running_loop()
+
+        def _after_warmup() -> None:
+            from services.warmup import get_warmup
+            get_warmup().wait(timeout=float(_env("ROUTER_PRELOAD_WAIT_S") or "120"))
+            if preload:
+                _routers.prepare_all()
+                loop.call_soon_threadsafe(_routers.mount_all)
+                import_profiler.mark("routers_preloaded")
+            import_profiler.uninstall()
+
+        threading.Thread(target=_after_warmup, name="relay-router-preload", daemon=True).start()
+
         # routes/ inventory (best-effort)
         try:
             import pkgutil, routes  # type: ignore
@@ -266,6 +277,15 @@ def create_app() -> FastAPI:
 
         yield
 
+        # Drain/close background resources owned by modules that were loaded
+        for mod_name, hook in _SHUTDOWN_HOOKS:
+            mod = sys.modules.get(mod_name)
+            if mod is not None and hasattr(mod, hook):
+                try:
+                    await getattr(mod, hook)()
+                except Exception as e:
+                    logger.warning("shutdown hook %s.%s failed: %s", mod_name, hook, e)
+
     # FastAPI app with lifespan manager
     app = FastAPI(lifespan=lifespan)
 
@@ -284,6 +304,12 @@ def create_app() -> FastAPI:
 
     logger.info("🔒 CORS allow_origins=%s app_env=%s credentials=True", allow_origins, app_env)
 
+    # ── Admission control (innermost: 429s still get CORS + corr-id) ---------
+    if admission.enabled():
+        app.add_middleware(admission.AdmissionMiddleware)
+    # Rate limits run first, so a throttled user never holds an admission slot.
+    app.add_middleware(rate_limit.RateLimitMiddleware)
+
     app.add_middleware(
         CORSMiddleware,
         allow_origins=allow_origins,
@@ -298,12 +324,18 @@ def create_app() -> FastAPI:
             "x-user-id",
             "x-thread-id",
         ],
-        expose_headers=["x-corr-id"],
+        expose_headers=[
+            "x-corr-id",
+            "retry-after",
+            "x-ratelimit-limit",
+            "x-ratelimit-remaining",
+            "x-ratelimit-reset",
+        ],
         max_age=600,
     )
 
     # ── Core Middlewares -------------------------------------------------------
-    app.add_middleware(GZipMiddleware, minimum_size=1024)
+    app.add_middleware(CompressionMiddleware)  # gzip ≥ GZIP_MIN_BYTES; never streams
     app.add_middleware(RequestIDMiddleware)
     app.add_middleware(AccessLogMiddleware)
     app.add_middleware(TimeoutMiddleware, timeout_s=float(_env("HTTP_TIMEOUT_S", "35")))
@@ -328,6 +360,27 @@ def create_app() -> FastAPI:
 
 # Instantiate the app (used by ASGI server)
 app = create_app()
+_routers = LazyRouters(app)
+
+
+# ╔══════════════════════════════════════════════════════════════════════════╗
+# ║ Startup report (read-only; safe for ops)                                 ║
+# ╚══════════════════════════════════════════════════════════════════════════╝
+# Registered before the routers so a lazy "/debug" stub never shadows it.
+
+@app.get("/debug/startup")
+def debug_startup(limit: int = 50, sort: str = "cumulative"):
+    """
+    Per-module import times (importtime-style), startup milestones and how
+    each router was mounted.
+      • sort=cumulative|self  • limit=N  (top N modules)
+    """
+    return {
+        "mount_mode": router_mount_mode(),
+        "imports": import_profiler.report(limit=limit, sort=sort),
+        "routers": _routers.report(),
+        "pending_routers": _routers.pending(),
+    }
 
 
 # ╔══════════════════════════════════════════════════════════════════════════╗
@@ -337,6 +390,8 @@ app = create_app()
 #   • PRIMARY_ROUTERS must succeed; raise on failure (fail-fast).
 #   • SECONDARY_ROUTERS are recommended; log + continue on failure.
 #   • OPTIONAL_ROUTERS are experimental/nice-to-have; log + continue on failure.
+#   • ROUTER_MOUNT=lazy: secondary/optional routers are mounted as stubs on
+#     ROUTER_PREFIXES and imported on first request (or after warmup).
 
 PRIMARY_ROUTERS: Iterable[str] = (
     "routes.ask",
@@ -346,6 +401,7 @@ PRIMARY_ROUTERS: Iterable[str] = (
 SECONDARY_ROUTERS: Iterable[str] = (
     # Make these fail-soft so the app stays up while we diagnose imports.
     "routes.docs",
+    "routes.jobs",     # job records / SSE progress for /docs long ops
     "routes.kb",
 )
 
@@ -358,33 +414,43 @@ OPTIONAL_ROUTERS = {
     "routes.integrations_github",
     "routes.github_proxy",
     "routes.webhooks_github",
+    # Session memory browser (paginated, merged across users)
+    "routes.logs_sessions",
+    # SolArk plant_flow rollups (needs SOLARK_DATABASE_URL / DATABASE_URL)
+    "routes.solar",
     # NOTE: routes.health is mounted early above; do not mount it again.
 }
 
+# URL prefixes served by each deferrable router (must match its APIRouter prefix)
+ROUTER_PREFIXES = {
+    "routes.docs": ["/docs"],
+    "routes.jobs": ["/jobs"],
+    "routes.kb": ["/kb"],
+    "routes.control": ["/control"],
+    "routes.x_mirror": ["/x_mirror"],
+    "routes.debug_diagnostics": ["/debug"],
+    "routes.debug_flow_trace": ["/debug"],
+    "routes.integrations_github": ["/integrations/github"],
+    "routes.github_proxy": ["/gh"],
+    "routes.webhooks_github": ["/webhooks"],
+    "routes.logs_sessions": ["/logs/sessions"],
+    "routes.solar": ["/solar"],
+}
+
+
 def _include(router_path: str, *, required: bool) -> None:
     """
     Import and mount a router by module path.
 
     • required=True → raises on any error (service should not run without it)
     • required=False → logs full traceback and continues
+    • lazy mode (non-required, known prefix) → stub now, import on first use
     """
-    try:
-        module = importlib.import_module(router_path)
-        router = getattr(module, "router", None)
-        if router is None or not isinstance(router, APIRouter):
-            msg = f"no/invalid 'router' in {router_path}"
-            if required:
-                raise ImportError(msg)
-            logger.warning("⏭️  Router skipped (%s): %s", router_path, msg)
-            return
-        app.include_router(router)
-        name = getattr(router, "__module__", router_path).split(".")[-1]
-        logger.info("🔌 Router enabled: %s (from %s)", name, router_path)
-    except Exception as e:
-        if required:
-            logger.exception("💥 Required router failed: %s", router_path)
-            raise
-        logger.error("⏭️  Router skipped (%s): %s\n%s", router_path, e, traceback.format_exc())
+    if not required and router_mount_mode() == "lazy" and router_path in ROUTER_PREFIXES:
+        _routers.add(router_path, ROUTER_PREFIXES[router_path])
+        logger.info("💤 Router deferred: %s (prefixes=%s)", router_path, ROUTER_PREFIXES[router_path])
+        return
+    _routers.include(router_path, required=required)
 
 
 # Mount primary first (must succeed), then tolerant passes for secondary/optional
@@ -394,6 +460,7 @@ for rp in SECONDARY_ROUTERS:
     _include(rp, required=False)
 for rp in OPTIONAL_ROUTERS:
     _include(rp, required=False)
+import_profiler.mark("routers_mounted")
 
 logger.info("✅ Critical routers present: ['ask','mcp']")
 
@@ -548,6 +615,8 @@ def debug_api_key() -> dict:
     }
 
 
+import_profiler.mark("main_imported")
+
 # ──────────────────────────────────────────────────────────────────────────────
 # End of file
 # ──────────────────────────────────────────────────────────────────────────────
@@ -26,6 +26,8 @@ from fastapi.responses import StreamingResponse, JSONResponse
 import anyio
 from utils.env import get_float
 from services.errors import error_payload
+from services.ask_stream import relay, wants_sse
+from services.serialization import FastJSONResponse
 from utils.async_helpers import maybe_await, filter_kwargs_for_callable
 
 # --- Pydantic v1/v2 compatibility ---------------------------------------------
@@ -234,18 +236,6 @@ def _filter_kwargs_for_callable(func, **kwargs):
     except Exception:
         return {}
 
-def _json_safe(obj: Any) -> Any:
-    try:
-        if isinstance(obj, (str, int, float, bool)) or obj is None:
-            return obj
-        if isinstance(obj, dict):
-            return {str(k): _json_safe(v) for k, v in obj.items()}
-        if isinstance(obj, (list, tuple, set)):
-            return [_json_safe(x) for x in obj]
-        return str(obj)
-    except Exception:
-        return "[unserializable]"
-
 def _normalize_result(result_or_wrapper: Dict[str, Any]) -> Dict[str, Any]:
     if isinstance(result_or_wrapper, dict) and "result" in result_or_wrapper:
         inner = result_or_wrapper.get("result") or {}
@@ -472,8 +462,9 @@ def ask_preflight() -> Response:
 
 @router.post(
     "/ask",
-    response_model=AskResponse,
+    response_model=AskResponse,  # schema only; the body is returned pre-serialized
     response_model_exclude_none=True,
+    response_class=FastJSONResponse,
     responses={400: {"model": ErrorEnvelope}, 500: {"model": ErrorEnvelope}, 504: {"model": ErrorEnvelope}},
 )
 async def ask(
@@ -665,11 +656,12 @@ async def ask(
         normalized = {}
         try:
             normalized = _normalize_result(mcp_raw if isinstance(mcp_raw, dict) else {})
-            plan = _json_safe(normalized.get("plan"))
+            # mcp_agent already normalized these; FastJSONResponse handles stragglers.
+            plan = normalized.get("plan")
             routed_result = normalized.get("routed_result", {})
-            critics = _json_safe(normalized.get("critics"))
+            critics = normalized.get("critics")
             context_from_agent = str(normalized.get("context") or "")
-            files_used_agent = _json_safe(normalized.get("files_used") or [])
+            files_used_agent = normalized.get("files_used") or []
             upstream_meta = normalized.get("meta") or {}
             final_text_raw = _final_text_from(plan, routed_result, root_final=normalized.get("final_text"))
         except Exception as e:
@@ -725,7 +717,7 @@ async def ask(
 
         meta: Dict[str, Any] = {"role": role, "debug": debug, "corr_id": corr_id}
         if isinstance(upstream_meta, dict):
-            meta.update(_json_safe(upstream_meta))
+            meta.update(upstream_meta)
         meta["kb"] = {
             "hits": int(kb_meta.get("hits") or 0),
             "max_score": float(kb_meta.get("max_score") or 0.0),
@@ -766,15 +758,18 @@ async def ask(
             },
         )
 
-        response = AskResponse(
-            plan=plan if isinstance(plan, dict) else None,
-            routed_result=_json_safe(routed_result_out) if isinstance(routed_result_out, (dict, str)) else {},
-            critics=critics if critics is not None else None,
-            context=context,
-            files_used=files_used_out if isinstance(files_used_out, list) else [],
-            meta=_json_safe(meta),
-            final_text=final_text_out,
-        )
+        # AskResponse shape, built once and serialized once (None fields omitted,
+        # as response_model_exclude_none did for the top level).
+        body: Dict[str, Any] = {
+            "plan": plan if isinstance(plan, dict) else None,
+            "routed_result": routed_result_out if isinstance(routed_result_out, (dict, str)) else {},
+            "critics": list(critics) if isinstance(critics, (list, tuple)) else None,
+            "context": context,
+            "files_used": files_used_out if isinstance(files_used_out, list) else [],
+            "meta": meta,
+            "final_text": final_text_out,
+        }
+        response = FastJSONResponse({k: v for k, v in body.items() if v is not None})
     except HTTPException as exc:
         elapsed_ms = _elapsed_ms(pipeline_t0)
         detail = exc.detail if isinstance(exc.detail, dict) else {}
@@ -810,7 +805,7 @@ async def ask(
         ) from exc
     else:
         elapsed_ms = _elapsed_ms(pipeline_t0)
-        success_meta = response.meta if isinstance(response.meta, dict) else {}
+        success_meta = meta
         log_event(
             "ask_pipeline_success",
             {
@@ -832,9 +827,50 @@ async def ask_get(
     payload = AskRequest.model_validate({"question": question})
     return await ask(payload, request, x_request_id=x_request_id, x_corr_id=x_corr_id)
 
+# ── Streaming (retrieval first, then live tokens) ------------------------------
+
+async def _stream_meta(q: str, context: str, corr_id: str) -> tuple[str, Dict[str, Any]]:
+    """Run retrieval before the first token; returns (context, meta frame)."""
+    t0 = time.perf_counter()
+    if context:
+        hits, max_score, sources = _extract_grounding_from_context(context)
+        meta: Dict[str, Any] = {
+            "retrieval": "provided",
+            "grounding": sources,
+            "kb": {"hits": hits, "max_score": max_score or 0.0},
+        }
+    else:
+        built = await _build_context_safe(q, corr_id)
+        context = built.get("context") or ""
+        meta = {
+            "retrieval": "built",
+            "grounding": built.get("grounding") or [],
+            "kb": built.get("kb") or {},
+            "files_used": built.get("files_used") or [],
+        }
+    meta["timings"] = {"retrieval_ms": _elapsed_ms(t0)}
+    return context, meta
+
+
+def _stream_media(as_sse: bool) -> Dict[str, Any]:
+    if as_sse:
+        return {
+            "media_type": "text/event-stream",
+            "headers": {"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+        }
+    return {"media_type": "text/plain"}
+
+
 @router.post("/ask/stream")
-async def ask_stream(payload: StreamRequest, request: Request):
-    """Streamed answer via Echo (lazy-imported)."""
+async def ask_stream(
+    payload: StreamRequest,
+    request: Request,
+    format: Optional[str] = Query(None, description="sse | text (default: from Accept)"),
+):
+    """
+    Streamed answer via Echo (lazy-imported): retrieval first, then LLM tokens
+    as they are generated. SSE clients get meta → token* → done frames.
+    """
     corr_id = request.headers.get("X-Corr-Id") or uuid4().hex
 
     try:
@@ -863,21 +899,20 @@ async def ask_stream(payload: StreamRequest, request: Request):
             ),
         )
 
+    as_sse = wants_sse(request.headers.get("accept"), format)
+
     async def gen() -> AsyncGenerator[bytes, None]:
         try:
             # Validate that echo_stream is available and callable
             if not hasattr(echo_stream, '__call__'):
                 raise RuntimeError("echo_stream is not callable")
 
-            async for chunk in echo_stream(
-                query=q,
-                context=payload.context or "",
-                user_id=payload.user_id,
-                corr_id=corr_id
-            ):
-                if chunk:  # Only yield non-empty chunks
-                    chunk_str = chunk if isinstance(chunk, str) else str(chunk)
-                    yield chunk_str.encode("utf-8")
+            context, meta = await _stream_meta(q, payload.context or "", corr_id)
+            chunks = echo_stream(**_filter_kwargs_for_callable(
+                echo_stream, query=q, context=context, user_id=payload.user_id, corr_id=corr_id,
+            ))
+            async for frame in relay(chunks, meta=meta, route="/ask/stream", corr_id=corr_id, as_sse=as_sse):
+                yield frame
         except ImportError as e:
             log_event("ask_stream_import_error", {"corr_id": corr_id, "error": str(e)})
             yield f"[Stream service unavailable: {str(e)}]".encode("utf-8")
@@ -888,11 +923,15 @@ async def ask_stream(payload: StreamRequest, request: Request):
             log_event("ask_stream_error", {"corr_id": corr_id, "error": str(e)})
             yield f"[Stream error: {str(e)}]".encode("utf-8")
 
-    return StreamingResponse(gen(), media_type="text/plain")
+    return StreamingResponse(gen(), **_stream_media(as_sse))
 
 @router.post("/ask/codex_stream")
-async def ask_codex_stream(payload: StreamRequest, request: Request):
-    """Streamed code/patch output via Codex (lazy-imported)."""
+async def ask_codex_stream(
+    payload: StreamRequest,
+    request: Request,
+    format: Optional[str] = Query(None, description="sse | text (default: from Accept)"),
+):
+    """Streamed code/patch output via Codex (lazy-imported); same framing as /ask/stream."""
     corr_id = request.headers.get("X-Corr-Id") or uuid4().hex
 
     try:
@@ -921,21 +960,20 @@ async def ask_codex_stream(payload: StreamRequest, request: Request):
             ),
         )
 
+    as_sse = wants_sse(request.headers.get("accept"), format)
+
     async def gen() -> AsyncGenerator[bytes, None]:
         try:
             # Validate that codex_stream is available and callable
             if not hasattr(codex_stream, '__call__'):
                 raise RuntimeError("codex_stream is not callable")
 
-            async for chunk in codex_stream(
-                query=q,
-                context=payload.context or "",
-                user_id=payload.user_id,
-                corr_id=corr_id
-            ):
-                if chunk:  # Only yield non-empty chunks
-                    chunk_str = chunk if isinstance(chunk, str) else str(chunk)
-                    yield chunk_str.encode("utf-8")
+            context, meta = await _stream_meta(q, payload.context or "", corr_id)
+            chunks = codex_stream(**_filter_kwargs_for_callable(
+                codex_stream, query=q, context=context, user_id=payload.user_id, corr_id=corr_id,
+            ))
+            async for frame in relay(chunks, meta=meta, route="/ask/codex_stream", corr_id=corr_id, as_sse=as_sse):
+                yield frame
         except ImportError as e:
             log_event("ask_codex_stream_import_error", {"corr_id": corr_id, "error": str(e)})
             yield f"[Codex stream service unavailable: {str(e)}]".encode("utf-8")
@@ -946,6 +984,6 @@ async def ask_codex_stream(payload: StreamRequest, request: Request):
             log_event("ask_codex_stream_error", {"corr_id": corr_id, "error": str(e)})
             yield f"[Codex stream error: {str(e)}]".encode("utf-8")
 
-    return StreamingResponse(gen(), media_type="text/plain")
+    return StreamingResponse(gen(), **_stream_media(as_sse))
 
 # ──────────────────────────────────────────────────────────────────────────────
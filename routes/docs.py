@@ -11,12 +11,17 @@
 #   • POST /docs/prune_duplicates?wait=true|false   # canonicalize duplicate doc IDs
 #   • POST /docs/promote                            # promote a chosen file to canonical
 #   • POST /docs/mark_priority                      # set tier/pinned metadata
+#   • GET  /docs/op_status                          # long-ops, locks, KB watcher queue
 #
 # Guarantees
 #   • Never allows path traversal: requested files must resolve under ./docs/*
-#   • Long ops are lock-protected (409 on contention; 202 when wait=false)
+#   • Long ops run as services.jobs records: per-type slots shared across
+#     workers (409 on contention); wait=false → 202 {job_id, status_url},
+#     progress/cancel via /jobs/{id}
 #   • Google stack absence → 503 with actionable detail (never generic 500)
 #   • ContextEngine.clear_cache() and kb.api_reindex() are wrapped to never crash
+#   • Single-file edits (mark_priority) go through the KB watcher's incremental
+#     queue rather than a full reindex
 #   • Success payloads are structured and predictable (no ad-hoc shapes)
 # ──────────────────────────────────────────────────────────────────────────────
 
@@ -25,17 +30,18 @@ from __future__ import annotations
 import logging
 import os
 import shutil
-import time
-from contextlib import contextmanager
 from pathlib import Path
 from typing import Any, Callable, Dict, Iterable, List, Literal, Optional, Tuple
 
-from fastapi import APIRouter, BackgroundTasks, Depends, HTTPException, Query, Request
+from fastapi import APIRouter, Depends, HTTPException, Query, Request
 from fastapi.responses import JSONResponse
 
 # ── Local/Service imports -----------------------------------------------------
 from services import kb
 from services.auth import require_api_key  # shared API key validator
+from services.doc_catalog import get_catalog
+from services.serialization import FastJSONResponse
+from services.jobs import JobBusy, get_store as get_job_store
 
 # ContextEngine — cache clear is wrapped to never raise
 try:
@@ -49,9 +55,11 @@ else:
 # Google sync (optional)
 try:
     from services.google_docs_sync import sync_google_docs as _sync_google_docs
+    from services.google_docs_sync import sync_google_docs_report
     _GOOGLE_SYNC_IMPORT_ERROR: Exception | None = None
 except Exception as exc:  # pragma: no cover - optional dependency may be absent
     _sync_google_docs = None  # type: ignore[assignment]
+    sync_google_docs_report = None  # type: ignore[assignment]
     _GOOGLE_SYNC_IMPORT_ERROR = exc
 
 # Preserve historical symbol for tests/monkeypatching
@@ -78,15 +86,6 @@ for _p in (DOCS_BASE, DOCS_IMPORTED, DOCS_GENERATED):
         # Startup should remain resilient; /readyz surfaces writability separately
         pass
 
-# Lock directory (shared; overridable by env)
-LOCK_DIR = Path(os.getenv("LOCK_DIR") or PROJECT_ROOT / "var" / "locks")
-try:
-    LOCK_DIR.mkdir(parents=True, exist_ok=True)
-except Exception:
-    # will be caught by _writable checks during operations
-    pass
-
-
 # ╔══════════════════════════════════════════════════════════════════════════╗
 # ║ Utilities (safe pathing, locks, wrappers)                                ║
 # ╚══════════════════════════════════════════════════════════════════════════╝
@@ -107,7 +106,7 @@ def _iter_files(base: Path) -> Iterable[Path]:
 
 def _ok(content: Dict[str, Any], status: int = 200) -> JSONResponse:
     content.setdefault("ok", True)
-    return JSONResponse(status_code=status, content=content)
+    return FastJSONResponse(status_code=status, content=content)
 
 def _err(status: int, detail: str) -> None:
     raise HTTPException(status_code=status, detail=detail)
@@ -137,81 +136,53 @@ def _safe_kb_reindex() -> Dict[str, Any]:
         return {"ok": bool(res.get("ok", True)), **{k: v for k, v in res.items() if k != "ok"}}
     return {"ok": True, "status": "done", "result": str(res)}
 
-@contextmanager
-def _op_lock(name: str):
-    """
-    Cross-process advisory lock.
-    - Linux: fcntl flock (non-blocking)
-    - Fallback: lock file presence
-    """
-    lock_path = LOCK_DIR / f"{name}.lock"
-    fh = lock_path.open("a+")
+def _safe_kb_ingest(paths: List[Path]) -> Dict[str, Any]:
+    """Queue paths on the KB watcher (applied incrementally after its debounce)."""
     try:
-        try:
-            import fcntl  # type: ignore
-            try:
-                fcntl.flock(fh.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
-            except BlockingIOError as exc:
-                raise RuntimeError(f"{name} already in progress") from exc
-        except ImportError:
-            if lock_path.exists():
-                raise RuntimeError(f"{name} already in progress")
-            lock_path.write_text(str(time.time()), encoding="utf-8")
-        yield
-    finally:
-        try:
-            try:
-                import fcntl  # type: ignore
-                fcntl.flock(fh.fileno(), fcntl.LOCK_UN)
-            except ImportError:
-                pass
-        except Exception:
-            pass
-        fh.close()
-        try:
-            if lock_path.exists():
-                lock_path.unlink()
-        except Exception:
-            pass
-
-_ASYNC_IN_FLIGHT: set[str] = set()
+        from services.kb_watcher import get_watcher
+        watcher = get_watcher()
+        gen = watcher.notify(paths)
+        if watcher.mode not in ("watchfiles", "poll"):
+            watcher.flush()  # no background worker: apply inline
+            return {"ok": True, "status": "done", "generation": gen, "result": watcher.last_batch}
+        return {"ok": True, "status": "queued", "generation": gen}
+    except Exception as e:
+        return {"ok": False, "error": str(e)}
 
-def _run_locked(name: str, fn: Callable[[], Dict[str, Any]]) -> Dict[str, Any]:
-    with _op_lock(name):
-        return fn()
 
 def _execute_op(
     name: str,
     *,
     wait: bool,
-    background: BackgroundTasks,
     fn: Callable[[], Dict[str, Any]],
+    params: Optional[Dict[str, Any]] = None,
 ):
     """
-    Execute an operation with locking.
-    - wait=true  → run now under lock, return result
-    - wait=false → queue background task (202) unless already in-flight
-    - if locked/in-flight → 409
+    Execute an operation as a recorded job (services.jobs).
+    - wait=true  → run now on this worker, return the result (+ job_id)
+    - wait=false → start in the background, 202 with the job id and status URLs
+    - no free slot for this job type (any worker) → 409
     """
-    if wait:
-        return _run_locked(name, fn)
-
-    if name in _ASYNC_IN_FLIGHT:
-        _err(409, f"{name} already in progress")
-
-    _ASYNC_IN_FLIGHT.add(name)
-
-    def _bg_wrapper() -> None:
-        try:
-            _run_locked(name, fn)
-        finally:
-            _ASYNC_IN_FLIGHT.discard(name)
-
-    background.add_task(_bg_wrapper)
-    return _ok({"accepted": True}, status=202)
+    store = get_job_store()
+    try:
+        if not wait:
+            rec = store.submit(name, lambda _ctx: fn(), params=params)
+            job_id = rec["id"]
+            return _ok(
+                {"accepted": True, "job_id": job_id, "status_url": f"/jobs/{job_id}", "events_url": f"/jobs/{job_id}/events"},
+                status=202,
+            )
+        rec = store.run_inline(name, lambda _ctx: fn(), params=params)
+    except JobBusy as exc:
+        _err(409, str(exc))
+
+    if rec["state"] == "cancelled":
+        _err(409, f"{name} cancelled")
+    if rec["state"] != "succeeded":
+        raise RuntimeError(rec.get("error") or f"{name} {rec['state']}")
+    result = rec.get("result")
+    return {**result, "job_id": rec["id"]} if isinstance(result, dict) else result
 
-    # (remove any nested / duplicated @router.get("/op_status") definitions here)
-    # (keep _execute_op helper body focused solely on running ops)
 # ╔══════════════════════════════════════════════════════════════════════════╗
 # ║ Router                                                                   ║
 # ╚══════════════════════════════════════════════════════════════════════════╝
@@ -232,21 +203,25 @@ def op_status():
     """Read-only probe for long-ops and active locks. Never raises."""
     try:
         try:
-            in_flight = sorted(list(_ASYNC_IN_FLIGHT))
+            active = get_job_store().active()
         except Exception:
-            in_flight = []
+            active = []
+        in_flight = sorted({j.get("type") for j in active})
+        jobs = [
+            {"id": j.get("id"), "type": j.get("type"), "state": j.get("state"), "progress": j.get("progress")}
+            for j in active
+        ]
 
-        locks: List[str] = []
         try:
-            for p in Path(str(LOCK_DIR)).glob("*.lock"):
-                locks.append(p.name)
-        except Exception:
-            locks = []
+            from services.kb_watcher import get_watcher
+            watcher = get_watcher().stats()
+        except Exception as e:
+            watcher = {"error": str(e)}
 
-        return _ok({"action": "op_status", "in_flight": in_flight, "locks": locks})
+        return _ok({"action": "op_status", "in_flight": in_flight, "jobs": jobs, "kb_watcher": watcher})
     except Exception as e:
         # Final guard: never raise from diagnostics
-        return {"ok": False, "action": "op_status", "error": str(e), "in_flight": [], "locks": []}
+        return {"ok": False, "action": "op_status", "error": str(e), "in_flight": [], "jobs": []}
 
 
 # ── List documents (read-only) -----------------------------------------------
@@ -260,14 +235,16 @@ def list_docs(
     List .md files under docs/imported and/or docs/generated.
     Returns stable shape: {ok, category, count, total, items:[{source,relpath,bytes,mtime}]}
     """
-    imported = [
-        {"source": "imported", "relpath": str(p.relative_to(DOCS_BASE)), "bytes": p.stat().st_size, "mtime": p.stat().st_mtime}
-        for p in _iter_files(DOCS_IMPORTED) if p.suffix.lower() == ".md"
-    ]
-    generated = [
-        {"source": "generated", "relpath": str(p.relative_to(DOCS_BASE)), "bytes": p.stat().st_size, "mtime": p.stat().st_mtime}
-        for p in _iter_files(DOCS_GENERATED) if p.suffix.lower() == ".md"
-    ]
+    catalog = get_catalog(DOCS_BASE.parent)
+
+    def _items(source: str) -> List[Dict[str, Any]]:
+        return [
+            {"source": source, "relpath": e.relpath.split("/", 1)[1], "bytes": e.size, "mtime": e.mtime}
+            for e in catalog.entries(f"docs/{source}", exts=(".md",))
+        ]
+
+    imported = _items("imported")
+    generated = _items("generated")
 
     if category == "imported":
         items = imported
@@ -355,17 +332,28 @@ def view_doc(path: str = Query(..., description="Relative path under 'docs/', 'i
 # ── Google Docs Sync ----------------------------------------------------------
 def _google_sync_ready() -> Tuple[bool, str]:
     """Return (ready, reason) for google sync availability."""
-    if sync_google_docs is None:
+    if sync_google_docs_report is None:
         reason = "google sync module not available"
         if _GOOGLE_SYNC_IMPORT_ERROR:
             reason += f": {_GOOGLE_SYNC_IMPORT_ERROR}"
         return False, reason
     return True, ""
 
+
+def _sync_result(action: str) -> Dict[str, Any]:
+    """Run the incremental sync; synced_docs lists every doc on disk, counts/changed_docs what this run did."""
+    report = sync_google_docs_report()  # type: ignore[misc]
+    return {
+        "action": action,
+        "synced_docs": report.changed + report.unchanged,
+        "changed_docs": report.changed + report.deleted,
+        "counts": report.counts(),
+        "errors": report.errors,
+    }
+
 @router.post("/sync")
 def sync_docs(
     request: Request,  # reserved for future telemetry
-    background: BackgroundTasks,
     wait: bool = Query(True),
 ):
     ready, reason = _google_sync_ready()
@@ -373,13 +361,17 @@ def sync_docs(
         _err(503, f"Google Docs sync is not available ({reason})")
 
     def _job() -> Dict[str, Any]:
-        files = sync_google_docs()  # type: ignore[misc]
+        result = _sync_result("sync")
+        if not result["changed_docs"]:
+            # Incremental sync: nothing written or removed → index is still current.
+            skipped = {"ok": True, "skipped": "no changed docs"}
+            return {**result, "kb": skipped, "cache": skipped}
         reindex = _safe_kb_reindex()
         cache = _safe_clear_cache()
-        return {"action": "sync", "synced_docs": files, "kb": reindex, "cache": cache}
+        return {**result, "kb": reindex, "cache": cache}
 
     try:
-        return _execute_op("docs_sync", wait=wait, background=background, fn=_job)
+        return _execute_op("docs_sync", wait=wait, fn=_job)
     except RuntimeError as err:
         if "already in progress" in str(err):
             _err(409, str(err))
@@ -393,7 +385,6 @@ def sync_docs(
 @router.post("/full_sync")
 def full_sync(
     request: Request,
-    background: BackgroundTasks,
     wait: bool = Query(True),
 ):
     ready, reason = _google_sync_ready()
@@ -401,13 +392,13 @@ def full_sync(
         _err(503, f"Google Docs sync is not available ({reason})")
 
     def _job() -> Dict[str, Any]:
-        files = sync_google_docs()  # type: ignore[misc]
+        result = _sync_result("full_sync")
         reindex = _safe_kb_reindex()
         cache = _safe_clear_cache()
-        return {"action": "full_sync", "synced_docs": files, "kb": reindex, "cache": cache}
+        return {**result, "kb": reindex, "cache": cache}
 
     try:
-        return _execute_op("docs_full_sync", wait=wait, background=background, fn=_job)
+        return _execute_op("docs_full_sync", wait=wait, fn=_job)
     except RuntimeError as err:
         if "already in progress" in str(err):
             _err(409, str(err))
@@ -420,7 +411,6 @@ def full_sync(
 @router.post("/refresh_kb")
 def refresh_kb(
     request: Request,
-    background: BackgroundTasks,
     wait: bool = Query(True),
 ):
     def _job() -> Dict[str, Any]:
@@ -453,7 +443,7 @@ def refresh_kb(
         return {"action": "refresh_kb", "kb": reindex, "kb_source": kb_source, "semantic_counts": semantic_counts, "cache": cache}
 
     try:
-        return _execute_op("kb_reindex", wait=wait, background=background, fn=_job)
+        return _execute_op("kb_reindex", wait=wait, fn=_job)
     except RuntimeError as err:
         if "already in progress" in str(err):
             _err(409, str(err))
@@ -508,7 +498,6 @@ async def promote_doc(request: Request):
 @router.post("/prune_duplicates")
 def prune_duplicates(
     request: Request,
-    background: BackgroundTasks,
     wait: bool = Query(True),
 ):
     """
@@ -539,7 +528,7 @@ def prune_duplicates(
         return {"action": "prune_duplicates", "removed": removed, "kb": reindex, "cache": cache}
 
     try:
-        return _execute_op("docs_prune", wait=wait, background=background, fn=_job)
+        return _execute_op("docs_prune", wait=wait, fn=_job)
     except RuntimeError as err:
         if "already in progress" in str(err):
             _err(409, str(err))
@@ -579,7 +568,7 @@ async def mark_priority(request: Request):
     try:
         from services.docs_utils import write_doc_metadata
         write_doc_metadata(full_path, {"tier": tier, "pinned": pinned})
-        reindex = _safe_kb_reindex()
+        reindex = _safe_kb_ingest([full_path])
         cache = _safe_clear_cache()
         return _ok({"action": "mark_priority", "updated": str(full_path.relative_to(DOCS_BASE)), "tier": tier, "pinned": pinned, "kb": reindex, "cache": cache})
     except Exception as e:
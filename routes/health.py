@@ -9,6 +9,8 @@
 #            - Index root: path + writability (docs/KB rely on this)
 #            - Google stack: enabled/disabled/misconfigured without network I/O
 #            - Routes: count of mounted FastAPI routes (helps detect router drift)
+#            - Warmup: state (idle|warming|ready|degraded) + per-step timings
+#            - LLM: shared OpenAI client capabilities + governor queues (if loaded)
 #
 # Contract:
 #   • Status code 200 when generally OK.
@@ -16,6 +18,9 @@
 #       - 503 if API auth missing, index root not writable, or Google stack
 #         is "misconfigured". A "disabled" Google stack is allowed in PROD.
 #   • In non-prod: never blocks; issues listed in payload for visibility.
+#   • Any env: 503 while the startup warmup is still "warming", so the load
+#     balancer only routes traffic once the /ask hot path is hot. "degraded"
+#     (a warmup step failed) is listed as a problem but does not block.
 #
 # Notes:
 #   • Avoids importing heavy/optional deps except guarded (google sync module).
@@ -29,6 +34,7 @@ from __future__ import annotations
 import base64
 import json
 import os
+import sys
 import time
 from pathlib import Path
 from typing import Any, Dict, List, Optional, Tuple
@@ -265,6 +271,48 @@ def _locks_report() -> Dict[str, Any]:
     return {"candidates": report}
 
 
+def _warmup_snapshot() -> Dict[str, Any]:
+    """Warmup state + per-step timings; "idle" when no warmup was started."""
+    try:
+        from services.warmup import get_warmup
+        return get_warmup().stats()
+    except Exception as e:
+        return {"state": "idle", "error": str(e), "steps": {}}
+
+
+def _llm_snapshot() -> Optional[Dict[str, Any]]:
+    """Shared OpenAI client stats; None until something has imported it."""
+    mod = sys.modules.get("services.openai_client")
+    if mod is None:
+        return None
+    try:
+        return mod.stats()
+    except Exception as e:
+        return {"error": str(e)}
+
+
+def _admission_snapshot() -> Optional[Dict[str, Any]]:
+    """Per-route admission stats (limit, in_flight, queued, rejections, waits)."""
+    mod = sys.modules.get("services.admission")
+    if mod is None:
+        return None
+    try:
+        return mod.stats()
+    except Exception as e:
+        return {"error": str(e)}
+
+
+def _rate_limit_snapshot() -> Optional[Dict[str, Any]]:
+    """Rate limit backend plus per-route limits and allowed/limited counts."""
+    mod = sys.modules.get("services.rate_limit")
+    if mod is None:
+        return None
+    try:
+        return mod.stats()
+    except Exception as e:
+        return {"error": str(e)}
+
+
 def _routes_count(app) -> Optional[int]:
     """Count APIRoute entries (helps detect router mount drift)."""
     try:
@@ -310,9 +358,17 @@ def readyz(request: Request) -> JSONResponse:
     # Routes
     routes_count = _routes_count(request.app)
 
-    # Decision: 200 vs 503 (strict only in prod)
+    # Warmup (started by the app lifespan)
+    warmup = _warmup_snapshot()
+
+    # Decision: 200 vs 503 (strict only in prod, except warmup)
     ok = True
     problems: List[str] = []
+    if warmup["state"] == "warming":
+        ok = False
+        problems.append("warming")
+    elif warmup["state"] == "degraded":
+        problems.append("warmup_degraded")
     if env == "prod":
         if api_auth != "configured":
             ok = False
@@ -336,12 +392,17 @@ def readyz(request: Request) -> JSONResponse:
         "auth_present_keys": [k for k in present_keys if k],  # redact values; show which families exist
         "index_root": {"path": str(index_root), "writable": index_writable},
         "google_stack": google_status,
+        "state": warmup["state"],
+        "warmup": warmup,
         "details": {
             "google": google_detail,
             "cors_env_frontend_origins": cors_env,
             "cors_middleware": cors_mw,
             "routes_count": routes_count,
             "locks": _locks_report(),
+            "llm": _llm_snapshot(),
+            "admission": _admission_snapshot(),
+            "rate_limit": _rate_limit_snapshot(),
         },
         "problems": problems,
     }
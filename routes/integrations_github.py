@@ -19,6 +19,9 @@
 # - All routes are allowlisted to OWNER/REPO (no external repos).
 # - Write routes require BOTH the env gate + API key header.
 # - Errors bubble as HTTP errors (prevents Railway 502 masks).
+# - All calls share one pooled client (services.github_client): GETs are
+#   ETag-conditional, tree/contents at a full commit SHA are cached on disk,
+#   and calls are paced before the rate limit runs out (429 if the wait is long).
 
 from __future__ import annotations
 import os, time, base64, calendar, json
@@ -30,6 +33,8 @@ import jwt
 from fastapi import APIRouter, HTTPException, Header, Query
 from pydantic import BaseModel
 
+from services.github_client import GitHubRateLimited, get_github_client, is_commit_sha
+
 router = APIRouter(prefix="/integrations/github", tags=["github"])
 
 # ── Config ────────────────────────────────────────────────────────────────────
@@ -89,6 +94,13 @@ def _make_app_jwt() -> str:
     except Exception as e:
         raise HTTPException(500, f"JWT encode failed: {e}")
 
+async def _gh_request(method: str, url: str, **kw: Any) -> httpx.Response:
+    """Send via the shared GitHub client; rate-limit backoff surfaces as 429."""
+    try:
+        return await get_github_client().request(method, url, **kw)
+    except GitHubRateLimited as e:
+        raise HTTPException(429, str(e), headers={"Retry-After": str(int(e.retry_after_s) + 1)})
+
 async def _get_installation_token() -> str:
     # refresh if less than 2 minutes remaining
     now = int(time.time())
@@ -100,8 +112,7 @@ async def _get_installation_token() -> str:
                "Accept": "application/vnd.github+json", **UA}
     url = f"{GITHUB_API}/app/installations/{inst_id}/access_tokens"
 
-    async with httpx.AsyncClient(timeout=HTTP_TIMEOUT) as x:
-        r = await x.post(url, headers=headers)
+    r = await _gh_request("POST", url, headers=headers)
     if r.status_code >= 300:
         raise HTTPException(r.status_code, f"/access_tokens failed: {r.text}")
 
@@ -133,21 +144,20 @@ async def diag() -> Dict[str, Any]:
     owner, repo = _require_env("GITHUB_OWNER"), _require_env("GITHUB_REPO")
     try:
         headers = await _gh_headers()
-        async with httpx.AsyncClient(timeout=HTTP_TIMEOUT) as x:
-            r = await x.get(f"{GITHUB_API}/repos/{owner}/{repo}", headers=headers)
+        r = await _gh_request("GET", f"{GITHUB_API}/repos/{owner}/{repo}", headers=headers)
         rb = r.json() if "application/json" in r.headers.get("content-type","") else {}
         default_branch = (rb or {}).get("default_branch")
     except Exception:
         default_branch = None
-    return {"ok": all(presence.values()), "presence": presence, "lengths": lengths, "default_branch": default_branch}
+    return {"ok": all(presence.values()), "presence": presence, "lengths": lengths,
+            "default_branch": default_branch, "client": get_github_client().stats()}
 
 @router.get("/app")
 async def app_info() -> Dict[str, Any]:
     try:
         headers = {"Authorization": f"Bearer {_make_app_jwt()}",
                    "Accept": "application/vnd.github+json", **UA}
-        async with httpx.AsyncClient(timeout=HTTP_TIMEOUT) as x:
-            r = await x.get(f"{GITHUB_API}/app", headers=headers)
+        r = await _gh_request("GET", f"{GITHUB_API}/app", headers=headers)
         body: Any = r.json() if "application/json" in r.headers.get("content-type","") else r.text
         return {"status": r.status_code, "body": body}
     except Exception as e:
@@ -158,8 +168,7 @@ async def list_installations() -> Dict[str, Any]:
     try:
         headers = {"Authorization": f"Bearer {_make_app_jwt()}",
                    "Accept": "application/vnd.github+json", **UA}
-        async with httpx.AsyncClient(timeout=HTTP_TIMEOUT) as x:
-            r = await x.get(f"{GITHUB_API}/app/installations", headers=headers)
+        r = await _gh_request("GET", f"{GITHUB_API}/app/installations", headers=headers)
         body: Any = r.json() if "application/json" in r.headers.get("content-type","") else r.text
         return {"status": r.status_code, "body": body}
     except Exception as e:
@@ -170,8 +179,7 @@ async def status(branch: str = "main") -> Any:
     owner, repo = _require_env("GITHUB_OWNER"), _require_env("GITHUB_REPO")
     try:
         headers = await _gh_headers()
-        async with httpx.AsyncClient(timeout=HTTP_TIMEOUT) as x:
-            r = await x.get(f"{GITHUB_API}/repos/{owner}/{repo}/commits/{branch}/status", headers=headers)
+        r = await _gh_request("GET", f"{GITHUB_API}/repos/{owner}/{repo}/commits/{branch}/status", headers=headers)
         if r.status_code >= 300:
             raise HTTPException(r.status_code, r.text)
         return r.json()
@@ -185,16 +193,25 @@ async def status(branch: str = "main") -> Any:
 async def get_tree(ref: str = "HEAD", recursive: bool = True) -> Any:
     """Return the git tree for a ref (branch or SHA). Use ?recursive=1 for full listing."""
     owner, repo = _require_env("GITHUB_OWNER"), _require_env("GITHUB_REPO")
+    # Trees at a full SHA are immutable → serve from the on-disk cache
+    disk = get_github_client().disk_cache if is_commit_sha(ref) else None
+    disk_key = ("tree", owner, repo, ref.lower(), str(bool(recursive)))
+    if disk is not None:
+        hit = await disk.aget(disk_key)
+        if hit is not None:
+            return hit
     try:
         headers = await _gh_headers()
         url = f"{GITHUB_API}/repos/{owner}/{repo}/git/trees/{ref}"
         if recursive:
             url += "?recursive=1"
-        async with httpx.AsyncClient(timeout=HTTP_TIMEOUT) as x:
-            r = await x.get(url, headers=headers)
+        r = await _gh_request("GET", url, headers=headers)
         if r.status_code >= 300:
             raise HTTPException(r.status_code, r.text)
-        return r.json()
+        data = r.json()
+        if disk is not None:
+            await disk.aput(disk_key, data)
+        return data
     except HTTPException:
         raise
     except Exception as e:
@@ -209,38 +226,47 @@ async def get_contents(path: str = "", ref: str = "main", raw: bool = False) ->
     - Files (raw=true)  → {path, ref, raw:true, content: <string> }
     """
     owner, repo = _require_env("GITHUB_OWNER"), _require_env("GITHUB_REPO")
+    disk = get_github_client().disk_cache if is_commit_sha(ref) else None
+    disk_key = ("contents", owner, repo, ref.lower(), path, str(bool(raw)))
+    if disk is not None:
+        hit = await disk.aget(disk_key)
+        if hit is not None:
+            return hit
     try:
         headers = await _gh_headers(raw=raw)
         url = f"{GITHUB_API}/repos/{owner}/{repo}/contents/{path}"
         params = {"ref": ref}
-        async with httpx.AsyncClient(timeout=HTTP_TIMEOUT) as x:
-            r = await x.get(url, headers=headers, params=params)
+        r = await _gh_request("GET", url, headers=headers, params=params)
         if r.status_code >= 300:
             raise HTTPException(r.status_code, r.text)
 
         if raw:
             # Raw returns the file content body directly
             text = r.text
-            return {"path": path, "ref": ref, "raw": True, "content": text}
-
-        data = r.json()
-        if isinstance(data, list):
-            return {
-                "type": "dir",
-                "entries": [
-                    {"name": i["name"], "path": i["path"], "type": i["type"], "size": i.get("size")}
-                    for i in data
-                ],
-            }
-        # file with base64 payload
-        if data.get("encoding") == "base64" and "content" in data:
-            try:
-                decoded = base64.b64decode(data["content"]).decode("utf-8", errors="ignore")
-            except Exception:
-                decoded = ""
-            return {"type": "file", "path": data.get("path"), "sha": data.get("sha"),
-                    "size": data.get("size"), "content": decoded}
-        return data
+            out: Any = {"path": path, "ref": ref, "raw": True, "content": text}
+        else:
+            data = r.json()
+            if isinstance(data, list):
+                out = {
+                    "type": "dir",
+                    "entries": [
+                        {"name": i["name"], "path": i["path"], "type": i["type"], "size": i.get("size")}
+                        for i in data
+                    ],
+                }
+            # file with base64 payload
+            elif data.get("encoding") == "base64" and "content" in data:
+                try:
+                    decoded = base64.b64decode(data["content"]).decode("utf-8", errors="ignore")
+                except Exception:
+                    decoded = ""
+                out = {"type": "file", "path": data.get("path"), "sha": data.get("sha"),
+                       "size": data.get("size"), "content": decoded}
+            else:
+                out = data
+        if disk is not None:
+            await disk.aput(disk_key, out)
+        return out
     except HTTPException:
         raise
     except Exception as e:
@@ -257,8 +283,7 @@ async def search_code(
         headers = await _gh_headers()
         query = f"{q} repo:{owner}/{repo}"
         params = {"q": query, "per_page": per_page, "page": page}
-        async with httpx.AsyncClient(timeout=HTTP_TIMEOUT) as x:
-            r = await x.get(f"{GITHUB_API}/search/code", headers=headers, params=params)
+        r = await _gh_request("GET", f"{GITHUB_API}/search/code", headers=headers, params=params)
         if r.status_code >= 300:
             raise HTTPException(r.status_code, r.text)
         data = r.json()
@@ -297,9 +322,7 @@ async def put_contents(body: PutFile, x_api_key: Optional[str] = Header(default=
         payload = {"message": body.message, "content": body.content_b64, "branch": body.branch}
         if body.sha:
             payload["sha"] = body.sha
-        async with httpx.AsyncClient(timeout=HTTP_TIMEOUT) as x:
-            r = await x.put(f"{GITHUB_API}/repos/{owner}/{repo}/contents/{body.path}",
-                            headers=headers, json=payload)
+        r = await _gh_request("PUT", f"{GITHUB_API}/repos/{owner}/{repo}/contents/{body.path}", headers=headers, json=payload)
         if r.status_code >= 300:
             raise HTTPException(r.status_code, r.text)
         data = r.json()
@@ -323,8 +346,7 @@ async def create_pr(body: NewPR, x_api_key: Optional[str] = Header(default=None,
     try:
         headers = await _gh_headers()
         payload = {"title": body.title, "head": body.head, "base": body.base, "body": body.body}
-        async with httpx.AsyncClient(timeout=HTTP_TIMEOUT) as x:
-            r = await x.post(f"{GITHUB_API}/repos/{owner}/{repo}/pulls", headers=headers, json=payload)
+        r = await _gh_request("POST", f"{GITHUB_API}/repos/{owner}/{repo}/pulls", headers=headers, json=payload)
         if r.status_code >= 300:
             raise HTTPException(r.status_code, r.text)
         data = r.json()
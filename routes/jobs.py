@@ -0,0 +1,105 @@
+# ──────────────────────────────────────────────────────────────────────────────
+# File: jobs.py
+# Directory: routes
+# Purpose: Inspect, follow and cancel long-running jobs (reindex, Drive sync,
+#          prune) started by routes.docs.
+#
+# Upstream:
+#   - ENV: JOBS_DIR, LOCK_DIR, JOBS_LIMITS (via services.jobs)
+#   - Imports: asyncio, fastapi, json, services.auth, services.jobs
+#
+# Downstream:
+#   - frontend ops panels, scripts polling /docs/* with wait=false
+#
+# Contents:
+#   - list_jobs()      GET  /jobs?type=&state=&limit=
+#   - get_job()        GET  /jobs/{id}
+#   - job_events()     GET  /jobs/{id}/events   (SSE)
+#   - cancel_job()     POST /jobs/{id}/cancel
+#
+# Notes:
+#   • Records live on disk, so any worker can answer for a job started by
+#     another. The SSE stream polls the record and emits an event whenever
+#     its "seq" changes, then a final `event: done` at a terminal state.
+# ──────────────────────────────────────────────────────────────────────────────
+
+from __future__ import annotations
+
+import asyncio
+import json
+import time
+from typing import Any, Dict, Optional
+
+from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi.responses import StreamingResponse
+
+from services.auth import require_api_key
+from services.jobs import TERMINAL, get_store
+
+router = APIRouter(prefix="/jobs", tags=["jobs"], dependencies=[Depends(require_api_key)])
+
+POLL_S = 0.5
+KEEPALIVE_S = 15.0
+
+
+def _get_or_404(job_id: str) -> Dict[str, Any]:
+    rec = get_store().get(job_id)
+    if rec is None:
+        raise HTTPException(status_code=404, detail="job not found")
+    return rec
+
+
+@router.get("")
+def list_jobs(
+    type: Optional[str] = Query(None, description="Job type, e.g. kb_reindex"),
+    state: Optional[str] = Query(None, description="queued|running|succeeded|failed|cancelled|interrupted"),
+    limit: int = Query(50, ge=1, le=500),
+):
+    """Most recent jobs first."""
+    return {"jobs": get_store().list(type=type, state=state, limit=limit)}
+
+
+@router.get("/{job_id}")
+def get_job(job_id: str):
+    return _get_or_404(job_id)
+
+
+@router.get("/{job_id}/events")
+async def job_events(job_id: str):
+    """Server-Sent Events: one `progress` event per record change, then `done`."""
+    _get_or_404(job_id)
+    store = get_store()
+
+    async def event_generator():
+        last_seq = -1
+        last_sent = time.monotonic()
+        while True:
+            rec = await asyncio.to_thread(store.get, job_id)
+            if rec is None:
+                yield f"event: error\ndata: {json.dumps({'error': 'job not found'})}\n\n"
+                return
+            if rec.get("seq") != last_seq:
+                last_seq = rec.get("seq")
+                last_sent = time.monotonic()
+                if rec.get("state") in TERMINAL:
+                    yield f"event: done\ndata: {json.dumps(rec, default=str)}\n\n"
+                    return
+                yield f"event: progress\ndata: {json.dumps(rec, default=str)}\n\n"
+            elif time.monotonic() - last_sent >= KEEPALIVE_S:
+                last_sent = time.monotonic()
+                yield ": keepalive\n\n"
+            await asyncio.sleep(POLL_S)
+
+    return StreamingResponse(
+        event_generator(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "Connection": "keep-alive", "X-Accel-Buffering": "no"},
+    )
+
+
+@router.post("/{job_id}/cancel")
+def cancel_job(job_id: str):
+    """Request cooperative cancellation; the job stops at its next progress checkpoint."""
+    _get_or_404(job_id)
+    rec = get_store().request_cancel(job_id)
+    return {"ok": True, "job": rec}
@@ -13,19 +13,22 @@
 #   • Fast path uses services.semantic_retriever.search (adaptable signature).
 #   • Optional fallback to services.kb.search guarded by ALLOW_KB_FALLBACK.
 #   • Non-blocking timeouts return JSON 503 (never edge 504).
+#   • Search work runs on a bounded pool (KB_SEARCH_THREADS, default 8);
+#     request concurrency is capped by services.admission (429 when full).
 #   • Scores normalized to [0,1]; filtered by SEMANTIC_SCORE_THRESHOLD (env).
 #   • Stable, non-throwing warmup and summary paths.
 # ──────────────────────────────────────────────────────────────────────────────
 
 from __future__ import annotations
 
+import asyncio
+import concurrent.futures
 import logging
 import math
 import os
 import time
 from typing import Any, Callable, List, Optional, Tuple
 
-import anyio
 from fastapi import APIRouter, Depends, Header, HTTPException, Query, Request
 from fastapi.responses import JSONResponse
 from pydantic import BaseModel, Field
@@ -39,6 +42,7 @@ except Exception:  # pragma: no cover
 
 from services import kb as kb_service
 from services.auth import require_api_key
+from services.serialization import FastJSONResponse
 
 # Prefer semantic adapter when available (fast path)
 try:  # pragma: no cover
@@ -73,6 +77,9 @@ def _env_float(name: str, default: float) -> float:
 SEMANTIC_SCORE_THRESHOLD: float = _env_float("SEMANTIC_SCORE_THRESHOLD", 0.25)
 KB_SEARCH_TIMEOUT_S: float = _env_float("KB_SEARCH_TIMEOUT_S", 30.0)
 ALLOW_KB_FALLBACK: bool = os.getenv("ALLOW_KB_FALLBACK", "1") not in ("0", "false", "False")
+KB_SEARCH_THREADS: int = max(1, int(_env_float("KB_SEARCH_THREADS", 8)))
+
+_SEARCH_POOL = concurrent.futures.ThreadPoolExecutor(max_workers=KB_SEARCH_THREADS, thread_name_prefix="kb-search")
 
 # ──────────────────────────────────────────────────────────────────────────────
 # Helpers: non-blocking timeout harness, scoring, logging
@@ -81,7 +88,7 @@ ALLOW_KB_FALLBACK: bool = os.getenv("ALLOW_KB_FALLBACK", "1") not in ("0", "fals
 
 async def _run_with_timeout(fn: Callable[[], Any], timeout_s: float) -> Tuple[bool, Any]:
     """
-    Run a blocking function in a worker thread and race a timeout.
+    Run a blocking function on the bounded kb-search pool and race a timeout.
 
     Returns:
         (ok, value) on success,
@@ -89,35 +96,20 @@ async def _run_with_timeout(fn: Callable[[], Any], timeout_s: float) -> Tuple[bo
         (False, Exception) on error.
 
     Design:
-        - The worker runs in a thread via anyio.to_thread.run_sync.
-        - The main task awaits a memory channel receive with a move_on_after timeout.
-        - We never block the event loop; the worker may complete later but we return promptly.
+        - Work runs on a fixed-size pool (KB_SEARCH_THREADS), so searches that
+          outlive their timeout can never grow the thread count or starve the
+          shared anyio worker pool.
+        - On timeout we return at once; work that has not started is cancelled,
+          work already running finishes in the background on its pool thread.
     """
-    send, recv = anyio.create_memory_object_stream(1)
-
-    async def _runner() -> None:
-        def _work():
-            try:
-                return fn()
-            except Exception as e:  # noqa: BLE001
-                return e
-
-        result = await anyio.to_thread.run_sync(_work)
-        # send is async; dispatch from thread-safe context is not needed here
-        await send.send(result)
-
-    result: Any = None
-    async with anyio.create_task_group() as tg:
-        tg.start_soon(_runner)
-        with anyio.move_on_after(timeout_s) as scope:
-            result = await recv.receive()
-        tg.cancel_scope.cancel()
-
-    if scope.cancel_called:
+    fut = _SEARCH_POOL.submit(fn)
+    try:
+        return True, await asyncio.wait_for(asyncio.wrap_future(fut), timeout_s)
+    except asyncio.TimeoutError:
+        fut.cancel()
         return False, "timeout"
-    if isinstance(result, Exception):
-        return False, result
-    return True, result
+    except Exception as e:  # noqa: BLE001
+        return False, e
 
 
 def _score_of(row: dict) -> float:
@@ -305,13 +297,13 @@ async def search_kb(
         query_len=len(q.query or ""),
         user_id=user_id,
     )
-    return {
+    return FastJSONResponse({
         "ok": True,
         "threshold": SEMANTIC_SCORE_THRESHOLD,
         "count": len(normalized),
         "results": normalized,
         **({"impl": IMPL_MARKER} if IMPL_MARKER else {}),
-    }
+    })
 
 
 # ──────────────────────────────────────────────────────────────────────────────
@@ -434,13 +426,13 @@ async def search_kb_get(
         query_len=len(query or ""),
         user_id=user_id,
     )
-    return {
+    return FastJSONResponse({
         "ok": True,
         "threshold": SEMANTIC_SCORE_THRESHOLD,
         "count": len(normalized),
         "results": normalized,
         **({"impl": IMPL_MARKER} if IMPL_MARKER else {}),
-    }
+    })
 
 
 # ──────────────────────────────────────────────────────────────────────────────
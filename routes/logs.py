@@ -4,7 +4,7 @@
 #
 # Upstream:
 #   - ENV: —
-#   - Imports: fastapi, services.logs
+#   - Imports: fastapi, services.logs, services.serialization
 #
 # Downstream:
 #   - main
@@ -15,10 +15,11 @@
 
 from fastapi import APIRouter, Query
 from services.logs import get_recent_logs
+from services.serialization import FastJSONResponse
 
 router = APIRouter(prefix="/logs", tags=["logs"])
 
 @router.get("/recent")
 def recent_logs(n: int = 50, level_filter: str = None):
     logs = get_recent_logs(n=n, level_filter=level_filter)
-    return {"logs": logs}
+    return FastJSONResponse({"logs": logs})
@@ -3,34 +3,202 @@
 # Purpose: # Purpose: Manage and retrieve logs of user sessions within the application.
 #
 # Upstream:
-#   - ENV: —
-#   - Imports: fastapi, json, pathlib
+#   - ENV: SESSION_DIR (via services.session_store)
+#   - Imports: base64, fastapi, heapq, json, services.auth, services.serialization,
+#              services.session_store
 #
 # Downstream:
-#   - —
+#   - frontend MemoryPanel
 #
 # Contents:
 #   - list_all_sessions()
-
+#
+# Notes:
+#   • Per-user stores are each read newest-first (reverse from EOF) and
+#     k-way merged with a heap, so a page costs O(limit · log users) reads
+#     regardless of total history. Order: timestamp desc, then user desc.
+#   • Pagination is by opaque cursor (last timestamp/user/tie count, ties
+#     counted after the q filter); the per-user walk resumes at the cursor
+#     via the sparse time index. MemoryPanel requests the next page on demand.
+#   • Entries without a timestamp sort last (ts 0) in file order, oldest
+#     first, so later appends never shift a cursor's position among them.
+#     They are only listed when neither since nor until is given.
+#   • format=json (default) → {"entries": [...], "next_cursor": str|null}
+#     format=ndjson → one entry per line, then {"next_cursor": ...} last.
 # ──────────────────────────────────────────────────────────────────────────────
 
-from fastapi import APIRouter, Request
-from pathlib import Path
+from __future__ import annotations
+
+import base64
+import heapq
 import json
+from datetime import datetime, timezone
+from typing import Any, Dict, Iterator, List, Literal, Optional, Tuple
+
+from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi.responses import StreamingResponse
+
+from services.auth import require_api_key
+from services.serialization import FastJSONResponse, dumps
+from services.session_store import SessionStore, entry_ts_ms, get_store
+
+router = APIRouter(prefix="/logs/sessions", tags=["logs", "memory"], dependencies=[Depends(require_api_key)])
+
+MAX_LIMIT = 1000
+
+Cursor = Tuple[int, str, int]  # (ts_ms, user, entries already emitted at that (ts, user))
+
+
+def _encode_cursor(c: Cursor) -> str:
+    raw = json.dumps({"t": c[0], "u": c[1], "n": c[2]}, separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def _decode_cursor(s: str) -> Cursor:
+    try:
+        d = json.loads(base64.urlsafe_b64decode(s + "=" * (-len(s) % 4)))
+        return int(d["t"]), str(d["u"]), int(d["n"])
+    except Exception:
+        raise HTTPException(status_code=400, detail="invalid cursor")
+
 
-router = APIRouter(prefix="/logs/sessions", tags=["logs", "memory"])
+def _ms(value: Optional[str], name: str) -> Optional[int]:
+    if not value:
+        return None
+    try:
+        dt = datetime.fromisoformat(value.replace("Z", "+00:00"))
+    except ValueError:
+        raise HTTPException(status_code=400, detail=f"{name} must be an ISO-8601 timestamp")
+    if dt.tzinfo is None:
+        dt = dt.replace(tzinfo=timezone.utc)
+    return int(dt.timestamp() * 1000)
+
+
+def _matches(entry: Dict[str, Any], needle: str) -> bool:
+    for v in entry.values():
+        if isinstance(v, str) and needle in v.lower():
+            return True
+    return False
+
+
+def _user_stream(
+    store: SessionStore,
+    user: str,
+    *,
+    cursor: Optional[Cursor],
+    since_ms: Optional[int],
+    until_ms: Optional[int],
+    needle: Optional[str],
+) -> Iterator[Tuple[int, str, Dict[str, Any]]]:
+    """One user's entries newest-first as (ts_ms, user, entry), positioned after cursor."""
+    before = until_ms
+    skip_ties = 0
+    if cursor is not None:
+        c_ts, c_user, c_n = cursor
+        before = c_ts if before is None else min(before, c_ts)
+        if user > c_user:
+            skip_ties = -1  # all of this user's entries at c_ts were already emitted
+        elif user == c_user:
+            skip_ties = c_n
+
+    def walk() -> Iterator[Tuple[int, Dict[str, Any]]]:
+        if cursor is None or cursor[0] > 0:
+            for entry in store.iter_reverse(user, before_ms=before, since_ms=since_ms):
+                ts = entry_ts_ms(entry)
+                if ts is not None:
+                    yield ts, entry
+        if since_ms is None and until_ms is None:
+            for entry in store.iter_untimestamped(user):
+                yield 0, entry  # legacy lines without a timestamp sort last
+
+    for ts, entry in walk():
+        # Filter before counting ties: the cursor's tie count is in emitted entries.
+        if needle and not _matches(entry, needle):
+            continue
+        if cursor is not None and ts == cursor[0] and skip_ties:
+            if skip_ties < 0:
+                continue
+            skip_ties -= 1
+            continue
+        yield ts, user, entry
+
+
+def merged(
+    store: SessionStore,
+    *,
+    users: Optional[List[str]] = None,
+    cursor: Optional[Cursor] = None,
+    since_ms: Optional[int] = None,
+    until_ms: Optional[int] = None,
+    text: Optional[str] = None,
+) -> Iterator[Tuple[int, str, Dict[str, Any]]]:
+    """k-way merge of every selected user's newest-first stream."""
+    needle = text.lower() if text else None
+    streams = [
+        _user_stream(store, u, cursor=cursor, since_ms=since_ms, until_ms=until_ms, needle=needle)
+        for u in (users or store.users())
+    ]
+    return heapq.merge(*streams, key=lambda item: (item[0], item[1]), reverse=True)
+
+
+def _page(items: Iterator[Tuple[int, str, Dict[str, Any]]], limit: int, cursor: Optional[Cursor]):
+    """Yield up to limit entries, then the next cursor (or None) as the final item."""
+    last: Optional[Cursor] = None
+    count = 0
+    for ts, user, entry in items:
+        if count == limit:
+            yield last  # there is at least one more entry
+            return
+        if last is not None and last[0] == ts and last[1] == user:
+            last = (ts, user, last[2] + 1)
+        elif cursor is not None and cursor[0] == ts and cursor[1] == user:
+            last = (ts, user, cursor[2] + 1)
+        else:
+            last = (ts, user, 1)
+        count += 1
+        yield entry
+    yield None
 
-SESSION_LOG_DIR = Path("./logs/sessions")
 
 @router.get("/all")
-def list_all_sessions():
-    entries = []
-    for path in SESSION_LOG_DIR.glob("*.jsonl"):
-        with open(path) as f:
-            for line in f:
-                try:
-                    parsed = json.loads(line)
-                    entries.append(parsed)
-                except json.JSONDecodeError:
-                    continue
-    return {"entries": sorted(entries, key=lambda x: x.get("timestamp", ""), reverse=True)}
+def list_all_sessions(
+    limit: int = Query(200, ge=1, le=MAX_LIMIT),
+    cursor: Optional[str] = Query(None, description="next_cursor from the previous page"),
+    user: Optional[str] = Query(None, description="Comma list of user ids"),
+    since: Optional[str] = Query(None, description="ISO-8601, inclusive"),
+    until: Optional[str] = Query(None, description="ISO-8601, inclusive"),
+    q: Optional[str] = Query(None, description="Case-insensitive text filter"),
+    format: Literal["json", "ndjson"] = Query("json"),
+):
+    store = get_store()
+    cur = _decode_cursor(cursor) if cursor else None
+    users = [u.strip() for u in user.split(",") if u.strip()] if user else None
+    items = merged(
+        store,
+        users=users,
+        cursor=cur,
+        since_ms=_ms(since, "since"),
+        until_ms=_ms(until, "until"),
+        text=q,
+    )
+    page = _page(items, limit, cur)
+
+    if format == "ndjson":
+        def stream() -> Iterator[bytes]:
+            for item in page:
+                if isinstance(item, dict):
+                    yield dumps(item) + b"\n"
+                else:
+                    nxt = _encode_cursor(item) if item else None
+                    yield dumps({"next_cursor": nxt}) + b"\n"
+
+        return StreamingResponse(stream(), media_type="application/x-ndjson")
+
+    entries: List[Dict[str, Any]] = []
+    next_cursor: Optional[str] = None
+    for item in page:
+        if isinstance(item, dict):
+            entries.append(item)
+        elif item:
+            next_cursor = _encode_cursor(item)
+    return FastJSONResponse({"entries": entries, "next_cursor": next_cursor})
@@ -33,6 +33,7 @@ from uuid import uuid4
 
 from fastapi import APIRouter, Header, HTTPException, Request
 from fastapi.responses import JSONResponse
+from services.serialization import FastJSONResponse, jsonable
 
 if TYPE_CHECKING:
     # Hints only (do not create import cycles at runtime)
@@ -129,23 +130,6 @@ def _as_int(val: Any, default: int) -> int:
         return int(default)
 
 
-def _json_safe(obj: Any) -> Any:
-    try:
-        if isinstance(obj, (str, int, float, bool)) or obj is None:
-            return obj
-        if isinstance(obj, dict):
-            return {str(k): _json_safe(v) for k, v in obj.items()}
-        if isinstance(obj, (list, tuple, set)):
-            return [_json_safe(x) for x in obj]
-        # Pydantic v1/v2 models
-        if hasattr(obj, "model_dump"):
-            return obj.model_dump()  # type: ignore[attr-defined]
-        if hasattr(obj, "dict"):
-            return obj.dict()  # type: ignore[attr-defined]
-        return str(obj)
-    except Exception:
-        return "[unserializable]"
-
 def _final_text_from(plan: Any, rr: Any, root_final: Optional[str] = None) -> str:
     # 1) explicit final_text at root
     if isinstance(root_final, str) and root_final.strip():
@@ -283,8 +267,9 @@ async def mcp_diag_ctx(q: str = "Relay Command Center") -> Dict[str, Any]:
 
 @router.post(
     "/run",
-    response_model=McpEnvelope,
+    response_model=McpEnvelope,  # schema only; the body is returned pre-serialized
     response_model_exclude_none=True,
+    response_class=FastJSONResponse,
     responses={400: {"model": ErrorEnvelope}, 500: {"model": ErrorEnvelope}, 504: {"model": ErrorEnvelope}},
 )
 async def mcp_run(
@@ -446,7 +431,7 @@ async def mcp_run(
             log_event("mcp_result_normalize_warn", {"corr_id": corr_id, "error": str(_e)})
 
         if not isinstance(result, dict):
-            result = {"routed_result": _json_safe(result)}
+            result = {"routed_result": jsonable(result)}
 
     except HTTPException:
         raise  # FastAPI-generated; bubble up
@@ -474,7 +459,7 @@ async def mcp_run(
     except Exception:
         pass
     if not isinstance(result, dict):
-        result = {"routed_result": _json_safe(result)}
+        result = {"routed_result": jsonable(result)}
 
     plan = result.get("plan") if isinstance(result.get("plan"), dict) else None
     rr = result.get("routed_result")
@@ -526,27 +511,28 @@ async def mcp_run(
 
     final_text = _final_text_from(plan, rr, root_final=result.get("final_text"))
 
-    envelope = McpEnvelope(
-        plan=_json_safe(plan) if plan else None,
-        routed_result=_json_safe(rr) if isinstance(rr, (dict, str)) else {},
-        critics=_json_safe(critics) if critics is not None else None,
-        context=context_out,
-        files_used=_json_safe(files_out) if isinstance(files_out, list) else [],
-        meta={**_json_safe(meta_in), "request_id": corr_id, "kb": kb_final},
-        final_text=final_text or "",
-    )
+    # McpEnvelope shape, serialized once by FastJSONResponse (None fields omitted).
+    envelope: Dict[str, Any] = {
+        "plan": plan or None,
+        "routed_result": rr if isinstance(rr, (dict, str)) else {},
+        "critics": list(critics) if isinstance(critics, (list, tuple)) else None,
+        "context": context_out,
+        "files_used": files_out if isinstance(files_out, list) else [],
+        "meta": {**meta_in, "request_id": corr_id, "kb": kb_final},
+        "final_text": final_text or "",
+    }
 
     log_event(
         "mcp_run_completed",
         {
             "corr_id": corr_id,
-            "route": envelope.meta.get("route"),
-            "kb_hits": ((envelope.meta.get("kb") or {}).get("hits")),
-            "kb_max_score": ((envelope.meta.get("kb") or {}).get("max_score")),
-            "final_len": len(envelope.final_text or ""),
+            "route": envelope["meta"].get("route"),
+            "kb_hits": kb_final.get("hits"),
+            "kb_max_score": kb_final.get("max_score"),
+            "final_len": len(envelope["final_text"]),
         },
     )
-    return envelope
+    return FastJSONResponse({k: v for k, v in envelope.items() if v is not None})
 
 # ──────────────────────────────────────────────────────────────────────────────
 # Recommendations (next PRs)
@@ -0,0 +1,73 @@
+# ──────────────────────────────────────────────────────────────────────────────
+# File: routes/solar.py
+# Purpose: Aggregated SolArk plant_flow windows for dashboards (rollup-backed)
+#
+# Endpoints (require X-Api-Key or Authorization: Bearer …):
+#   • GET /solar/plant_flow?plant_id=&start=&end=&grain=auto|1m|15m|1h|1d&metrics=pv_power,soc
+#       → {ok, plant_id, grain, start, end, count, cached, rows:[{bucket, n, <metric>:{min,max,avg,last}, energy_wh}]}
+#
+# Notes:
+#   • Reads only the rollup tables (never raw plant_flow / raw_json).
+#   • Defaults: end=now, start=end-24h, plant_id=$PLANT_ID.
+#   • DB missing/unreachable → 503 with reason; bad params → 400.
+#   • Cache-Control mirrors the server-side cache TTL for the window.
+# ──────────────────────────────────────────────────────────────────────────────
+
+from __future__ import annotations
+
+import os
+from datetime import datetime, timedelta, timezone
+from typing import Literal, Optional
+
+from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi.responses import JSONResponse
+
+from services import solar_rollups
+from services.auth import require_api_key
+
+router = APIRouter(prefix="/solar", tags=["solar"], dependencies=[Depends(require_api_key)])
+
+MAX_WINDOW_DAYS = 400
+
+
+def _parse_ts(value: Optional[str], name: str) -> Optional[datetime]:
+    if not value:
+        return None
+    try:
+        ts = datetime.fromisoformat(value.replace("Z", "+00:00"))
+    except ValueError:
+        raise HTTPException(status_code=400, detail=f"{name} must be an ISO-8601 timestamp")
+    return ts if ts.tzinfo else ts.replace(tzinfo=timezone.utc)
+
+
+@router.get("/plant_flow")
+def plant_flow(
+    plant_id: Optional[int] = Query(None, description="Defaults to $PLANT_ID"),
+    start: Optional[str] = Query(None, description="ISO-8601; default end-24h"),
+    end: Optional[str] = Query(None, description="ISO-8601; default now"),
+    grain: Literal["auto", "1m", "15m", "1h", "1d"] = Query("auto"),
+    metrics: Optional[str] = Query(None, description="Comma list; default all"),
+):
+    if plant_id is None:
+        try:
+            plant_id = int(os.getenv("PLANT_ID", ""))
+        except ValueError:
+            raise HTTPException(status_code=400, detail="plant_id is required (PLANT_ID not set)")
+
+    end_ts = _parse_ts(end, "end") or datetime.now(timezone.utc)
+    start_ts = _parse_ts(start, "start") or (end_ts - timedelta(hours=24))
+    if start_ts >= end_ts:
+        raise HTTPException(status_code=400, detail="start must be before end")
+    if end_ts - start_ts > timedelta(days=MAX_WINDOW_DAYS):
+        raise HTTPException(status_code=400, detail=f"window exceeds {MAX_WINDOW_DAYS} days")
+
+    wanted = [m.strip() for m in metrics.split(",") if m.strip()] if metrics else None
+    try:
+        res = solar_rollups.query_window(plant_id, start_ts, end_ts, grain=grain, metrics=wanted)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except solar_rollups.SolarDataUnavailable as e:
+        raise HTTPException(status_code=503, detail=f"solar data unavailable: {e}")
+
+    body = {"ok": True, "plant_id": plant_id, "count": len(res["rows"]), **res}
+    return JSONResponse(content=body, headers={"Cache-Control": f"private, max-age={int(res['ttl_s'])}"})
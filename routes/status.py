@@ -5,7 +5,7 @@
 #
 # Upstream:
 #   - ENV: RELAY_PROJECT_ROOT
-#   - Imports: datetime, fastapi, os, pathlib, subprocess
+#   - Imports: datetime, fastapi, os, pathlib, services.doc_catalog, subprocess
 #
 # Downstream:
 #   - main
@@ -26,6 +26,8 @@ import os
 from subprocess import check_output, CalledProcessError
 from datetime import datetime
 
+from services.doc_catalog import get_catalog
+
 router = APIRouter(prefix="/status", tags=["status"])
 
 @router.get("/paths")
@@ -102,20 +104,18 @@ def list_context_inventory(
     exts = [".md", ".txt"]
 ):
     """
-    Helper: Returns a list of context file metadata from all roots.
+    Helper: Returns a list of context file metadata from all roots
+    (served from the shared document catalog; no per-call filesystem scan).
     """
+    catalog = get_catalog(base)
     inventory = []
     for root in roots:
-        folder = base / root
-        if not folder.exists():
-            continue
-        for f in folder.rglob("*"):
-            if f.is_file() and f.suffix in exts:
-                inventory.append({
-                    "path": str(f.relative_to(base)),
-                    "size_bytes": f.stat().st_size,
-                    "last_modified": datetime.utcfromtimestamp(f.stat().st_mtime).isoformat() + "Z"
-                })
+        for e in catalog.entries(root, exts=exts):
+            inventory.append({
+                "path": e.relpath,
+                "size_bytes": e.size,
+                "last_modified": datetime.utcfromtimestamp(e.mtime).isoformat() + "Z"
+            })
     return inventory
 
 @router.get("/context")
@@ -4,8 +4,12 @@
 #
 # Notes:
 #  - Verifies X-Hub-Signature-256 (sha256=...) or legacy X-Hub-Signature (sha1=...)
-#  - Returns 2xx quickly; heavy work runs in BackgroundTasks
-#  - In-memory de-dupe on X-GitHub-Delivery to avoid reprocessing retries
+#  - Returns 2xx quickly; work goes onto a bounded queue drained by one consumer
+#  - 503 + Retry-After when the queue is full (GitHub/ops can redeliver later)
+#  - Persistent TTL de-dupe on X-GitHub-Delivery (survives restarts/redelivery storms)
+#  - The claim row holds the event until it is dispatched; events left queued by a
+#    crash/restart are replayed (or taken over by a redelivery) after a lease
+#  - Event log is appended in batches through one open handle (fsync configurable)
 #  - Dispatches common events (pull_request, issue_comment, push, ping)
 #  - Queues a Control action via in-process queue first; falls back to HTTP; else logs
 #  - Does NOT execute repo writes; those live in /control endpoints or GH Actions
@@ -17,6 +21,9 @@ from __future__ import annotations
 import os
 import hmac
 import json
+import time
+import atexit
+import asyncio
 import hashlib
 import logging
 import urllib.request
@@ -24,9 +31,12 @@ import urllib.error
 from datetime import datetime, timezone
 from typing import Any, Optional
 
-from fastapi import APIRouter, Request, HTTPException, BackgroundTasks, Response
+import anyio
+from fastapi import APIRouter, Request, HTTPException, Response
 from starlette.requests import ClientDisconnect
 
+from services.webhook_ingest import DeliveryIndex, EventLogWriter, IngestQueue
+
 router = APIRouter(prefix="/webhooks", tags=["webhooks"])
 log = logging.getLogger("webhooks.github")
 
@@ -38,21 +48,33 @@ EVENT_LOG_PATH = os.getenv("EVENT_LOG_PATH", "logs/events.log")
 MAX_EVENT_BYTES = int(os.getenv("GITHUB_WEBHOOK_MAX_BYTES", "1048576"))  # 1 MiB
 WEBHOOK_SECRET = os.getenv("GITHUB_WEBHOOK_SECRET", "")
 
-# De-dup cache (process-local)
-_seen: set[str] = set()
-_SEEN_MAX = 2048  # simple cap to avoid unbounded growth
+# Ingestion pipeline knobs
+QUEUE_MAX = int(os.getenv("GITHUB_WEBHOOK_QUEUE_MAX", "256"))
+RETRY_AFTER_S = int(os.getenv("GITHUB_WEBHOOK_RETRY_AFTER_S", "30"))
+DEDUP_DB_PATH = os.getenv("GITHUB_WEBHOOK_DEDUP_DB", "data/webhook_deliveries.sqlite3")
+DEDUP_TTL_S = float(os.getenv("GITHUB_WEBHOOK_DEDUP_TTL_S", str(72 * 3600)))
+DEDUP_LEASE_S = float(os.getenv("GITHUB_WEBHOOK_LEASE_S", "300"))      # queued claim → orphaned
+REPLAY_EVERY_S = float(os.getenv("GITHUB_WEBHOOK_REPLAY_EVERY_S", "60"))
+EVENT_LOG_BATCH = int(os.getenv("EVENT_LOG_BATCH", "32"))
+EVENT_LOG_FLUSH_S = float(os.getenv("EVENT_LOG_FLUSH_S", "1.0"))
+EVENT_LOG_FSYNC = os.getenv("EVENT_LOG_FSYNC", "batch")  # never | batch | always
+
+# De-dup index (persistent, TTL) and batched event log
+_deliveries = DeliveryIndex(DEDUP_DB_PATH, ttl_s=DEDUP_TTL_S, lease_s=DEDUP_LEASE_S)
+_event_log = EventLogWriter(
+    EVENT_LOG_PATH,
+    batch_size=EVENT_LOG_BATCH,
+    flush_interval_s=EVENT_LOG_FLUSH_S,
+    fsync=EVENT_LOG_FSYNC,
+)
+atexit.register(_event_log.close)
 
 
 # ────────────────────────── Utilities ──────────────────────────
 
 def _append_event_log(record: dict[str, Any]) -> None:
-    """Best-effort JSONL append (never raises)."""
-    try:
-        os.makedirs(os.path.dirname(EVENT_LOG_PATH), exist_ok=True)
-        with open(EVENT_LOG_PATH, "a", encoding="utf-8") as f:
-            f.write(json.dumps(record, separators=(",", ":"), ensure_ascii=False) + "\n")
-    except Exception as e:
-        log.warning("Failed to write event log: %s", e)
+    """Best-effort JSONL append via the batched writer (never raises)."""
+    _event_log.append(record)
 
 
 def _queue_control_action(kind: str, payload: dict[str, Any]) -> bool:
@@ -91,16 +113,10 @@ def _queue_control_action(kind: str, payload: dict[str, Any]) -> bool:
         return False
 
 
-def _already_seen(delivery_id: str) -> bool:
-    """Return True if this delivery was already processed; record if new."""
-    if not delivery_id:
-        return False
-    if delivery_id in _seen:
-        return True
-    if len(_seen) >= _SEEN_MAX:
-        _seen.clear()
-    _seen.add(delivery_id)
-    return False
+async def _already_seen(delivery_id: str, event: str, payload: dict[str, Any]) -> bool:
+    """Return True if this delivery was already accepted (within TTL); record it with its payload if new."""
+    fresh = await anyio.to_thread.run_sync(_deliveries.claim, delivery_id, event, payload)
+    return not fresh
 
 
 def _safe_json_loads(raw: bytes) -> dict[str, Any]:
@@ -169,12 +185,20 @@ async def github_probe():
 
 @router.get("/github/debug")
 async def github_debug():
-    # Do not return the secret; just presence & cache stats.
+    # Do not return the secret; just presence, dedup and queue stats.
     return {
         "ok": True,
         "has_secret": bool(WEBHOOK_SECRET),
-        "delivery_cache_size": len(_seen),
+        "delivery_cache_size": _deliveries.size(),
+        "delivery_ttl_s": DEDUP_TTL_S,
         "max_event_bytes": MAX_EVENT_BYTES,
+        "queue": _ingest.stats(),
+        "event_log": {
+            "pending": _event_log.pending(),
+            "written": _event_log.records_written,
+            "flushes": _event_log.flushes,
+            "fsync": _event_log.fsync,
+        },
     }
 
 
@@ -182,14 +206,14 @@ async def github_debug():
 
 # ── Main webhook handler ─────────────────────────────────────────────────────
 @router.post("/github")
-async def github(req: Request, bg: BackgroundTasks):
+async def github(req: Request):
     """
     Hardened webhook ingress:
       • 204 on ClientDisconnect (quiet)
       • payload size guard
       • HMAC verification
-      • in-memory de-dup on X-GitHub-Delivery
-      • enqueue background dispatch, return 2xx immediately
+      • persistent TTL de-dup on X-GitHub-Delivery
+      • bounded enqueue (503 + Retry-After when full), return 2xx immediately
     """
     # 1) ClientDisconnect is not an error (quiet 204)
     try:
@@ -208,23 +232,79 @@ async def github(req: Request, bg: BackgroundTasks):
     event = req.headers.get("X-GitHub-Event", "unknown")
     delivery = req.headers.get("X-GitHub-Delivery", "")
 
-    # 5) De-duplicate
-    if _already_seen(delivery):
-        return {"ok": True, "event": event, "delivery": delivery, "deduped": True}
-
-    # 6) Parse JSON (400 if invalid)
+    # 5) Parse JSON (400 if invalid) — before claiming, so a bad body is never recorded
     payload = _safe_json_loads(body)
 
-    # 7) Dispatch asynchronously; keep GitHub happy with quick 2xx
-    bg.add_task(_dispatch_event, event, payload, delivery)
+    # 6) De-duplicate (the claim also persists the event until it is dispatched)
+    if await _already_seen(delivery, event, payload):
+        return {"ok": True, "event": event, "delivery": delivery, "deduped": True}
+
+    # 7) Hand off to the consumer; keep GitHub happy with quick 2xx
+    _maybe_replay_orphans()
+    if not _ingest.offer(event, payload, delivery):
+        # Un-claim so a redelivery after backoff is not treated as a dupe
+        await anyio.to_thread.run_sync(_deliveries.release, delivery)
+        log.warning("Webhook queue full (depth=%s); rejecting delivery=%s", _ingest.depth(), delivery)
+        raise HTTPException(
+            status_code=503,
+            detail="Webhook queue full; retry later",
+            headers={"Retry-After": str(RETRY_AFTER_S)},
+        )
     return {"ok": True, "event": event, "delivery": delivery, "queued": True}
 
 
+_last_replay = 0.0
+_replay_task: Optional[asyncio.Task] = None
+
+
+def _maybe_replay_orphans() -> None:
+    """At most every REPLAY_EVERY_S, re-queue events a dead/stopped worker left undispatched."""
+    global _last_replay, _replay_task
+    now = time.monotonic()
+    if now - _last_replay < REPLAY_EVERY_S or (_replay_task is not None and not _replay_task.done()):
+        return
+    _last_replay = now
+    _replay_task = asyncio.get_running_loop().create_task(_replay_orphans())
+
+
+async def _replay_orphans() -> int:
+    room = _ingest.maxsize - _ingest.depth()
+    if room <= 0:
+        return 0
+    try:
+        rows = await anyio.to_thread.run_sync(_deliveries.orphans, room)
+    except Exception as e:
+        log.warning("Webhook orphan replay failed: %s", e)
+        return 0
+    replayed = 0
+    for delivery, event, payload in rows:
+        # A full queue leaves the row leased; it comes back after the next lease.
+        if _ingest.offer(event, payload, delivery):
+            replayed += 1
+    if rows:
+        log.info("Replayed %d/%d orphaned webhook deliveries", replayed, len(rows))
+    return replayed
+
+
+async def shutdown(drain_timeout_s: float = 5.0) -> None:
+    """Drain the ingest queue (bounded) and flush the event log. Never raises.
+    Anything left behind stays "queued" in the delivery index and is replayed later."""
+    try:
+        drained, left = await _ingest.stop(drain_timeout_s)
+        if not drained:
+            log.warning("Webhook queue not drained on shutdown (left=%s)", left)
+    except Exception as e:
+        log.warning("Webhook shutdown failed: %s", e)
+    finally:
+        _event_log.close()
+        _deliveries.close()
+
+
 # ────────────────────────── Dispatcher ──────────────────────────
 
 def _dispatch_event(event: str, p: dict[str, Any], delivery: str) -> None:
     """
-    Background dispatcher — never raises up the stack.
+    Queue consumer handler (runs in a worker thread) — never raises up the stack.
     """
     try:
         if event == "ping":
@@ -245,6 +325,17 @@ def _dispatch_event(event: str, p: dict[str, Any], delivery: str) -> None:
         _append_event_log({"event": event, "delivery": delivery, "error": str(ex)})
 
 
+def _process_delivery(event: str, p: dict[str, Any], delivery: str) -> None:
+    """Consumer handler: dispatch, then mark the delivery done so it is never replayed."""
+    _dispatch_event(event, p, delivery)
+    _deliveries.done(delivery)
+
+
+# Single consumer: dispatch runs off the request path, one event at a time.
+# The event log is flushed whenever the queue goes idle.
+_ingest = IngestQueue(_process_delivery, maxsize=QUEUE_MAX, name="github_webhook", on_idle=_event_log.flush)
+
+
 def _on_pull_request(p: dict[str, Any], delivery: str) -> None:
     action = p.get("action")
     repo = p.get("repository", {}).get("full_name")
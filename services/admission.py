@@ -0,0 +1,300 @@
+# ─────────────────────────────────────────────────────────────────────────────
+# File: admission.py
+# Directory: services
+# Purpose: Per-route admission control for expensive endpoints: a concurrency
+#          limit, a bounded FIFO wait queue with a deadline, fast 429 +
+#          Retry-After on overflow, and optional latency-driven limits.
+#
+# Upstream:
+#   - ENV: ADMISSION (default 1)
+#          ADMISSION_<NAME>_MAX        concurrent requests (ask 16, mcp_run 16, kb_search 32)
+#          ADMISSION_<NAME>_QUEUE      waiting requests (default 2 × MAX)
+#          ADMISSION_<NAME>_WAIT_S     max queue wait (default 5)
+#          ADMISSION_<NAME>_TARGET_MS  latency target; set → adaptive limit
+#          (<NAME> = ASK | MCP_RUN | KB_SEARCH)
+#   - Imports: asyncio, collections, services.errors, services.serialization,
+#              services.telemetry
+#
+# Downstream:
+#   - main (AdmissionMiddleware in the core stack)
+#   - routes.health (details.admission)
+#
+# Contents:
+#   - Overloaded
+#   - AdmissionController (acquire / stats), Ticket (release)
+#   - AdmissionMiddleware
+#   - get_controllers(), stats()
+#
+# Notes:
+#   • Slots are handed directly to the oldest waiter on release, so a burst
+#     cannot starve queued requests. Waiters past their deadline get 429
+#     "queue_timeout"; a full queue gets 429 "queue_full" immediately.
+#   • The slot is held until the response body has been sent, so in-flight
+#     is the real work in progress.
+#   • Adaptive mode (TARGET_MS): after every `limit` completions the EWMA
+#     latency is compared with the target — above → limit × 0.8, well below
+#     while saturated → limit + 1, bounded by [1, MAX].
+#   • Metrics (no-op without OTEL): relay_admission_queue_depth,
+#     relay_admission_in_flight (up/down), relay_admission_rejected_total
+#     {route, reason}, relay_admission_wait_ms, relay_admission_latency_ms.
+# ─────────────────────────────────────────────────────────────────────────────
+
+from __future__ import annotations
+
+import asyncio
+import collections
+import math
+import os
+import time
+from typing import Any, Deque, Dict, Optional
+
+from services import telemetry
+
+DEFAULT_ROUTES = {
+    # path → (controller name, default max concurrency)
+    "/ask": ("ask", 16),
+    "/mcp/run": ("mcp_run", 16),
+    "/kb/search": ("kb_search", 32),
+}
+
+
+class Overloaded(Exception):
+    def __init__(self, reason: str, retry_after_s: int) -> None:
+        super().__init__(reason)
+        self.reason = reason
+        self.retry_after_s = retry_after_s
+
+
+class Ticket:
+    def __init__(self, ctl: "AdmissionController") -> None:
+        self.ctl = ctl
+        self.t0 = time.perf_counter()
+        self._released = False
+
+    def release(self) -> None:
+        if self._released:
+            return
+        self._released = True
+        self.ctl._release((time.perf_counter() - self.t0) * 1000)
+
+
+class AdmissionController:
+    def __init__(
+        self,
+        name: str,
+        *,
+        max_concurrency: int = 16,
+        max_queue: Optional[int] = None,
+        queue_timeout_s: float = 5.0,
+        target_ms: Optional[float] = None,
+    ) -> None:
+        self.name = name
+        self.max_limit = max(1, int(max_concurrency))
+        self.limit = self.max_limit
+        self.max_queue = max(0, int(2 * self.max_limit if max_queue is None else max_queue))
+        self.queue_timeout_s = float(queue_timeout_s)
+        self.target_ms = float(target_ms) if target_ms else None
+        self.in_flight = 0
+        self._waiters: Deque[asyncio.Future] = collections.deque()
+        self._latency_ms: Optional[float] = None
+        self._completions = 0
+        self._attrs = {"route": name}
+        self._wait = {"count": 0, "total_ms": 0.0, "max_ms": 0.0}
+        self.counters = {"admitted": 0, "enqueued": 0, "completed": 0, "rejected_queue_full": 0, "rejected_queue_timeout": 0}
+
+    async def acquire(self) -> Ticket:
+        t0 = time.perf_counter()
+        if self.in_flight < self.limit and not self._waiters:
+            self._take()
+            return self._admitted(t0)
+        if len(self._waiters) >= self.max_queue:
+            raise self._reject("queue_full")
+
+        fut = asyncio.get_running_loop().create_future()
+        self._waiters.append(fut)
+        self.counters["enqueued"] += 1
+        telemetry.adjust("relay_admission_queue_depth", +1, self._attrs)
+        try:
+            await asyncio.wait({fut}, timeout=self.queue_timeout_s)
+        except BaseException:
+            # Caller cancelled (client went away) while queued or just after a handoff.
+            if fut.done() and not fut.cancelled():
+                self._release(None)
+            else:
+                self._dequeue(fut)
+            raise
+        if not fut.done():
+            self._dequeue(fut)
+            raise self._reject("queue_timeout")
+        return self._admitted(t0)
+
+    def stats(self) -> Dict[str, Any]:
+        w = self._wait
+        return {
+            "limit": self.limit,
+            "max_concurrency": self.max_limit,
+            "adaptive": self.target_ms is not None,
+            "target_ms": self.target_ms,
+            "in_flight": self.in_flight,
+            "queued": len(self._waiters),
+            "max_queue": self.max_queue,
+            "queue_timeout_s": self.queue_timeout_s,
+            "latency_ewma_ms": round(self._latency_ms, 1) if self._latency_ms is not None else None,
+            "wait_ms": {
+                "count": w["count"],
+                "avg": round(w["total_ms"] / w["count"], 1) if w["count"] else 0.0,
+                "max": round(w["max_ms"], 1),
+            },
+            **self.counters,
+        }
+
+    # ── internals ───────────────────────────────────────────────────────────
+
+    def _take(self) -> None:
+        self.in_flight += 1
+        telemetry.adjust("relay_admission_in_flight", +1, self._attrs)
+
+    def _admitted(self, t0: float) -> Ticket:
+        waited_ms = (time.perf_counter() - t0) * 1000
+        self.counters["admitted"] += 1
+        self._wait["count"] += 1
+        self._wait["total_ms"] += waited_ms
+        self._wait["max_ms"] = max(self._wait["max_ms"], waited_ms)
+        telemetry.observe("relay_admission_wait_ms", waited_ms, self._attrs)
+        return Ticket(self)
+
+    def _dequeue(self, fut: asyncio.Future) -> None:
+        try:
+            self._waiters.remove(fut)
+        except ValueError:
+            return
+        fut.cancel()
+        telemetry.adjust("relay_admission_queue_depth", -1, self._attrs)
+
+    def _reject(self, reason: str) -> Overloaded:
+        self.counters[f"rejected_{reason}"] += 1
+        telemetry.incr("relay_admission_rejected_total", 1, {**self._attrs, "reason": reason})
+        return Overloaded(reason, self._retry_after())
+
+    def _retry_after(self) -> int:
+        # Roughly how long until the queue ahead of a new caller drains.
+        per_req_s = (self._latency_ms or 1000.0) / 1000.0
+        backlog = (len(self._waiters) + 1) / max(1, self.limit)
+        return int(min(60, max(1, math.ceil(per_req_s * backlog))))
+
+    def _release(self, latency_ms: Optional[float]) -> None:
+        self.in_flight -= 1
+        telemetry.adjust("relay_admission_in_flight", -1, self._attrs)
+        if latency_ms is not None:
+            self.counters["completed"] += 1
+            telemetry.observe("relay_admission_latency_ms", latency_ms, self._attrs)
+            self._latency_ms = latency_ms if self._latency_ms is None else 0.8 * self._latency_ms + 0.2 * latency_ms
+            self._adapt()
+        self._wake()
+
+    def _adapt(self) -> None:
+        if self.target_ms is None or self._latency_ms is None:
+            return
+        self._completions += 1
+        if self._completions < self.limit:
+            return
+        self._completions = 0
+        if self._latency_ms > self.target_ms:
+            self.limit = max(1, int(self.limit * 0.8))
+        elif self._latency_ms < 0.7 * self.target_ms and (self.in_flight + len(self._waiters)) >= self.limit:
+            self.limit = min(self.max_limit, self.limit + 1)
+
+    def _wake(self) -> None:
+        while self._waiters and self.in_flight < self.limit:
+            fut = self._waiters.popleft()
+            telemetry.adjust("relay_admission_queue_depth", -1, self._attrs)
+            if fut.done():
+                continue
+            self._take()
+            fut.set_result(None)
+
+
+# ── ASGI middleware ──────────────────────────────────────────────────────────
+
+class AdmissionMiddleware:
+    """Admit requests to the configured paths through their controller; 429 on overflow."""
+
+    def __init__(self, app, controllers: Optional[Dict[str, AdmissionController]] = None) -> None:
+        self.app = app
+        self.controllers = get_controllers() if controllers is None else controllers
+
+    async def __call__(self, scope, receive, send) -> None:
+        ctl = None
+        if scope["type"] == "http" and scope.get("method") != "OPTIONS":
+            ctl = self.controllers.get(scope.get("path") or "")
+        if ctl is None:
+            await self.app(scope, receive, send)
+            return
+        try:
+            ticket = await ctl.acquire()
+        except Overloaded as e:
+            await _too_busy(ctl, e, scope, receive, send)
+            return
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            ticket.release()
+
+
+async def _too_busy(ctl: AdmissionController, e: Overloaded, scope, receive, send) -> None:
+    from services.errors import error_payload
+    from services.serialization import FastJSONResponse
+
+    corr_id = (scope.get("state") or {}).get("corr_id", "")
+    detail = error_payload(
+        "overloaded",
+        f"{ctl.name} is at capacity; retry later.",
+        corr_id=corr_id,
+        hint=f"Retry after {e.retry_after_s}s.",
+        extra={"reason": e.reason, "retry_after_s": e.retry_after_s},
+    )
+    response = FastJSONResponse({"detail": detail}, status_code=429, headers={"Retry-After": str(e.retry_after_s)})
+    await response(scope, receive, send)
+
+
+# ── Registry ─────────────────────────────────────────────────────────────────
+
+_controllers: Optional[Dict[str, AdmissionController]] = None
+
+
+def enabled() -> bool:
+    return (os.getenv("ADMISSION") or "1").strip().lower() in {"1", "true", "yes"}
+
+
+def _env_num(key: str, default: Optional[float]) -> Optional[float]:
+    raw = (os.getenv(key) or "").strip()
+    try:
+        return float(raw) if raw else default
+    except ValueError:
+        return default
+
+
+def get_controllers() -> Dict[str, AdmissionController]:
+    """path → controller, built once from ADMISSION_* env."""
+    global _controllers
+    if _controllers is None:
+        out: Dict[str, AdmissionController] = {}
+        for path, (name, default_max) in DEFAULT_ROUTES.items():
+            env = f"ADMISSION_{name.upper()}"
+            max_c = int(_env_num(f"{env}_MAX", default_max) or default_max)
+            queue = _env_num(f"{env}_QUEUE", None)
+            out[path] = AdmissionController(
+                name,
+                max_concurrency=max_c,
+                max_queue=int(queue) if queue is not None else None,
+                queue_timeout_s=_env_num(f"{env}_WAIT_S", 5.0) or 5.0,
+                target_ms=_env_num(f"{env}_TARGET_MS", None),
+            )
+        _controllers = out
+    return _controllers
+
+
+def stats() -> Dict[str, Any]:
+    if _controllers is None:
+        return {}
+    return {ctl.name: ctl.stats() for ctl in _controllers.values()}
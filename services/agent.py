@@ -4,8 +4,8 @@
 # Purpose: Provides functionalities for automated documentation generation, code review, and interaction with knowledge base services.
 #
 # Upstream:
-#   - ENV: API_KEY, ENABLE_REFLECT_AND_PLAN, RAILWAY_URL
-#   - Imports: httpx, json, openai, os, pathlib, re, services.context_engine, services.kb, typing, utils.openai_client
+#   - ENV: API_KEY, ENABLE_REFLECT_AND_PLAN, RAILWAY_URL, HISTORY_SUMMARY_MODEL (+ HISTORY_* in services.conversation_history)
+#   - Imports: httpx, json, os, pathlib, re, services.context_engine, services.conversation_history, services.kb, typing, services.openai_client
 #
 # Downstream:
 #   - —
@@ -26,14 +26,11 @@ import re
 import json
 from pathlib import Path
 from typing import List, Dict, Any, Optional, AsyncGenerator
-from openai import AsyncOpenAI
 import services.kb as kb
 import httpx
 from core.context_engine import ContextEngine
-from utils.openai_client import create_openai_client
-
-# === Initialize OpenAI client ===
-client = create_openai_client()
+from services.conversation_history import Turn, store_from_env
+from services import openai_client  # shared pooled client + governor
 
 # === Railway control endpoint for queueing actions/docs ===
 RAILWAY_KEY = os.getenv("API_KEY")
@@ -62,8 +59,29 @@ def wants_docgen(query: str) -> Optional[str]:
     match = re.search(r"(?:generate|create|make).*doc.*for ([\w/\\.]+\.\w+)", query.lower())
     return match.group(1).strip() if match else None
 
-# === In-memory store for multi-turn history (per user) ===
-conversation_history: Dict[str, List[Dict[str, Any]]] = {}
+# === Multi-turn history (per user): LRU of token-budgeted windows + running summary ===
+HISTORY_SUMMARY_MODEL = os.getenv("HISTORY_SUMMARY_MODEL", "gpt-4o-mini")
+
+async def _summarize_turns(previous: str, turns: List[Turn], max_tokens: int) -> str:
+    """Fold turns that slid out of the window into the running summary."""
+    transcript = "\n".join(f"{t.get('role')}: {t.get('content')}" for t in turns)
+    response = await openai_client.chat_create(
+        priority="background",
+        model=HISTORY_SUMMARY_MODEL,
+        messages=[
+            {"role": "system", "content": (
+                "Update the running summary of a conversation. Keep facts, decisions, "
+                f"open questions and file paths; drop pleasantries. Under {max_tokens} tokens."
+            )},
+            {"role": "user", "content": f"Current summary:\n{previous or '(none)'}\n\nNew turns:\n{transcript}"},
+        ],
+        temperature=0.0,
+        max_tokens=max_tokens,
+        stream=False,
+    )
+    return response.choices[0].message.content or previous
+
+conversation_history = store_from_env(_summarize_turns)
 
 # === Tool dispatchers ===
 async def search_docs(query: str, user_id: str) -> Dict[str, Any]:
@@ -85,7 +103,7 @@ async def reflect_and_plan(user_id: str, query: str) -> Dict[str, Any]:
         {"role": "assistant", "content": f"Previous context:\n{kb.get_recent_summaries(user_id)}" if hasattr(kb, "get_recent_summaries") else ""},
         {"role": "user", "content": f"Reflect on this query for planning: {query}"},
     ]
-    response = await client.chat.completions.create(
+    response = await openai_client.chat_create(
         model="gpt-4o",
         messages=messages,
         temperature=0.0,
@@ -145,18 +163,17 @@ async def answer(
         plan = {"plan": []}
 
     # --- Update conversation history ---
-    history = conversation_history.setdefault(user_id, [])
-    history.append({"role": "user", "content": query})
-    
-    # --- Compose messages with history and plan ---
+    conversation_history.append(user_id, "user", query)
+
+    # --- Compose messages with (bounded) history and plan ---
     messages: List[Dict[str, Any]] = [
         {"role": "system", "content": SYSTEM_PROMPT},
         {"role": "system", "content": f"Context:\n{context}"},
         {"role": "assistant", "content": f"Plan: {json.dumps(plan)}"},
-    ] + history
+    ] + conversation_history.messages(user_id)
 
     try:
-        response = await client.chat.completions.create(
+        response = await openai_client.chat_create(
             model="gpt-4o",
             messages=messages,
             stream=stream,
@@ -183,7 +200,7 @@ async def answer(
                     if delta and delta.content:
                         collected.append(delta.content)
                         yield delta.content
-                history.append({"role": "assistant", "content": "".join(collected)})
+                conversation_history.append(user_id, "assistant", "".join(collected))
 
             return gen()
         else:
@@ -199,7 +216,7 @@ async def answer(
                     result = {"error": f"Unknown function: {fname}"}
                 return json.dumps(result)
             else:
-                history.append({"role": "assistant", "content": message.content})
+                conversation_history.append(user_id, "assistant", message.content)
                 return message.content
 
     except Exception as e:
@@ -222,7 +239,8 @@ File: {rel_path}
 {content[:3000]}
 """
 
-    response = await client.chat.completions.create(
+    response = await openai_client.chat_create(
+        priority="background",
         model="gpt-4o",
         messages=[
             {"role": "system", "content": SYSTEM_PROMPT},
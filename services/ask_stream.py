@@ -1,22 +1,100 @@
-# File: routes/ask_stream.py
-from fastapi import APIRouter
-from fastapi.responses import StreamingResponse
-from agents import mcp_agent
-
-router = APIRouter()
-
-@router.post("/ask/stream")
-async def ask_stream(body: dict):
-    async def gen():
-        # start MCP with a streamed agent (if available), else chunk the final answer
-        res = await mcp_agent.run_mcp(query=body.get("query",""), files=body.get("files") or [], topics=body.get("topics") or [], role=body.get("role","planner"), user_id=body.get("user_id","anonymous"), debug=bool(body.get("debug")))
-        txt = (res.get("final_text") or "").split()
-        yield f"data: {res.get('meta')}\n\n"  # first meta frame
-        buf = []
-        for w in txt:
-            buf.append(w)
-            if len(buf) >= 30:
-                yield f"data: {' '.join(buf)} \n\n"; buf.clear()
-        if buf: yield f"data: {' '.join(buf)} \n\n"
-        yield "event: done\ndata: {}\n\n"
-    return StreamingResponse(gen(), media_type="text/event-stream")
+# ─────────────────────────────────────────────────────────────────────────────
+# File: ask_stream.py
+# Directory: services
+# Purpose: Frame an agent's token stream for /ask/stream and /ask/codex_stream:
+#          meta frame (grounding + retrieval timings) → tokens → done frame,
+#          recording time-to-first-token.
+#
+# Upstream:
+#   - Imports: core.logging, json, services.telemetry, time
+#
+# Downstream:
+#   - routes.ask (ask_stream, ask_codex_stream)
+#
+# Contents:
+#   - wants_sse(accept, fmt)
+#   - sse(event, data)
+#   - relay(chunks, *, meta, route, corr_id, as_sse)
+#
+# Notes:
+#   • SSE is opt-in (Accept: text/event-stream, or ?format=sse) so existing
+#     text/plain consumers keep receiving the bare concatenated tokens.
+#   • Tokens are forwarded as soon as the agent yields them; nothing here
+#     buffers or re-chunks.
+#   • TTFT is observed as relay_ask_ttft_ms{route} (no-op without OTEL) and
+#     logged with the total stream time.
+# ─────────────────────────────────────────────────────────────────────────────
+
+from __future__ import annotations
+
+import json
+import time
+from typing import Any, AsyncIterator, Dict, Optional
+
+try:
+    from core.logging import log_event  # type: ignore
+except Exception:  # pragma: no cover
+    def log_event(event: str, data: Optional[Dict[str, Any]] = None) -> None:
+        pass
+
+try:
+    from services.telemetry import observe
+except Exception:  # pragma: no cover
+    def observe(name: str, value: float, attrs: Optional[dict] = None, unit: str = "ms") -> None:
+        pass
+
+
+def wants_sse(accept: Optional[str], fmt: Optional[str] = None) -> bool:
+    if fmt:
+        return fmt.strip().lower() == "sse"
+    return "text/event-stream" in (accept or "").lower()
+
+
+def sse(event: str, data: Any) -> bytes:
+    return f"event: {event}\ndata: {json.dumps(data, default=str)}\n\n".encode("utf-8")
+
+
+async def relay(
+    chunks: AsyncIterator[Any],
+    *,
+    meta: Dict[str, Any],
+    route: str,
+    corr_id: str,
+    as_sse: bool,
+) -> AsyncIterator[bytes]:
+    """
+    Forward agent chunks to the client as they arrive.
+
+    SSE: `meta` first, one `token` event per chunk, then `done` with timings
+    (or `error`). Plain text: bare chunks; errors propagate to the caller.
+    """
+    t0 = time.perf_counter()
+    ttft_ms: Optional[int] = None
+    chars = 0
+    if as_sse:
+        yield sse("meta", {**meta, "corr_id": corr_id})
+    try:
+        async for chunk in chunks:
+            if not chunk:
+                continue
+            text = chunk if isinstance(chunk, str) else str(chunk)
+            if ttft_ms is None:
+                ttft_ms = int((time.perf_counter() - t0) * 1000)
+                observe("relay_ask_ttft_ms", ttft_ms, {"route": route})
+            chars += len(text)
+            yield sse("token", {"text": text}) if as_sse else text.encode("utf-8")
+    except Exception as e:
+        if not as_sse:
+            raise
+        log_event("ask_stream_error", {"corr_id": corr_id, "route": route, "error": str(e)})
+        yield sse("error", {"error": str(e), "corr_id": corr_id})
+        return
+
+    timings = {
+        **(meta.get("timings") or {}),
+        "ttft_ms": ttft_ms,
+        "stream_ms": int((time.perf_counter() - t0) * 1000),
+    }
+    log_event("ask_stream_done", {"corr_id": corr_id, "route": route, "chars": chars, **timings})
+    if as_sse:
+        yield sse("done", {"timings": timings, "chars": chars})
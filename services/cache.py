@@ -1,8 +1,9 @@
-"""Redis helpers (lazy aioredis import, safe on import).
+"""Redis helpers (lazy redis.asyncio import, safe on import).
 
 Notes:
 - Avoid top-level awaits or demo snippets that break module import.
-- Return None from get_redis() when aioredis or REDIS_URL is unavailable.
+- Prefer redis.asyncio (redis>=4.2); the archived aioredis package is only a fallback.
+- Return None from get_redis() when neither client or REDIS_URL is available.
 """
 
 from typing import Optional
@@ -17,15 +18,19 @@ _aioredis = None
 
 
 def _get_aioredis():
-    """Return aioredis module or None; memoized and import-safe."""
+    """Return the async redis module (redis.asyncio, else aioredis) or None; memoized and import-safe."""
     global _aioredis
     if _aioredis is None:
         try:
-            import aioredis  # type: ignore
+            import redis.asyncio as aioredis  # type: ignore
             _aioredis = aioredis
         except Exception as e:  # pragma: no cover
-            logger.info("aioredis unavailable: %s", e)
-            _aioredis = False
+            try:
+                import aioredis  # type: ignore
+                _aioredis = aioredis
+            except Exception:
+                logger.info("redis.asyncio unavailable: %s", e)
+                _aioredis = False
     return _aioredis or None
 
 
@@ -33,7 +38,7 @@ _redis = None
 
 
 async def get_redis():
-    """Get a cached aioredis client or None if not available/configured."""
+    """Get a cached async redis client or None if not available/configured."""
     global _redis
     mod = _get_aioredis()
     url = os.getenv("REDIS_URL")
@@ -41,7 +46,8 @@ async def get_redis():
         return None
     try:
         if _redis is None:
-            _redis = await mod.from_url(url, decode_responses=True)
+            # from_url is synchronous in both clients; the pool connects on first command.
+            _redis = mod.from_url(url, decode_responses=True)
         return _redis
     except Exception as e:  # pragma: no cover
         logger.info("redis connect failed: %s", e)
@@ -0,0 +1,176 @@
+# ─────────────────────────────────────────────────────────────────────────────
+# File: context_refresh.py
+# Directory: services
+# Purpose: Debounced, in-process refresh of docs/generated/relay_context.md
+#          from the session log tail (replaces HTTP self-calls to /context/update).
+#
+# Upstream:
+#   - ENV: OPENAI_API_KEY, CONTEXT_REFRESH_DEBOUNCE_S, CONTEXT_REFRESH_MIN_INTERVAL_S,
+#          CONTEXT_REFRESH_MODEL
+#   - Imports: hashlib, pathlib, services.openai_client (background priority), services.logs, threading
+#
+# Downstream:
+#   - routes.context
+#   - services.logs (log_and_refresh)
+#
+# Contents:
+#   - ContextRefresher (request / run_now / stats / cancel)
+#   - get_refresher()
+#
+# Notes:
+#   • request() is non-blocking: bursts within the debounce window coalesce
+#     into one run, and runs are spaced at least MIN_INTERVAL apart. Work runs
+#     on a daemon timer thread, never on the caller's request worker.
+#   • The LLM call is skipped when the hash of the log tail is unchanged
+#     since the last successful summary.
+#   • The refresher logs via log_entry (not log_and_refresh) under its own
+#     source, which is excluded from the hashed tail, so a refresh never
+#     schedules or invalidates another one.
+# ─────────────────────────────────────────────────────────────────────────────
+
+from __future__ import annotations
+
+import hashlib
+import os
+import threading
+import time
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional
+
+RELAY_CONTEXT_PATH = Path("docs/generated/relay_context.md")
+HEADER = "Relay Context (auto-generated)"
+TAIL_LINES = 100
+SOURCE = "context_refresh"
+
+
+def _tail_text(logs: List[Dict[str, Any]]) -> str:
+    return "\n".join(f"[{l.get('source')}] {l.get('message')}" for l in logs)
+
+
+def _write_markdown(path: Path, body: str) -> None:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_suffix(path.suffix + ".tmp")
+    tmp.write_text(f"# {HEADER}\n\n{body.strip()}\n", encoding="utf-8")
+    os.replace(tmp, path)
+
+
+def openai_summarize(text: str) -> str:
+    from services.openai_client import sync_chat_create
+
+    response = sync_chat_create(
+        priority="background",
+        cache="context_summary",  # unchanged log tail (e.g. force=True) → cached summary
+        temperature=0,
+        model=os.getenv("CONTEXT_REFRESH_MODEL", "gpt-4o"),
+        messages=[
+            {"role": "system", "content": "You are a system summarizer for a command center log."},
+            {"role": "user", "content": f"Summarize the following session log:\n\n{text}"},
+        ],
+    )
+    return (response.choices[0].message.content or "").strip()
+
+
+class ContextRefresher:
+    def __init__(
+        self,
+        *,
+        debounce_s: float = 5.0,
+        min_interval_s: float = 60.0,
+        summarize: Callable[[str], str] = openai_summarize,
+        path: Path = RELAY_CONTEXT_PATH,
+    ) -> None:
+        self.debounce_s = max(0.0, debounce_s)
+        self.min_interval_s = max(0.0, min_interval_s)
+        self.summarize = summarize
+        self.path = path
+        self._lock = threading.Lock()
+        self._run_lock = threading.Lock()
+        self._timer: Optional[threading.Timer] = None
+        self._last_run = 0.0
+        self._last_hash: Optional[str] = None
+        self.counters = {"requested": 0, "coalesced": 0, "runs": 0, "skipped_unchanged": 0, "errors": 0}
+        self.last_error: Optional[str] = None
+
+    # ── Scheduling ───────────────────────────────────────────────────────────
+    def request(self) -> None:
+        """Ask for a refresh soon; coalesces with any pending request."""
+        with self._lock:
+            self.counters["requested"] += 1
+            if self._timer is not None:
+                self.counters["coalesced"] += 1
+                return
+            wait = max(self.debounce_s, self._last_run + self.min_interval_s - time.monotonic())
+            self._timer = threading.Timer(wait, self._fire)
+            self._timer.daemon = True
+            self._timer.start()
+
+    def _fire(self) -> None:
+        with self._lock:
+            self._timer = None
+        try:
+            self.run_now()
+        except Exception:
+            pass  # recorded in counters/last_error
+
+    def cancel(self) -> None:
+        with self._lock:
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+
+    # ── Work ─────────────────────────────────────────────────────────────────
+    def run_now(self, *, force: bool = False) -> Dict[str, Any]:
+        """Summarize the log tail into relay_context.md (synchronous)."""
+        from services.logs import get_recent_logs, log_entry
+
+        with self._run_lock:
+            self._last_run = time.monotonic()
+            # Our own "updated" lines are excluded so they don't defeat the hash check.
+            logs = [l for l in get_recent_logs(TAIL_LINES) if l.get("source") != SOURCE]
+            if not logs:
+                _write_markdown(self.path, "No logs to summarize.")
+                return {"status": "no logs to summarize"}
+            text = _tail_text(logs)
+            digest = hashlib.sha256(text.encode("utf-8")).hexdigest()
+            if not force and digest == self._last_hash:
+                self.counters["skipped_unchanged"] += 1
+                return {"status": "unchanged"}
+            try:
+                summary = self.summarize(text)
+            except Exception as e:
+                self.counters["errors"] += 1
+                self.last_error = str(e)
+                raise
+            _write_markdown(self.path, summary)
+            self._last_hash = digest
+            self.counters["runs"] += 1
+            self.last_error = None
+            log_entry(SOURCE, "Updated relay_context.md from session logs.")
+            return {"status": "ok", "summary": summary}
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            pending = self._timer is not None
+        return {
+            "pending": pending,
+            "debounce_s": self.debounce_s,
+            "min_interval_s": self.min_interval_s,
+            "last_error": self.last_error,
+            **self.counters,
+        }
+
+
+_refresher: Optional[ContextRefresher] = None
+_refresher_lock = threading.Lock()
+
+
+def get_refresher() -> ContextRefresher:
+    global _refresher
+    if _refresher is None:
+        with _refresher_lock:
+            if _refresher is None:
+                _refresher = ContextRefresher(
+                    debounce_s=float(os.getenv("CONTEXT_REFRESH_DEBOUNCE_S", "5")),
+                    min_interval_s=float(os.getenv("CONTEXT_REFRESH_MIN_INTERVAL_S", "60")),
+                )
+    return _refresher
@@ -0,0 +1,349 @@
+# ──────────────────────────────────────────────────────────────────────────────
+# File: conversation_history.py
+# Directory: services
+# Purpose: Bounded, token-aware multi-turn history for services.agent.
+#
+# Upstream:
+#   - ENV: HISTORY_MAX_USERS, HISTORY_WINDOW_TOKENS, HISTORY_SUMMARY_TOKENS,
+#          HISTORY_PERSIST, HISTORY_DIR, HISTORY_FLUSH_S (default 1.0)
+#   - Imports: asyncio, collections, hashlib, json, os, services.session_store,
+#              services.token_budget, threading
+#
+# Downstream:
+#   - services.agent
+#
+# Contents:
+#   - ConversationStore (append / messages / forget / flush / drain / stats)
+#   - extractive_summarizer(), extractive_summarizer_sync()
+#   - store_from_env()
+#
+# Notes:
+#   • Per-user window is a deque of turns capped by HISTORY_WINDOW_TOKENS;
+#     turns pushed out of the window are folded into a running summary that
+#     is sent as one system message, so prompt size stays ~constant.
+#   • Folding runs in the background (asyncio task) when a loop is running and
+#     a summarizer coroutine is configured; otherwise the cheap extractive
+#     fold runs inline. Evicted turns are never lost: they stay in a pending
+#     list until a fold succeeds.
+#   • Users are kept in an LRU capped at HISTORY_MAX_USERS. With
+#     HISTORY_PERSIST=1 each conversation is snapshotted to
+#     logs/sessions/<safe user>.<hash>.history.json and rehydrated on the next
+#     request, so LRU eviction and restarts lose nothing. The short sha256 of
+#     the raw id keeps ids that sanitize alike (a@b / a#b) apart. The .json
+#     suffix keeps these out of the *.jsonl session-log readers.
+#   • On the event loop, snapshots are batched: changed conversations are
+#     marked dirty and written by flush() on a worker thread HISTORY_FLUSH_S
+#     later. Without a running loop they are written inline.
+# ──────────────────────────────────────────────────────────────────────────────
+
+from __future__ import annotations
+
+import asyncio
+import collections
+import hashlib
+import json
+import logging
+import os
+import threading
+from pathlib import Path
+from typing import Any, Awaitable, Callable, Deque, Dict, List, Optional
+
+from services.session_store import safe_user
+from services.token_budget import estimate_tokens, first_n_sentences, truncate_to_tokens
+
+logger = logging.getLogger("relay.history")
+
+Turn = Dict[str, Any]
+Summarizer = Callable[[str, List[Turn], int], Awaitable[str]]
+
+# Per-message overhead the chat API adds on top of content tokens.
+_MSG_OVERHEAD = 4
+
+
+def _turn_tokens(turn: Turn) -> int:
+    return estimate_tokens(str(turn.get("content") or "")) + _MSG_OVERHEAD
+
+
+def extractive_summarizer_sync(previous: str, turns: List[Turn], max_tokens: int) -> str:
+    """Cheap, deterministic fold: keep the first sentence or two of each turn."""
+    lines = [previous.strip()] if previous else []
+    for t in turns:
+        text = first_n_sentences(str(t.get("content") or "").replace("\n", " "), 2)
+        if text:
+            lines.append(f"{t.get('role', 'user')}: {text}")
+    joined = "\n".join(lines)
+    # Keep the most recent material when over budget.
+    if estimate_tokens(joined) > max_tokens:
+        tail = joined[::-1]
+        joined = truncate_to_tokens(tail, max_tokens)[::-1].lstrip()
+    return joined
+
+
+async def extractive_summarizer(previous: str, turns: List[Turn], max_tokens: int) -> str:
+    return extractive_summarizer_sync(previous, turns, max_tokens)
+
+
+class _Conversation:
+    __slots__ = ("turns", "tokens", "summary", "evicted", "folding", "lock")
+
+    def __init__(self) -> None:
+        self.turns: Deque[Turn] = collections.deque()
+        self.tokens = 0
+        self.summary = ""
+        self.evicted: List[Turn] = []
+        self.folding = False
+        self.lock = threading.Lock()
+
+
+class ConversationStore:
+    """
+    LRU of per-user conversations, each a token-budgeted sliding window plus
+    a compact running summary of everything older.
+    """
+
+    def __init__(
+        self,
+        *,
+        max_users: int = 1000,
+        window_tokens: int = 3000,
+        summary_tokens: int = 400,
+        summarizer: Optional[Summarizer] = None,
+        persist_dir: Optional[Path] = None,
+        flush_s: float = 1.0,
+    ) -> None:
+        self.max_users = max(1, max_users)
+        self.window_tokens = max(1, window_tokens)
+        self.summary_tokens = max(0, summary_tokens)
+        self.summarizer = summarizer
+        self.persist_dir = Path(persist_dir) if persist_dir else None
+        self._users: "collections.OrderedDict[str, _Conversation]" = collections.OrderedDict()
+        self._lock = threading.Lock()
+        self.flush_s = max(0.0, float(flush_s))
+        self._tasks: set = set()
+        self._dirty: Dict[str, _Conversation] = {}
+        self._dirty_lock = threading.Lock()
+        self._flush_scheduled = False
+        self.stats_counters = {"evicted_users": 0, "evicted_turns": 0, "folds": 0, "fold_errors": 0}
+
+    # ── LRU ──────────────────────────────────────────────────────────────────
+    def _get(self, user_id: str) -> _Conversation:
+        with self._lock:
+            conv = self._users.get(user_id)
+            if conv is not None:
+                self._users.move_to_end(user_id)
+                return conv
+            conv = self._load(user_id) or _Conversation()
+            self._users[user_id] = conv
+            while len(self._users) > self.max_users:
+                old_id, old = self._users.popitem(last=False)
+                self.stats_counters["evicted_users"] += 1
+                self._save(old_id, old)
+            return conv
+
+    def forget(self, user_id: str) -> None:
+        with self._lock:
+            self._users.pop(user_id, None)
+        with self._dirty_lock:
+            self._dirty.pop(user_id, None)
+        for path in (self._path(user_id), self._legacy_path(user_id)):
+            if path is None:
+                continue
+            try:
+                path.unlink()
+            except FileNotFoundError:
+                pass
+
+    # ── Window ───────────────────────────────────────────────────────────────
+    def append(self, user_id: str, role: str, content: str) -> None:
+        """Add a turn; overflow is moved to the pending-summary list."""
+        conv = self._get(user_id)
+        turn = {"role": role, "content": content or ""}
+        with conv.lock:
+            conv.turns.append(turn)
+            conv.tokens += _turn_tokens(turn)
+            # Always keep the newest turn, even if it alone exceeds the budget.
+            while conv.tokens > self.window_tokens and len(conv.turns) > 1:
+                old = conv.turns.popleft()
+                conv.tokens -= _turn_tokens(old)
+                conv.evicted.append(old)
+                self.stats_counters["evicted_turns"] += 1
+            need_fold = bool(conv.evicted) and not conv.folding
+            if need_fold:
+                conv.folding = True
+        if need_fold:
+            self._schedule_fold(user_id, conv)
+        else:
+            self._save(user_id, conv)
+
+    def messages(self, user_id: str) -> List[Turn]:
+        """Summary (as one system message) followed by the live window."""
+        conv = self._get(user_id)
+        with conv.lock:
+            out: List[Turn] = []
+            if conv.summary or conv.evicted:
+                summary = conv.summary
+                if conv.evicted:
+                    # A fold is still pending; include a cheap stand-in so nothing is dropped.
+                    summary = extractive_summarizer_sync(summary, conv.evicted, self.summary_tokens)
+                if summary:
+                    out.append({"role": "system", "content": f"Earlier in this conversation:\n{summary}"})
+            out.extend(dict(t) for t in conv.turns)
+            return out
+
+    # ── Summarization ────────────────────────────────────────────────────────
+    def _schedule_fold(self, user_id: str, conv: _Conversation) -> None:
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            loop = None
+        if loop is None or self.summarizer is None:
+            self._fold_sync(user_id, conv)
+            return
+        task = loop.create_task(self._fold_async(user_id, conv))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    def _fold_sync(self, user_id: str, conv: _Conversation) -> None:
+        with conv.lock:
+            batch, conv.evicted = conv.evicted, []
+            conv.summary = extractive_summarizer_sync(conv.summary, batch, self.summary_tokens)
+            conv.folding = False
+            self.stats_counters["folds"] += 1
+        self._save(user_id, conv)
+
+    async def _fold_async(self, user_id: str, conv: _Conversation) -> None:
+        while True:
+            with conv.lock:
+                batch = list(conv.evicted)
+                previous = conv.summary
+                if not batch:
+                    conv.folding = False
+                    break
+            try:
+                summary = await self.summarizer(previous, batch, self.summary_tokens)  # type: ignore[misc]
+                summary = truncate_to_tokens(summary or "", self.summary_tokens)
+            except Exception as e:
+                logger.warning("history summarizer failed (%s); using extractive fold", e)
+                self.stats_counters["fold_errors"] += 1
+                summary = extractive_summarizer_sync(previous, batch, self.summary_tokens)
+            with conv.lock:
+                del conv.evicted[:len(batch)]
+                conv.summary = summary
+                self.stats_counters["folds"] += 1
+        self._save(user_id, conv)
+
+    async def drain(self) -> None:
+        """Wait for in-flight background folds, then write pending snapshots (tests / shutdown)."""
+        while self._tasks:
+            await asyncio.gather(*list(self._tasks), return_exceptions=True)
+        if self._dirty:
+            await asyncio.to_thread(self.flush)
+
+    # ── Persistence ──────────────────────────────────────────────────────────
+    def _path(self, user_id: str) -> Optional[Path]:
+        if self.persist_dir is None:
+            return None
+        digest = hashlib.sha256((user_id or "").encode("utf-8")).hexdigest()[:16]
+        return self.persist_dir / f"{safe_user(user_id)[:64]}.{digest}.history.json"
+
+    def _legacy_path(self, user_id: str) -> Optional[Path]:
+        """Pre-hash file name; only trusted when the id survived sanitizing unchanged (no collision possible)."""
+        if self.persist_dir is None or not user_id or len(user_id) > 128:
+            return None
+        if any(not (c.isascii() and (c.isalnum() or c in "_.-")) for c in user_id):
+            return None
+        return self.persist_dir / f"{user_id}.history.json"
+
+    def _save(self, user_id: str, conv: _Conversation) -> None:
+        """Persist now without a running loop; otherwise mark dirty for a batched flush off the loop."""
+        if self.persist_dir is None:
+            return
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            self._write(user_id, conv)
+            return
+        with self._dirty_lock:
+            self._dirty[user_id] = conv
+            if self._flush_scheduled:
+                return
+            self._flush_scheduled = True
+        loop.call_later(self.flush_s, self._start_flush, loop)
+
+    def _start_flush(self, loop: asyncio.AbstractEventLoop) -> None:
+        task = loop.create_task(asyncio.to_thread(self.flush))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    def flush(self) -> int:
+        """Write every dirty conversation; returns how many were written."""
+        with self._dirty_lock:
+            dirty, self._dirty = self._dirty, {}
+            self._flush_scheduled = False
+        for user_id, conv in dirty.items():
+            self._write(user_id, conv)
+        return len(dirty)
+
+    def _write(self, user_id: str, conv: _Conversation) -> None:
+        path = self._path(user_id)
+        if path is None:
+            return
+        with conv.lock:
+            snap = {"summary": conv.summary, "evicted": list(conv.evicted), "turns": list(conv.turns)}
+        try:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            tmp = path.with_suffix(".tmp")
+            tmp.write_text(json.dumps(snap, ensure_ascii=False), encoding="utf-8")
+            os.replace(tmp, path)
+        except Exception as e:
+            logger.warning("history persist failed for %s: %s", user_id, e)
+
+    def _load(self, user_id: str) -> Optional[_Conversation]:
+        with self._dirty_lock:
+            pending = self._dirty.get(user_id)
+        if pending is not None:
+            return pending  # evicted from the LRU but not written yet
+        path = self._path(user_id)
+        if path is not None and not path.exists():
+            legacy = self._legacy_path(user_id)
+            path = legacy if legacy is not None and legacy.exists() else None
+        if path is None:
+            return None
+        try:
+            snap = json.loads(path.read_text(encoding="utf-8"))
+        except Exception as e:
+            logger.warning("history load failed for %s: %s", user_id, e)
+            return None
+        conv = _Conversation()
+        conv.summary = str(snap.get("summary") or "")
+        conv.evicted = [t for t in snap.get("evicted") or [] if isinstance(t, dict)]
+        for t in snap.get("turns") or []:
+            if isinstance(t, dict):
+                conv.turns.append(t)
+                conv.tokens += _turn_tokens(t)
+        return conv
+
+    # ── Introspection ────────────────────────────────────────────────────────
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            users = len(self._users)
+        return {
+            "users": users,
+            "max_users": self.max_users,
+            "window_tokens": self.window_tokens,
+            "summary_tokens": self.summary_tokens,
+            "pending_folds": len(self._tasks),
+            **self.stats_counters,
+        }
+
+
+def store_from_env(summarizer: Optional[Summarizer] = None) -> ConversationStore:
+    persist = os.getenv("HISTORY_PERSIST", "false").lower() in ("1", "true", "yes")
+    return ConversationStore(
+        max_users=int(os.getenv("HISTORY_MAX_USERS", "1000")),
+        window_tokens=int(os.getenv("HISTORY_WINDOW_TOKENS", "3000")),
+        summary_tokens=int(os.getenv("HISTORY_SUMMARY_TOKENS", "400")),
+        summarizer=summarizer,
+        persist_dir=Path(os.getenv("HISTORY_DIR", "./logs/sessions")) if persist else None,
+        flush_s=float(os.getenv("HISTORY_FLUSH_S", "1.0")),
+    )
@@ -0,0 +1,298 @@
+# ──────────────────────────────────────────────────────────────────────────────
+# File: doc_catalog.py
+# Directory: services/
+# Purpose : In-memory catalog of context/doc files (path, size, mtime, doc_id,
+#           tier, pinned) kept current by a filesystem watcher.
+#
+# Upstream:
+#   - ENV: DOC_CATALOG_WATCH (default 1), DOC_CATALOG_POLL_S (default 2)
+#   - Imports: os, pathlib, re, threading, watchfiles (optional)
+#
+# Downstream:
+#   - routes.docs (list_docs), routes.status (list_context_inventory)
+#   - services.docs_utils (build_doc_registry)
+#
+# Contents:
+#   - DocEntry
+#   - DocCatalog (entries / refresh / refresh_path / start / stop / stats)
+#   - get_catalog()
+#   - read_header_meta()
+#
+# Notes:
+#   • Built once per root with a stat-only walk; only the first few KB of a
+#     file are read (for doc_id / tier / pinned), and only when its size or
+#     mtime changed.
+#   • With `watchfiles` installed a daemon thread applies inotify/FSEvents
+#     changes incrementally; otherwise a daemon thread re-walks every
+#     DOC_CATALOG_POLL_S seconds. Reads never touch the filesystem.
+#   • Without a running watcher (DOC_CATALOG_WATCH=0, tests) reads re-walk
+#     lazily at most once per poll interval.
+# ──────────────────────────────────────────────────────────────────────────────
+
+from __future__ import annotations
+
+import logging
+import os
+import re
+import threading
+import time
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+logger = logging.getLogger("relay.doc_catalog")
+
+DEFAULT_DIRS: Tuple[str, ...] = ("docs", "context")
+DEFAULT_EXTS: Tuple[str, ...] = (".md", ".txt")
+HEADER_BYTES = 4096
+
+_DOC_ID_RE = re.compile(r"doc_id:\s*(\S+)")
+_META_RE = re.compile(r"^\s*(tier|pinned):\s*(\S+)", re.IGNORECASE)
+
+
+@dataclass(frozen=True)
+class DocEntry:
+    relpath: str          # relative to the catalog root, '/'-separated
+    path: Path            # absolute
+    size: int
+    mtime: float
+    mtime_ns: int
+    doc_id: str
+    tier: Optional[str] = None
+    pinned: bool = False
+
+    @property
+    def parts(self) -> Tuple[str, ...]:
+        return tuple(self.relpath.split("/"))
+
+
+def read_header_meta(path: Path, limit: int = HEADER_BYTES) -> Tuple[str, Optional[str], bool]:
+    """
+    (doc_id, tier, pinned) from the file header only. doc_id follows
+    docs_utils.extract_doc_id: first `doc_id:` in the first 10 lines, else stem.
+    """
+    doc_id: Optional[str] = None
+    tier: Optional[str] = None
+    pinned = False
+    try:
+        with open(path, "rb") as f:
+            head = f.read(limit).decode("utf-8", errors="replace")
+    except OSError:
+        return path.stem, None, False
+    for i, line in enumerate(head.splitlines()[:20]):
+        if doc_id is None and i < 10 and "doc_id:" in line:
+            m = _DOC_ID_RE.search(line)
+            if m:
+                doc_id = m.group(1).strip()
+        m = _META_RE.match(line)
+        if m:
+            key, val = m.group(1).lower(), m.group(2)
+            if key == "tier":
+                tier = val
+            else:
+                pinned = val.lower() in ("true", "1", "yes")
+    return doc_id or path.stem, tier, pinned
+
+
+class DocCatalog:
+    def __init__(
+        self,
+        root: Path,
+        *,
+        dirs: Sequence[str] = DEFAULT_DIRS,
+        exts: Sequence[str] = DEFAULT_EXTS,
+        poll_s: float = 2.0,
+    ) -> None:
+        self.root = Path(root).resolve()
+        self.dirs = tuple(dirs)
+        self.exts = tuple(e.lower() for e in exts)
+        self.poll_s = max(0.0, poll_s)
+        self._entries: Dict[str, DocEntry] = {}
+        self._lock = threading.Lock()
+        self._scan_lock = threading.Lock()
+        self._last_scan = 0.0
+        self._built = False
+        self._thread: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+        self.mode = "lazy"
+        self.counters = {"scans": 0, "header_reads": 0, "events": 0}
+
+    # ── Scanning ─────────────────────────────────────────────────────────────
+    def _wanted(self, name: str) -> bool:
+        return os.path.splitext(name)[1].lower() in self.exts
+
+    def _rel(self, path: Path) -> Optional[str]:
+        try:
+            return path.relative_to(self.root).as_posix()
+        except ValueError:
+            return None
+
+    def _make_entry(self, path: Path, st: os.stat_result, prev: Optional[DocEntry]) -> Optional[DocEntry]:
+        rel = self._rel(path)
+        if rel is None:
+            return None
+        if prev is not None and prev.size == st.st_size and prev.mtime_ns == st.st_mtime_ns:
+            return prev
+        self.counters["header_reads"] += 1
+        doc_id, tier, pinned = read_header_meta(path)
+        return DocEntry(rel, path, st.st_size, st.st_mtime, st.st_mtime_ns, doc_id, tier, pinned)
+
+    def _walk(self, top: Path) -> Iterable[Tuple[Path, os.stat_result]]:
+        for dirpath, _dirnames, filenames in os.walk(top):
+            for name in filenames:
+                if not self._wanted(name):
+                    continue
+                p = Path(dirpath) / name
+                try:
+                    st = p.stat()
+                except OSError:
+                    continue
+                yield p, st
+
+    def refresh(self) -> None:
+        """Full stat-only re-walk; headers re-read only for changed files."""
+        with self._scan_lock:
+            current = dict(self._entries)
+            fresh: Dict[str, DocEntry] = {}
+            for d in self.dirs:
+                top = self.root / d
+                if not top.is_dir():
+                    continue
+                for p, st in self._walk(top):
+                    rel = self._rel(p)
+                    if rel is None:
+                        continue
+                    entry = self._make_entry(p, st, current.get(rel))
+                    if entry is not None:
+                        fresh[rel] = entry
+            with self._lock:
+                self._entries = fresh
+                self._built = True
+                self._last_scan = time.monotonic()
+            self.counters["scans"] += 1
+
+    def refresh_path(self, path: Path) -> None:
+        """Apply a single change (file or directory, created/modified/deleted)."""
+        path = Path(path)
+        if not path.is_absolute():
+            path = self.root / path
+        rel = self._rel(path)
+        if rel is None or not any(rel == d or rel.startswith(d + "/") for d in self.dirs):
+            return
+        self.counters["events"] += 1
+        if path.is_dir():
+            updates = {}
+            for p, st in self._walk(path):
+                r = self._rel(p)
+                if r is not None:
+                    e = self._make_entry(p, st, self._entries.get(r))
+                    if e is not None:
+                        updates[r] = e
+            with self._lock:
+                self._entries.update(updates)
+            return
+        try:
+            st = path.stat()
+        except OSError:
+            prefix = rel + "/"
+            with self._lock:
+                self._entries.pop(rel, None)
+                for k in [k for k in self._entries if k.startswith(prefix)]:
+                    del self._entries[k]
+            return
+        if self._wanted(path.name):
+            entry = self._make_entry(path, st, self._entries.get(rel))
+            if entry is not None:
+                with self._lock:
+                    self._entries[rel] = entry
+
+    # ── Reads ────────────────────────────────────────────────────────────────
+    def _ensure_fresh(self) -> None:
+        if not self._built:
+            self.refresh()
+            return
+        watching = self._thread is not None and self._thread.is_alive()
+        if not watching and time.monotonic() - self._last_scan >= self.poll_s:
+            self.refresh()
+
+    def entries(
+        self,
+        under: Optional[str] = None,
+        exts: Optional[Sequence[str]] = None,
+    ) -> List[DocEntry]:
+        """Entries (sorted like sorted(Path.rglob)) under a root-relative dir."""
+        self._ensure_fresh()
+        with self._lock:
+            items = list(self._entries.values())
+        if under:
+            prefix = under.strip("/") + "/"
+            items = [e for e in items if e.relpath.startswith(prefix)]
+        if exts:
+            want = tuple(x.lower() for x in exts)
+            items = [e for e in items if os.path.splitext(e.relpath)[1].lower() in want]
+        items.sort(key=lambda e: e.parts)
+        return items
+
+    # ── Watcher ──────────────────────────────────────────────────────────────
+    def start(self) -> None:
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._ensure_fresh()
+        self._stop.clear()
+        try:
+            import watchfiles  # type: ignore  # noqa: F401
+            target, self.mode = self._watch_loop, "watchfiles"
+        except Exception:
+            target, self.mode = self._poll_loop, "poll"
+        self._thread = threading.Thread(target=target, name=f"doc-catalog:{self.root.name}", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+
+    def _poll_loop(self) -> None:
+        while not self._stop.wait(self.poll_s or 2.0):
+            try:
+                self.refresh()
+            except Exception as e:  # keep the thread alive
+                logger.warning("doc catalog poll failed: %s", e)
+
+    def _watch_loop(self) -> None:
+        import watchfiles  # type: ignore
+
+        dirs = [str(self.root / d) for d in self.dirs if (self.root / d).is_dir()]
+        if not dirs:
+            self.mode = "poll"
+            return self._poll_loop()
+        try:
+            for changes in watchfiles.watch(*dirs, stop_event=self._stop, debounce=200):
+                for _change, p in changes:
+                    self.refresh_path(Path(p))
+        except Exception as e:
+            logger.warning("doc catalog watcher failed (%s); falling back to polling", e)
+            self.mode = "poll"
+            self._poll_loop()
+
+    def stats(self) -> Dict[str, object]:
+        with self._lock:
+            n = len(self._entries)
+        return {"root": str(self.root), "entries": n, "mode": self.mode, **self.counters}
+
+
+_catalogs: Dict[Path, DocCatalog] = {}
+_catalogs_lock = threading.Lock()
+
+
+def get_catalog(root: Optional[Path] = None) -> DocCatalog:
+    """Shared catalog per project root (default: repo root); starts its watcher."""
+    key = Path(root or Path(__file__).resolve().parents[1]).resolve()
+    with _catalogs_lock:
+        cat = _catalogs.get(key)
+        if cat is None:
+            cat = _catalogs[key] = DocCatalog(key, poll_s=float(os.getenv("DOC_CATALOG_POLL_S", "2")))
+            if os.getenv("DOC_CATALOG_WATCH", "1").lower() in ("1", "true", "yes"):
+                try:
+                    cat.start()
+                except Exception as e:
+                    logger.warning("doc catalog watcher not started: %s", e)
+    return cat
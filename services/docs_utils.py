@@ -8,7 +8,7 @@
 #
 # Upstream:
 #   - ENV: —
-#   - Imports: collections, pathlib, re, typing
+#   - Imports: collections, pathlib, re, services.doc_catalog, typing
 #
 # Downstream:
 #   - routes.docs
@@ -56,22 +56,15 @@ def extract_doc_id(path: Path) -> str:
 
 def build_doc_registry() -> Dict[str, List[Path]]:
     """
-    Scans /docs folders and groups files by doc_id.
+    Groups /docs markdown files by doc_id (from the shared document catalog,
+    which reads only file headers and is kept current by a watcher).
     Returns dict of doc_id -> list of Path objects.
     """
-    registry: Dict[str, List[Path]] = defaultdict(list)
-
-    for folder in DOC_FOLDERS:
-        base = BASE_DIR / folder if folder else BASE_DIR
-        if not base.exists():
-            continue
-        for f in base.rglob("*.md"):
-            try:
-                doc_id = extract_doc_id(f)
-                registry[doc_id].append(f)
-            except Exception:
-                continue
+    from services.doc_catalog import get_catalog
 
+    registry: Dict[str, List[Path]] = defaultdict(list)
+    for entry in get_catalog(PROJECT_ROOT).entries("docs", exts=(".md",)):
+        registry[entry.doc_id].append(entry.path)
     return registry
 
 
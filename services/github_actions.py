@@ -22,13 +22,16 @@ from typing import Any, Dict, Optional, Set
 from github import Github
 from github.GithubException import GithubException
 
+from services.github_client import get_github_client, is_commit_sha
+
 
 def _token_present() -> bool:
     return bool(os.getenv("GITHUB_TOKEN"))
 
 
-# Initialize a module-level Github client (unauth if token missing)
-gh = Github(os.getenv("GITHUB_TOKEN"))
+# Initialize a module-level Github client (unauth if token missing).
+# One instance = one pooled requests session; size the pool for concurrent routes.
+gh = Github(os.getenv("GITHUB_TOKEN"), pool_size=int(os.getenv("GITHUB_POOL_MAX", "20")))
 
 
 def _allowlist_from_env() -> Set[str]:
@@ -71,16 +74,27 @@ def list_repos() -> Dict[str, Any]:
 def get_file(repo: str, path: str, ref: Optional[str] = None) -> Dict[str, Any]:
     _assert_ready(write=False)
     _repo_guard(repo)
+    # Contents at a full commit SHA never change → shared on-disk cache
+    disk = get_github_client().disk_cache if is_commit_sha(ref) else None
+    disk_key = ("gh_actions.get_file", repo, (ref or "").lower(), path)
+    if disk is not None:
+        hit = disk.get(disk_key)
+        if hit is not None:
+            return hit
     rep = gh.get_repo(repo)  # type: ignore[attr-defined]
     content = rep.get_contents(path, ref=ref) if ref else rep.get_contents(path)
     if isinstance(content, list):
-        return {
+        out = {
             "type": "dir",
             "entries": [{"name": c.name, "path": c.path, "type": c.type, "sha": c.sha, "size": getattr(c, "size", None)} for c in content],
         }
-    # file
-    text = base64.b64decode(content.content or b"").decode("utf-8", errors="ignore")
-    return {"type": "file", "path": content.path, "sha": content.sha, "size": getattr(content, "size", None), "content": text}
+    else:
+        # file
+        text = base64.b64decode(content.content or b"").decode("utf-8", errors="ignore")
+        out = {"type": "file", "path": content.path, "sha": content.sha, "size": getattr(content, "size", None), "content": text}
+    if disk is not None:
+        disk.put(disk_key, out)
+    return out
 
 
 def put_file(repo: str, path: str, content_b64: str, message: str, branch: str, sha: Optional[str] = None) -> Dict[str, Any]:
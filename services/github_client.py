@@ -0,0 +1,418 @@
+# ──────────────────────────────────────────────────────────────────────────────
+# File: services/github_client.py
+# Purpose: Shared, long-lived async GitHub REST client
+#
+# Features
+#   • One pooled httpx.AsyncClient (keep-alive; HTTP/2 when GITHUB_HTTP2=1 and
+#     the 'h2' package is installed)
+#   • Conditional GETs: remembers ETag/Last-Modified per URL and serves 304s
+#     from a bounded in-memory LRU (304s do not count against the rate limit)
+#   • ResponseDiskCache: bounded on-disk JSON cache for immutable lookups
+#     (tree/contents addressed by a full commit SHA). The byte total is kept
+#     incrementally; the directory is only walked to evict (down to ~90% of
+#     the budget) or to resync every RESCAN_EVERY puts. Async routes use
+#     aget/aput, which run the file I/O via anyio.to_thread.
+#   • Rate-limit tracking from X-RateLimit-* headers; once the remaining budget
+#     drops under a reserve, calls are spaced out until reset instead of
+#     running into 403s. Waits longer than GITHUB_RATE_MAX_WAIT_S raise
+#     GitHubRateLimited so routes can answer 429 + Retry-After.
+#
+# Env
+#   GITHUB_HTTP2=0|1                 GITHUB_POOL_MAX=20
+#   GITHUB_ETAG_CACHE_ENTRIES=512    GITHUB_CACHE_DIR=data/cache/github
+#   GITHUB_CACHE_MAX_MB=64           GITHUB_RATE_RESERVE=50
+#   GITHUB_RATE_MAX_WAIT_S=10
+# ──────────────────────────────────────────────────────────────────────────────
+
+from __future__ import annotations
+
+import asyncio
+import collections
+import hashlib
+import importlib.util
+import json
+import logging
+import os
+import re
+import threading
+import time
+from pathlib import Path
+from typing import Any, Dict, Optional, Tuple
+
+import anyio
+import httpx
+
+log = logging.getLogger("relay.github_client")
+
+GITHUB_API = "https://api.github.com"
+_SHA_RE = re.compile(r"^[0-9a-f]{40}$")
+
+
+def is_commit_sha(ref: Optional[str]) -> bool:
+    """True for a full 40-hex commit SHA (immutable → safe to cache forever)."""
+    return bool(ref) and bool(_SHA_RE.match(str(ref).lower()))
+
+
+class GitHubRateLimited(RuntimeError):
+    """Raised when honoring the rate limit would mean waiting too long."""
+
+    def __init__(self, retry_after_s: float):
+        super().__init__(f"GitHub rate limit nearly exhausted; retry in {int(retry_after_s)}s")
+        self.retry_after_s = retry_after_s
+
+
+# ╔══════════════════════════════════════════════════════════════════════════╗
+# ║ Rate-limit tracking                                                      ║
+# ╚══════════════════════════════════════════════════════════════════════════╝
+
+class RateLimitState:
+    """Tracks X-RateLimit-* headers and computes how long to hold a call."""
+
+    def __init__(self, reserve: int = 50, max_wait_s: float = 10.0):
+        self.reserve = max(0, int(reserve))
+        self.max_wait_s = float(max_wait_s)
+        self.limit: Optional[int] = None
+        self.remaining: Optional[int] = None
+        self.reset_unix: Optional[float] = None
+        self.throttled_calls = 0
+
+    def update(self, headers: httpx.Headers) -> None:
+        try:
+            if "x-ratelimit-remaining" in headers:
+                self.remaining = int(headers["x-ratelimit-remaining"])
+            if "x-ratelimit-limit" in headers:
+                self.limit = int(headers["x-ratelimit-limit"])
+            if "x-ratelimit-reset" in headers:
+                self.reset_unix = float(headers["x-ratelimit-reset"])
+        except (TypeError, ValueError):
+            pass
+
+    def delay_s(self, now: Optional[float] = None) -> float:
+        """
+        Seconds to wait before the next call:
+          • 0 while remaining > reserve (or unknown)
+          • window / remaining while inside the reserve (spreads the tail)
+          • full time-to-reset when remaining hits 0
+        """
+        if self.remaining is None or self.reset_unix is None:
+            return 0.0
+        now = time.time() if now is None else now
+        window = max(0.0, self.reset_unix - now)
+        if window == 0.0 or self.remaining > self.reserve:
+            return 0.0
+        if self.remaining <= 0:
+            return window
+        return window / (self.remaining + 1)
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            "limit": self.limit,
+            "remaining": self.remaining,
+            "reset_unix": self.reset_unix,
+            "reserve": self.reserve,
+            "throttled_calls": self.throttled_calls,
+        }
+
+
+# ╔══════════════════════════════════════════════════════════════════════════╗
+# ║ Bounded on-disk cache for immutable responses                            ║
+# ╚══════════════════════════════════════════════════════════════════════════╝
+
+class ResponseDiskCache:
+    """
+    Small JSON file cache keyed by a tuple of strings.
+
+    Intended for content addressed by commit SHA, which never changes; the only
+    eviction is size-based (oldest access first) once max_bytes is exceeded.
+    Other workers may share the directory, so the running total is resynced
+    from disk every RESCAN_EVERY puts.
+    """
+
+    RESCAN_EVERY = 256
+    LOW_WATER = 0.9
+
+    def __init__(self, root: str | Path, max_bytes: int):
+        self.root = Path(root)
+        self.max_bytes = max(0, int(max_bytes))
+        self.hits = 0
+        self.misses = 0
+        self.scans = 0
+        self._bytes: Optional[int] = None  # unknown until the first walk
+        self._puts = 0
+        self._lock = threading.Lock()
+
+    def _path(self, key: Tuple[str, ...]) -> Path:
+        h = hashlib.sha256("\x1f".join(key).encode("utf-8")).hexdigest()
+        return self.root / h[:2] / f"{h}.json"
+
+    def get(self, key: Tuple[str, ...]) -> Optional[Any]:
+        p = self._path(key)
+        try:
+            data = json.loads(p.read_text(encoding="utf-8"))
+        except (OSError, ValueError):
+            self.misses += 1
+            return None
+        try:
+            os.utime(p, None)  # mark as recently used
+        except OSError:
+            pass
+        self.hits += 1
+        return data
+
+    def put(self, key: Tuple[str, ...], value: Any) -> None:
+        if self.max_bytes <= 0:
+            return
+        p = self._path(key)
+        try:
+            p.parent.mkdir(parents=True, exist_ok=True)
+            try:
+                old = p.stat().st_size
+            except FileNotFoundError:
+                old = 0
+            tmp = p.with_suffix(".tmp")
+            data = json.dumps(value, separators=(",", ":")).encode("utf-8")
+            tmp.write_bytes(data)
+            os.replace(tmp, p)
+        except (OSError, TypeError, ValueError) as e:
+            log.info("github disk cache write failed: %s", e)
+            return
+        with self._lock:
+            self._puts += 1
+            if self._puts % self.RESCAN_EVERY == 0:
+                self._bytes = None
+            if self._bytes is not None:
+                self._bytes += len(data) - old
+            if self._bytes is not None and self._bytes <= self.max_bytes:
+                return
+            self._evict()
+
+    async def aget(self, key: Tuple[str, ...]) -> Optional[Any]:
+        """get() for async routes: the file read runs on a worker thread."""
+        return await anyio.to_thread.run_sync(self.get, key)
+
+    async def aput(self, key: Tuple[str, ...], value: Any) -> None:
+        """put() for async routes: the write (and any eviction walk) runs on a worker thread."""
+        await anyio.to_thread.run_sync(self.put, key, value)
+
+    def _evict(self) -> None:
+        """Walk the cache (lock held); if over budget, drop oldest-used files down to LOW_WATER."""
+        self.scans += 1
+        files = []
+        for f in self.root.rglob("*.json"):
+            try:
+                st = f.stat()
+            except OSError:
+                continue
+            files.append((st.st_mtime, st.st_size, f))
+        total = sum(size for _, size, _ in files)
+        if total > self.max_bytes:
+            target = int(self.max_bytes * self.LOW_WATER)
+            for _, size, f in sorted(files, key=lambda t: t[0]):
+                try:
+                    f.unlink()
+                    total -= size
+                except OSError:
+                    continue
+                if total <= target:
+                    break
+        self._bytes = total
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "root": str(self.root),
+            "max_bytes": self.max_bytes,
+            "bytes": self._bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "scans": self.scans,
+        }
+
+
+# ╔══════════════════════════════════════════════════════════════════════════╗
+# ║ Client                                                                   ║
+# ╚══════════════════════════════════════════════════════════════════════════╝
+
+class _Validator:
+    __slots__ = ("etag", "last_modified", "status", "headers", "content")
+
+    def __init__(self, etag, last_modified, status, headers, content):
+        self.etag = etag
+        self.last_modified = last_modified
+        self.status = status
+        self.headers = headers
+        self.content = content
+
+
+class GitHubClient:
+    """Pooled async client with conditional-request cache and rate-limit pacing."""
+
+    def __init__(
+        self,
+        *,
+        timeout_s: float = 20.0,
+        http2: bool = False,
+        max_connections: int = 20,
+        etag_entries: int = 512,
+        rate: Optional[RateLimitState] = None,
+        disk_cache: Optional[ResponseDiskCache] = None,
+        transport: Optional[httpx.AsyncBaseTransport] = None,
+    ):
+        self.timeout_s = timeout_s
+        self._transport = transport
+        self.http2 = bool(http2) and importlib.util.find_spec("h2") is not None
+        if http2 and not self.http2:
+            log.info("GITHUB_HTTP2 requested but 'h2' is not installed; using HTTP/1.1")
+        self.max_connections = max_connections
+        self.etag_entries = max(0, int(etag_entries))
+        self.rate = rate or RateLimitState()
+        self.disk_cache = disk_cache
+        self._client: Optional[httpx.AsyncClient] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._validators: "collections.OrderedDict[str, _Validator]" = collections.OrderedDict()
+        self.requests = 0
+        self.not_modified = 0
+
+    def _http(self) -> httpx.AsyncClient:
+        loop = asyncio.get_running_loop()
+        if self._client is None or self._client.is_closed or self._loop is not loop:
+            # A client is bound to the loop it first ran on; rebuild on loop change
+            self._client = httpx.AsyncClient(
+                timeout=self.timeout_s,
+                http2=self.http2,
+                limits=httpx.Limits(
+                    max_connections=self.max_connections,
+                    max_keepalive_connections=self.max_connections,
+                    keepalive_expiry=60.0,
+                ),
+                transport=self._transport,
+            )
+            self._loop = loop
+        return self._client
+
+    @staticmethod
+    def _cache_key(url: str, params: Optional[Dict[str, Any]], headers: Dict[str, str]) -> str:
+        q = "&".join(f"{k}={params[k]}" for k in sorted(params)) if params else ""
+        accept = headers.get("Accept") or headers.get("accept") or ""
+        return f"{url}?{q}|{accept}"
+
+    async def _pace(self) -> None:
+        delay = self.rate.delay_s()
+        if delay <= 0:
+            return
+        if delay > self.rate.max_wait_s:
+            raise GitHubRateLimited(delay)
+        self.rate.throttled_calls += 1
+        await asyncio.sleep(delay)
+
+    async def request(
+        self,
+        method: str,
+        url: str,
+        *,
+        headers: Optional[Dict[str, str]] = None,
+        params: Optional[Dict[str, Any]] = None,
+        json: Any = None,
+        conditional: bool = True,
+    ) -> httpx.Response:
+        """
+        Send a request through the shared pool.
+
+        GETs are conditional by default: a 304 is answered from the local copy
+        and returned as a normal 200 response (header X-Relay-Cache: etag).
+        """
+        hdrs = dict(headers or {})
+        method = method.upper()
+        key = None
+        cached: Optional[_Validator] = None
+        if method == "GET" and conditional and self.etag_entries:
+            key = self._cache_key(url, params, hdrs)
+            cached = self._validators.get(key)
+            if cached is not None:
+                if cached.etag:
+                    hdrs["If-None-Match"] = cached.etag
+                elif cached.last_modified:
+                    hdrs["If-Modified-Since"] = cached.last_modified
+
+        await self._pace()
+        self.requests += 1
+        r = await self._http().request(method, url, headers=hdrs, params=params, json=json)
+        self.rate.update(r.headers)
+
+        if key is None:
+            return r
+        if r.status_code == 304 and cached is not None:
+            self.not_modified += 1
+            self._validators.move_to_end(key)
+            out_headers = dict(cached.headers)
+            out_headers["X-Relay-Cache"] = "etag"
+            return httpx.Response(cached.status, headers=out_headers, content=cached.content, request=r.request)
+        if r.status_code == 200 and (r.headers.get("etag") or r.headers.get("last-modified")):
+            keep = {k: v for k, v in r.headers.items() if k.lower() in ("content-type", "etag", "last-modified")}
+            self._validators[key] = _Validator(
+                r.headers.get("etag"), r.headers.get("last-modified"), r.status_code, keep, r.content
+            )
+            self._validators.move_to_end(key)
+            while len(self._validators) > self.etag_entries:
+                self._validators.popitem(last=False)
+        return r
+
+    async def get(self, url: str, **kw: Any) -> httpx.Response:
+        return await self.request("GET", url, **kw)
+
+    async def post(self, url: str, **kw: Any) -> httpx.Response:
+        return await self.request("POST", url, **kw)
+
+    async def put(self, url: str, **kw: Any) -> httpx.Response:
+        return await self.request("PUT", url, **kw)
+
+    async def aclose(self) -> None:
+        if self._client is not None:
+            try:
+                await self._client.aclose()
+            finally:
+                self._client = None
+                self._loop = None
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "http2": self.http2,
+            "requests": self.requests,
+            "not_modified": self.not_modified,
+            "etag_entries": len(self._validators),
+            "rate_limit": self.rate.snapshot(),
+            "disk_cache": self.disk_cache.stats() if self.disk_cache else None,
+        }
+
+
+# ── Shared instance ───────────────────────────────────────────────────────────
+_shared: Optional[GitHubClient] = None
+
+
+def get_github_client() -> GitHubClient:
+    """Return the process-wide client (created on first use from env)."""
+    global _shared
+    if _shared is None:
+        _shared = GitHubClient(
+            timeout_s=float(os.getenv("GITHUB_HTTP_TIMEOUT_S", "20")),
+            http2=os.getenv("GITHUB_HTTP2", "0").lower() in ("1", "true", "yes"),
+            max_connections=int(os.getenv("GITHUB_POOL_MAX", "20")),
+            etag_entries=int(os.getenv("GITHUB_ETAG_CACHE_ENTRIES", "512")),
+            rate=RateLimitState(
+                reserve=int(os.getenv("GITHUB_RATE_RESERVE", "50")),
+                max_wait_s=float(os.getenv("GITHUB_RATE_MAX_WAIT_S", "10")),
+            ),
+            disk_cache=ResponseDiskCache(
+                os.getenv("GITHUB_CACHE_DIR", "data/cache/github"),
+                max_bytes=int(float(os.getenv("GITHUB_CACHE_MAX_MB", "64")) * 1024 * 1024),
+            ),
+        )
+    return _shared
+
+
+async def aclose_shared() -> None:
+    """Close the shared client's pool (app shutdown). Never raises."""
+    if _shared is not None:
+        try:
+            await _shared.aclose()
+        except Exception as e:
+            log.info("github client close failed: %s", e)
@@ -11,12 +11,31 @@ This version includes several improvements over the original:
   preserves basic formatting when converting to Markdown.
 - Error handling provides clear messages when credentials are missing or a
   specified folder can't be found.
+
+Sync is incremental: per-file ``modifiedTime``/``version`` (and
+``md5Checksum`` where Drive provides one) are persisted in
+``docs/imported/.sync_state.json``; only changed docs are exported, with
+bounded concurrency (GOOGLE_SYNC_CONCURRENCY, default 4), and a Markdown file
+is rewritten atomically only when its content actually differs. Docs removed
+from the folder have their Markdown removed. Unchanged files keep their mtime,
+so downstream reindexing is not triggered for them.
+
+When run as a job (services.jobs), export progress and ETA are reported per
+finished doc, and a cancel request stops further exports; docs already
+written are recorded in the state file so the next run resumes.
 """
 
 import os
 import base64
+import hashlib
+import json
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from dataclasses import dataclass, field
 from pathlib import Path
-from typing import List, Tuple
+from typing import Callable, Dict, List, Optional, Tuple
+
+from services.jobs import JobCancelled, report_progress
 
 try:  # optional dependency block
     from google.oauth2.credentials import Credentials  # type: ignore
@@ -66,9 +85,9 @@ def _load_json_from_env_or_path(env_name: str, fallback_path: Path) -> str:
 FOLDER_NAME = os.getenv("GOOGLE_FOLDER_NAME", "COMMAND_CENTER")
 
 
-def get_google_service() -> Tuple:
+def get_credentials():
     """
-    Authenticate with Google APIs and return Drive and Docs service clients.
+    Load (and refresh if needed) Google OAuth credentials.
 
     Credentials are loaded from environment variables if not already present.
     In production, interactive OAuth flows are disabled.
@@ -107,8 +126,12 @@ def get_google_service() -> Tuple:
                     "Missing valid Google credentials; set GOOGLE_TOKEN_JSON "
                     "or enable interactive login in a local environment."
                 )
+    return creds
+
 
-    # Build service clients
+def get_google_service() -> Tuple:
+    """Authenticate with Google APIs and return Drive and Docs service clients."""
+    creds = get_credentials()
     drive_service = build("drive", "v3", credentials=creds)
     docs_service = build("docs", "v1", credentials=creds)
     return drive_service, docs_service
@@ -140,58 +163,238 @@ def find_folder_id(drive_service, folder_name: str) -> str:
 
 def get_docs_in_folder(drive_service, folder_id: str) -> List[dict]:
     """
-    Return a list of Google Docs files contained within the specified folder.
+    Return the Google Docs in the folder with the metadata used for change
+    detection (id, name, modifiedTime, version, md5Checksum). Follows paging.
     """
     query = (
         f"'{folder_id}' in parents "
         "and mimeType='application/vnd.google-apps.document' "
         "and trashed=false"
     )
-    result = (
-        drive_service.files()
-        .list(q=query, fields="files(id, name)")
-        .execute()
-    )
-    return result.get("files", [])
-
-
-def fetch_and_save_doc(docs_service, file_info: dict) -> str:
+    files: List[dict] = []
+    page_token = None
+    while True:
+        result = (
+            drive_service.files()
+            .list(
+                q=query,
+                fields="nextPageToken, files(id, name, modifiedTime, version, md5Checksum)",
+                pageSize=1000,
+                pageToken=page_token,
+            )
+            .execute()
+        )
+        files.extend(result.get("files", []))
+        page_token = result.get("nextPageToken")
+        if not page_token:
+            return files
+
+
+def _out_name(file_info: dict) -> str:
+    """Slugified title used as the Markdown filename."""
+    return f"{file_info['name'].replace(' ', '_').lower()}.md"
+
+
+def _fingerprint(file_info: dict) -> Dict[str, Optional[str]]:
+    return {
+        "modifiedTime": file_info.get("modifiedTime"),
+        "version": file_info.get("version"),
+        "md5Checksum": file_info.get("md5Checksum"),
+    }
+
+
+def _atomic_write_if_changed(path: Path, text: str) -> bool:
+    """Write text to path via temp+rename unless identical; True if written."""
+    data = text.encode("utf-8")
+    try:
+        if path.read_bytes() == data:
+            return False
+    except FileNotFoundError:
+        pass
+    tmp = path.with_name(f".{path.name}.tmp")
+    tmp.write_bytes(data)
+    os.replace(tmp, path)
+    return True
+
+
+@dataclass
+class SyncReport:
+    changed: List[str] = field(default_factory=list)
+    unchanged: List[str] = field(default_factory=list)
+    deleted: List[str] = field(default_factory=list)
+    errors: Dict[str, str] = field(default_factory=dict)
+
+    def counts(self) -> Dict[str, int]:
+        return {
+            "changed": len(self.changed),
+            "unchanged": len(self.unchanged),
+            "deleted": len(self.deleted),
+            "errors": len(self.errors),
+        }
+
+
+class DocsSyncEngine:
     """
-    Fetch a Google Doc by ID, convert it to Markdown and save it locally.
+    Incremental Drive folder → Markdown sync.
 
-    Returns the filename of the saved Markdown file.
+    ``list_files()`` returns Drive file metadata; ``export_html(file_id)``
+    returns the doc as HTML bytes and must be safe to call from worker
+    threads. Both are injected so tests can use a local stand-in.
     """
-    # Export the doc as HTML; this includes basic formatting.
-    export = (
-        docs_service.documents()
-        .export(fileId=file_info["id"], mimeType="text/html")
-        .execute()
-    )
-    html_content = export.decode("utf-8")
-    markdown = md(html_content)
 
-    # Use a slugified title for the output filename
-    title_slug = file_info["name"].replace(" ", "_").lower()
-    out_path = IMPORT_PATH / f"{title_slug}.md"
-    out_path.write_text(markdown, encoding="utf-8")
-    return out_path.name
+    STATE_FILE = ".sync_state.json"
+
+    def __init__(
+        self,
+        list_files: Callable[[], List[dict]],
+        export_html: Callable[[str], bytes],
+        *,
+        out_dir: Path = IMPORT_PATH,
+        max_workers: int = 4,
+        convert: Optional[Callable[[str], str]] = None,
+    ):
+        self.list_files = list_files
+        self.export_html = export_html
+        self.out_dir = Path(out_dir)
+        self.max_workers = max(1, max_workers)
+        self.convert = convert or md
+        self.state_path = self.out_dir / self.STATE_FILE
+
+    def _load_state(self) -> Dict[str, dict]:
+        try:
+            state = json.loads(self.state_path.read_text(encoding="utf-8"))
+            return state if isinstance(state, dict) else {}
+        except (FileNotFoundError, ValueError):
+            return {}
+
+    def _save_state(self, state: Dict[str, dict]) -> None:
+        _atomic_write_if_changed(self.state_path, json.dumps(state, indent=1, sort_keys=True))
+
+    def _export_one(self, file_info: dict) -> Tuple[str, bool, str]:
+        """Export + convert + write one doc; returns (name, written, sha256)."""
+        html = self.export_html(file_info["id"])
+        if isinstance(html, bytes):
+            html = html.decode("utf-8")
+        markdown = self.convert(html)
+        name = _out_name(file_info)
+        written = _atomic_write_if_changed(self.out_dir / name, markdown)
+        return name, written, hashlib.sha256(markdown.encode("utf-8")).hexdigest()
+
+    def run(self, *, force: bool = False) -> SyncReport:
+        self.out_dir.mkdir(parents=True, exist_ok=True)
+        state = self._load_state()
+        report = SyncReport()
+        files = self.list_files()
+
+        todo: List[dict] = []
+        for f in files:
+            prev = state.get(f["id"])
+            if (
+                not force
+                and prev
+                and prev.get("fingerprint") == _fingerprint(f)
+                and prev.get("out") == _out_name(f)
+                and (self.out_dir / prev["out"]).exists()
+            ):
+                report.unchanged.append(prev["out"])
+            else:
+                todo.append(f)
+
+        report_progress("export", done=0, total=len(todo), listed=len(files), unchanged=len(report.unchanged))
+        results: List[Tuple[int, dict, object]] = []
+        cancelled: Optional[BaseException] = None
+        with ThreadPoolExecutor(max_workers=self.max_workers) as pool:
+            futures = {pool.submit(self._safe_export, f): (i, f) for i, f in enumerate(todo)}
+            try:
+                for fut in as_completed(futures):
+                    i, f = futures[fut]
+                    results.append((i, f, fut.result()))
+                    report_progress(done=len(results), total=len(todo))
+            except JobCancelled as exc:
+                # Keep what finished: its state is saved below, so a re-run resumes.
+                cancelled = exc
+                pool.shutdown(wait=True, cancel_futures=True)
+        results.sort(key=lambda r: r[0])
+        for _i, f, res in results:
+            if isinstance(res, Exception):
+                report.errors[f.get("name") or f["id"]] = str(res)
+                continue
+            name, written, digest = res
+            prev_out = (state.get(f["id"]) or {}).get("out")
+            if prev_out and prev_out != name and self._remove(prev_out):
+                report.deleted.append(prev_out)  # renamed in Drive
+            state[f["id"]] = {"out": name, "fingerprint": _fingerprint(f), "sha256": digest}
+            (report.changed if written else report.unchanged).append(name)
+
+        if cancelled is not None:
+            self._save_state(state)
+            raise cancelled
+
+        live = {f["id"] for f in files}
+        for file_id in [k for k in state if k not in live]:
+            out = state.pop(file_id).get("out")
+            if out and self._remove(out):
+                report.deleted.append(out)
+
+        self._save_state(state)
+        return report
+
+    def _safe_export(self, file_info: dict):
+        try:
+            return self._export_one(file_info)
+        except Exception as exc:  # surfaced per-file in the report
+            return exc
+
+    def _remove(self, name: str) -> bool:
+        target = (self.out_dir / name).resolve()
+        if target.parent != self.out_dir.resolve():
+            return False
+        try:
+            target.unlink()
+            return True
+        except FileNotFoundError:
+            return False
+
 
+def _drive_engine() -> DocsSyncEngine:
+    """Engine wired to the real Drive API (one client per worker thread)."""
+    creds = get_credentials()
+    drive_service = build("drive", "v3", credentials=creds)
+    folder_id = find_folder_id(drive_service, FOLDER_NAME)
+    local = threading.local()
+
+    def export_html(file_id: str) -> bytes:
+        # googleapiclient/httplib2 clients are not thread-safe.
+        if getattr(local, "drive", None) is None:
+            local.drive = build("drive", "v3", credentials=creds, cache_discovery=False)
+        return local.drive.files().export(fileId=file_id, mimeType="text/html").execute()
+
+    return DocsSyncEngine(
+        lambda: get_docs_in_folder(drive_service, folder_id),
+        export_html,
+        max_workers=int(os.getenv("GOOGLE_SYNC_CONCURRENCY", "4")),
+    )
 
-def sync_google_docs() -> List[str]:
-    """
-    Authenticate and synchronise all Google Docs from the configured folder.
 
-    Returns a list of filenames that were saved.
-    """
+def sync_google_docs_report(force: bool = False) -> SyncReport:
+    """Run an incremental sync of the configured folder and return the report."""
     if SYNC_AVAILABLE_ERR is not None:
         raise RuntimeError(f"Google client stack unavailable: {SYNC_AVAILABLE_ERR}")
 
-    drive_service, docs_service = get_google_service()
-    folder_id = find_folder_id(drive_service, FOLDER_NAME)
-    doc_files = get_docs_in_folder(drive_service, folder_id)
-    saved = [fetch_and_save_doc(docs_service, f) for f in doc_files]
-    print(f"Synced {len(saved)} file(s) from Drive folder '{FOLDER_NAME}': {saved}")
-    return saved
+    report = _drive_engine().run(force=force)
+    print(f"Synced Drive folder '{FOLDER_NAME}': {report.counts()}")
+    return report
+
+
+def sync_google_docs(force: bool = False) -> List[str]:
+    """
+    Authenticate and incrementally synchronise Google Docs from the configured folder.
+
+    Returns the filenames of every doc now synced on disk (exported this run
+    or already current). Use sync_google_docs_report() to see what changed.
+    """
+    report = sync_google_docs_report(force=force)
+    return report.changed + report.unchanged
 
 
 if __name__ == "__main__":
@@ -0,0 +1,250 @@
+# ─────────────────────────────────────────────────────────────────────────────
+# File: http_middleware.py
+# Directory: services
+# Purpose: Core request middlewares for main (correlation id, access log,
+#          per-path timeout, response compression) written as plain ASGI
+#          callables.
+#
+# Upstream:
+#   - ENV: LONG_OP_PATHS (comma list), LONG_OP_TIMEOUT_S (default 300),
+#          GZIP_MIN_BYTES (default 1024), GZIP_LEVEL (default 6)
+#   - Imports: anyio, gzip, starlette.responses, uuid
+#
+# Downstream:
+#   - main (create_app middleware stack)
+#   - tools/bench_middleware.py
+#
+# Contents:
+#   - new_corr_id()
+#   - RequestIDMiddleware
+#   - AccessLogMiddleware
+#   - TimeoutMiddleware
+#   - CompressionMiddleware
+#
+# Notes:
+#   • No BaseHTTPMiddleware: no extra task, memory stream or Request object per
+#     layer, and streaming bodies (/ask/stream, /debug/flow-events) go straight
+#     through to the server.
+#   • Behaviour matches the previous BaseHTTPMiddleware versions: the access
+#     line is written when the response starts (or with status=ERR if the app
+#     raises first), and the timeout budget covers the time until the response
+#     starts, never an already-streaming body.
+#   • CompressionMiddleware only gzips complete, single-message bodies with a
+#     Content-Length ≥ GZIP_MIN_BYTES. Streams (no Content-Length, or more
+#     than one body message) and already-encoded bodies pass through as-is, so
+#     token streams are never held back in a compressor buffer.
+#   • Non-HTTP scopes (lifespan, websocket) are passed through untouched.
+# ─────────────────────────────────────────────────────────────────────────────
+
+from __future__ import annotations
+
+import gzip
+import logging
+import math
+import os
+import time
+import uuid
+from typing import Any, Awaitable, Callable, Dict, MutableMapping, Optional
+
+import anyio
+from starlette.responses import Response
+
+# Same logger the access line has always used, so log filters keep working.
+logger = logging.getLogger("relay.main")
+
+Scope = MutableMapping[str, Any]
+Message = MutableMapping[str, Any]
+Receive = Callable[[], Awaitable[Message]]
+Send = Callable[[Message], Awaitable[None]]
+ASGIApp = Callable[[Scope, Receive, Send], Awaitable[None]]
+
+CORR_HEADER = b"x-corr-id"
+
+
+def new_corr_id() -> str:
+    return f"{uuid.uuid4().hex[:8]}{int(time.time())%1000:03d}"
+
+
+def _header(scope: Scope, name: bytes) -> Optional[str]:
+    for key, value in scope.get("headers") or ():
+        if key.lower() == name:
+            return value.decode("latin-1")
+    return None
+
+
+def _state(scope: Scope) -> Dict[str, Any]:
+    # Starlette's Request.state is a view over scope["state"].
+    return scope.setdefault("state", {})
+
+
+class RequestIDMiddleware:
+    """
+    Attach a correlation ID to each request and echo it in the response headers.
+
+    Header: X-Corr-Id (in/out); also available as request.state.corr_id
+    """
+    def __init__(self, app: ASGIApp) -> None:
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        cid = _header(scope, CORR_HEADER) or new_corr_id()
+        _state(scope)["corr_id"] = cid
+        raw = cid.encode("latin-1")
+
+        async def send_with_cid(message: Message) -> None:
+            if message["type"] == "http.response.start":
+                headers = [(k, v) for k, v in message.get("headers") or () if k.lower() != CORR_HEADER]
+                headers.append((CORR_HEADER, raw))
+                message["headers"] = headers
+            await send(message)
+
+        await self.app(scope, receive, send_with_cid)
+
+
+class AccessLogMiddleware:
+    """
+    Minimal structured access log. Always logs a line, even on exceptions.
+
+    Fields: method, path, cid, status, dur_ms
+    """
+    def __init__(self, app: ASGIApp) -> None:
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        t0 = time.perf_counter()
+        logged = False
+
+        def log(status: Any) -> None:
+            nonlocal logged
+            logged = True
+            dur_ms = int((time.perf_counter() - t0) * 1000)
+            cid = (scope.get("state") or {}).get("corr_id", "-")
+            logger.info(
+                "req method=%s path=%s cid=%s status=%s dur_ms=%s",
+                scope.get("method"), scope.get("path"), cid, status, dur_ms
+            )
+
+        async def send_logged(message: Message) -> None:
+            if message["type"] == "http.response.start" and not logged:
+                log(message.get("status"))
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_logged)
+        finally:
+            if not logged:
+                log("ERR")
+
+
+class TimeoutMiddleware:
+    """Per-request timeout with a longer budget for known long operations.
+
+    Default: 35s (HTTP_TIMEOUT_S). Long ops: LONG_OP_TIMEOUT_S (default 300s).
+    Long ops are matched by path startswith against LONG_OP_PATHS.
+    """
+    def __init__(self, app: ASGIApp, timeout_s: float = 35.0) -> None:
+        self.app = app
+        self.default_timeout = timeout_s
+        # Comma-separated, defaults cover our KB/docs heavy endpoints
+        paths = os.getenv(
+            "LONG_OP_PATHS",
+            "/docs/refresh_kb,/docs/sync,/docs/full_sync,/kb/reindex"
+        )
+        self.long_op_paths = tuple(p.strip() for p in paths.split(",") if p.strip())
+        self.long_timeout = float(os.getenv("LONG_OP_TIMEOUT_S", "300"))
+
+    def budget_for(self, path: str) -> float:
+        return self.long_timeout if path.startswith(self.long_op_paths) else self.default_timeout
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        started = False
+
+        with anyio.CancelScope(deadline=anyio.current_time() + self.budget_for(scope.get("path") or "")) as cancel:
+            async def send_started(message: Message) -> None:
+                nonlocal started
+                if message["type"] == "http.response.start":
+                    started = True
+                    cancel.deadline = math.inf  # the body is no longer on the clock
+                await send(message)
+
+            await self.app(scope, receive, send_started)
+
+        if cancel.cancelled_caught and not started:
+            await Response("Request timeout", status_code=504)(scope, receive, send)
+
+
+class CompressionMiddleware:
+    """Gzip for complete JSON/text bodies; small and streaming bodies are sent as-is."""
+
+    EXCLUDED_TYPES = ("text/event-stream", "application/x-ndjson", "image/", "audio/", "video/", "application/zip", "application/gzip")
+
+    def __init__(self, app: ASGIApp, minimum_size: Optional[int] = None, compresslevel: Optional[int] = None) -> None:
+        self.app = app
+        self.minimum_size = int(minimum_size if minimum_size is not None else os.getenv("GZIP_MIN_BYTES", "1024"))
+        self.compresslevel = int(compresslevel if compresslevel is not None else os.getenv("GZIP_LEVEL", "6"))
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http" or "gzip" not in (_header(scope, b"accept-encoding") or ""):
+            await self.app(scope, receive, send)
+            return
+        start: Optional[Message] = None
+        passthrough = False
+
+        async def send_compressed(message: Message) -> None:
+            nonlocal start, passthrough
+            if passthrough:
+                await send(message)
+                return
+            if message["type"] == "http.response.start":
+                if self._eligible(message):
+                    start = message  # hold until we see the body
+                else:
+                    passthrough = True
+                    await send(message)
+                return
+            if message["type"] != "http.response.body" or start is None:
+                await send(message)
+                return
+            if message.get("more_body", False):
+                # Multi-part body (stream / file): give up on compression.
+                passthrough = True
+                await send(start)
+                await send(message)
+                return
+            body = gzip.compress(message.get("body", b""), compresslevel=self.compresslevel, mtime=0)
+            vary = [v for k, v in start.get("headers") or () if k.lower() == b"vary"]
+            headers = [(k, v) for k, v in start.get("headers") or () if k.lower() not in (b"content-length", b"vary")]
+            headers += [
+                (b"content-encoding", b"gzip"),
+                (b"content-length", str(len(body)).encode("latin-1")),
+                (b"vary", b", ".join(vary + [b"Accept-Encoding"])),
+            ]
+            start["headers"] = headers
+            await send(start)
+            await send({"type": "http.response.body", "body": body, "more_body": False})
+
+        await self.app(scope, receive, send_compressed)
+
+    def _eligible(self, start: Message) -> bool:
+        length = None
+        ctype = ""
+        for key, value in start.get("headers") or ():
+            k = key.lower()
+            if k == b"content-encoding":
+                return False
+            if k == b"content-length":
+                length = int(value)
+            elif k == b"content-type":
+                ctype = value.decode("latin-1").lower()
+        if length is None or length < self.minimum_size or start.get("status") == 206:
+            return False
+        return not any(ctype.startswith(t) for t in self.EXCLUDED_TYPES)
@@ -0,0 +1,469 @@
+# ─────────────────────────────────────────────────────────────────────────────
+# File: jobs.py
+# Directory: services
+# Purpose: Durable long-operation jobs (reindex, Drive sync, prune) with
+#          progress, cooperative cancellation and per-type concurrency
+#          limits shared by every worker process.
+#
+# Upstream:
+#   - ENV: JOBS_DIR (default var/jobs), LOCK_DIR (default var/locks),
+#          JOBS_LIMITS ("type=n,..."; default 1 per type), JOBS_KEEP (default 500),
+#          JOBS_LEASE_S (default 60; heartbeat age after which a job is orphaned)
+#   - Imports: contextvars, fcntl (optional), json, os, threading, uuid
+#
+# Downstream:
+#   - routes.docs (sync / full_sync / refresh_kb / prune_duplicates)
+#   - routes.jobs (GET /jobs, GET /jobs/{id}, SSE events, cancel)
+#   - services.kb (embed_all progress), services.google_docs_sync (export progress)
+#
+# Contents:
+#   - JobBusy, JobCancelled
+#   - JobContext (progress / cancelled / raise_if_cancelled)
+#   - JobStore (submit / run_inline / slot / get / list / request_cancel)
+#   - report_progress(), raise_if_cancelled()
+#   - get_store()
+#
+# Notes:
+#   • One JSON record per job under JOBS_DIR, rewritten atomically (tmp +
+#     os.replace). Every write bumps "seq", which the SSE stream watches.
+#   • Concurrency: a job holds one of N flock'd slot files
+#     (LOCK_DIR/<type>.<k>.slot) for its lifetime. flock is released by the
+#     kernel if the process dies, so limits hold across uvicorn workers and
+#     never leak. No free slot → JobBusy (routes map it to 409). slot()
+#     holds one without recording a job (kb_watcher's incremental applies
+#     share the kb_reindex slot this way).
+#   • Running jobs heartbeat ("heartbeat_at", every lease/4, without bumping
+#     "seq"). A "running"/"queued" record whose heartbeat is older than the
+#     lease reads back as "interrupted" on any host — a redeployed container
+#     has a new hostname and pids get reused, so pid checks alone can't tell.
+#     A dead pid on this host short-circuits the wait.
+#   • list() keeps an in-memory index of parsed records keyed by file mtime,
+#     so op_status only re-reads records that changed.
+#   • Cancellation is cooperative: any worker drops an <id>.cancel marker;
+#     the running job sees it at its next progress()/cancelled() call.
+#   • Long-running code reports through report_progress() /
+#     raise_if_cancelled(), which are no-ops outside a job.
+# ─────────────────────────────────────────────────────────────────────────────
+
+from __future__ import annotations
+
+import contextvars
+import json
+import logging
+import os
+import socket
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterator, List, Optional
+
+try:  # POSIX only; elsewhere limits are enforced per process
+    import fcntl  # type: ignore
+except Exception:  # pragma: no cover
+    fcntl = None  # type: ignore
+
+logger = logging.getLogger("relay.jobs")
+
+PROJECT_ROOT = Path(__file__).resolve().parents[1]
+TERMINAL = ("succeeded", "failed", "cancelled", "interrupted")
+_HOST = socket.gethostname()
+
+
+class JobBusy(RuntimeError):
+    """Every slot for this job type is taken."""
+
+
+class JobCancelled(BaseException):
+    """
+    Raised inside a job once cancellation was requested. Like
+    asyncio.CancelledError it is not an Exception, so the many never-raise
+    `except Exception` wrappers along the reindex/sync paths let it through.
+    """
+
+
+def _parse_limits(raw: str) -> Dict[str, int]:
+    out: Dict[str, int] = {}
+    for part in (raw or "").split(","):
+        name, _, n = part.partition("=")
+        try:
+            out[name.strip()] = max(1, int(n))
+        except ValueError:
+            continue
+    return out
+
+
+def _pid_alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+class JobContext:
+    """Handle given to a running job for progress and cancellation."""
+
+    def __init__(self, store: "JobStore", job_id: str, *, min_write_s: float = 0.5) -> None:
+        self.store = store
+        self.job_id = job_id
+        self.min_write_s = min_write_s
+        self._started = time.monotonic()
+        self._stage_t0 = self._started
+        self._last_write = 0.0
+        self._last_cancel_check = 0.0
+        self._cancelled = False
+        self._progress: Dict[str, Any] = {}
+
+    def progress(
+        self,
+        stage: Optional[str] = None,
+        *,
+        done: Optional[int] = None,
+        total: Optional[int] = None,
+        force: bool = False,
+        **counters: Any,
+    ) -> None:
+        """Merge progress fields (ETA derived from done/total); persisted at most every min_write_s."""
+        p = self._progress
+        if stage is not None and stage != p.get("stage"):
+            p.update(stage=stage, stage_started=time.time(), done=None, total=None, eta_s=None)
+            self._stage_t0 = time.monotonic()
+            force = True
+        if done is not None:
+            p["done"] = done
+        if total is not None:
+            p["total"] = total
+        p.update(counters)
+        d, t = p.get("done"), p.get("total")
+        if d and t:
+            elapsed = time.monotonic() - self._stage_t0
+            rate = d / elapsed if elapsed > 0 else None
+            p["rate_per_s"] = round(rate, 2) if rate else None
+            p["eta_s"] = round((t - d) / rate, 1) if rate else None
+        now = time.monotonic()
+        if force or now - self._last_write >= self.min_write_s:
+            self._last_write = now
+            self.store._update(self.job_id, progress=dict(p))
+        self.raise_if_cancelled()
+
+    def cancelled(self) -> bool:
+        if self._cancelled:
+            return True
+        now = time.monotonic()
+        if now - self._last_cancel_check >= self.min_write_s:
+            self._last_cancel_check = now
+            self._cancelled = self.store._cancel_marker(self.job_id).exists()
+        return self._cancelled
+
+    def raise_if_cancelled(self) -> None:
+        if self.cancelled():
+            raise JobCancelled(self.job_id)
+
+
+_current: contextvars.ContextVar[Optional[JobContext]] = contextvars.ContextVar("relay_job", default=None)
+
+
+def current_job() -> Optional[JobContext]:
+    return _current.get()
+
+
+def report_progress(stage: Optional[str] = None, **kw: Any) -> None:
+    """Report progress for the job running in this context (no-op otherwise)."""
+    ctx = _current.get()
+    if ctx is not None:
+        ctx.progress(stage, **kw)
+
+
+def raise_if_cancelled() -> None:
+    ctx = _current.get()
+    if ctx is not None:
+        ctx.raise_if_cancelled()
+
+
+class JobStore:
+    def __init__(
+        self,
+        root: Path,
+        *,
+        lock_dir: Optional[Path] = None,
+        limits: Optional[Dict[str, int]] = None,
+        keep: int = 500,
+        lease_s: float = 60.0,
+    ) -> None:
+        self.root = Path(root)
+        self.lock_dir = Path(lock_dir or self.root / "locks")
+        self.limits = dict(limits or {})
+        self.keep = max(10, keep)
+        self.lease_s = max(0.05, float(lease_s))
+        self._lock = threading.Lock()
+        self._local_slots: Dict[str, int] = {}  # fallback when fcntl is unavailable
+        self._running: Dict[str, bool] = {}  # job ids executing in this process
+        self._heartbeat: Optional[threading.Thread] = None
+        self._index: Dict[str, tuple] = {}  # job id → (mtime_ns, record)
+        self._index_lock = threading.Lock()
+
+    # ── Records ──────────────────────────────────────────────────────────────
+    def _path(self, job_id: str) -> Path:
+        return self.root / f"{job_id}.json"
+
+    def _cancel_marker(self, job_id: str) -> Path:
+        return self.root / f"{job_id}.cancel"
+
+    def _read(self, job_id: str) -> Optional[Dict[str, Any]]:
+        if not job_id or "/" in job_id or job_id.startswith("."):
+            return None
+        try:
+            rec = json.loads(self._path(job_id).read_text(encoding="utf-8"))
+        except (FileNotFoundError, ValueError):
+            return None
+        rec["cancel_requested"] = bool(rec.get("cancel_requested")) or self._cancel_marker(job_id).exists()
+        return rec
+
+    def _write(self, rec: Dict[str, Any]) -> None:
+        self.root.mkdir(parents=True, exist_ok=True)
+        path = self._path(rec["id"])
+        tmp = path.with_name(f".{path.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+        tmp.write_text(json.dumps(rec, default=str), encoding="utf-8")
+        os.replace(tmp, path)
+
+    def _update(self, job_id: str, **fields: Any) -> Dict[str, Any]:
+        with self._lock:
+            rec = self._read(job_id) or {"id": job_id}
+            if fields.pop("_if_live", False) and rec.get("state") in TERMINAL:
+                return rec
+            quiet = fields.pop("_quiet", False)
+            rec.update(fields)
+            if not quiet:
+                rec["seq"] = int(rec.get("seq", 0)) + 1
+                rec["updated_at"] = time.time()
+            self._write(rec)
+            return rec
+
+    def _resolve(self, rec: Dict[str, Any]) -> Dict[str, Any]:
+        """Mark records whose owner is gone (stale heartbeat, or a dead pid on this host) as interrupted."""
+        if rec.get("state") not in ("queued", "running"):
+            return rec
+        pid = rec.get("pid")
+        if rec.get("host") == _HOST and isinstance(pid, int) and not _pid_alive(pid):
+            error = "worker process exited"
+        else:
+            beat = rec.get("heartbeat_at") or rec.get("updated_at") or rec.get("created_at") or 0
+            if time.time() - float(beat) <= self.lease_s:
+                return rec
+            error = f"no heartbeat for {self.lease_s:g}s (worker gone)"
+        return self._update(rec["id"], state="interrupted", finished_at=time.time(), error=error, _if_live=True)
+
+    def _beat(self) -> None:
+        """Heartbeat every job this process is running, until none are left."""
+        while True:
+            time.sleep(self.lease_s / 4)
+            with self._lock:
+                ids = list(self._running)
+                if not ids:
+                    self._heartbeat = None
+                    return
+            for job_id in ids:
+                try:
+                    self._update(job_id, heartbeat_at=time.time(), _quiet=True, _if_live=True)
+                except OSError as e:
+                    logger.warning("job %s heartbeat failed: %s", job_id, e)
+
+    def _track(self, job_id: str, running: bool) -> None:
+        with self._lock:
+            if running:
+                self._running[job_id] = True
+                if self._heartbeat is None:
+                    self._heartbeat = threading.Thread(target=self._beat, name="job-heartbeat", daemon=True)
+                    self._heartbeat.start()
+            else:
+                self._running.pop(job_id, None)
+
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        rec = self._read(job_id)
+        return self._resolve(rec) if rec else None
+
+    def _scan(self) -> List[Dict[str, Any]]:
+        """All records, newest first; only files whose mtime changed are re-read."""
+        entries = []
+        try:
+            with os.scandir(self.root) as it:
+                for e in it:
+                    if e.name.endswith(".json") and not e.name.startswith("."):
+                        try:
+                            entries.append((e.stat().st_mtime_ns, e.name[:-5]))
+                        except FileNotFoundError:
+                            continue
+        except FileNotFoundError:
+            return []
+        entries.sort(reverse=True)
+        with self._index_lock:
+            index, self._index = self._index, {}
+            for mtime, job_id in entries:
+                cached = index.get(job_id)
+                if cached is None or cached[0] != mtime:
+                    rec = self._read(job_id)
+                    if rec is None:
+                        continue
+                    cached = (mtime, rec)
+                self._index[job_id] = cached
+            return [self._index[j][1] for _m, j in entries if j in self._index]
+
+    def list(self, *, type: Optional[str] = None, state: Optional[str] = None, limit: int = 50) -> List[Dict[str, Any]]:
+        out: List[Dict[str, Any]] = []
+        for rec in self._scan():
+            rec = self._resolve(dict(rec))
+            if (type and rec.get("type") != type) or (state and rec.get("state") != state):
+                continue
+            out.append(rec)
+            if len(out) >= limit:
+                break
+        return out
+
+    def active(self) -> List[Dict[str, Any]]:
+        return [r for r in self.list(limit=self.keep) if r.get("state") in ("queued", "running")]
+
+    def request_cancel(self, job_id: str) -> Optional[Dict[str, Any]]:
+        rec = self.get(job_id)
+        if rec is None or rec.get("state") in TERMINAL:
+            return rec
+        # A separate marker file, so a concurrent progress write can't drop it.
+        self._cancel_marker(job_id).touch()
+        return self._update(job_id, cancel_requested=True)
+
+    def _prune(self) -> None:
+        try:
+            files = sorted(self.root.glob("*.json"), key=lambda p: p.stat().st_mtime)
+        except OSError:
+            return
+        for p in files[: max(0, len(files) - self.keep)]:
+            rec = self._read(p.stem) or {}
+            if rec.get("state") in TERMINAL:
+                p.unlink(missing_ok=True)
+                self._cancel_marker(p.stem).unlink(missing_ok=True)
+
+    # ── Slots ────────────────────────────────────────────────────────────────
+    def _acquire_slot(self, job_type: str):
+        limit = self.limits.get(job_type, self.limits.get("*", 1))
+        if fcntl is None:
+            with self._lock:
+                if self._local_slots.get(job_type, 0) >= limit:
+                    raise JobBusy(f"{job_type} already in progress")
+                self._local_slots[job_type] = self._local_slots.get(job_type, 0) + 1
+            return job_type
+        self.lock_dir.mkdir(parents=True, exist_ok=True)
+        for k in range(limit):
+            fh = open(self.lock_dir / f"{job_type}.{k}.slot", "a+")
+            try:
+                fcntl.flock(fh.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                fh.close()
+                continue
+            return fh
+        raise JobBusy(f"{job_type} already in progress")
+
+    def _release_slot(self, slot) -> None:
+        if isinstance(slot, str):
+            with self._lock:
+                self._local_slots[slot] = max(0, self._local_slots.get(slot, 1) - 1)
+            return
+        try:
+            fcntl.flock(slot.fileno(), fcntl.LOCK_UN)
+        finally:
+            slot.close()
+
+    @contextmanager
+    def slot(self, job_type: str) -> Iterator[None]:
+        """Hold a job_type slot for the block without recording a job. Raises JobBusy."""
+        slot = self._acquire_slot(job_type)
+        try:
+            yield
+        finally:
+            self._release_slot(slot)
+
+    # ── Running ──────────────────────────────────────────────────────────────
+    def _create(self, job_type: str, params: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+        rec = {
+            "id": uuid.uuid4().hex,
+            "type": job_type,
+            "state": "queued",
+            "params": params or {},
+            "created_at": time.time(),
+            "started_at": None,
+            "finished_at": None,
+            "progress": {},
+            "result": None,
+            "error": None,
+            "cancel_requested": False,
+            "pid": os.getpid(),
+            "host": _HOST,
+            "heartbeat_at": time.time(),
+            "seq": 0,
+        }
+        with self._lock:
+            self._write(rec)
+        return rec
+
+    def _execute(self, rec: Dict[str, Any], fn: Callable[[JobContext], Any], slot) -> Dict[str, Any]:
+        ctx = JobContext(self, rec["id"])
+        token = _current.set(ctx)
+        self._track(rec["id"], True)
+        self._update(rec["id"], state="running", started_at=time.time(), heartbeat_at=time.time())
+        try:
+            result = fn(ctx)
+            final = {"state": "succeeded", "result": result}
+        except JobCancelled:
+            final = {"state": "cancelled", "error": "cancelled"}
+        except Exception as e:
+            logger.exception("job %s (%s) failed", rec["id"], rec["type"])
+            final = {"state": "failed", "error": f"{e.__class__.__name__}: {e}"}
+        finally:
+            _current.reset(token)
+            self._track(rec["id"], False)
+            self._release_slot(slot)
+        return self._update(rec["id"], finished_at=time.time(), progress=ctx._progress, **final)
+
+    def submit(self, job_type: str, fn: Callable[[JobContext], Any], *, params: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        """Start fn(ctx) on a daemon thread; returns the queued record. Raises JobBusy."""
+        slot = self._acquire_slot(job_type)
+        try:
+            rec = self._create(job_type, params)
+            self._prune()
+        except Exception:
+            self._release_slot(slot)
+            raise
+        t = threading.Thread(target=self._execute, args=(rec, fn, slot), name=f"job:{job_type}:{rec['id'][:8]}", daemon=True)
+        t.start()
+        return rec
+
+    def run_inline(self, job_type: str, fn: Callable[[JobContext], Any], *, params: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        """Run fn(ctx) on the caller's thread as a recorded job; returns the final record. Raises JobBusy."""
+        slot = self._acquire_slot(job_type)
+        try:
+            rec = self._create(job_type, params)
+        except Exception:
+            self._release_slot(slot)
+            raise
+        return self._execute(rec, fn, slot)
+
+
+_store: Optional[JobStore] = None
+_store_lock = threading.Lock()
+
+
+def get_store() -> JobStore:
+    global _store
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                _store = JobStore(
+                    Path(os.getenv("JOBS_DIR") or PROJECT_ROOT / "var" / "jobs"),
+                    lock_dir=Path(os.getenv("LOCK_DIR") or PROJECT_ROOT / "var" / "locks"),
+                    limits=_parse_limits(os.getenv("JOBS_LIMITS", "")),
+                    keep=int(os.getenv("JOBS_KEEP", "500")),
+                    lease_s=float(os.getenv("JOBS_LEASE_S", "60")),
+                )
+    return _store
@@ -12,12 +12,19 @@
 # Public API (kept stable for routes and services):
 #   - api_reindex(*, tiers=None, verbose=False) -> Dict[str, Any]
 #   - embed_all(verbose=False, tiers=None) -> Dict[str, Any]
+#   - ingest_paths(paths, *, tiers=None) -> Dict[str, Any]
 #   - index_is_valid() -> bool
 #   - get_index() -> VectorStoreIndex|None
 #   - simple_search(query, top_k=5, score_threshold=None) -> List[Dict]
 #   - search(query=..., k/top_k=..., score_threshold=None, **kwargs) -> List[Dict]
 #   - api_search(query, k=5, search_type=None) -> List[Dict]
 #   - warmup() -> None
+#
+# Shared index: every build publishes an mmap'd binary snapshot
+# (services.kb_shared) under INDEX_DIR/shared; searches read it in place,
+# get_index() serves a lazy SnapshotIndex from it (JSON store only when the
+# snapshot is missing or stale) and drops its per-process cache when another
+# worker publishes a new generation.
 # ──────────────────────────────────────────────────────────────────────────────
 
 from __future__ import annotations
@@ -42,6 +49,8 @@ logging.basicConfig(
 )
 logger = logging.getLogger("services.kb")
 
+from services.jobs import report_progress
+
 # Optional structured logger shim
 try:
     from core.logging import log_event  # type: ignore
@@ -90,7 +99,7 @@ INDEX_ROOT: Path = Path(ENV_INDEX_ROOT or str(_CFG_INDEX_ROOT)).resolve()
 INDEX_DIR: Path = Path(os.getenv("INDEX_DIR", str(_CFG_INDEX_DIR))).resolve()
 INDEX_DIR.mkdir(parents=True, exist_ok=True)
 
-PROJECT_ROOT = Path(os.getenv("RELAY_PROJECT_ROOT") or Path(".").resolve())
+PROJECT_ROOT = Path(os.getenv("RELAY_PROJECT_ROOT") or ".").resolve()
 DEFAULT_DOC_DIRS = [PROJECT_ROOT / "docs", PROJECT_ROOT / "README.md"]
 DEFAULT_CODE_DIRS = [
     PROJECT_ROOT / "agents",
@@ -140,6 +149,7 @@ IGNORED_FOLDERS: set[str] = {
     ".mypy_cache", ".pytest_cache",
 }
 MAX_FILE_SIZE_MB: int = int(os.getenv("KB_MAX_FILE_SIZE_MB", "2"))
+EMBED_BATCH: int = max(1, int(os.getenv("KB_EMBED_BATCH", "256")))
 
 def _should_index_file(filepath: str, tier: str) -> bool:
     """
@@ -233,11 +243,23 @@ def _resolve_embed_model():
 # ╚══════════════════════════════════════════════════════════════════════════╝
 
 DIM_FILE = INDEX_DIR / "dim.json"
+# Documents are keyed by resolved file path (_doc_id) so single files can be
+# replaced in place (ingest_paths); older indexes used random or unresolved
+# ids and need a rebuild.
+ID_SCHEME = "path:resolved"
+
+
+def _doc_id(path: str | Path) -> str:
+    """The one document id for a file: its resolved absolute path."""
+    return str(Path(path).resolve())
 
 def _write_dim_meta(dim: int) -> None:
     DIM_FILE.parent.mkdir(parents=True, exist_ok=True)
     DIM_FILE.write_text(
-        json.dumps({"dim": dim, "model": MODEL_NAME, "ts": int(time.time())}, indent=2),
+        json.dumps(
+            {"dim": dim, "model": MODEL_NAME, "ts": int(time.time()), "id_scheme": ID_SCHEME},
+            indent=2,
+        ),
         encoding="utf-8",
     )
 
@@ -302,25 +324,26 @@ def _iter_docs(tiers: Optional[List[TierSpec]] = None) -> List[Any]:
                     for f in path.rglob("*"):
                         if not f.is_file():
                             continue
-                        fpath = str(f)
+                        fpath = _doc_id(f)
                         if _should_index_file(fpath, tier):
                             try:
                                 text = f.read_text(encoding="utf-8")
                             except Exception as e:
                                 _log_skip(fpath, tier, f"unreadable: {e.__class__.__name__}")
                                 continue
-                            docs.append(Document(text=text, metadata={"tier": tier, "file_path": fpath}))
+                            docs.append(Document(id_=fpath, text=text, metadata={"tier": tier, "file_path": fpath}))
+                            report_progress("load", done=len(docs), files=len(docs))
                         else:
                             _log_skip(fpath, tier, "filtered by rules")
                 elif path.is_file():
-                    fpath = str(path)
+                    fpath = _doc_id(path)
                     if _should_index_file(fpath, tier):
                         try:
                             text = path.read_text(encoding="utf-8")
                         except Exception as e:
                             _log_skip(fpath, tier, f"unreadable: {e.__class__.__name__}")
                             continue
-                        docs.append(Document(text=text, metadata={"tier": tier, "file_path": fpath}))
+                        docs.append(Document(id_=fpath, text=text, metadata={"tier": tier, "file_path": fpath}))
                     else:
                         _log_skip(fpath, tier, "filtered by rules")
                 else:
@@ -378,13 +401,23 @@ def embed_all(verbose: bool = False, tiers: Optional[List[TierSpec]] = None) ->
             return {"ok": False, "error": msg, "model": MODEL_NAME, "indexed": 0}
 
         t0 = time.time()
+        report_progress("chunk", files=len(docs), force=True)
         nodes = INGEST_PIPELINE.run(documents=docs)
         logger.info("[KB] Nodes generated: %s", len(nodes))
 
+        # Embed in batches so a running job reports chunks/ETA and can be
+        # cancelled between batches (nothing is persisted until the end).
         from llama_index.core import VectorStoreIndex
-        index = VectorStoreIndex(nodes=nodes, embed_model=EMBED_MODEL)
+        index = VectorStoreIndex(nodes=[], embed_model=EMBED_MODEL)
+        report_progress("embed", done=0, total=len(nodes), chunks=len(nodes))
+        for i in range(0, len(nodes), EMBED_BATCH):
+            batch = nodes[i : i + EMBED_BATCH]
+            index.insert_nodes(batch)
+            report_progress(done=i + len(batch), total=len(nodes))
+        report_progress("persist", force=True)
         index.storage_context.persist(persist_dir=str(INDEX_DIR))
         _write_dim_meta(int(EXPECTED_DIM or 0))
+        _publish_shared(index)
         dt = time.time() - t0
 
         logger.info("✅ Index persisted → %s (%.2fs)", INDEX_DIR, dt)
@@ -491,6 +524,195 @@ def api_reindex(
     return response
 
 
+def _tier_for_path(path: Path, tiers: List[TierSpec]) -> Optional[str]:
+    for spec in tiers:
+        for root in spec.paths:
+            root = Path(root).resolve()
+            if path == root or root in path.parents:
+                return spec.name
+    return None
+
+
+def ingest_paths(
+    paths: Iterable[str | Path],
+    *,
+    tiers: Optional[List[TierSpec]] = None,
+) -> Dict[str, Any]:
+    """
+    Incrementally apply changed files to the persisted index: each path's
+    nodes are dropped and, if the file still exists and passes
+    _should_index_file, re-embedded. Paths outside every tier are ignored.
+    Falls back to api_reindex() when there is no path-keyed index yet.
+    Never raises. Returns:
+      {"ok", "status", "mode": "incremental"|"full", "updated", "removed",
+       "skipped", "took_ms", "error"?}
+    """
+    t0 = time.perf_counter()
+    tiers = tiers or _discover_default_tiers()
+    wanted: Dict[str, Optional[str]] = {}
+    skipped = 0
+    for raw in paths:
+        p = Path(_doc_id(raw))
+        tier = _tier_for_path(p, tiers)
+        if tier is None:
+            skipped += 1
+            continue
+        wanted[str(p)] = tier
+
+    def _done(ok: bool, **extra: Any) -> Dict[str, Any]:
+        resp = {"ok": ok, "status": "done" if ok else "error", "mode": "incremental",
+                "updated": 0, "removed": 0, "skipped": skipped,
+                "took_ms": int((time.perf_counter() - t0) * 1000)}
+        resp.update(extra)
+        return resp
+
+    if not wanted:
+        return _done(True)
+
+    meta = _read_dim_meta() or {}
+    if meta.get("id_scheme") != ID_SCHEME or not index_is_valid():
+        logger.info("[KB] ingest_paths: no path-keyed index; running full reindex")
+        full = api_reindex(tiers=tiers)
+        return _done(bool(full.get("ok")), mode="full", updated=int(full.get("indexed") or 0),
+                     **({"error": full["error"]} if full.get("error") else {}))
+
+    try:
+        Document, *_ = _llama_imports()
+        index = _load_storage_index()
+        docs: List[Any] = []
+        removed = 0
+        for fpath, tier in wanted.items():
+            try:
+                index.delete_ref_doc(fpath, delete_from_docstore=True)
+            except Exception:
+                pass  # not previously indexed
+            f = Path(fpath)
+            if not f.is_file():
+                removed += 1
+                continue
+            if not _should_index_file(fpath, tier):
+                _log_skip(fpath, tier, "filtered by rules")
+                removed += 1
+                continue
+            try:
+                text = f.read_text(encoding="utf-8")
+            except Exception as e:
+                _log_skip(fpath, tier, f"unreadable: {e.__class__.__name__}")
+                removed += 1
+                continue
+            docs.append(Document(id_=fpath, text=text, metadata={"tier": tier, "file_path": fpath}))
+
+        if docs:
+            nodes = _pipeline().run(documents=docs)
+            index.insert_nodes(nodes)
+        index.storage_context.persist(persist_dir=str(INDEX_DIR))
+        _publish_shared(index)
+        clear_index_cache()
+        log_event("kb_index_incremental", {"updated": len(docs), "removed": removed})
+        logger.info("[KB] ingest_paths → updated=%s removed=%s", len(docs), removed)
+        return _done(True, updated=len(docs), removed=removed)
+    except Exception as e:
+        logger.exception("[KB] ingest_paths failed")
+        log_event("kb_index_incremental_fail", {"error": str(e)})
+        return _done(False, error=str(e))
+
+
+# ╔══════════════════════════════════════════════════════════════════════════╗
+# ║ Shared mmap snapshot (cross-worker)                                      ║
+# ╚══════════════════════════════════════════════════════════════════════════╝
+
+SHARED_DIR = INDEX_DIR / "shared"
+SHARED_ENABLED = os.getenv("KB_SHARED", "1").lower() not in ("0", "false", "no")
+
+
+def _publish_shared(index: Any) -> None:
+    """Publish the just-persisted index as a new shared generation (best-effort)."""
+    if not SHARED_ENABLED:
+        return
+    try:
+        from services import kb_shared
+        kb_shared.publish(
+            SHARED_DIR,
+            kb_shared.export_rows(index),
+            model=MODEL_NAME,
+            keep=int(os.getenv("KB_SHARED_KEEP", "2")),
+            extra={"store_sig": _store_signature()},
+        )
+    except Exception as e:
+        logger.warning("[KB] shared snapshot publish failed: %s", e)
+        log_event("kb_shared_publish_fail", {"error": str(e)})
+
+
+def _shared_snapshot():
+    if not SHARED_ENABLED:
+        return None
+    try:
+        from services.kb_shared import get_shared
+        return get_shared(SHARED_DIR).current()
+    except Exception:
+        return None
+
+
+def _shared_generation() -> Optional[int]:
+    snap = _shared_snapshot()
+    return snap.gen if snap is not None else None
+
+
+# JSON store files written by StorageContext.persist()
+_STORE_FILES = ("docstore.json", "index_store.json", "default__vector_store.json")
+
+
+def _store_signature() -> List[int]:
+    """mtime_ns of the persisted JSON store files (0 when absent)."""
+    sig = []
+    for name in _STORE_FILES:
+        try:
+            sig.append((INDEX_DIR / name).stat().st_mtime_ns)
+        except OSError:
+            sig.append(0)
+    return sig
+
+
+def _fresh_snapshot(*, log: bool = False):
+    """The current snapshot if it matches MODEL_NAME and the JSON store, else None."""
+    snap = _shared_snapshot()
+    if snap is None or not snap.n:
+        return None
+    head = snap.header
+    if head.get("model") != MODEL_NAME or head.get("store_sig") != _store_signature():
+        # JSON store was rewritten without a publish (or by another model)
+        if log:
+            logger.info("[KB] snapshot gen=%s is stale; loading JSON store", snap.gen)
+        return None
+    return snap
+
+
+def _snapshot_index():
+    """SnapshotIndex over the current snapshot, or None if missing/stale."""
+    snap = _fresh_snapshot(log=True)
+    if snap is None:
+        return None
+    from services.kb_shared import SnapshotIndex
+    return SnapshotIndex(snap, _query_embedding)
+
+
+def _load_storage_index():
+    """Full (mutable) LlamaIndex load from the JSON store; bypasses the cache."""
+    from llama_index.core import StorageContext, load_index_from_storage  # lazy
+    ctx = StorageContext.from_defaults(persist_dir=str(INDEX_DIR))
+    return load_index_from_storage(ctx, embed_model=_resolve_embed_model())
+
+
+_QUERY_EMBED_MODEL = None
+
+
+def _query_embedding(query: str) -> List[float]:
+    global _QUERY_EMBED_MODEL
+    if _QUERY_EMBED_MODEL is None:
+        _QUERY_EMBED_MODEL = _resolve_embed_model()
+    return list(_QUERY_EMBED_MODEL.get_query_embedding(query))
+
+
 # ╔══════════════════════════════════════════════════════════════════════════╗
 # ║ Health & Load                                                            ║
 # ╚══════════════════════════════════════════════════════════════════════════╝
@@ -507,6 +729,7 @@ def index_is_valid() -> bool:
 # Module-level cache for the loaded index
 _CACHED_INDEX = None
 _CACHE_LOADED_AT = None
+_CACHED_GEN = None  # shared snapshot generation the cached index was loaded at
 
 def clear_index_cache():
     """Clear the cached index. Call this after rebuilding the index."""
@@ -520,12 +743,29 @@ def get_index():
     Load (or rebuild once) and return a VectorStoreIndex.
     Never leaves the index unusable; performs one rebuild attempt on errors.
     Uses module-level cache to avoid reloading on every request.
+
+    When a current binary snapshot exists this returns a read-only
+    kb_shared.SnapshotIndex (retriever / query-engine / docstore subset);
+    code that mutates the index uses _load_storage_index() instead.
     """
-    global _CACHED_INDEX, _CACHE_LOADED_AT
+    global _CACHED_INDEX, _CACHE_LOADED_AT, _CACHED_GEN
 
-    # Return cached index if available
+    # Return cached index if available (and no other worker published since)
+    gen = _shared_generation()
+    if _CACHED_INDEX is not None and gen != _CACHED_GEN:
+        logger.info("[KB] shared generation %s → %s; dropping cached index", _CACHED_GEN, gen)
+        clear_index_cache()
     if _CACHED_INDEX is not None:
         return _CACHED_INDEX
+    _CACHED_GEN = gen
+
+    # Fast path: the binary snapshot (no JSON parsing, nodes built on demand)
+    snap_index = _snapshot_index()
+    if snap_index is not None:
+        _CACHED_INDEX = snap_index
+        _CACHE_LOADED_AT = time.time()
+        logger.info("[KB] Index loaded from snapshot gen=%s nodes=%s", snap_index.gen, snap_index.snapshot.n)
+        return snap_index
 
     from llama_index.core import StorageContext, load_index_from_storage  # lazy
     EMBED_MODEL = _resolve_embed_model()
@@ -622,7 +862,49 @@ def simple_search(
     """
     Quick similarity search with normalized rows:
       {title, path, tier, snippet, similarity, meta}
+
+    Served from the shared mmap snapshot when one is published and current
+    (same staleness check as get_index: model + JSON store signature);
+    otherwise via the LlamaIndex query engine.
     """
+    thr_env = os.getenv("SEMANTIC_SCORE_THRESHOLD")
+    thr = score_threshold if score_threshold is not None else (float(thr_env) if thr_env not in (None, "") else None)
+
+    def _row(text: str, meta: Dict[str, Any], score: Optional[float]) -> Optional[Dict[str, Any]]:
+        path = meta.get("file_path") or meta.get("path") or meta.get("source") or ""
+        tier = meta.get("tier")
+        title = meta.get("title") or (os.path.basename(str(path)) if path else "Untitled")
+        if thr is not None and (score is not None):
+            try:
+                if float(score) < float(thr):
+                    return None
+            except Exception:
+                pass
+        return {
+            "title": str(title),
+            "path": str(path),
+            "tier": (str(tier).lower() if tier else None),
+            "snippet": str(text)[:1500],
+            "similarity": float(score) if score is not None else None,
+            "meta": meta,
+        }
+
+    rows: List[Dict[str, Any]] = []
+    snap = _fresh_snapshot()
+    if snap is not None:
+        try:
+            qvec = _query_embedding(query)
+            if len(qvec) == snap.dim:  # defensive; the model check above covers this
+                for score, i in snap.search(qvec, top_k):
+                    rec = snap.record(i)
+                    row = _row(rec.get("text") or "", rec.get("metadata") or {}, score)
+                    if row is not None:
+                        rows.append(row)
+                return rows[: int(top_k or 5)]
+        except Exception as e:
+            logger.warning("[KB] shared snapshot search failed (%s); using index", e)
+            rows = []
+
     index = get_index()
     if index is None:
         return []
@@ -630,36 +912,15 @@ def simple_search(
         engine = index.as_query_engine(similarity_top_k=top_k)
         res = engine.query(query)
 
-        rows: List[Dict[str, Any]] = []
         for sn in getattr(res, "source_nodes", []) or []:
             try:
                 score = getattr(sn, "score", None)
                 node = getattr(sn, "node", sn)
                 text = getattr(node, "text", "") or (getattr(node, "get_text", lambda: "")() or "")
                 meta = getattr(node, "metadata", {}) or {}
-                path = meta.get("file_path") or meta.get("path") or meta.get("source") or ""
-                tier = meta.get("tier")
-                title = meta.get("title") or (os.path.basename(str(path)) if path else "Untitled")
-
-                thr_env = os.getenv("SEMANTIC_SCORE_THRESHOLD")
-                thr = score_threshold if score_threshold is not None else (float(thr_env) if thr_env not in (None, "") else None)
-                if thr is not None and (score is not None):
-                    try:
-                        if float(score) < float(thr):
-                            continue
-                    except Exception:
-                        pass
-
-                rows.append(
-                    {
-                        "title": str(title),
-                        "path": str(path),
-                        "tier": (str(tier).lower() if tier else None),
-                        "snippet": str(text)[:1500],
-                        "similarity": float(score) if score is not None else None,
-                        "meta": meta,
-                    }
-                )
+                row = _row(text, meta, score)
+                if row is not None:
+                    rows.append(row)
             except Exception:
                 continue
 
@@ -0,0 +1,458 @@
+# ─────────────────────────────────────────────────────────────────────────────
+# File: kb_shared.py
+# Directory: services
+# Purpose: Read-only, memory-mapped KB snapshot shared by every worker through
+#          the page cache, with generation-file invalidation across processes.
+#
+# Upstream:
+#   - ENV: KB_SHARED_CHECK_S (default 2); KB_SHARED / KB_SHARED_KEEP are
+#          read by services.kb
+#   - Imports: fcntl (optional), json, mmap, numpy (optional), struct
+#
+# Downstream:
+#   - services.kb (publish after embed_all / ingest_paths; simple_search;
+#     get_index cross-worker invalidation)
+#
+# Contents:
+#   - publish()
+#   - export_rows()
+#   - MappedSnapshot (search / record / node_id / text / metadata / close)
+#   - SnapshotIndex (retrieve / as_retriever / as_query_engine / node)
+#   - SharedIndex (current / generation)
+#   - get_shared()
+#
+# Layout (under <INDEX_DIR>/shared/):
+#   kb-<gen>.snap   JSON header, then 64-byte aligned sections:
+#                     vectors       n × dim float32, L2-normalised, row-major
+#                     meta_idx      n uint32 → row of meta_table
+#                     id_offsets    (n+1) uint64 into ids
+#                     text_offsets  (n+1) uint64 into text
+#                     ids, text     UTF-8 blobs
+#                     meta_table    JSON array of the distinct metadata dicts
+#   GENERATION      {"gen", "file", "n", "dim", "ts"}; replaced atomically
+#
+# Notes:
+#   • Snapshots are immutable; publishing writes a new file and then swaps
+#     GENERATION, so readers never see a half-written index. The newest
+#     KB_SHARED_KEEP files are kept so workers still mapping an older one
+#     are unaffected (unlinking a mapped file is safe on POSIX anyway).
+#   • Readers stat GENERATION at most every KB_SHARED_CHECK_S seconds and
+#     remap when it changes, so all workers converge within that window.
+#   • Vectors are viewed in place (numpy.frombuffer over the mmap, or a
+#     memoryview cast without numpy) — one physical copy per host. Node ids,
+#     text and metadata are decoded only for the rows actually returned.
+# ─────────────────────────────────────────────────────────────────────────────
+
+from __future__ import annotations
+
+import heapq
+import json
+import logging
+import math
+import mmap
+import os
+import struct
+import threading
+import time
+from collections.abc import Mapping
+from pathlib import Path
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+try:  # POSIX only; publishing without it is still atomic, just not serialized
+    import fcntl  # type: ignore
+except Exception:  # pragma: no cover
+    fcntl = None  # type: ignore
+
+logger = logging.getLogger("services.kb_shared")
+
+MAGIC = b"RKBSNAP1"
+VERSION = 2
+_PREFIX = struct.Struct("<8sII")  # magic, version, header_json_len
+_ALIGN = 64
+GENERATION_FILE = "GENERATION"
+
+Row = Tuple[str, str, List[float], Dict[str, Any]]  # (node_id, text, embedding, metadata)
+
+
+def _align(n: int) -> int:
+    return (n + _ALIGN - 1) // _ALIGN * _ALIGN
+
+
+def _normalise(vec: Sequence[float]) -> List[float]:
+    norm = math.sqrt(sum(x * x for x in vec)) or 1.0
+    return [x / norm for x in vec]
+
+
+# ── Writing ──────────────────────────────────────────────────────────────────
+
+def _read_generation(root: Path) -> Dict[str, Any]:
+    try:
+        return json.loads((root / GENERATION_FILE).read_text(encoding="utf-8"))
+    except (FileNotFoundError, ValueError):
+        return {}
+
+
+def _offsets_and_blob(items: List[bytes]) -> Tuple[bytes, bytes]:
+    offsets = [0]
+    for b in items:
+        offsets.append(offsets[-1] + len(b))
+    return struct.pack(f"<{len(offsets)}Q", *offsets), b"".join(items)
+
+
+def _write_snapshot(path: Path, rows: List[Row], dim: int, meta: Dict[str, Any]) -> None:
+    n = len(rows)
+    # Chunks of one file share their metadata dict: store each distinct one once.
+    table: List[str] = []
+    interned: Dict[str, int] = {}
+    meta_idx: List[int] = []
+    for _nid, _text, _vec, md in rows:
+        key = json.dumps(md, ensure_ascii=False, sort_keys=True, default=str)
+        if key not in interned:
+            interned[key] = len(table)
+            table.append(key)
+        meta_idx.append(interned[key])
+
+    packer = struct.Struct(f"<{dim}f")
+    vec_parts = []
+    for _nid, _text, vec, _md in rows:
+        if len(vec) != dim:
+            raise ValueError(f"embedding dim {len(vec)} != {dim}")
+        vec_parts.append(packer.pack(*_normalise(vec)))
+    id_offs, id_blob = _offsets_and_blob([r[0].encode("utf-8") for r in rows])
+    text_offs, text_blob = _offsets_and_blob([r[1].encode("utf-8") for r in rows])
+    sections = [
+        ("vectors", b"".join(vec_parts)),
+        ("meta_idx", struct.pack(f"<{n}I", *meta_idx)),
+        ("id_offsets", id_offs),
+        ("text_offsets", text_offs),
+        ("ids", id_blob),
+        ("text", text_blob),
+        ("meta_table", ("[" + ",".join(table) + "]").encode("utf-8")),
+    ]
+
+    header = dict(meta, n=n, dim=dim, metas=len(table))
+    # Section offsets depend on the header length; fix them up in a second pass.
+    for _ in range(2):
+        head = json.dumps(header, separators=(",", ":")).encode("utf-8")
+        pos = _PREFIX.size + len(head)
+        for name, data in sections:
+            pos = _align(pos)
+            header[name] = [pos, len(data)]
+            pos += len(data)
+    head = json.dumps(header, separators=(",", ":")).encode("utf-8")
+
+    tmp = path.with_name(f".{path.name}.{os.getpid()}.tmp")
+    with open(tmp, "wb") as f:
+        f.write(_PREFIX.pack(MAGIC, VERSION, len(head)))
+        f.write(head)
+        for name, data in sections:
+            f.write(b"\0" * (header[name][0] - f.tell()))
+            f.write(data)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, path)
+
+
+def publish(
+    root: Path,
+    rows: Iterable[Row],
+    *,
+    model: Optional[str] = None,
+    keep: int = 2,
+    extra: Optional[Dict[str, Any]] = None,
+) -> Dict[str, Any]:
+    """
+    Write a new snapshot and atomically make it current; returns the new
+    GENERATION record. `extra` is stored in the snapshot header (e.g. the
+    signature of the JSON store it was exported from).
+    """
+    root = Path(root)
+    root.mkdir(parents=True, exist_ok=True)
+    rows = list(rows)
+    dim = len(rows[0][2]) if rows else 0
+    with open(root / ".publish.lock", "a+") as lock:
+        if fcntl is not None:
+            fcntl.flock(lock.fileno(), fcntl.LOCK_EX)
+        gen = int(_read_generation(root).get("gen") or 0) + 1
+        name = f"kb-{gen:08d}.snap"
+        _write_snapshot(root / name, rows, dim, {**(extra or {}), "gen": gen, "model": model, "ts": time.time()})
+        record = {"gen": gen, "file": name, "n": len(rows), "dim": dim, "ts": time.time()}
+        tmp = root / f".{GENERATION_FILE}.tmp"
+        tmp.write_text(json.dumps(record), encoding="utf-8")
+        os.replace(tmp, root / GENERATION_FILE)
+        for old in sorted(root.glob("kb-*.snap"))[: -max(1, keep)]:
+            old.unlink(missing_ok=True)
+    logger.info("[KB] shared snapshot published gen=%s nodes=%s dim=%s", gen, len(rows), dim)
+    return record
+
+
+def export_rows(index: Any) -> List[Row]:
+    """(node_id, text, embedding, metadata) for every embedded node of a LlamaIndex VectorStoreIndex."""
+    embeddings = index.vector_store.data.embedding_dict  # SimpleVectorStore
+    docstore = index.storage_context.docstore
+    rows: List[Row] = []
+    for node_id, vec in embeddings.items():
+        node = docstore.get_node(node_id, raise_error=False)
+        if node is None or not vec:
+            continue
+        text = node.get_content() if hasattr(node, "get_content") else getattr(node, "text", "")
+        rows.append((node_id, text or "", list(vec), dict(getattr(node, "metadata", {}) or {})))
+    return rows
+
+
+# ── Reading ──────────────────────────────────────────────────────────────────
+
+class MappedSnapshot:
+    """One mapped, immutable snapshot file."""
+
+    def __init__(self, path: Path) -> None:
+        self.path = Path(path)
+        with open(self.path, "rb") as f:
+            self._mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, hlen = _PREFIX.unpack_from(self._mm, 0)
+        if magic != MAGIC or version != VERSION:
+            self._mm.close()
+            raise ValueError(f"not a v{VERSION} KB snapshot: {self.path}")
+        self.header: Dict[str, Any] = json.loads(self._mm[_PREFIX.size : _PREFIX.size + hlen])
+        self.n = int(self.header["n"])
+        self.dim = int(self.header["dim"])
+        self.gen = self.header.get("gen")
+        self._vectors = self._view_vectors()
+        self._meta_idx = self._section("meta_idx").cast("I")
+        self._id_offs = self._section("id_offsets").cast("Q")
+        self._text_offs = self._section("text_offsets").cast("Q")
+        self._metas: Optional[List[Dict[str, Any]]] = None
+
+    def _section(self, name: str) -> memoryview:
+        start, length = self.header[name]
+        return memoryview(self._mm)[start : start + length]
+
+    @property
+    def metas(self) -> List[Dict[str, Any]]:
+        """The interned metadata table (parsed once, on first use)."""
+        if self._metas is None:
+            self._metas = json.loads(bytes(self._section("meta_table")))
+        return self._metas
+
+    def _view_vectors(self):
+        start, count = self.header["vectors"][0], self.n * self.dim
+        try:
+            import numpy as np  # type: ignore
+
+            return np.frombuffer(self._mm, dtype=np.float32, count=count, offset=start).reshape(self.n, self.dim)
+        except ImportError:
+            return memoryview(self._mm)[start : start + count * 4].cast("f")
+
+    def search(self, query_vec: Sequence[float], k: int = 5) -> List[Tuple[float, int]]:
+        """Top-k (cosine similarity, row) pairs, best first."""
+        if not self.n or len(query_vec) != self.dim:
+            return []
+        q = _normalise(query_vec)
+        k = max(1, min(int(k), self.n))
+        if not isinstance(self._vectors, memoryview):
+            import numpy as np  # type: ignore
+
+            scores = self._vectors @ np.asarray(q, dtype=np.float32)
+            top = np.argpartition(-scores, k - 1)[:k]
+            return sorted(((float(scores[i]), int(i)) for i in top), reverse=True)
+        v, d = self._vectors, self.dim
+        scored = ((sum(q[j] * v[i * d + j] for j in range(d)), i) for i in range(self.n))
+        return heapq.nlargest(k, scored)
+
+    def _blob(self, name: str, offs: memoryview, i: int) -> str:
+        base = self.header[name][0]
+        return self._mm[base + offs[i] : base + offs[i + 1]].decode("utf-8")
+
+    def node_id(self, i: int) -> str:
+        return self._blob("ids", self._id_offs, i)
+
+    def text(self, i: int) -> str:
+        return self._blob("text", self._text_offs, i)
+
+    def metadata(self, i: int) -> Dict[str, Any]:
+        return dict(self.metas[self._meta_idx[i]])
+
+    def record(self, i: int) -> Dict[str, Any]:
+        """Node record {id, text, metadata} for row i, read on demand."""
+        return {"id": self.node_id(i), "text": self.text(i), "metadata": self.metadata(i)}
+
+    def close(self) -> None:
+        try:
+            for view in (self._meta_idx, self._id_offs, self._text_offs):
+                view.release()
+            if isinstance(self._vectors, memoryview):
+                self._vectors.release()
+            self._vectors = None
+            self._mm.close()
+        except (BufferError, ValueError):
+            pass  # a concurrent search still holds a view; GC will unmap
+
+
+class _Retriever:
+    def __init__(self, index: "SnapshotIndex", k: int) -> None:
+        self.index, self.k = index, k
+
+    def retrieve(self, query: Any) -> List[Any]:
+        return self.index.retrieve(getattr(query, "query_str", query), self.k)
+
+
+class _QueryEngine(_Retriever):
+    def query(self, query: Any) -> Any:
+        """Retrieval only: source_nodes are filled, no answer is synthesized."""
+        from types import SimpleNamespace
+
+        return SimpleNamespace(response=None, source_nodes=self.retrieve(query), metadata={})
+
+
+class _LazyNodes(Mapping):
+    def __init__(self, docstore: "_LazyDocstore") -> None:
+        self._ds = docstore
+
+    def __len__(self) -> int:
+        return self._ds._index.snapshot.n
+
+    def __iter__(self) -> Iterator[str]:
+        snap = self._ds._index.snapshot
+        return (snap.node_id(i) for i in range(snap.n))
+
+    def __getitem__(self, node_id: str) -> Any:
+        node = self._ds.get_node(node_id, raise_error=False)
+        if node is None:
+            raise KeyError(node_id)
+        return node
+
+
+class _LazyDocstore:
+    """The slice of a LlamaIndex docstore callers use (docs / get_node)."""
+
+    def __init__(self, index: "SnapshotIndex") -> None:
+        self._index = index
+        self._rows: Optional[Dict[str, int]] = None
+
+    def _row_of(self, node_id: str) -> Optional[int]:
+        if self._rows is None:
+            snap = self._index.snapshot
+            self._rows = {snap.node_id(i): i for i in range(snap.n)}
+        return self._rows.get(node_id)
+
+    @property
+    def docs(self) -> "Mapping[str, Any]":
+        return _LazyNodes(self)
+
+    def get_node(self, node_id: str, raise_error: bool = True) -> Any:
+        i = self._row_of(node_id)
+        if i is None:
+            if raise_error:
+                raise ValueError(f"node {node_id} not found")
+            return None
+        return self._index.node(i)
+
+
+class SnapshotIndex:
+    """
+    Read-only stand-in for a VectorStoreIndex backed by a mapped snapshot.
+    Nodes are materialized (TextNode when llama_index is importable) only
+    when a search returns them or a caller asks for one.
+    """
+
+    def __init__(self, snapshot: MappedSnapshot, embed_query) -> None:
+        from types import SimpleNamespace
+
+        self.snapshot = snapshot
+        self.embed_query = embed_query
+        self._nodes: Dict[int, Any] = {}
+        self.storage_context = SimpleNamespace(docstore=_LazyDocstore(self))
+
+    @property
+    def gen(self) -> Optional[int]:
+        return self.snapshot.gen
+
+    def node(self, i: int) -> Any:
+        node = self._nodes.get(i)
+        if node is None:
+            snap = self.snapshot
+            try:
+                from llama_index.core.schema import TextNode  # type: ignore
+
+                node = TextNode(id_=snap.node_id(i), text=snap.text(i), metadata=snap.metadata(i))
+            except ImportError:
+                from types import SimpleNamespace
+
+                node = SimpleNamespace(id_=snap.node_id(i), node_id=snap.node_id(i), text=snap.text(i),
+                                       metadata=snap.metadata(i))
+            self._nodes[i] = node
+        return node
+
+    def retrieve(self, query: str, k: int = 2) -> List[Any]:
+        hits = self.snapshot.search(self.embed_query(query), k)
+        try:
+            from llama_index.core.schema import NodeWithScore  # type: ignore
+        except ImportError:
+            from types import SimpleNamespace as NodeWithScore  # type: ignore
+        return [NodeWithScore(node=self.node(i), score=score) for score, i in hits]
+
+    def as_retriever(self, similarity_top_k: int = 2, **_kw: Any) -> _Retriever:
+        return _Retriever(self, similarity_top_k)
+
+    def as_query_engine(self, similarity_top_k: int = 2, **_kw: Any) -> _QueryEngine:
+        return _QueryEngine(self, similarity_top_k)
+
+
+class SharedIndex:
+    """Follows GENERATION under root and keeps the current snapshot mapped."""
+
+    def __init__(self, root: Path, *, check_s: float = 2.0) -> None:
+        self.root = Path(root)
+        self.check_s = max(0.0, check_s)
+        self._lock = threading.Lock()
+        self._snap: Optional[MappedSnapshot] = None
+        self._sig: Optional[Tuple[int, int]] = None
+        self._checked = 0.0
+        self.remaps = 0
+
+    def _stat_sig(self) -> Optional[Tuple[int, int]]:
+        try:
+            st = (self.root / GENERATION_FILE).stat()
+        except FileNotFoundError:
+            return None
+        return st.st_mtime_ns, st.st_size
+
+    def current(self) -> Optional[MappedSnapshot]:
+        """The mapped current snapshot (remapped if a new one was published), or None."""
+        now = time.monotonic()
+        if self._snap is not None and now - self._checked < self.check_s:
+            return self._snap
+        with self._lock:
+            self._checked = now
+            sig = self._stat_sig()
+            if sig == self._sig:
+                return self._snap
+            info = _read_generation(self.root)
+            old, self._snap = self._snap, None
+            try:
+                if info.get("file"):
+                    self._snap = MappedSnapshot(self.root / info["file"])
+                    self.remaps += 1
+            except Exception as e:
+                logger.warning("[KB] shared snapshot unavailable (%s); falling back", e)
+            self._sig = sig
+            # The old map is not closed here: a concurrent search may still
+            # be reading it. It is unmapped once the last reference goes.
+            del old
+            return self._snap
+
+    def generation(self) -> Optional[int]:
+        snap = self.current()
+        return snap.gen if snap is not None else None
+
+
+_shared: Dict[Path, SharedIndex] = {}
+_shared_lock = threading.Lock()
+
+
+def get_shared(root: Path) -> SharedIndex:
+    key = Path(root).resolve()
+    with _shared_lock:
+        if key not in _shared:
+            _shared[key] = SharedIndex(key, check_s=float(os.getenv("KB_SHARED_CHECK_S", "2")))
+        return _shared[key]
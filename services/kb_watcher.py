@@ -0,0 +1,394 @@
+# ─────────────────────────────────────────────────────────────────────────────
+# File: kb_watcher.py
+# Directory: services
+# Purpose: Watch the KB tier roots and feed changed files into incremental
+#          ingestion (kb.ingest_paths) instead of full rebuilds.
+#
+# Upstream:
+#   - ENV: KB_WATCH (default 1), KB_WATCH_DEBOUNCE_S (default 2),
+#          KB_WATCH_MAX_BATCH (default 200), KB_WATCH_POLL_S (default 5),
+#          LOCK_DIR (leader lock, via services.jobs)
+#   - Imports: fcntl (optional), os, pathlib, services.jobs, services.kb,
+#              threading, watchfiles (optional)
+#
+# Downstream:
+#   - main (lifespan start / shutdown hook)
+#   - routes.docs (op_status, mark_priority)
+#
+# Contents:
+#   - KBWatcher (notify / flush / start / stop / stats)
+#   - get_watcher()
+#   - shutdown()
+#
+# Notes:
+#   • Every accepted change gets a generation number. Changes are held until
+#     the tree has been quiet for KB_WATCH_DEBOUNCE_S, then applied in batches
+#     of at most KB_WATCH_MAX_BATCH paths; last_applied_generation advances as
+#     batches land, so callers can tell when their edit is searchable. A
+#     failed batch is re-queued (retried with backoff, up to 60 s) and does
+#     not advance it.
+#   • One watcher per host directory: start() takes an flock on
+#     LOCK_DIR/kb_watcher.leader; other workers stay in "standby" and retry
+#     the lock, so a new leader takes over if the old one exits. Applies run
+#     inside the kb_reindex job slot, so they never overlap /docs/refresh_kb.
+#   • Repeated events for one path coalesce into a single re-embed.
+#   • With `watchfiles` installed a daemon thread consumes inotify/FSEvents
+#     changes; otherwise a daemon thread diffs a stat snapshot every
+#     KB_WATCH_POLL_S seconds.
+#   • On start, files modified after the last index build (dim.json ts) are
+#     queued so edits made while the process was down are not missed.
+# ─────────────────────────────────────────────────────────────────────────────
+
+from __future__ import annotations
+
+import logging
+import os
+import threading
+import time
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+try:  # POSIX only; elsewhere every worker watches
+    import fcntl  # type: ignore
+except Exception:  # pragma: no cover
+    fcntl = None  # type: ignore
+
+logger = logging.getLogger("relay.kb_watcher")
+
+MAX_RETRY_S = 60.0
+
+ApplyFn = Callable[[List[str]], Dict[str, Any]]
+Roots = Sequence[Tuple[str, Path]]  # (tier, file-or-directory)
+
+
+def _default_roots() -> List[Tuple[str, Path]]:
+    from services import kb
+
+    return [(spec.name, Path(p).resolve()) for spec in kb._discover_default_tiers() for p in spec.paths]
+
+
+def _default_accept(path: str, tier: str) -> bool:
+    from services import kb
+
+    return kb._should_index_file(path, tier)
+
+
+def _default_apply(paths: List[str]) -> Dict[str, Any]:
+    from services import kb
+    from services.jobs import JobBusy, get_store
+
+    try:
+        with get_store().slot("kb_reindex"):
+            return kb.ingest_paths(paths)
+    except JobBusy as e:
+        return {"ok": False, "error": f"busy: {e}"}
+
+
+class KBWatcher:
+    def __init__(
+        self,
+        roots: Optional[Roots] = None,
+        *,
+        apply: ApplyFn = _default_apply,
+        accept: Callable[[str, str], bool] = _default_accept,
+        debounce_s: float = 2.0,
+        max_batch: int = 200,
+        poll_s: float = 5.0,
+        leader_lock: Optional[Path] = None,
+    ) -> None:
+        self._roots = [(t, Path(p).resolve()) for t, p in roots] if roots is not None else None
+        self.apply = apply
+        self.accept = accept
+        self.debounce_s = max(0.0, debounce_s)
+        self.max_batch = max(1, max_batch)
+        self.poll_s = max(0.1, poll_s)
+        self._cond = threading.Condition()
+        self._pending: Dict[str, int] = {}  # path -> generation of its latest change
+        self._last_event = 0.0
+        self._applying = False
+        self.generation = 0
+        self.last_applied_generation = 0
+        self.last_batch: Optional[Dict[str, Any]] = None
+        self.last_error: Optional[str] = None
+        self.counters = {"events": 0, "ignored": 0, "coalesced": 0, "batches": 0, "applied_paths": 0, "errors": 0}
+        self.mode = "idle"
+        self.leader_lock = Path(leader_lock) if leader_lock else None
+        self._leader_fh: Any = None
+        self._failures = 0
+        self._retry_at = 0.0
+        self._stop = threading.Event()
+        self._threads: List[threading.Thread] = []
+
+    @property
+    def roots(self) -> List[Tuple[str, Path]]:
+        if self._roots is None:
+            self._roots = _default_roots()
+        return self._roots
+
+    # ── Intake ───────────────────────────────────────────────────────────────
+    def tier_for(self, path: Path) -> Optional[str]:
+        for tier, root in self.roots:
+            if path == root or root in path.parents:
+                return tier
+        return None
+
+    def notify(self, paths: Iterable[str | Path]) -> int:
+        """Queue changed paths (created, modified or deleted); returns the current generation."""
+        with self._cond:
+            for raw in paths:
+                p = Path(raw).resolve()
+                tier = self.tier_for(p)
+                self.counters["events"] += 1
+                if tier is None or not self.accept(str(p), tier):
+                    self.counters["ignored"] += 1
+                    continue
+                key = str(p)
+                if key in self._pending:
+                    self.counters["coalesced"] += 1
+                self.generation += 1
+                self._pending[key] = self.generation
+                self._last_event = time.monotonic()
+            self._cond.notify_all()
+            return self.generation
+
+    # ── Apply ────────────────────────────────────────────────────────────────
+    def _take_batch(self) -> Dict[str, int]:
+        batch = sorted(self._pending, key=self._pending.__getitem__)[: self.max_batch]
+        return {p: self._pending.pop(p) for p in batch}
+
+    def _apply_batch(self, gens: Dict[str, int]) -> bool:
+        batch = list(gens)
+        t0 = time.perf_counter()
+        try:
+            result = self.apply(batch)
+            ok = bool(result.get("ok", True)) if isinstance(result, dict) else True
+            self.last_error = None if ok else str((result or {}).get("error"))
+        except Exception as e:  # keep the worker alive
+            result, ok = {"ok": False, "error": str(e)}, False
+            self.last_error = str(e)
+        with self._cond:
+            self._applying = False
+            self.counters["batches"] += 1
+            if ok:
+                self.counters["applied_paths"] += len(batch)
+                self._failures = 0
+                self._retry_at = 0.0
+            else:
+                self.counters["errors"] += 1
+                logger.warning("kb incremental apply failed for %d paths: %s", len(batch), self.last_error)
+                for p, gen in gens.items():
+                    self._pending.setdefault(p, gen)  # newer events for p keep their generation
+                self._failures += 1
+                self._retry_at = time.monotonic() + min(MAX_RETRY_S, 2.0 ** self._failures)
+            self.last_applied_generation = (
+                min(self._pending.values()) - 1 if self._pending else self.generation
+            )
+            self.last_batch = {
+                "generation": self.last_applied_generation,
+                "paths": len(batch),
+                "ok": ok,
+                "took_ms": int((time.perf_counter() - t0) * 1000),
+                "at": time.time(),
+                "result": result,
+            }
+            self._cond.notify_all()
+        return ok
+
+    def flush(self) -> int:
+        """Apply everything pending now, ignoring the debounce; returns batches applied.
+
+        Stops at the first failed batch (its paths stay pending).
+        """
+        n = 0
+        while True:
+            with self._cond:
+                while self._applying:
+                    self._cond.wait()
+                if not self._pending:
+                    return n
+                batch = self._take_batch()
+                self._applying = True
+            if not self._apply_batch(batch):
+                return n
+            n += 1
+
+    def _worker(self) -> None:
+        while not self._stop.is_set():
+            with self._cond:
+                if not self._pending or self._applying:
+                    self._cond.wait(1.0)
+                    continue
+                quiet = max(self._last_event + self.debounce_s, self._retry_at) - time.monotonic()
+                if quiet > 0:
+                    self._cond.wait(quiet)
+                    continue
+                batch = self._take_batch()
+                self._applying = True
+            self._apply_batch(batch)
+
+    # ── Sources ──────────────────────────────────────────────────────────────
+    def _snapshot(self) -> Dict[str, Tuple[int, int]]:
+        snap: Dict[str, Tuple[int, int]] = {}
+        for tier, root in self.roots:
+            files: Iterable[Path]
+            if root.is_dir():
+                files = (Path(d) / n for d, _dirs, names in os.walk(root) for n in names)
+            else:
+                files = [root]
+            for f in files:
+                key = str(f)
+                if not self.accept(key, tier):
+                    continue
+                try:
+                    st = f.stat()
+                except OSError:
+                    continue
+                snap[key] = (st.st_mtime_ns, st.st_size)
+        return snap
+
+    def _poll_loop(self) -> None:
+        prev = self._snapshot()
+        while not self._stop.wait(self.poll_s):
+            try:
+                cur = self._snapshot()
+            except Exception as e:
+                logger.warning("kb watcher poll failed: %s", e)
+                continue
+            changed = [p for p, sig in cur.items() if prev.get(p) != sig]
+            changed += [p for p in prev if p not in cur]
+            if changed:
+                self.notify(changed)
+            prev = cur
+
+    def _watch_loop(self) -> None:
+        import watchfiles  # type: ignore
+
+        targets = [str(root) for _tier, root in self.roots if root.exists()]
+        if not targets:
+            self.mode = "poll"
+            return self._poll_loop()
+        try:
+            for changes in watchfiles.watch(*targets, stop_event=self._stop, debounce=200):
+                self.notify(p for _change, p in changes)
+        except Exception as e:
+            logger.warning("kb watcher failed (%s); falling back to polling", e)
+            self.mode = "poll"
+            self._poll_loop()
+
+    def _catch_up(self) -> None:
+        """Queue files edited since the last index build (path-keyed indexes only)."""
+        from services import kb
+
+        meta = kb._read_dim_meta() or {}
+        built = meta.get("ts")
+        if meta.get("id_scheme") != kb.ID_SCHEME or not isinstance(built, (int, float)):
+            return
+        stale = [p for p, (mtime_ns, _size) in self._snapshot().items() if mtime_ns / 1e9 > built]
+        if stale:
+            logger.info("kb watcher: %d files changed since last build", len(stale))
+            self.notify(stale)
+
+    # ── Lifecycle ────────────────────────────────────────────────────────────
+    def _try_lead(self) -> bool:
+        """Take the leader flock (always true without a lock path or fcntl)."""
+        if self.leader_lock is None or fcntl is None or self._leader_fh is not None:
+            return True
+        self.leader_lock.parent.mkdir(parents=True, exist_ok=True)
+        fh = open(self.leader_lock, "a+")
+        try:
+            fcntl.flock(fh.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            fh.close()
+            return False
+        self._leader_fh = fh
+        return True
+
+    def _standby(self, catch_up: bool) -> None:
+        while not self._stop.wait(self.poll_s):
+            if self._try_lead():
+                self._run(catch_up)
+                return
+
+    def start(self, *, catch_up: bool = True) -> None:
+        if any(t.is_alive() for t in self._threads):
+            return
+        self._stop.clear()
+        if not self._try_lead():
+            self.mode = "standby"  # another worker watches; take over if it exits
+            self._threads = [threading.Thread(target=self._standby, args=(catch_up,), name="kb-watcher:standby", daemon=True)]
+            self._threads[0].start()
+            return
+        self._run(catch_up)
+
+    def _run(self, catch_up: bool) -> None:
+        if catch_up:
+            try:
+                self._catch_up()
+            except Exception as e:
+                logger.warning("kb watcher catch-up skipped: %s", e)
+        try:
+            import watchfiles  # type: ignore  # noqa: F401
+            source, self.mode = self._watch_loop, "watchfiles"
+        except Exception:
+            source, self.mode = self._poll_loop, "poll"
+        threads = [
+            threading.Thread(target=source, name="kb-watcher:source", daemon=True),
+            threading.Thread(target=self._worker, name="kb-watcher:apply", daemon=True),
+        ]
+        self._threads = self._threads + threads
+        for t in threads:
+            t.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        with self._cond:
+            self._cond.notify_all()
+        self.mode = "stopped" if self._threads else self.mode
+        if self._leader_fh is not None:
+            self._leader_fh.close()  # releases the flock
+            self._leader_fh = None
+
+    def stats(self) -> Dict[str, Any]:
+        with self._cond:
+            pending = sorted(self._pending, key=self._pending.__getitem__)
+            return {
+                "mode": self.mode,
+                "pending": len(pending),
+                "pending_paths": pending[:20],
+                "applying": self._applying,
+                "generation": self.generation,
+                "last_applied_generation": self.last_applied_generation,
+                "last_batch": self.last_batch,
+                "last_error": self.last_error,
+                "leader": self._leader_fh is not None or self.leader_lock is None,
+                "debounce_s": self.debounce_s,
+                "max_batch": self.max_batch,
+                **self.counters,
+            }
+
+
+_watcher: Optional[KBWatcher] = None
+_watcher_lock = threading.Lock()
+
+
+def get_watcher() -> KBWatcher:
+    """Process-wide watcher over kb._discover_default_tiers() (not started)."""
+    global _watcher
+    if _watcher is None:
+        with _watcher_lock:
+            if _watcher is None:
+                from services.jobs import get_store
+
+                _watcher = KBWatcher(
+                    debounce_s=float(os.getenv("KB_WATCH_DEBOUNCE_S", "2")),
+                    max_batch=int(os.getenv("KB_WATCH_MAX_BATCH", "200")),
+                    poll_s=float(os.getenv("KB_WATCH_POLL_S", "5")),
+                    leader_lock=get_store().lock_dir / "kb_watcher.leader",
+                )
+    return _watcher
+
+
+async def shutdown() -> None:
+    """Lifespan hook: stop the source and apply threads (pending changes are re-found on next start)."""
+    if _watcher is not None:
+        _watcher.stop()
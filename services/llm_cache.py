@@ -0,0 +1,295 @@
+# ─────────────────────────────────────────────────────────────────────────────
+# File: llm_cache.py
+# Directory: services
+# Purpose: Content-addressed cache for deterministic LLM completions:
+#          in-process LRU in front of a persistent SQLite tier, per-caller TTLs,
+#          hit-rate and saved-token accounting.
+#
+# Upstream:
+#   - ENV: LLM_CACHE (default 1), LLM_CACHE_PATH (default
+#          data/llm_cache.sqlite3), LLM_CACHE_MAX (LRU entries, default 1024),
+#          LLM_CACHE_TTL_S (default 3600), LLM_CACHE_TTLS ("caller=seconds,...")
+#   - Imports: asyncio, collections, hashlib, json, sqlite3, threading
+#
+# Downstream:
+#   - services.openai_client (chat_complete / chat_create / sync_chat_create
+#     when called with cache="<caller>")
+#
+# Contents:
+#   - cache_key(...)
+#   - CompletionCache (get / put / aget / aput / stats / clear)
+#   - get_cache()
+#
+# Notes:
+#   • The key hashes (model, system, user/messages, temperature, tool schema);
+#     callers decide eligibility (temperature 0, or explicit opt-in).
+#   • SQLite rows are shared across workers on the same volume. Any DB error
+#     degrades to LRU-only — the cache must never fail a completion.
+#   • Async callers use aget/aput, which run SQLite I/O on a worker thread;
+#     memory hits stay on the loop. _lock only guards the LRU and stats; the
+#     connection has its own _db_lock, so a slow disk never blocks the loop. Expired rows are swept at most once per
+#     SWEEP_INTERVAL_S (single expired rows are dropped when read).
+# ─────────────────────────────────────────────────────────────────────────────
+
+from __future__ import annotations
+
+import asyncio
+import collections
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Any, Dict, Optional, Tuple
+
+log = logging.getLogger("relay.llm_cache")
+
+SWEEP_INTERVAL_S = 300.0
+
+DEFAULT_TTLS = {
+    "docs_summary": 24 * 3600,
+    "codex_patch": 3600,
+    "context_summary": 6 * 3600,
+    "memory_summary": 7 * 24 * 3600,
+}
+
+
+def cache_key(
+    *,
+    model: str,
+    system: Optional[str] = None,
+    user: Any = None,
+    temperature: Optional[float] = None,
+    tools: Any = None,
+) -> str:
+    """sha256 over a canonical JSON of everything that shapes the completion."""
+    blob = json.dumps(
+        {"m": model, "s": system, "u": user, "t": temperature, "tools": tools},
+        sort_keys=True,
+        separators=(",", ":"),
+        default=str,
+    )
+    return hashlib.sha256(blob.encode("utf-8")).hexdigest()
+
+
+def _parse_ttls(raw: Optional[str]) -> Dict[str, float]:
+    out: Dict[str, float] = {}
+    for part in (raw or "").split(","):
+        name, _, val = part.partition("=")
+        try:
+            if name.strip():
+                out[name.strip()] = float(val)
+        except ValueError:
+            continue
+    return out
+
+
+class CompletionCache:
+    def __init__(
+        self,
+        path: Optional[str | Path],
+        *,
+        max_entries: int = 1024,
+        default_ttl_s: float = 3600.0,
+        ttls: Optional[Dict[str, float]] = None,
+    ) -> None:
+        self.path = Path(path) if path else None
+        self.max_entries = max(1, int(max_entries))
+        self.default_ttl_s = float(default_ttl_s)
+        self.ttls = {**DEFAULT_TTLS, **(ttls or {})}
+        self._lru: "collections.OrderedDict[str, Tuple[float, Any, int]]" = collections.OrderedDict()
+        self._lock = threading.Lock()
+        self._db_lock = threading.Lock()
+        self._conn: Optional[sqlite3.Connection] = None
+        self._db_failed = False
+        self._last_sweep = 0.0
+        self._stats: Dict[str, Dict[str, int]] = {}
+
+    def ttl_for(self, caller: str) -> float:
+        return float(self.ttls.get(caller, self.default_ttl_s))
+
+    # ── public API ──────────────────────────────────────────────────────────
+
+    def get(self, key: str, *, caller: str = "default") -> Optional[Any]:
+        now = time.time()
+        with self._lock:
+            hit = self._lru.get(key)
+            if hit is not None and hit[0] < now:
+                self._lru.pop(key, None)
+                hit = None
+            if hit is not None:
+                self._lru.move_to_end(key)
+                return self._count_hit(caller, hit, "memory")
+        with self._db_lock:
+            hit = self._db_get(key, now)
+        with self._lock:
+            if hit is None:
+                self._caller(caller)["misses"] += 1
+                return None
+            self._remember(key, hit)
+            return self._count_hit(caller, hit, "sqlite")
+
+    def put(self, key: str, value: Any, *, caller: str = "default", tokens: Optional[int] = None,
+            ttl_s: Optional[float] = None) -> None:
+        expires = time.time() + (self.ttl_for(caller) if ttl_s is None else float(ttl_s))
+        entry = (expires, value, int(tokens or 0))
+        with self._lock:
+            self._caller(caller)["stores"] += 1
+            self._remember(key, entry)
+        with self._db_lock:
+            self._db_put(key, caller, entry)
+
+    async def aget(self, key: str, *, caller: str = "default") -> Optional[Any]:
+        """get() for the event loop: SQLite lookups run on a worker thread."""
+        with self._lock:
+            hit = self._lru.get(key)
+            in_memory = hit is not None and hit[0] >= time.time()
+        if in_memory or self.path is None or self._db_failed:
+            return self.get(key, caller=caller)
+        return await asyncio.to_thread(self.get, key, caller=caller)
+
+    async def aput(self, key: str, value: Any, *, caller: str = "default", tokens: Optional[int] = None,
+                   ttl_s: Optional[float] = None) -> None:
+        """put() for the event loop: the SQLite write runs on a worker thread."""
+        if self.path is None or self._db_failed:
+            self.put(key, value, caller=caller, tokens=tokens, ttl_s=ttl_s)
+            return
+        await asyncio.to_thread(self.put, key, value, caller=caller, tokens=tokens, ttl_s=ttl_s)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._lru.clear()
+        with self._db_lock:
+            db = self._db()
+            if db is not None:
+                try:
+                    db.execute("DELETE FROM completions")
+                    db.commit()
+                except sqlite3.Error as e:
+                    log.warning("llm cache clear failed: %s", e)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            callers = {}
+            for name, st in self._stats.items():
+                lookups = st["hits"] + st["misses"]
+                callers[name] = {**st, "hit_rate": round(st["hits"] / lookups, 3) if lookups else 0.0}
+            hits = sum(s["hits"] for s in self._stats.values())
+            lookups = hits + sum(s["misses"] for s in self._stats.values())
+            return {
+                "entries_memory": len(self._lru),
+                "max_entries": self.max_entries,
+                "sqlite": (str(self.path) if self.path and not self._db_failed else None),
+                "hit_rate": round(hits / lookups, 3) if lookups else 0.0,
+                "saved_tokens": sum(s["saved_tokens"] for s in self._stats.values()),
+                "callers": callers,
+            }
+
+    # ── internals (_lock held for LRU/stats, _db_lock for SQLite) ───────────
+
+    def _count_hit(self, caller: str, hit: Tuple[float, Any, int], tier: str) -> Any:
+        st = self._caller(caller)
+        st["hits"] += 1
+        st[f"hits_{tier}"] += 1
+        st["saved_tokens"] += int(hit[2] or 0)
+        return hit[1]
+
+    def _caller(self, caller: str) -> Dict[str, int]:
+        st = self._stats.get(caller)
+        if st is None:
+            st = self._stats[caller] = {
+                "hits": 0, "hits_memory": 0, "hits_sqlite": 0, "misses": 0, "stores": 0, "saved_tokens": 0,
+            }
+        return st
+
+    def _remember(self, key: str, entry: Tuple[float, Any, int]) -> None:
+        self._lru[key] = entry
+        self._lru.move_to_end(key)
+        while len(self._lru) > self.max_entries:
+            self._lru.popitem(last=False)
+
+    def _db(self) -> Optional[sqlite3.Connection]:
+        if self.path is None or self._db_failed:
+            return None
+        if self._conn is None:
+            try:
+                self.path.parent.mkdir(parents=True, exist_ok=True)
+                conn = sqlite3.connect(str(self.path), timeout=5.0, check_same_thread=False)
+                conn.execute("PRAGMA journal_mode=WAL")
+                conn.execute("PRAGMA synchronous=NORMAL")
+                conn.execute(
+                    "CREATE TABLE IF NOT EXISTS completions ("
+                    " key TEXT PRIMARY KEY,"
+                    " caller TEXT NOT NULL,"
+                    " value TEXT NOT NULL,"
+                    " tokens INTEGER NOT NULL DEFAULT 0,"
+                    " expires_at REAL NOT NULL)"
+                )
+                conn.execute("CREATE INDEX IF NOT EXISTS completions_expires ON completions(expires_at)")
+                conn.commit()
+                self._conn = conn
+            except sqlite3.Error as e:
+                log.warning("llm cache sqlite unavailable (%s); memory tier only", e)
+                self._db_failed = True
+                return None
+        return self._conn
+
+    def _db_get(self, key: str, now: float) -> Optional[Tuple[float, Any, int]]:
+        db = self._db()
+        if db is None:
+            return None
+        try:
+            row = db.execute(
+                "SELECT expires_at, value, tokens FROM completions WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                return None
+            if row[0] < now:
+                db.execute("DELETE FROM completions WHERE key = ?", (key,))
+                db.commit()
+                return None
+            return (float(row[0]), json.loads(row[1]), int(row[2]))
+        except (sqlite3.Error, ValueError) as e:
+            log.warning("llm cache read failed: %s", e)
+            return None
+
+    def _db_put(self, key: str, caller: str, entry: Tuple[float, Any, int]) -> None:
+        db = self._db()
+        if db is None:
+            return
+        try:
+            db.execute(
+                "INSERT OR REPLACE INTO completions(key, caller, value, tokens, expires_at) VALUES (?, ?, ?, ?, ?)",
+                (key, caller, json.dumps(entry[1], default=str), entry[2], entry[0]),
+            )
+            now = time.time()
+            if now - self._last_sweep >= SWEEP_INTERVAL_S:
+                self._last_sweep = now
+                db.execute("DELETE FROM completions WHERE expires_at < ?", (now,))
+            db.commit()
+        except sqlite3.Error as e:
+            log.warning("llm cache write failed: %s", e)
+
+
+_cache: Optional[CompletionCache] = None
+_cache_lock = threading.Lock()
+
+
+def enabled() -> bool:
+    return (os.getenv("LLM_CACHE") or "1").strip().lower() in {"1", "true", "yes"}
+
+
+def get_cache() -> CompletionCache:
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            _cache = CompletionCache(
+                os.getenv("LLM_CACHE_PATH", "data/llm_cache.sqlite3") or None,
+                max_entries=int(os.getenv("LLM_CACHE_MAX", "1024") or 1024),
+                default_ttl_s=float(os.getenv("LLM_CACHE_TTL_S", "3600") or 3600),
+                ttls=_parse_ttls(os.getenv("LLM_CACHE_TTLS")),
+            )
+        return _cache
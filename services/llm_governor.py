@@ -0,0 +1,338 @@
+# ─────────────────────────────────────────────────────────────────────────────
+# File: llm_governor.py
+# Directory: services
+# Purpose: Process-wide admission for LLM calls: a concurrency cap plus a
+#          tokens-per-minute bucket, served in priority order (interactive
+#          before background) and fairly across users, with queue-wait
+#          metrics.
+#
+# Upstream:
+#   - ENV: OPENAI_MAX_CONCURRENCY (default 16), OPENAI_TPM (0 = unlimited),
+#          OPENAI_BACKGROUND_MAX (default half of the concurrency cap),
+#          LLM_USER_WEIGHTS ("key:relay_api_key/alice=2,anon:10.0.0.5=0.5";
+#          names as tagged by services.rate_limit; everyone else 1)
+#   - Imports: asyncio, contextvars, heapq, services.telemetry, threading
+#
+# Downstream:
+#   - services.openai_client (every chat call acquires a lease here)
+#
+# Contents:
+#   - Lease (release(used_tokens))
+#   - Governor (acquire / acquire_sync / stats)
+#   - priority(name) context manager, current_priority()
+#   - user(name) context manager, current_user()
+#   - get_governor()
+#
+# Notes:
+#   • Waiters form one heap ordered by (priority, fair start tag, arrival);
+#     only the head is admitted, so background work never overtakes queued
+#     interactive work.
+#   • Within a priority, users share capacity by start-time fair queuing:
+#     each call is tagged max(virtual clock, the user's last finish tag) and
+#     costs tokens / weight, so a user with 50 queued calls delays a new
+#     user by at most one call. Calls outside a user() context share the
+#     "" flow.
+#     Background leases are additionally capped below the full concurrency
+#     cap, which keeps slots free for /ask.
+#   • State lives behind a threading.Lock so sync (thread) and async callers
+#     share the same budget; async waiters are woken with
+#     call_soon_threadsafe, sync waiters with an Event.
+#   • The bucket is charged an estimate up front and reconciled with the
+#     real usage on release.
+# ─────────────────────────────────────────────────────────────────────────────
+
+from __future__ import annotations
+
+import asyncio
+import contextvars
+import heapq
+import itertools
+import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, List, Optional
+
+try:
+    from services.telemetry import observe
+except Exception:  # pragma: no cover
+    def observe(name: str, value: float, attrs: Optional[dict] = None, unit: str = "ms") -> None:
+        pass
+
+PRIORITIES = {"interactive": 0, "background": 1}
+
+_PRIORITY: contextvars.ContextVar[str] = contextvars.ContextVar("llm_priority", default="interactive")
+
+
+@contextmanager
+def priority(name: str) -> Iterator[None]:
+    """Run the enclosed LLM calls at *name* priority ("interactive" | "background")."""
+    token = _PRIORITY.set(name if name in PRIORITIES else "interactive")
+    try:
+        yield
+    finally:
+        _PRIORITY.reset(token)
+
+
+def current_priority() -> str:
+    return _PRIORITY.get()
+
+
+_USER: contextvars.ContextVar[str] = contextvars.ContextVar("llm_user", default="")
+
+
+@contextmanager
+def user(name: str) -> Iterator[None]:
+    """Attribute the enclosed LLM calls to *name* for per-user fair queuing."""
+    token = _USER.set(name or "")
+    try:
+        yield
+    finally:
+        _USER.reset(token)
+
+
+def current_user() -> str:
+    return _USER.get()
+
+
+def _parse_weights(raw: str) -> Dict[str, float]:
+    out: Dict[str, float] = {}
+    for part in (raw or "").split(","):
+        name, _, weight = part.partition("=")
+        try:
+            if name.strip() and float(weight) > 0:
+                out[name.strip()] = float(weight)
+        except ValueError:
+            continue
+    return out
+
+
+class Lease:
+    def __init__(self, gov: "Governor", prio: str, tokens: int, waited_ms: float) -> None:
+        self.gov = gov
+        self.priority = prio
+        self.tokens = tokens
+        self.waited_ms = waited_ms
+        self._released = False
+
+    def release(self, used_tokens: Optional[int] = None) -> None:
+        if self._released:
+            return
+        self._released = True
+        self.gov._release(self, used_tokens)
+
+
+class _Waiter:
+    __slots__ = ("prio", "tokens", "user", "t0", "loop", "future", "event", "granted")
+
+    def __init__(self, prio: str, tokens: int) -> None:
+        self.prio = prio
+        self.tokens = tokens
+        self.user = current_user()
+        self.t0 = time.perf_counter()
+        self.loop: Optional[asyncio.AbstractEventLoop] = None
+        self.future: Optional[asyncio.Future] = None
+        self.event: Optional[threading.Event] = None
+        self.granted = False
+
+
+class Governor:
+    def __init__(
+        self,
+        *,
+        max_concurrency: int = 16,
+        tpm: int = 0,
+        background_max: Optional[int] = None,
+        weights: Optional[Dict[str, float]] = None,
+    ) -> None:
+        self.max_concurrency = max(1, int(max_concurrency))
+        self.tpm = max(0, int(tpm))
+        self.background_max = max(1, int(background_max or max(1, self.max_concurrency // 2)))
+        self._lock = threading.Lock()
+        self._heap: List[Any] = []
+        self._seq = itertools.count()
+        self._in_flight = {p: 0 for p in PRIORITIES}
+        self._bucket = float(self.tpm)
+        self._refilled_at = time.monotonic()
+        self._timer: Optional[threading.Timer] = None
+        self.weights = dict(weights or {})
+        self._vtime = 0.0
+        self._finish: Dict[str, float] = {}
+        self._waits = {p: {"count": 0, "total_ms": 0.0, "max_ms": 0.0} for p in PRIORITIES}
+        self.counters = {"granted": 0, "released": 0, "cancelled": 0, "tokens_charged": 0}
+
+    # ── acquisition ─────────────────────────────────────────────────────────
+
+    async def acquire(self, *, tokens: int = 0, prio: Optional[str] = None) -> Lease:
+        w = _Waiter(self._prio(prio), self._clamp(tokens))
+        w.loop = asyncio.get_running_loop()
+        w.future = w.loop.create_future()
+        self._enqueue(w)
+        try:
+            await w.future
+        except BaseException:
+            self._abandon(w)
+            raise
+        return self._lease(w)
+
+    def acquire_sync(self, *, tokens: int = 0, prio: Optional[str] = None) -> Lease:
+        w = _Waiter(self._prio(prio), self._clamp(tokens))
+        w.event = threading.Event()
+        self._enqueue(w)
+        w.event.wait()
+        return self._lease(w)
+
+    # ── introspection ───────────────────────────────────────────────────────
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            self._refill()
+            queued = {p: 0 for p in PRIORITIES}
+            users = set()
+            for *_key, w in self._heap:
+                queued[w.prio] += 1
+                users.add(w.user)
+            return {
+                "max_concurrency": self.max_concurrency,
+                "background_max": self.background_max,
+                "tpm": self.tpm,
+                "tokens_available": (int(self._bucket) if self.tpm else None),
+                "in_flight": dict(self._in_flight),
+                "queued": queued,
+                "queued_users": len(users),
+                "queue_wait_ms": {
+                    p: {
+                        "count": s["count"],
+                        "avg": round(s["total_ms"] / s["count"], 1) if s["count"] else 0.0,
+                        "max": round(s["max_ms"], 1),
+                    }
+                    for p, s in self._waits.items()
+                },
+                "counters": dict(self.counters),
+            }
+
+    # ── internals ───────────────────────────────────────────────────────────
+
+    @staticmethod
+    def _prio(prio: Optional[str]) -> str:
+        prio = prio or current_priority()
+        return prio if prio in PRIORITIES else "interactive"
+
+    def _clamp(self, tokens: int) -> int:
+        tokens = max(0, int(tokens or 0))
+        # A single request larger than a minute of budget would never fit.
+        return min(tokens, self.tpm) if self.tpm else tokens
+
+    def _enqueue(self, w: _Waiter) -> None:
+        with self._lock:
+            start = max(self._vtime, self._finish.get(w.user, 0.0))
+            self._finish[w.user] = start + max(1, w.tokens) / self.weights.get(w.user, 1.0)
+            heapq.heappush(self._heap, (PRIORITIES[w.prio], start, next(self._seq), w))
+            self._dispatch()
+
+    def _abandon(self, w: _Waiter) -> None:
+        with self._lock:
+            if w.granted:
+                # Granted but the caller was cancelled before using it.
+                self._in_flight[w.prio] -= 1
+                if self.tpm:
+                    self._bucket = min(float(self.tpm), self._bucket + w.tokens)
+            else:
+                self._heap = [e for e in self._heap if e[3] is not w]
+                heapq.heapify(self._heap)
+            self.counters["cancelled"] += 1
+            self._dispatch()
+
+    def _lease(self, w: _Waiter) -> Lease:
+        waited_ms = (time.perf_counter() - w.t0) * 1000
+        with self._lock:
+            s = self._waits[w.prio]
+            s["count"] += 1
+            s["total_ms"] += waited_ms
+            s["max_ms"] = max(s["max_ms"], waited_ms)
+        observe("relay_llm_queue_wait_ms", waited_ms, {"priority": w.prio})
+        return Lease(self, w.prio, w.tokens, waited_ms)
+
+    def _release(self, lease: Lease, used_tokens: Optional[int]) -> None:
+        with self._lock:
+            self._in_flight[lease.priority] -= 1
+            self.counters["released"] += 1
+            if self.tpm and used_tokens is not None:
+                # Reconcile the estimate with what the call actually cost.
+                self._bucket = min(float(self.tpm), self._bucket + lease.tokens - int(used_tokens))
+            self._dispatch()
+
+    def _refill(self) -> None:
+        if not self.tpm:
+            return
+        now = time.monotonic()
+        self._bucket = min(float(self.tpm), self._bucket + (now - self._refilled_at) * self.tpm / 60.0)
+        self._refilled_at = now
+
+    def _dispatch(self) -> None:
+        """Admit waiters from the head of the heap while capacity allows (lock held)."""
+        self._refill()
+        while self._heap:
+            _rank, start, _seq, w = self._heap[0]
+            if sum(self._in_flight.values()) >= self.max_concurrency:
+                return
+            if w.prio == "background" and self._in_flight["background"] >= self.background_max:
+                return
+            if self.tpm and self._bucket < w.tokens:
+                self._schedule_refill((w.tokens - self._bucket) * 60.0 / self.tpm)
+                return
+            heapq.heappop(self._heap)
+            self._advance(start)
+            if self.tpm:
+                self._bucket -= w.tokens
+            self._in_flight[w.prio] += 1
+            self.counters["granted"] += 1
+            self.counters["tokens_charged"] += w.tokens
+            w.granted = True
+            if w.event is not None:
+                w.event.set()
+            elif w.loop is not None and w.future is not None:
+                w.loop.call_soon_threadsafe(_resolve, w.future)
+
+    def _advance(self, start: float) -> None:
+        """Move the virtual clock to the admitted call's start tag (lock held)."""
+        self._vtime = max(self._vtime, start)
+        if len(self._finish) > 1024:
+            # Users whose last call is behind the clock are indistinguishable from new ones.
+            self._finish = {u: f for u, f in self._finish.items() if f > self._vtime}
+
+    def _schedule_refill(self, delay_s: float) -> None:
+        if self._timer is not None and self._timer.is_alive():
+            return
+        self._timer = threading.Timer(max(0.01, delay_s), self._on_timer)
+        self._timer.daemon = True
+        self._timer.start()
+
+    def _on_timer(self) -> None:
+        with self._lock:
+            self._timer = None
+            self._dispatch()
+
+
+def _resolve(fut: asyncio.Future) -> None:
+    if not fut.done():
+        fut.set_result(None)
+
+
+_governor: Optional[Governor] = None
+_governor_lock = threading.Lock()
+
+
+def get_governor() -> Governor:
+    global _governor
+    with _governor_lock:
+        if _governor is None:
+            conc = int(os.getenv("OPENAI_MAX_CONCURRENCY", "16") or 16)
+            bg = os.getenv("OPENAI_BACKGROUND_MAX")
+            _governor = Governor(
+                max_concurrency=conc,
+                tpm=int(os.getenv("OPENAI_TPM", "0") or 0),
+                background_max=int(bg) if bg else None,
+                weights=_parse_weights(os.getenv("LLM_USER_WEIGHTS", "")),
+            )
+        return _governor
@@ -4,8 +4,9 @@
 # Purpose: # Purpose: Manage logging of application activities and exceptions, and provide access to recent log data.
 #
 # Upstream:
-#   - ENV: —
-#   - Imports: datetime, json, pathlib, requests, traceback
+#   - ENV: LOG_MAX_BYTES, LOG_BACKUPS
+#   - Imports: datetime, json, os, pathlib, re, services.context_refresh, struct, traceback,
+#              utils.locked_append, utils.reverse_read
 #
 # Downstream:
 #   - routes.context
@@ -16,17 +17,68 @@
 #   - log_and_refresh()
 #   - log_entry()
 #   - log_exception()
+#
+# Notes:
+#   • Each write also appends the line's byte offset to a per-level sidecar
+#     (session_log.jsonl.<LEVEL>.idx, int64 records), so "last n ERROR lines"
+#     reads 8·n bytes of index plus n lines instead of the whole log.
+#   • Unfiltered reads scan backwards from EOF in blocks (O(n)).
+#   • The log rotates at LOG_MAX_BYTES into session_log.<k>.jsonl (k=1 newest),
+#     keeping LOG_BACKUPS files; level indexes rotate alongside.
 # ─────────────────────────────────────────────────────────────────────────────
 
 from datetime import datetime
 import json
+import os
 import pathlib
-import requests
+import re
+import struct
 import traceback
 
+from utils.locked_append import open_locked_append
+from utils.reverse_read import reverse_lines
+
 LOG_PATH = pathlib.Path("logs/session_log.jsonl")
 LOG_PATH.parent.mkdir(parents=True, exist_ok=True)
 
+LOG_MAX_BYTES = int(os.getenv("LOG_MAX_BYTES", str(16 * 1024 * 1024)))
+LOG_BACKUPS = int(os.getenv("LOG_BACKUPS", "3"))
+
+_OFF = struct.Struct("<q")
+
+
+def _level_index(path: pathlib.Path, level: str) -> pathlib.Path:
+    safe = re.sub(r"[^A-Za-z0-9_-]", "_", str(level))[:32] or "_"
+    return path.with_name(f"{path.name}.{safe}.idx")
+
+
+def _fully_indexed(path: pathlib.Path) -> pathlib.Path:
+    """Marker (rotates with the .idx files): every line of path is in a level index."""
+    return path.with_name(f"{path.name}.@.idx")
+
+
+def _log_files() -> list:
+    """Current log first, then rotated backups newest → oldest."""
+    files = [LOG_PATH]
+    for k in range(1, LOG_BACKUPS + 1):
+        files.append(LOG_PATH.with_name(f"{LOG_PATH.stem}.{k}{LOG_PATH.suffix}"))
+    return files
+
+
+def _rotate() -> None:
+    files = _log_files()
+    for src, dst in reversed(list(zip(files[:-1], files[1:]))):
+        for idx in src.parent.glob(f"{src.name}.*.idx"):
+            os.replace(idx, dst.with_name(dst.name + idx.name[len(src.name):]))
+        if src.exists():
+            os.replace(src, dst)
+    # Indexes for the dropped oldest file would otherwise linger.
+    oldest = files[-1]
+    if not oldest.exists():
+        for idx in oldest.parent.glob(f"{oldest.name}.*.idx"):
+            idx.unlink()
+
+
 def log_entry(source: str, message: str, level: str = "INFO", extra: dict = None):
     """
     Write a new line to the session log, optionally with level and extra fields.
@@ -39,8 +91,19 @@ def log_entry(source: str, message: str, level: str = "INFO", extra: dict = None
     }
     if extra:
         entry.update(extra)
-    with LOG_PATH.open("a", encoding="utf-8") as f:
-        f.write(json.dumps(entry) + "\n")
+    line = (json.dumps(entry) + "\n").encode("utf-8")
+    # The lock is on the inode at LOG_PATH (re-checked after rotation), so the
+    # line and its level-index offset always land on the same file.
+    with open_locked_append(LOG_PATH) as f:
+        offset = f.seek(0, os.SEEK_END)
+        if offset == 0:
+            _fully_indexed(LOG_PATH).touch()
+        f.write(line)
+        f.flush()
+        with _level_index(LOG_PATH, level).open("ab") as fi:
+            fi.write(_OFF.pack(offset))
+        if LOG_MAX_BYTES > 0 and offset + len(line) >= LOG_MAX_BYTES:
+            _rotate()
 
 def log_exception(source: str, exc: Exception, context: str = ""):
     """
@@ -54,21 +117,87 @@ def log_exception(source: str, exc: Exception, context: str = ""):
         extra={"stack_trace": stack}
     )
 
+def _indexed_offsets(path: pathlib.Path, level: str, want: int) -> list:
+    """Up to `want` newest offsets for level from the sidecar (newest first)."""
+    try:
+        with _level_index(path, level).open("rb") as fi:
+            size = fi.seek(0, os.SEEK_END)
+            size -= size % _OFF.size
+            take = min(want, size // _OFF.size)
+            fi.seek(size - take * _OFF.size)
+            data = fi.read(take * _OFF.size)
+    except FileNotFoundError:
+        return []
+    offs = [_OFF.unpack_from(data, i * _OFF.size)[0] for i in range(take)]
+    return offs[::-1]
+
+
+def _read_at(f, offset: int):
+    f.seek(offset)
+    try:
+        return json.loads(f.readline())
+    except ValueError:
+        return None
+
+
+def _scan_reverse(path: pathlib.Path, want: int, level_filter, end=None) -> list:
+    out = []
+    for raw in reverse_lines(path, end=end):
+        try:
+            log = json.loads(raw)
+        except ValueError:
+            continue
+        if level_filter and log.get("level") != level_filter:
+            continue
+        out.append(log)
+        if len(out) >= want:
+            break
+    return out
+
+
 def get_recent_logs(n=100, level_filter=None):
     """
-    Retrieve the last n log entries, optionally filtering by log level.
+    Retrieve the last n log entries (oldest first), optionally filtering by log level.
+
+    With a level filter this returns up to n *matching* entries, using the
+    per-level offset index and falling back to a backwards scan for lines
+    written before the index existed.
     """
-    if not LOG_PATH.exists():
-        return []
-    lines = LOG_PATH.read_text(encoding="utf-8").splitlines()
-    logs = [json.loads(line) for line in lines[-n:]]
-    if level_filter:
-        logs = [log for log in logs if log.get("level") == level_filter]
-    return logs
+    out = []
+    for path in _log_files():
+        want = n - len(out)
+        if want <= 0:
+            break
+        if not path.exists():
+            continue
+        if not level_filter:
+            out.extend(_scan_reverse(path, want, None))
+            continue
+        offsets = _indexed_offsets(path, level_filter, want)
+        found = []
+        if offsets:
+            with path.open("rb") as f:
+                for off in offsets:
+                    log = _read_at(f, off)
+                    if log is not None and log.get("level") == level_filter:
+                        found.append(log)
+        if len(found) < want and not _fully_indexed(path).exists():
+            # Pre-index lines live before the earliest indexed offset.
+            end = min(offsets) if offsets else None
+            if end is None or end > 0:
+                found.extend(_scan_reverse(path, want - len(found), level_filter, end=end))
+        out.extend(found)
+    out.reverse()
+    return out
 
 def log_and_refresh(source: str, message: str):
+    """
+    Log, then ask for a (debounced, background) relay_context.md refresh.
+    Never blocks the caller on the summary or an HTTP round-trip.
+    """
     log_entry(source, message)
     try:
-        requests.post("http://localhost:8000/context/update", timeout=2)
+        from services.context_refresh import get_refresher
+        get_refresher().request()
     except Exception as e:
-        log_exception("log_and_refresh", e, "Failed to auto-refresh context")
+        log_exception("log_and_refresh", e, "Failed to schedule context refresh")
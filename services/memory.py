@@ -5,7 +5,7 @@
 #
 # Upstream:
 #   - ENV: —
-#   - Imports: datetime, json, os
+#   - Imports: datetime, json, os, services.session_store
 #
 # Downstream:
 #   - agents.janitor_agent
@@ -20,6 +20,8 @@ import os
 import json
 import datetime
 
+from services.session_store import get_store
+
 SESSION_DIR = "./logs/sessions"
 
 def summarize_memory_entry(
@@ -58,12 +60,10 @@ def summarize_memory_entry(
 
 def save_memory_entry(user_id: str, summary: dict):
     """
-    Write a single memory entry to the per-user log file as JSONL.
+    Append a single memory entry to the user's session store
+    (logs/sessions/<user>.jsonl + sparse time index; rotates when large).
     """
-    os.makedirs(SESSION_DIR, exist_ok=True)
-    path = os.path.join(SESSION_DIR, f"{user_id}.jsonl")
-    with open(path, "a") as f:
-        f.write(json.dumps(summary) + "\n")
+    get_store().append(user_id, summary)
 
 # === Utility: For debugging/logging what gets stored ===
 def debug_log_entry(entry: dict):
@@ -1,14 +1,57 @@
-# File: services/openai_client.py
-# Purpose: Thin async wrapper for OpenAI, returning {"text","usage","raw"}.
+# ─────────────────────────────────────────────────────────────────────────────
+# File: openai_client.py
+# Directory: services
+# Purpose: The one shared OpenAI client layer: pooled clients, API capability
+#          detected once, and every call admitted by the process-wide governor.
+#
+# Upstream:
+#   - ENV: OPENAI_API_KEY, OPENAI_API_MODE (auto|responses|chat, default auto),
+#          OPENAI_EST_COMPLETION_TOKENS (default 512),
+#          OPENAI_CAPS_TTL_S (default 3600; re-probe Responses after a miss); pool/timeout knobs via
+#          utils.openai_client; concurrency/TPM via services.llm_governor;
+#          completion cache via services.llm_cache
+#   - Imports: asyncio, inspect, openai, services.llm_cache, services.llm_governor,
+#              utils.openai_client
+#
+# Downstream:
+#   - agents.codex_agent, agents.docs_agent, agents.echo_agent
+#   - services.agent, services.summarize_memory, services.context_refresh
+#
+# Contents:
+#   - available(), get_client(), get_sync_client()
+#   - chat_complete()      → {"text","usage","raw"}
+#   - chat_stream()        → async iterator of text deltas
+#   - chat_create()        → governed chat.completions.create passthrough
+#   - sync_chat_create()   → same, for thread callers
+#   - stats()
+#
+# Notes:
+#   • Responses-vs-Chat is probed on the first call and cached. Only a
+#     "this API does not exist" failure (missing SDK attribute, 404/405/501)
+#     switches the cache to chat; ordinary errors are retried on the same API,
+#     so a failing call is no longer doubled by a blind fallback. A 404 for
+#     an unknown model (code "model_not_found") is not a capability miss, and
+#     a miss is re-probed after OPENAI_CAPS_TTL_S.
+#   • Priority comes from the `priority=` argument or the llm_governor
+#     priority() context (interactive by default).
+#   • cache="<caller>" enables the completion cache for that call, but only
+#     at temperature 0 or with cache_opt_in=True. Hits skip the governor
+#     queue entirely; tool/function-call and empty replies are never cached.
+# ─────────────────────────────────────────────────────────────────────────────
 from __future__ import annotations
-import os, asyncio, random
-from typing import Any, Dict, Optional
+import os, asyncio, inspect, logging, random, threading, time, types
+from typing import Any, AsyncIterator, Dict, Optional
+
+from services import llm_cache
+from services.llm_governor import Lease, get_governor
 
 try:
     from openai import AsyncOpenAI  # SDK 1.x
 except Exception as e:
     AsyncOpenAI = None  # type: ignore
 
+logger = logging.getLogger("relay.openai")
+
 _TRANSIENT = ("timeout", "temporar", "rate limit", "unavailable", "again", "overloaded")
 
 def _is_transient(ex: Exception) -> bool:
@@ -18,18 +61,122 @@ def _jitter(n: int, base=0.25, cap=2.5) -> float:
     return min(cap, base * (2 ** n)) * random.random()
 
 _client: Optional[Any] = None
+_sync_client: Optional[Any] = None
+_client_lock = threading.Lock()
+
+# None = not probed yet; True/False once the first call has told us
+_CAPS: Dict[str, Optional[bool]] = {"responses": None}
+_caps_missed_at = 0.0  # monotonic time of the last capability miss
+
+def available() -> bool:
+    """True when the SDK is installed and an API key is configured."""
+    return AsyncOpenAI is not None and bool(os.environ.get("OPENAI_API_KEY"))
 
-def _client_or_raise():
+def get_client():
+    """Process-wide AsyncOpenAI over the tuned httpx pool (utils.openai_client)."""
     global _client
-    if _client is None:
-        if not AsyncOpenAI:
-            raise RuntimeError("openai SDK not installed. pip install openai>=1.0.0")
-        _client = AsyncOpenAI(
-            api_key=os.environ.get("OPENAI_API_KEY"),
-            base_url=os.environ.get("OPENAI_BASE_URL") or None,  # supports Azure/Proxy
-            max_retries=int(os.environ.get("OPENAI_MAX_RETRIES", "2")),  # SDK default ~2
-        )
-    return _client
+    with _client_lock:
+        if _client is None:
+            if not AsyncOpenAI:
+                raise RuntimeError("openai SDK not installed. pip install openai>=1.0.0")
+            from utils.openai_client import create_openai_client
+            _client = create_openai_client()
+        return _client
+
+def get_sync_client():
+    """Process-wide blocking client for thread-based callers."""
+    global _sync_client
+    with _client_lock:
+        if _sync_client is None:
+            from utils.openai_client import create_sync_openai_client
+            _sync_client = create_sync_openai_client()
+        return _sync_client
+
+# Kept for existing callers/tests that reach for the old name.
+_client_or_raise = get_client
+
+def _use_responses(cli: Any) -> bool:
+    mode = (os.getenv("OPENAI_API_MODE") or "auto").strip().lower()
+    if mode in ("responses", "chat"):
+        return mode == "responses"
+    if _CAPS["responses"] is False and _caps_missed_at:
+        ttl = float(os.getenv("OPENAI_CAPS_TTL_S", "3600") or 3600)
+        if time.monotonic() - _caps_missed_at >= ttl:
+            _CAPS["responses"] = None  # re-probe: the miss may have been an outage or a rollout gap
+    if _CAPS["responses"] is None and not hasattr(cli, "responses"):
+        _CAPS["responses"] = False
+    return _CAPS["responses"] is not False
+
+def _caps_miss() -> None:
+    global _caps_missed_at
+    _CAPS["responses"] = False
+    _caps_missed_at = time.monotonic()
+
+def _api_missing(ex: Exception) -> bool:
+    """True when the failure means "this endpoint/SDK surface does not exist"."""
+    if isinstance(ex, AttributeError):
+        return True
+    status = getattr(ex, "status_code", None)
+    text = str(ex).lower()
+    if status == 404:
+        # OpenAI also answers 404 for an unknown/unavailable model; that says nothing about the API.
+        code = getattr(ex, "code", None)
+        body = getattr(ex, "body", None)
+        if code is None and isinstance(body, dict):
+            err = body.get("error") if isinstance(body.get("error"), dict) else body
+            code = err.get("code")
+        return code != "model_not_found" and "model_not_found" not in text
+    if status in (405, 501):
+        return True
+    return status == 400 and "unrecognized request url" in text
+
+def _estimate_tokens(*texts: str, max_tokens: Optional[int] = None) -> int:
+    prompt = sum(len(t or "") for t in texts) // 4
+    completion = max_tokens or int(os.getenv("OPENAI_EST_COMPLETION_TOKENS", "512") or 512)
+    return prompt + completion
+
+def _used_tokens(usage: Any) -> Optional[int]:
+    total = getattr(usage, "total_tokens", None)
+    if total is None and isinstance(usage, dict):
+        total = usage.get("total_tokens")
+    return int(total) if total is not None else None
+
+def _cacheable(cache: Optional[str], temperature: Optional[float], opt_in: bool) -> bool:
+    return bool(cache) and llm_cache.enabled() and (temperature == 0 or opt_in)
+
+def _cached_chat(text: str) -> Any:
+    """Minimal Chat Completions look-alike for a cache hit."""
+    msg = types.SimpleNamespace(role="assistant", content=text, function_call=None, tool_calls=None)
+    choice = types.SimpleNamespace(index=0, message=msg, finish_reason="stop")
+    return types.SimpleNamespace(choices=[choice], usage=None, cached=True)
+
+def _chat_cache_key(kwargs: Dict[str, Any], cache: Optional[str], opt_in: bool) -> Optional[str]:
+    """None when this call is not cacheable."""
+    if kwargs.get("stream") or not _cacheable(cache, kwargs.get("temperature"), opt_in):
+        return None
+    return llm_cache.cache_key(
+        model=kwargs.get("model"),
+        user=kwargs.get("messages"),
+        temperature=kwargs.get("temperature"),
+        tools=[kwargs.get(k) for k in ("tools", "tool_choice", "functions", "function_call", "response_format")],
+    )
+
+def _chat_cache_text(resp: Any) -> Optional[str]:
+    """The reply text if it may be cached: plain, non-empty content (no tool/function calls)."""
+    try:
+        msg = resp.choices[0].message
+    except Exception:
+        return None
+    if getattr(msg, "function_call", None) or getattr(msg, "tool_calls", None):
+        return None
+    content = getattr(msg, "content", None)
+    return content if isinstance(content, str) and content.strip() else None
+
+def _messages_text(messages: Any) -> str:
+    try:
+        return "".join(str(m.get("content") or "") for m in messages or [])
+    except Exception:
+        return ""
 
 async def chat_complete(
     *,
@@ -37,48 +184,237 @@ async def chat_complete(
     user: str,
     model: str = "gpt-4o",
     timeout_s: int = 30,
+    priority: Optional[str] = None,
+    temperature: Optional[float] = None,
+    cache: Optional[str] = None,
+    cache_opt_in: bool = False,
 ) -> Dict[str, Any]:
     """
     Returns: {"text": <str>, "usage": {...} | None, "raw": <sdk object>}
+    (cache hits: raw=None, usage=None, cached=True)
     """
-    cli = _client_or_raise()
+    key: Optional[str] = None
+    if _cacheable(cache, temperature, cache_opt_in):
+        key = llm_cache.cache_key(model=model, system=system, user=user, temperature=temperature)
+        hit = await llm_cache.get_cache().aget(key, caller=cache)
+        if hit is not None:
+            return {"text": hit, "usage": None, "raw": None, "cached": True}
+
+    cli = get_client()
     attempts = 0
     last_exc: Optional[Exception] = None
-
-    while attempts < 3:
-        attempts += 1
-        try:
-            # Route through the modern Responses API if available; fall back to Chat Completions
-            async with asyncio.timeout(timeout_s):
-                try:
-                    # Preferred: Responses API (SDK 1.x)
-                    resp = await cli.responses.create(
-                        model=model,
-                        instructions=system,
-                        input=user,
-                    )
-                    text = getattr(resp, "output_text", None) or ""
-                    usage = getattr(resp, "usage", None)
-                    return {"text": text.strip(), "usage": usage, "raw": resp}
-                except Exception:
-                    # Back-compat: Chat Completions (still supported)
+    est = _estimate_tokens(system, user)
+    extra: Dict[str, Any] = {} if temperature is None else {"temperature": temperature}
+    lease = await get_governor().acquire(tokens=est, prio=priority)
+    used: Optional[int] = None
+    try:
+        while attempts < 3:
+            attempts += 1
+            try:
+                async with asyncio.timeout(timeout_s):
+                    if _use_responses(cli):
+                        try:
+                            resp = await cli.responses.create(
+                                model=model,
+                                instructions=system,
+                                input=user,
+                                **extra,
+                            )
+                            _CAPS["responses"] = True
+                            text = (getattr(resp, "output_text", None) or "").strip()
+                            usage = getattr(resp, "usage", None)
+                            used = _used_tokens(usage)
+                            if key is not None and text:
+                                await llm_cache.get_cache().aput(key, text, caller=cache, tokens=used or est)
+                            return {"text": text, "usage": usage, "raw": resp}
+                        except Exception as ex:
+                            if _CAPS["responses"] or not _api_missing(ex):
+                                raise
+                            # Capability miss: use Chat Completions until OPENAI_CAPS_TTL_S passes
+                            _caps_miss()
+                            logger.info("Responses API unavailable (%s); using Chat Completions", ex)
                     cc = await cli.chat.completions.create(
                         model=model,
                         messages=[{"role": "system", "content": system},
                                   {"role": "user", "content": user}],
+                        **extra,
                     )
-                    text = (cc.choices[0].message.content or "") if cc.choices else ""
+                    text = ((cc.choices[0].message.content or "") if cc.choices else "").strip()
                     usage = getattr(cc, "usage", None)
-                    return {"text": text.strip(), "usage": usage, "raw": cc}
-        except asyncio.TimeoutError as ex:
-            last_exc = ex
-            if attempts >= 3: break
-            await asyncio.sleep(_jitter(attempts))
-        except Exception as ex:
-            last_exc = ex
-            if not _is_transient(ex) or attempts >= 3:
-                break
-            await asyncio.sleep(_jitter(attempts))
+                    used = _used_tokens(usage)
+                    if key is not None and text:
+                        await llm_cache.get_cache().aput(key, text, caller=cache, tokens=used or est)
+                    return {"text": text, "usage": usage, "raw": cc}
+            except asyncio.TimeoutError as ex:
+                last_exc = ex
+                if attempts >= 3: break
+                await asyncio.sleep(_jitter(attempts))
+            except Exception as ex:
+                last_exc = ex
+                if not _is_transient(ex) or attempts >= 3:
+                    break
+                await asyncio.sleep(_jitter(attempts))
+    finally:
+        lease.release(used)
 
     # If we get here, we failed
     raise RuntimeError(f"OpenAI chat_complete failed after {attempts} attempts: {last_exc}")
+
+
+async def chat_stream(
+    *,
+    system: str,
+    user: str,
+    model: str = "gpt-4o",
+    timeout_s: int = 30,
+    priority: Optional[str] = None,
+) -> AsyncIterator[str]:
+    """
+    Yield text deltas from a streaming Chat Completion as they arrive.
+
+    `timeout_s` bounds the wait for the stream to open and for each next
+    chunk (an idle timeout), not the whole generation. Transient failures are
+    retried only before the first delta; once text has been yielded, errors
+    propagate so the caller never sees a duplicated prefix. The governor
+    lease is held until the stream ends.
+    """
+    cli = get_client()
+    attempts = 0
+    lease = await get_governor().acquire(tokens=_estimate_tokens(system, user), prio=priority)
+    try:
+        while True:
+            attempts += 1
+            emitted = False
+            try:
+                stream = await asyncio.wait_for(
+                    cli.chat.completions.create(
+                        model=model,
+                        messages=[{"role": "system", "content": system},
+                                  {"role": "user", "content": user}],
+                        stream=True,
+                    ),
+                    timeout_s,
+                )
+                try:
+                    it = stream.__aiter__()
+                    while True:
+                        try:
+                            chunk = await asyncio.wait_for(it.__anext__(), timeout_s)
+                        except StopAsyncIteration:
+                            return
+                        for choice in getattr(chunk, "choices", None) or []:
+                            delta = getattr(getattr(choice, "delta", None), "content", None)
+                            if delta:
+                                emitted = True
+                                yield delta
+                finally:
+                    # Idle timeouts, retries and early exits by the consumer must not leak the connection.
+                    await _close_stream(stream)
+            except Exception as ex:
+                retryable = isinstance(ex, asyncio.TimeoutError) or _is_transient(ex)
+                if emitted or not retryable or attempts >= 3:
+                    raise RuntimeError(f"OpenAI chat_stream failed after {attempts} attempts: {ex}") from ex
+                await asyncio.sleep(_jitter(attempts))
+    finally:
+        lease.release()
+
+
+async def _close_stream(stream: Any) -> None:
+    """Close an SDK stream (close() or aclose(), sync or async); never raises."""
+    close = getattr(stream, "close", None) or getattr(stream, "aclose", None)
+    if close is None:
+        return
+    try:
+        result = close()
+        if inspect.isawaitable(result):
+            await result
+    except Exception as e:
+        logger.debug("stream close failed: %s", e)
+
+
+async def _leased_stream(stream: Any, lease: Lease) -> AsyncIterator[Any]:
+    try:
+        async for chunk in stream:
+            yield chunk
+    finally:
+        try:
+            await _close_stream(stream)
+        finally:
+            lease.release()
+
+
+async def chat_create(
+    *,
+    priority: Optional[str] = None,
+    cache: Optional[str] = None,
+    cache_opt_in: bool = False,
+    **kwargs: Any,
+) -> Any:
+    """
+    Governed `chat.completions.create(**kwargs)` on the shared client.
+
+    Returns the SDK response; with stream=True, an async iterator of chunks
+    that holds its governor lease until exhausted or closed.
+    """
+    key = _chat_cache_key(kwargs, cache, cache_opt_in)
+    if key is not None:
+        hit = await llm_cache.get_cache().aget(key, caller=cache)
+        if hit is not None:
+            return _cached_chat(hit)
+    cli = get_client()
+    tokens = _estimate_tokens(_messages_text(kwargs.get("messages")), max_tokens=kwargs.get("max_tokens"))
+    lease = await get_governor().acquire(tokens=tokens, prio=priority)
+    if kwargs.get("stream"):
+        try:
+            stream = await cli.chat.completions.create(**kwargs)
+        except BaseException:
+            lease.release()
+            raise
+        return _leased_stream(stream, lease)
+    used: Optional[int] = None
+    try:
+        resp = await cli.chat.completions.create(**kwargs)
+        used = _used_tokens(getattr(resp, "usage", None))
+        text = _chat_cache_text(resp) if key is not None else None
+        if text is not None:
+            await llm_cache.get_cache().aput(key, text, caller=cache, tokens=used or tokens)
+        return resp
+    finally:
+        lease.release(used)
+
+
+def sync_chat_create(
+    *,
+    priority: Optional[str] = "background",
+    cache: Optional[str] = None,
+    cache_opt_in: bool = False,
+    **kwargs: Any,
+) -> Any:
+    """Blocking twin of chat_create() for worker threads (background by default)."""
+    key = _chat_cache_key(kwargs, cache, cache_opt_in)
+    if key is not None:
+        hit = llm_cache.get_cache().get(key, caller=cache)
+        if hit is not None:
+            return _cached_chat(hit)
+    cli = get_sync_client()
+    tokens = _estimate_tokens(_messages_text(kwargs.get("messages")), max_tokens=kwargs.get("max_tokens"))
+    lease = get_governor().acquire_sync(tokens=tokens, prio=priority)
+    used: Optional[int] = None
+    try:
+        resp = cli.chat.completions.create(**kwargs)
+        used = _used_tokens(getattr(resp, "usage", None))
+        text = _chat_cache_text(resp) if key is not None else None
+        if text is not None:
+            llm_cache.get_cache().put(key, text, caller=cache, tokens=used or tokens)
+        return resp
+    finally:
+        lease.release(used)
+
+
+def stats() -> Dict[str, Any]:
+    return {
+        "api_mode": (os.getenv("OPENAI_API_MODE") or "auto").strip().lower(),
+        "capabilities": dict(_CAPS),
+        "governor": get_governor().stats(),
+        "cache": (llm_cache.get_cache().stats() if llm_cache.enabled() else None),
+    }
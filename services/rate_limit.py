@@ -0,0 +1,396 @@
+# ─────────────────────────────────────────────────────────────────────────────
+# File: rate_limit.py
+# Directory: services
+# Purpose: Per-user, per-route token-bucket rate limiting for the expensive
+#          endpoints, with limits reported in response headers, and user
+#          attribution for the LLM governor's fair queue.
+#
+# Upstream:
+#   - ENV: RATE_LIMIT (default 1; 0 = attribute users only, never limit)
+#          RATE_LIMIT_BACKEND (memory | redis, default memory)
+#          RATE_LIMIT_<NAME>_RPM    sustained requests/min (ask 30, kb_search 120, control 30)
+#          RATE_LIMIT_<NAME>_BURST  bucket size (ask 10, kb_search 30, control 10)
+#          RATE_LIMIT_MAX_KEYS      memory backend bucket cap (default 10000)
+#          (<NAME> = ASK | KB_SEARCH | CONTROL)
+#   - Imports: asyncio, collections, json, services.auth, services.cache,
+#              services.errors, services.llm_governor, services.serialization,
+#              services.telemetry
+#
+# Downstream:
+#   - main (RateLimitMiddleware in the core stack)
+#   - routes.health (details.rate_limit)
+#
+# Contents:
+#   - Decision
+#   - MemoryBackend, RedisBackend (take)
+#   - RateLimiter (check / stats)
+#   - RateLimitMiddleware
+#   - get_limiter(), stats()
+#
+# Notes:
+#   • Identity is the authenticated principal: a valid API key (X-Api-Key /
+#     Bearer, checked like services.auth) → "key:<family>", with X-User-Id,
+#     else the JSON body's "user_id" (small /ask bodies are buffered and
+#     replayed), as a sub-key inside it. Without a valid key the caller is
+#     "anon:<client ip>"; client-supplied user ids are ignored, so they can
+#     neither drain someone else's bucket nor mint fresh ones.
+#   • Routes that require auth (/kb/search, /control) are not charged when
+#     the credentials are missing or wrong; the route answers 401/403.
+#   • Every limited response carries X-RateLimit-Limit / -Remaining / -Reset;
+#     a 429 "rate_limited" adds Retry-After.
+#   • The redis backend refills and takes in one Lua script on a
+#     keyed_hash("ratelimit", …) key, so replicas share the budget. Redis
+#     errors fall back to the in-process buckets instead of failing requests.
+#   • The resolved user is set as llm_governor.user() for the request, so
+#     LLM calls it makes are queued fairly against other users.
+# ─────────────────────────────────────────────────────────────────────────────
+
+from __future__ import annotations
+
+import asyncio
+import collections
+import hmac
+import json
+import logging
+import math
+import os
+import time
+from dataclasses import dataclass
+from typing import Any, Dict, Optional, Tuple
+
+from services import telemetry
+from services.llm_governor import user as llm_user
+
+logger = logging.getLogger("relay.rate_limit")
+
+DEFAULT_ROUTES = (
+    # path prefix, bucket name, requests/min, burst
+    ("/ask", "ask", 30, 10),
+    ("/kb/search", "kb_search", 120, 30),
+    ("/control", "control", 30, 10),
+)
+AUTH_REQUIRED = {"kb_search", "control"}
+
+_MAX_PEEK_BYTES = 64 * 1024
+
+
+@dataclass
+class Decision:
+    allowed: bool
+    limit: int
+    remaining: int
+    reset_s: int
+    retry_after_s: int = 0
+
+    def headers(self) -> Dict[str, str]:
+        out = {
+            "X-RateLimit-Limit": str(self.limit),
+            "X-RateLimit-Remaining": str(self.remaining),
+            "X-RateLimit-Reset": str(self.reset_s),
+        }
+        if not self.allowed:
+            out["Retry-After"] = str(self.retry_after_s)
+        return out
+
+
+# ── Backends ─────────────────────────────────────────────────────────────────
+
+class MemoryBackend:
+    """
+    In-process buckets, LRU-bounded. An evicted bucket comes back full, so
+    max_keys must exceed the number of callers active within one refill
+    window; evictions of not-yet-refilled buckets are counted.
+    """
+
+    name = "memory"
+
+    def __init__(self, max_keys: int = 10000) -> None:
+        self.max_keys = max(1, int(max_keys))
+        self._buckets: "collections.OrderedDict[str, Tuple[float, float, float, float]]" = collections.OrderedDict()
+        self.evicted_unrefilled = 0
+
+    async def take(self, key: str, rate: float, burst: float, cost: float = 1.0) -> Tuple[bool, float]:
+        now = time.monotonic()
+        tokens, ts, _rate, _burst = self._buckets.get(key, (burst, now, rate, burst))
+        tokens = min(burst, tokens + (now - ts) * rate)
+        allowed = tokens >= cost
+        if allowed:
+            tokens -= cost
+        self._buckets[key] = (tokens, now, rate, burst)
+        self._buckets.move_to_end(key)
+        while len(self._buckets) > self.max_keys:
+            _key, (t, at, r, b) = self._buckets.popitem(last=False)
+            if t + (now - at) * r < b:
+                self.evicted_unrefilled += 1
+                if self.evicted_unrefilled == 1 or self.evicted_unrefilled % 1000 == 0:
+                    logger.warning("rate limit buckets evicted before refilling (%d); raise RATE_LIMIT_MAX_KEYS",
+                                   self.evicted_unrefilled)
+        return allowed, tokens
+
+
+_TAKE_LUA = """
+local rate, burst = tonumber(ARGV[1]), tonumber(ARGV[2])
+local now, cost = tonumber(ARGV[3]), tonumber(ARGV[4])
+local s = redis.call('HMGET', KEYS[1], 't', 'ts')
+local tokens = tonumber(s[1]) or burst
+local ts = tonumber(s[2]) or now
+tokens = math.min(burst, tokens + math.max(0, now - ts) * rate)
+local ok = 0
+if tokens >= cost then tokens = tokens - cost; ok = 1 end
+redis.call('HSET', KEYS[1], 't', tostring(tokens), 'ts', tostring(now))
+redis.call('PEXPIRE', KEYS[1], math.ceil(burst / rate * 1000) + 1000)
+return {ok, tostring(tokens)}
+"""
+
+
+class RedisBackend:
+    """Shared buckets: refill + take atomically in one Lua script."""
+
+    name = "redis"
+
+    def __init__(self, redis: Any, fallback: Optional[MemoryBackend] = None) -> None:
+        self.redis = redis
+        self.fallback = fallback or MemoryBackend()
+        self.errors = 0
+
+    async def take(self, key: str, rate: float, burst: float, cost: float = 1.0) -> Tuple[bool, float]:
+        from services.cache import keyed_hash
+
+        rkey = keyed_hash("ratelimit", {"key": key})
+        try:
+            ok, tokens = await self.redis.eval(_TAKE_LUA, 1, rkey, rate, burst, time.time(), cost)
+        except Exception as e:
+            self.errors += 1
+            if self.errors == 1 or self.errors % 100 == 0:
+                logger.warning("redis rate limit failed (%d); using local buckets: %s", self.errors, e)
+            return await self.fallback.take(key, rate, burst, cost)
+        if isinstance(tokens, bytes):
+            tokens = tokens.decode()
+        return bool(int(ok)), float(tokens)
+
+
+# ── Limiter ──────────────────────────────────────────────────────────────────
+
+class RateLimiter:
+    def __init__(self, backend: Any, limits: Dict[str, Tuple[float, int]]) -> None:
+        """limits: bucket name → (requests per minute, burst)."""
+        self.backend = backend
+        self.limits = dict(limits)
+        self.counters: Dict[str, Dict[str, int]] = {
+            name: {"allowed": 0, "limited": 0} for name in self.limits
+        }
+
+    async def check(self, route: str, user: str, cost: float = 1.0) -> Decision:
+        rpm, burst = self.limits[route]
+        rate = rpm / 60.0
+        allowed, tokens = await self.backend.take(f"{route}:{user}", rate, float(burst), cost)
+        self.counters[route]["allowed" if allowed else "limited"] += 1
+        if not allowed:
+            telemetry.incr("relay_rate_limited_total", 1, {"route": route})
+        return Decision(
+            allowed=allowed,
+            limit=int(burst),
+            remaining=max(0, int(tokens)),
+            reset_s=int(math.ceil(max(0.0, burst - tokens) / rate)),
+            retry_after_s=0 if allowed else max(1, int(math.ceil((cost - tokens) / rate))),
+        )
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "backend": self.backend.name,
+            "evicted_unrefilled": getattr(self.backend, "evicted_unrefilled", 0),
+            "routes": {
+                name: {"rpm": rpm, "burst": burst, **self.counters[name]}
+                for name, (rpm, burst) in self.limits.items()
+            },
+        }
+
+
+# ── ASGI middleware ──────────────────────────────────────────────────────────
+
+def _route_for(path: str) -> Optional[str]:
+    for prefix, name, _rpm, _burst in DEFAULT_ROUTES:
+        if path == prefix or path.startswith(prefix + "/"):
+            return name
+    return None
+
+
+def _header(scope, name: bytes) -> Optional[str]:
+    for key, value in scope.get("headers") or ():
+        if key.lower() == name:
+            return value.decode("latin-1")
+    return None
+
+
+async def _peek_body_user(scope, receive):
+    """Read a small JSON body for its "user_id"; return (user, replaying receive)."""
+    ctype = _header(scope, b"content-type") or ""
+    length = _header(scope, b"content-length") or ""
+    if scope.get("method") != "POST" or "json" not in ctype or not length.isdigit():
+        return None, receive
+    if int(length) > _MAX_PEEK_BYTES:
+        return None, receive
+
+    messages = []
+    body = b""
+    while True:
+        message = await receive()
+        messages.append(message)
+        if message["type"] != "http.request":
+            break
+        body += message.get("body", b"")
+        if not message.get("more_body", False):
+            break
+
+    async def replay():
+        return messages.pop(0) if messages else await receive()
+
+    try:
+        data = json.loads(body or b"{}")
+        user = data.get("user_id") if isinstance(data, dict) else None
+    except ValueError:
+        user = None
+    return (str(user) if user else None), replay
+
+
+def _principal(scope) -> Optional[str]:
+    """"key:<family>" for a valid API key (same check as services.auth), else None."""
+    from services.auth import _extract_token, _valid_keys
+
+    token = _extract_token(_header(scope, b"x-api-key"), _header(scope, b"authorization"))
+    if not token:
+        return None
+    for family, expected in _valid_keys().items():
+        if hmac.compare_digest(token.encode(), expected.encode()):
+            return f"key:{family.lower()}"
+    return None
+
+
+async def _identity(route: str, scope, receive):
+    """
+    (identity, receive) for the limiter and the LLM governor; identity is
+    None when the route requires auth and the caller has none (not charged).
+    """
+    principal = _principal(scope)
+    if principal is None:
+        if route in AUTH_REQUIRED:
+            return None, receive
+        return f"anon:{(scope.get('client') or ('unknown',))[0]}", receive
+    sub = _header(scope, b"x-user-id")
+    if not sub:
+        sub, receive = await _peek_body_user(scope, receive)
+    if sub and sub != "anonymous":
+        return f"{principal}/{sub}", receive
+    return principal, receive
+
+
+class RateLimitMiddleware:
+    """Resolve the caller, attribute its LLM calls, and enforce per-user buckets."""
+
+    def __init__(self, app, limiter: Optional[RateLimiter] = None, enforce: Optional[bool] = None) -> None:
+        self.app = app
+        self.limiter = limiter
+        self.enforce = enabled() if enforce is None else enforce
+
+    async def __call__(self, scope, receive, send) -> None:
+        route = None
+        if scope["type"] == "http" and scope.get("method") != "OPTIONS":
+            route = _route_for(scope.get("path") or "")
+        if route is None:
+            await self.app(scope, receive, send)
+            return
+
+        user, receive = await _identity(route, scope, receive)
+        if user is None:
+            await self.app(scope, receive, send)  # auth will reject it; don't charge anyone
+            return
+
+        decision = None
+        if self.enforce:
+            if self.limiter is None:
+                self.limiter = await get_limiter()
+            decision = await self.limiter.check(route, user)
+            if not decision.allowed:
+                await _rate_limited(route, decision, scope, receive, send)
+                return
+
+        async def send_with_headers(message) -> None:
+            if message["type"] == "http.response.start" and decision is not None:
+                headers = list(message.get("headers") or [])
+                headers += [(k.lower().encode("latin-1"), v.encode("latin-1")) for k, v in decision.headers().items()]
+                message = {**message, "headers": headers}
+            await send(message)
+
+        with llm_user(user):
+            await self.app(scope, receive, send_with_headers)
+
+
+async def _rate_limited(route: str, decision: Decision, scope, receive, send) -> None:
+    from services.errors import error_payload
+    from services.serialization import FastJSONResponse
+
+    corr_id = (scope.get("state") or {}).get("corr_id", "")
+    detail = error_payload(
+        "rate_limited",
+        f"Too many {route} requests for this user.",
+        corr_id=corr_id,
+        hint=f"Retry after {decision.retry_after_s}s.",
+        extra={"limit": decision.limit, "retry_after_s": decision.retry_after_s},
+    )
+    response = FastJSONResponse({"detail": detail}, status_code=429, headers=decision.headers())
+    await response(scope, receive, send)
+
+
+# ── Registry ─────────────────────────────────────────────────────────────────
+
+_limiter: Optional[RateLimiter] = None
+_limiter_lock = asyncio.Lock()
+
+
+def enabled() -> bool:
+    return (os.getenv("RATE_LIMIT") or "1").strip().lower() in {"1", "true", "yes"}
+
+
+def _env_num(key: str, default: float) -> float:
+    try:
+        value = float((os.getenv(key) or "").strip() or default)
+        return value if value > 0 else default
+    except ValueError:
+        return default
+
+
+def limits_from_env() -> Dict[str, Tuple[float, int]]:
+    return {
+        name: (
+            _env_num(f"RATE_LIMIT_{name.upper()}_RPM", rpm),
+            int(_env_num(f"RATE_LIMIT_{name.upper()}_BURST", burst)),
+        )
+        for _prefix, name, rpm, burst in DEFAULT_ROUTES
+    }
+
+
+async def get_limiter() -> RateLimiter:
+    """Process-wide limiter; the redis backend is used when configured and reachable."""
+    global _limiter
+    if _limiter is not None:
+        return _limiter
+    async with _limiter_lock:  # first concurrent requests must not build two limiters
+        if _limiter is None:
+            memory = MemoryBackend(int(_env_num("RATE_LIMIT_MAX_KEYS", 10000)))
+            backend: Any = memory
+            if (os.getenv("RATE_LIMIT_BACKEND") or "memory").strip().lower() == "redis":
+                from services.cache import get_redis
+
+                redis = await get_redis()
+                if redis is not None:
+                    backend = RedisBackend(redis, fallback=memory)
+                else:
+                    logger.warning("RATE_LIMIT_BACKEND=redis but redis is unavailable; using memory")
+            _limiter = RateLimiter(backend, limits_from_env())
+    return _limiter
+
+
+def stats() -> Dict[str, Any]:
+    if _limiter is None:
+        return {}
+    return _limiter.stats()
@@ -25,6 +25,8 @@ import time
 from pathlib import Path
 import math
 
+from services.jobs import report_progress
+
 # Safe logging shim (avoid hard dependency during early boot)
 try:
     from core.logging import log_event  # type: ignore
@@ -224,6 +226,7 @@ def reindex_all(root: str | Path) -> Dict[str, Any]:
                     acc = sz
             if acc > 0:
                 chunks += 1
+            report_progress("scan", done=docs, files=docs, chunks=chunks)
 
         took_ms = int((time.perf_counter() - t0) * 1000)
         log_event("semantic_reindex_done", {"docs": docs, "chunks": chunks, "took_ms": took_ms})
@@ -0,0 +1,89 @@
+# ─────────────────────────────────────────────────────────────────────────────
+# File: serialization.py
+# Directory: services
+# Purpose: One JSON serialization path for large API responses: a single
+#          normalization rule, orjson when installed, and a Response class
+#          that routes return directly (no pydantic re-validation, no
+#          jsonable_encoder walk).
+#
+# Upstream:
+#   - ENV: —
+#   - Imports: json, orjson (optional), starlette.responses
+#
+# Downstream:
+#   - routes.ask (/ask), routes.mcp (/mcp/run), routes.kb (/kb/search),
+#     routes.docs (_ok → /docs/list …), routes.logs, routes.logs_sessions
+#   - tools/bench_serialization.py
+#
+# Contents:
+#   - jsonable()          → plain JSON-safe structure (the normalization rule)
+#   - dumps()             → compact UTF-8 JSON bytes
+#   - FastJSONResponse
+#
+# Notes:
+#   • The rule is the one routes/ask._json_safe and mcp_agent._jsonable
+#     already apply: str keys, sets/tuples → lists, pydantic models dumped,
+#     anything else str(); non-finite floats become null.
+#   • With orjson, that rule runs inside the encoder (default hook +
+#     OPT_NON_STR_KEYS), so the payload is walked exactly once. Without it,
+#     stdlib json is tried first and jsonable() is only used when it refuses.
+# ─────────────────────────────────────────────────────────────────────────────
+
+from __future__ import annotations
+
+import json
+import math
+from typing import Any
+
+from starlette.responses import JSONResponse
+
+try:
+    import orjson  # type: ignore
+except Exception:  # pragma: no cover - optional speedup
+    orjson = None  # type: ignore
+
+
+def _default(obj: Any) -> Any:
+    if isinstance(obj, (set, frozenset, tuple)):
+        return list(obj)
+    if hasattr(obj, "model_dump"):
+        return obj.model_dump()  # pydantic v2
+    if hasattr(obj, "dict") and callable(obj.dict):
+        return obj.dict()  # pydantic v1
+    return str(obj)
+
+
+def jsonable(obj: Any) -> Any:
+    try:
+        if obj is None or isinstance(obj, (str, int, bool)):
+            return obj
+        if isinstance(obj, float):
+            return obj if math.isfinite(obj) else None
+        if isinstance(obj, dict):
+            return {str(k): jsonable(v) for k, v in obj.items()}
+        if isinstance(obj, (list, tuple, set, frozenset)):
+            return [jsonable(x) for x in obj]
+        return jsonable(_default(obj)) if hasattr(obj, "model_dump") or hasattr(obj, "dict") else str(obj)
+    except Exception:
+        return "[unserializable]"
+
+
+def dumps(obj: Any) -> bytes:
+    if orjson is not None:
+        try:
+            return orjson.dumps(obj, default=_default, option=orjson.OPT_NON_STR_KEYS)
+        except TypeError:
+            pass  # e.g. int > 64 bit, recursion limit → slow path below
+    try:
+        return json.dumps(
+            obj, ensure_ascii=False, separators=(",", ":"), allow_nan=False, default=_default
+        ).encode("utf-8")
+    except (TypeError, ValueError):
+        return json.dumps(jsonable(obj), ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+class FastJSONResponse(JSONResponse):
+    """JSONResponse rendered by dumps(); accepts any content jsonable() accepts."""
+
+    def render(self, content: Any) -> bytes:
+        return dumps(content)
@@ -0,0 +1,365 @@
+# ─────────────────────────────────────────────────────────────────────────────
+# File: session_store.py
+# Directory: services
+# Purpose: Segmented, indexed per-user session memory (JSONL) with O(limit)
+#          tail reads and index-assisted time-range queries.
+#
+# Upstream:
+#   - ENV: SESSION_DIR, SESSION_SEGMENT_BYTES, SESSION_MAX_SEGMENTS, SESSION_INDEX_BYTES
+#   - Imports: json, os, struct, utils.locked_append, utils.reverse_read
+#
+# Downstream:
+#   - services.memory, agents.memory_agent, agents.janitor_agent, routes.logs_sessions
+#
+# Contents:
+#   - SessionStore (append / tail / iter_reverse / range / iter_untimestamped /
+#     segments / compact / users)
+#   - get_store()
+#
+# Layout (per user, under SESSION_DIR):
+#   <user>.jsonl                     active segment (same file as before, so
+#                                    existing logs keep working unchanged)
+#   <user>.jsonl.idx                 sparse index: (ts_ms:int64, offset:int64)
+#                                    records, one per SESSION_INDEX_BYTES of data
+#   .segments/<user>/00000001.jsonl  sealed segments (+ .idx), oldest first
+#
+# Notes:
+#   • Entries are appended in time order; range() relies on that to binary
+#     search the index. Index offsets are hints — readers re-align to the
+#     next line start, and only trust a segment's first ts when its first
+#     record is at offset 0, so a stale/missing index only costs extra
+#     scanning. A pre-index file gets its index built on the next append.
+#   • Ids outside [\w.@-] used to be stored under the raw id; that legacy
+#     <raw id>.jsonl is still read (as the oldest segment), never written.
+#   • Active segment rotates at SESSION_SEGMENT_BYTES; compact() keeps the
+#     newest SESSION_MAX_SEGMENTS sealed segments (0 = keep all).
+#   • Appends take an flock on the active file where available (re-checked
+#     against the path after locking, so a writer never appends to a segment
+#     another worker just sealed), so several workers can share one directory.
+# ─────────────────────────────────────────────────────────────────────────────
+
+from __future__ import annotations
+
+import bisect
+import json
+import os
+import re
+import struct
+import threading
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from utils.locked_append import open_locked_append
+from utils.reverse_read import reverse_jsonl
+
+_REC = struct.Struct("<qq")
+SEGMENTS_DIR = ".segments"
+
+
+def _env_int(name: str, default: int) -> int:
+    try:
+        return int(os.getenv(name, str(default)))
+    except ValueError:
+        return default
+
+
+def safe_user(user_id: str) -> str:
+    return re.sub(r"[^\w.@-]", "_", user_id or "anonymous").lstrip(".")[:128] or "anonymous"
+
+
+def entry_ts_ms(entry: Dict[str, Any]) -> Optional[int]:
+    """Epoch millis from an entry's "timestamp" (or "time") ISO field; naive = UTC."""
+    raw = entry.get("timestamp") or entry.get("time")
+    if not isinstance(raw, str):
+        return None
+    try:
+        dt = datetime.fromisoformat(raw.replace("Z", "+00:00"))
+    except ValueError:
+        return None
+    if dt.tzinfo is None:
+        dt = dt.replace(tzinfo=timezone.utc)
+    return int(dt.timestamp() * 1000)
+
+
+def _read_index(path: Path) -> List[Tuple[int, int]]:
+    try:
+        data = path.read_bytes()
+    except FileNotFoundError:
+        return []
+    n = len(data) // _REC.size
+    return [_REC.unpack_from(data, i * _REC.size) for i in range(n)]
+
+
+def _first_ts(seg: Path) -> Optional[int]:
+    index = _read_index(Path(f"{seg}.idx"))[:1]
+    return index[0][0] if index and index[0][1] == 0 else None
+
+
+def _seek_line(f, offset: int) -> None:
+    """Position f at the first full line starting at or after offset."""
+    if offset <= 0:
+        f.seek(0)
+        return
+    f.seek(offset - 1)
+    if f.read(1) != b"\n":
+        f.readline()
+
+
+class SessionStore:
+    def __init__(
+        self,
+        root: Path,
+        *,
+        segment_bytes: int = 8 * 1024 * 1024,
+        max_segments: int = 0,
+        index_bytes: int = 64 * 1024,
+    ) -> None:
+        self.root = Path(root)
+        self.segment_bytes = max(1024, segment_bytes)
+        self.max_segments = max(0, max_segments)
+        self.index_bytes = max(1, index_bytes)
+        self._lock = threading.Lock()
+
+    # ── Paths ────────────────────────────────────────────────────────────────
+    def active_path(self, user_id: str) -> Path:
+        return self.root / f"{safe_user(user_id)}.jsonl"
+
+    def _sealed_dir(self, user_id: str) -> Path:
+        return self.root / SEGMENTS_DIR / safe_user(user_id)
+
+    def _legacy_path(self, user_id: str) -> Optional[Path]:
+        """Pre-safe_user() file for this id, if it differs and is a plain name."""
+        raw = user_id or ""
+        if not raw or raw in {".", ".."} or "/" in raw or os.sep in raw or "\0" in raw:
+            return None
+        if raw == safe_user(raw):
+            return None
+        path = self.root / f"{raw}.jsonl"
+        return path if path.is_file() else None
+
+    def segments(self, user_id: str) -> List[Path]:
+        """All segments oldest → newest (legacy, sealed, then the active file)."""
+        d = self._sealed_dir(user_id)
+        sealed = sorted(d.glob("*.jsonl")) if d.is_dir() else []
+        active = self.active_path(user_id)
+        legacy = self._legacy_path(user_id)
+        return ([legacy] if legacy else []) + sealed + ([active] if active.exists() else [])
+
+    def users(self) -> List[str]:
+        """User ids (file stems) with an active or sealed segment."""
+        names = {p.stem for p in self.root.glob("*.jsonl")}
+        sealed = self.root / SEGMENTS_DIR
+        if sealed.is_dir():
+            names.update(p.name for p in sealed.iterdir() if p.is_dir())
+        return sorted(names)
+
+    # ── Write ────────────────────────────────────────────────────────────────
+    def append(self, user_id: str, entry: Dict[str, Any]) -> None:
+        self.root.mkdir(parents=True, exist_ok=True)
+        path = self.active_path(user_id)
+        idx = Path(f"{path}.idx")
+        line = (json.dumps(entry, ensure_ascii=False) + "\n").encode("utf-8")
+        ts = entry_ts_ms(entry) or int(time.time() * 1000)
+        with self._lock, open_locked_append(path) as f:
+            offset = f.seek(0, os.SEEK_END)
+            f.write(line)
+            f.flush()
+            last = self._last_indexed(idx)
+            if last is None and offset > 0:
+                last = self._build_index(path, idx, offset)
+            if last is None or offset - last >= self.index_bytes:
+                with open(idx, "ab") as fi:
+                    fi.write(_REC.pack(ts, offset))
+            if offset + len(line) >= self.segment_bytes:
+                self._rotate(user_id, path, idx)
+
+    @staticmethod
+    def _last_indexed(idx: Path) -> Optional[int]:
+        try:
+            with open(idx, "rb") as fi:
+                size = fi.seek(0, os.SEEK_END)
+                if size < _REC.size:
+                    return None
+                fi.seek(size - size % _REC.size - _REC.size)
+                return _REC.unpack(fi.read(_REC.size))[1]
+        except FileNotFoundError:
+            return None
+
+    def _build_index(self, path: Path, idx: Path, upto: int) -> Optional[int]:
+        """Index the first `upto` bytes of a file written before the index existed."""
+        records: List[Tuple[int, int]] = []
+        last: Optional[int] = None
+        with open(path, "rb") as f:
+            pos = 0
+            for raw in f:
+                if pos >= upto:
+                    break
+                if last is None or pos - last >= self.index_bytes:
+                    try:
+                        ts = entry_ts_ms(json.loads(raw))
+                    except ValueError:
+                        ts = None
+                    if ts is not None:
+                        # The first record always covers offset 0.
+                        records.append((ts, 0 if last is None else pos))
+                        last = records[-1][1]
+                pos += len(raw)
+        if records:
+            with open(idx, "wb") as fi:
+                fi.write(b"".join(_REC.pack(ts, off) for ts, off in records))
+        return last
+
+    def _rotate(self, user_id: str, path: Path, idx: Path) -> None:
+        d = self._sealed_dir(user_id)
+        d.mkdir(parents=True, exist_ok=True)
+        existing = sorted(d.glob("*.jsonl"))
+        seq = int(existing[-1].stem) + 1 if existing else 1
+        dest = d / f"{seq:08d}.jsonl"
+        if idx.exists():
+            os.replace(idx, f"{dest}.idx")
+        os.replace(path, dest)
+        self.compact(user_id)
+
+    def compact(self, user_id: str) -> int:
+        """Drop the oldest sealed segments beyond max_segments; returns how many."""
+        if not self.max_segments:
+            return 0
+        d = self._sealed_dir(user_id)
+        sealed = sorted(d.glob("*.jsonl")) if d.is_dir() else []
+        drop = sealed[: max(0, len(sealed) - self.max_segments)]
+        for p in drop:
+            for q in (p, Path(f"{p}.idx")):
+                try:
+                    q.unlink()
+                except FileNotFoundError:
+                    pass
+        return len(drop)
+
+    # ── Read ─────────────────────────────────────────────────────────────────
+    def iter_reverse(
+        self,
+        user_id: str,
+        *,
+        before_ms: Optional[int] = None,
+        since_ms: Optional[int] = None,
+    ) -> Iterator[Dict[str, Any]]:
+        """
+        Entries newest → oldest, reading each segment backwards from EOF.
+
+        before_ms / since_ms bound the walk: the index lets a segment start
+        reading near the first entry <= before_ms, and the walk stops at the
+        first entry older than since_ms. Both bounds are inclusive; entries
+        without a timestamp only appear in unbounded walks.
+        """
+        for seg in reversed(self.segments(user_id)):
+            end = None
+            if before_ms is not None:
+                index = _read_index(Path(f"{seg}.idx"))
+                if index and index[0][1] == 0 and index[0][0] > before_ms:
+                    continue  # whole segment is newer than the bound
+                k = bisect.bisect_right([r[0] for r in index], before_ms)
+                if k < len(index):
+                    end = index[k][1]
+            for entry in reverse_jsonl(seg, end=end):
+                if before_ms is None and since_ms is None:
+                    yield entry
+                    continue
+                ts = entry_ts_ms(entry)
+                if ts is None:
+                    continue
+                if before_ms is not None and ts > before_ms:
+                    continue
+                if since_ms is not None and ts < since_ms:
+                    return
+                yield entry
+
+    def tail(self, user_id: str, limit: int = 10) -> List[Dict[str, Any]]:
+        """Last `limit` entries in chronological order; cost is O(limit)."""
+        out: List[Dict[str, Any]] = []
+        if limit <= 0:
+            return out
+        for entry in self.iter_reverse(user_id):
+            out.append(entry)
+            if len(out) >= limit:
+                break
+        out.reverse()
+        return out
+
+    def range(
+        self,
+        user_id: str,
+        start: Optional[datetime] = None,
+        end: Optional[datetime] = None,
+        *,
+        limit: Optional[int] = None,
+    ) -> Iterator[Dict[str, Any]]:
+        """Entries with start <= timestamp < end, oldest first, via the sparse index."""
+        lo = int(start.timestamp() * 1000) if start else None
+        hi = int(end.timestamp() * 1000) if end else None
+        segs = self.segments(user_id)
+        # A segment's first ts is only known when its first record covers offset 0.
+        firsts = [_first_ts(s) for s in segs]
+        emitted = 0
+        for i, seg in enumerate(segs):
+            nxt = firsts[i + 1] if i + 1 < len(segs) else None
+            if lo is not None and nxt is not None and nxt < lo:
+                continue  # every entry here precedes the next segment's first
+            if hi is not None and firsts[i] is not None and firsts[i] >= hi:
+                return
+            index = _read_index(Path(f"{seg}.idx"))
+            offset = 0
+            if lo is not None and index:
+                k = bisect.bisect_left([r[0] for r in index], lo) - 1
+                offset = index[k][1] if k >= 0 else 0
+            with open(seg, "rb") as f:
+                _seek_line(f, offset)
+                for raw in f:
+                    if not raw.endswith(b"\n"):
+                        break  # in-progress write
+                    try:
+                        entry = json.loads(raw)
+                    except ValueError:
+                        continue
+                    ts = entry_ts_ms(entry)
+                    if ts is None:
+                        continue
+                    if lo is not None and ts < lo:
+                        continue
+                    if hi is not None and ts >= hi:
+                        return
+                    yield entry
+                    emitted += 1
+                    if limit is not None and emitted >= limit:
+                        return
+
+    def iter_untimestamped(self, user_id: str) -> Iterator[Dict[str, Any]]:
+        """Entries with no parseable timestamp, oldest first (appends never reorder them)."""
+        for seg in self.segments(user_id):
+            with open(seg, "rb") as f:
+                for raw in f:
+                    if not raw.endswith(b"\n"):
+                        break  # in-progress write
+                    try:
+                        entry = json.loads(raw)
+                    except ValueError:
+                        continue
+                    if entry_ts_ms(entry) is None:
+                        yield entry
+
+
+_store: Optional[SessionStore] = None
+
+
+def get_store() -> SessionStore:
+    """Process-wide store rooted at SESSION_DIR (default ./logs/sessions)."""
+    global _store
+    if _store is None:
+        _store = SessionStore(
+            Path(os.getenv("SESSION_DIR", "./logs/sessions")),
+            segment_bytes=_env_int("SESSION_SEGMENT_BYTES", 8 * 1024 * 1024),
+            max_segments=_env_int("SESSION_MAX_SEGMENTS", 0),
+            index_bytes=_env_int("SESSION_INDEX_BYTES", 64 * 1024),
+        )
+    return _store
@@ -0,0 +1,239 @@
+# ──────────────────────────────────────────────────────────────────────────────
+# File: services/solar_rollups.py
+# Purpose: Read side of the solark.plant_flow rollups (1m / 15m / 1h / 1d)
+#
+# Notes:
+#   • Tables and columns are written by backend/solark_browser/plant_flow_rollups.py;
+#     GRAINS / METRICS / ENERGY here must stay in sync with that module.
+#   • grain="auto" picks the finest grain that keeps the window under
+#     SOLAR_MAX_POINTS buckets (30 days → 1h → 720 rows).
+#   • Results are cached in-process. Windows that are fully in the past are
+#     cached for SOLAR_CACHE_TTL_S; windows touching the open bucket use the
+#     short SOLAR_CACHE_LIVE_TTL_S. Closed buckets are not immutable — spool
+#     replay and late batches rebuild them in the writer process — so the
+#     closed TTL bounds how long a rebuilt window can be served stale.
+#   • psycopg2 is imported lazily so the app boots without a database.
+#
+# Env: SOLARK_DATABASE_URL (or DATABASE_URL), PLANT_ID, SOLAR_MAX_POINTS=1000,
+#      SOLAR_CACHE_TTL_S=300, SOLAR_CACHE_LIVE_TTL_S=30, SOLAR_CACHE_ENTRIES=256
+# ──────────────────────────────────────────────────────────────────────────────
+
+from __future__ import annotations
+
+import collections
+import logging
+import os
+import threading
+import time
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+from services.cache import keyed_hash
+
+logger = logging.getLogger("relay.solar")
+
+GRAINS: Dict[str, int] = {"1m": 60, "15m": 900, "1h": 3600, "1d": 86400}
+POWER_METRICS: Tuple[str, ...] = ("pv_power", "batt_power", "grid_power", "load_power", "gen_power")
+METRICS: Tuple[str, ...] = POWER_METRICS + ("soc",)
+ENERGY: Dict[str, str] = {m: m.replace("_power", "_wh") for m in POWER_METRICS}
+
+
+class SolarDataUnavailable(RuntimeError):
+    """Database not configured/reachable (routes map this to 503)."""
+
+
+def _env_int(name: str, default: int) -> int:
+    try:
+        return int(os.getenv(name, str(default)))
+    except ValueError:
+        return default
+
+
+def align(ts: datetime, width_s: int, *, up: bool = False) -> datetime:
+    """Floor (or ceil) ts to a UTC bucket boundary."""
+    epoch = int(ts.timestamp())
+    floor = epoch - (epoch % width_s)
+    if up and floor != epoch:
+        floor += width_s
+    return datetime.fromtimestamp(floor, tz=timezone.utc)
+
+
+def pick_grain(start: datetime, end: datetime, max_points: Optional[int] = None) -> str:
+    """Finest grain whose bucket count for [start, end) stays within max_points."""
+    limit = max_points or _env_int("SOLAR_MAX_POINTS", 1000)
+    span = max(1.0, (end - start).total_seconds())
+    for grain, width in GRAINS.items():
+        if span / width <= limit:
+            return grain
+    return "1d"
+
+
+# ╔══════════════════════════════════════════════════════════════════════════╗
+# ║ Response cache                                                           ║
+# ╚══════════════════════════════════════════════════════════════════════════╝
+
+class _TTLCache:
+    """Tiny thread-safe LRU with per-entry expiry."""
+
+    def __init__(self, max_entries: int):
+        self.max_entries = max(1, max_entries)
+        self._data: "collections.OrderedDict[str, Tuple[float, Any]]" = collections.OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: str) -> Optional[Any]:
+        with self._lock:
+            item = self._data.get(key)
+            if item is None or item[0] < time.monotonic():
+                if item is not None:
+                    del self._data[key]
+                self.misses += 1
+                return None
+            self._data.move_to_end(key)
+            self.hits += 1
+            return item[1]
+
+    def put(self, key: str, value: Any, ttl_s: float) -> None:
+        with self._lock:
+            self._data[key] = (time.monotonic() + ttl_s, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+
+
+_cache = _TTLCache(_env_int("SOLAR_CACHE_ENTRIES", 256))
+
+
+# ╔══════════════════════════════════════════════════════════════════════════╗
+# ║ Database                                                                 ║
+# ╚══════════════════════════════════════════════════════════════════════════╝
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def _get_pool():
+    global _pool
+    if _pool is not None:
+        return _pool
+    dsn = os.getenv("SOLARK_DATABASE_URL") or os.getenv("DATABASE_URL")
+    if not dsn:
+        raise SolarDataUnavailable("SOLARK_DATABASE_URL / DATABASE_URL not configured")
+    with _pool_lock:
+        if _pool is None:
+            try:
+                from psycopg2 import pool as pg_pool  # type: ignore
+            except Exception as e:
+                raise SolarDataUnavailable(f"psycopg2 unavailable: {e}")
+            try:
+                _pool = pg_pool.ThreadedConnectionPool(1, _env_int("SOLAR_DB_POOL_MAX", 4), dsn=dsn)
+            except Exception as e:
+                raise SolarDataUnavailable(f"database connect failed: {e}")
+    return _pool
+
+
+def _select_sql(grain: str, metrics: Sequence[str]) -> str:
+    cols = ["bucket", "n"]
+    for m in metrics:
+        cols += [f"{m}_min", f"{m}_max", f"{m}_sum / NULLIF({m}_n, 0) AS {m}_avg", f"{m}_last"]
+    cols += [ENERGY[m] for m in metrics if m in ENERGY]
+    return (
+        f"SELECT {', '.join(cols)} FROM solark.plant_flow_{grain} "
+        "WHERE plant_id = %s AND bucket >= %s AND bucket < %s ORDER BY bucket"
+    )
+
+
+def _fetch_rows(plant_id: int, grain: str, start: datetime, end: datetime,
+                metrics: Sequence[str]) -> List[Dict[str, Any]]:
+    """Run the rollup SELECT and shape rows as {bucket, n, <metric>:{min,max,avg,last}, energy_wh:{}}."""
+    pool = _get_pool()
+    conn = pool.getconn()
+    broken = False
+    try:
+        with conn.cursor() as cur:
+            cur.execute(_select_sql(grain, metrics), (plant_id, start, end))
+            raw = cur.fetchall()
+        conn.rollback()  # read-only; end the implicit transaction
+    except Exception as e:
+        broken = bool(getattr(conn, "closed", 0))
+        raise SolarDataUnavailable(f"rollup query failed: {e}")
+    finally:
+        pool.putconn(conn, close=broken)
+
+    out: List[Dict[str, Any]] = []
+    for r in raw:
+        row: Dict[str, Any] = {"bucket": r[0].isoformat(), "n": r[1]}
+        i = 2
+        for m in metrics:
+            row[m] = {"min": r[i], "max": r[i + 1], "avg": r[i + 2], "last": r[i + 3]}
+            i += 4
+        energy = {}
+        for m in metrics:
+            if m in ENERGY:
+                energy[ENERGY[m]] = r[i]
+                i += 1
+        if energy:
+            row["energy_wh"] = energy
+        out.append(row)
+    return out
+
+
+# ╔══════════════════════════════════════════════════════════════════════════╗
+# ║ Public API                                                               ║
+# ╚══════════════════════════════════════════════════════════════════════════╝
+
+def query_window(
+    plant_id: int,
+    start: datetime,
+    end: datetime,
+    *,
+    grain: str = "auto",
+    metrics: Optional[Sequence[str]] = None,
+    now: Optional[datetime] = None,
+) -> Dict[str, Any]:
+    """
+    Aggregated rows for [start, end) from the rollup tables.
+
+    Returns {grain, start, end, rows, cached, ttl_s}. start/end are widened to
+    bucket boundaries so nearby requests share cache entries.
+    """
+    if grain == "auto":
+        grain = pick_grain(start, end)
+    if grain not in GRAINS:
+        raise ValueError(f"unknown grain: {grain}")
+    wanted = [m for m in (metrics or METRICS) if m in METRICS]
+    if not wanted:
+        raise ValueError(f"no known metrics requested (valid: {', '.join(METRICS)})")
+
+    width = GRAINS[grain]
+    a_start, a_end = align(start, width), align(end, width, up=True)
+    now = now or datetime.now(timezone.utc)
+    live = a_end > align(now, width)
+    ttl_s = float(os.getenv("SOLAR_CACHE_LIVE_TTL_S", "30") if live else os.getenv("SOLAR_CACHE_TTL_S", "300"))
+
+    key = keyed_hash("solar", {
+        "plant": plant_id, "grain": grain, "start": a_start.isoformat(),
+        "end": a_end.isoformat(), "metrics": wanted,
+    })
+    rows = _cache.get(key)
+    cached = rows is not None
+    if rows is None:
+        rows = _fetch_rows(plant_id, grain, a_start, a_end, wanted)
+        _cache.put(key, rows, ttl_s)
+    return {
+        "grain": grain,
+        "start": a_start.isoformat(),
+        "end": a_end.isoformat(),
+        "rows": rows,
+        "cached": cached,
+        "ttl_s": ttl_s,
+    }
+
+
+def cache_stats() -> Dict[str, Any]:
+    return {"entries": len(_cache._data), "hits": _cache.hits, "misses": _cache.misses}
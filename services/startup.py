@@ -0,0 +1,312 @@
+# ─────────────────────────────────────────────────────────────────────────────
+# File: startup.py
+# Directory: services
+# Purpose: Startup-time tooling for main: per-module import timings
+#          (importtime-style) and lazy router mounting behind route stubs.
+#
+# Upstream:
+#   - ENV: STARTUP_PROFILE (default 1), STARTUP_PROFILE_MAX_S (default 300),
+#          ROUTER_MOUNT (eager|lazy, default eager)
+#   - Imports: builtins, fastapi, importlib, starlette, threading
+#
+# Downstream:
+#   - main (install profiler, mount routers, /debug/startup)
+#
+# Contents:
+#   - ImportProfiler (install / uninstall / mark / report)
+#   - LazyRouters (add / prepare / mount / load / prepare_all / mount_all /
+#     load_all / report)
+#   - import_profiler (module singleton)
+#
+# Notes:
+#   • The profiler wraps builtins.__import__ only for startup: main uninstalls
+#     it once warmup and router preload are done, and it removes itself after
+#     STARTUP_PROFILE_MAX_S regardless. It times imports of modules not yet in
+#     sys.modules, including `from pkg import submodule` when pkg is already
+#     loaded. "self_ms" excludes nested first-time imports, like
+#     `python -X importtime`.
+#   • A lazy router is represented by one stub route per URL prefix. The first
+#     request under that prefix imports the module in a worker thread
+#     (prepare), then splices its routes in where the stub was on the event
+#     loop (mount), and re-dispatches the request through the app router, so
+#     the caller sees the real endpoint. app.router.routes is only ever
+#     changed on the loop thread (or before serving).
+# ─────────────────────────────────────────────────────────────────────────────
+
+from __future__ import annotations
+
+import builtins
+import importlib
+import logging
+import os
+import sys
+import threading
+import time
+import traceback
+from typing import Any, Dict, List, Optional
+
+logger = logging.getLogger("relay.startup")
+
+MAX_RECORDS = 5000
+
+
+class ImportProfiler:
+    def __init__(self, max_s: Optional[float] = None) -> None:
+        self.t0 = time.perf_counter()
+        self.max_s = max_s
+        self.records: Dict[str, Dict[str, Any]] = {}
+        self.marks: Dict[str, float] = {}
+        self._local = threading.local()
+        self._orig_import = None
+
+    @property
+    def installed(self) -> bool:
+        return self._orig_import is not None
+
+    def install(self) -> None:
+        if self.installed:
+            return
+        self._orig_import = builtins.__import__
+        builtins.__import__ = self._import
+
+    def uninstall(self) -> None:
+        if self._orig_import is not None and builtins.__import__ is self._import:
+            builtins.__import__ = self._orig_import
+        self._orig_import = None
+
+    def mark(self, name: str) -> None:
+        """Record a named startup milestone (ms since the profiler was created)."""
+        self.marks.setdefault(name, round((time.perf_counter() - self.t0) * 1000, 1))
+
+    def _import(self, name, globals=None, locals=None, fromlist=(), level=0):
+        orig = self._orig_import or importlib.__import__
+        if self.max_s is not None and time.perf_counter() - self.t0 > self.max_s:
+            self.uninstall()  # startup is long over; stop taxing every import
+            return orig(name, globals, locals, fromlist, level)
+        key = name
+        if level:
+            pkg = (globals or {}).get("__package__") or ""
+            key = f"{pkg}.{name}" if name else pkg
+        if len(self.records) >= MAX_RECORDS:
+            return orig(name, globals, locals, fromlist, level)
+        if key in sys.modules:
+            if fromlist:
+                # `from pkg import sub`: pkg is loaded but sub may not be.
+                mod = sys.modules[key]
+                for item in fromlist:
+                    if item != "*" and not hasattr(mod, item):
+                        self._timed(f"{key}.{item}", importlib.import_module, f"{key}.{item}")
+            return orig(name, globals, locals, fromlist, level)
+        return self._timed(key, orig, name, globals, locals, fromlist, level)
+
+    def _timed(self, key: str, fn, *args):
+        if key in sys.modules:
+            return fn(*args)
+        stack = getattr(self._local, "stack", None)
+        if stack is None:
+            stack = self._local.stack = []
+        parent = stack[-1][0] if stack else None
+        stack.append([key, 0.0])
+        t0 = time.perf_counter()
+        try:
+            return fn(*args)
+        except ImportError:
+            if fn is importlib.import_module:
+                return None  # a plain attribute, or a real error orig() will raise
+            raise
+        finally:
+            cum = time.perf_counter() - t0
+            _key, child = stack.pop()
+            if stack:
+                stack[-1][1] += cum
+            if key not in self.records and key in sys.modules:
+                self.records[key] = {
+                    "module": key,
+                    "self_ms": round((cum - child) * 1000, 2),
+                    "cumulative_ms": round(cum * 1000, 2),
+                    "parent": parent,
+                    "at_ms": round((t0 - self.t0) * 1000, 1),
+                }
+
+    def report(self, *, limit: int = 50, sort: str = "cumulative") -> Dict[str, Any]:
+        field = "self_ms" if sort == "self" else "cumulative_ms"
+        rows = sorted(self.records.values(), key=lambda r: r[field], reverse=True)
+        top_level = [r for r in self.records.values() if r["parent"] is None]
+        return {
+            "installed": self.installed,
+            "sort": field,
+            "modules_recorded": len(self.records),
+            "top_level_import_ms": round(sum(r["cumulative_ms"] for r in top_level), 1),
+            "marks_ms": dict(self.marks),
+            "modules": rows[: max(0, limit)],
+        }
+
+
+def _max_s() -> Optional[float]:
+    try:
+        value = float(os.getenv("STARTUP_PROFILE_MAX_S") or 300)
+    except ValueError:
+        value = 300.0
+    return value if value > 0 else None
+
+
+import_profiler = ImportProfiler(max_s=_max_s())
+
+
+class LazyRouters:
+    """Mount routers eagerly, or lazily behind per-prefix stub routes."""
+
+    def __init__(self, app) -> None:
+        self.app = app
+        self.entries: Dict[str, Dict[str, Any]] = {}
+        self._lock = threading.RLock()
+
+    def include(self, module_path: str, *, required: bool) -> None:
+        """Eager mount (the pre-existing behavior), recorded for the report."""
+        entry = self._entry(module_path, mode="eager", prefixes=[], required=required)
+        self._import_and_mount(module_path, entry, at=None)
+
+    def add(self, module_path: str, prefixes: List[str]) -> None:
+        """Register stubs for *prefixes*; the router module is imported on first use."""
+        from starlette.routing import Route
+
+        entry = self._entry(module_path, mode="lazy", prefixes=prefixes, required=False)
+        for prefix in prefixes:
+            stub = Route(f"{prefix}{{_lazy_rest:path}}", endpoint=_StubEndpoint(self, module_path), include_in_schema=False)
+            stub.lazy_router = module_path  # type: ignore[attr-defined]
+            entry["stubs"].append(stub)
+            self.app.router.routes.append(stub)
+
+    def prepare(self, module_path: str) -> None:
+        """Import a lazy router's module (any thread; routes are not touched)."""
+        entry = self.entries[module_path]
+        if entry["loaded"] or entry["error"] or entry["router"] is not None:
+            return
+        t0 = time.perf_counter()
+        try:
+            router = self._import_router(module_path)
+        except Exception as e:
+            self._skip(module_path, entry, e)
+        else:
+            with self._lock:
+                entry["router"] = router
+        finally:
+            entry["import_ms"] = round((time.perf_counter() - t0) * 1000, 1)
+
+    def mount(self, module_path: str) -> bool:
+        """Splice a prepared router in place of its stubs. Call on the event loop thread."""
+        with self._lock:
+            entry = self.entries[module_path]
+            if entry["loaded"] or (entry["router"] is None and not entry["error"]):
+                return entry["loaded"]
+            routes = self.app.router.routes
+            at = min((routes.index(s) for s in entry["stubs"] if s in routes), default=None)
+            for stub in entry["stubs"]:
+                if stub in routes:
+                    routes.remove(stub)  # a failed import 404s from here on
+            if entry["error"]:
+                return False
+            self._mount(module_path, entry["router"], entry, at=at)
+            entry["router"] = None
+            return True
+
+    def load(self, module_path: str) -> bool:
+        """prepare + mount on the caller's thread (before serving, or from the loop)."""
+        self.prepare(module_path)
+        return self.mount(module_path)
+
+    def prepare_all(self) -> None:
+        """Post-ready phase, off the loop: import every pending lazy router."""
+        for module_path in self.pending():
+            self.prepare(module_path)
+
+    def mount_all(self) -> None:
+        """Splice every prepared router (event loop thread)."""
+        for module_path in list(self.entries):
+            self.mount(module_path)
+
+    def load_all(self) -> None:
+        for module_path in self.pending():
+            self.load(module_path)
+
+    def pending(self) -> List[str]:
+        return [m for m, e in self.entries.items() if e["mode"] == "lazy" and not e["loaded"] and not e["error"]]
+
+    def report(self) -> Dict[str, Any]:
+        return {m: {k: v for k, v in e.items() if k not in {"stubs", "router"}} for m, e in self.entries.items()}
+
+    # internals
+
+    def _entry(self, module_path: str, *, mode: str, prefixes: List[str], required: bool) -> Dict[str, Any]:
+        entry = {
+            "mode": mode,
+            "prefixes": prefixes,
+            "required": required,
+            "loaded": False,
+            "import_ms": None,
+            "error": None,
+            "router": None,  # imported, waiting for mount()
+            "stubs": [],
+        }
+        self.entries[module_path] = entry
+        return entry
+
+    def _import_and_mount(self, module_path: str, entry: Dict[str, Any], *, at: Optional[int]) -> None:
+        t0 = time.perf_counter()
+        try:
+            self._mount(module_path, self._import_router(module_path), entry, at=at)
+        except Exception as e:
+            self._skip(module_path, entry, e)
+        finally:
+            entry["import_ms"] = round((time.perf_counter() - t0) * 1000, 1)
+
+    @staticmethod
+    def _import_router(module_path: str):
+        from fastapi import APIRouter
+
+        module = importlib.import_module(module_path)
+        router = getattr(module, "router", None)
+        if router is None or not isinstance(router, APIRouter):
+            raise ImportError(f"no/invalid 'router' in {module_path}")
+        return router
+
+    def _mount(self, module_path: str, router, entry: Dict[str, Any], *, at: Optional[int]) -> None:
+        routes = self.app.router.routes
+        before = len(routes)
+        self.app.include_router(router)
+        if at is not None:
+            added = routes[before:]
+            del routes[before:]
+            routes[at:at] = added
+        self.app.openapi_schema = None  # rebuild with the new routes
+        entry["loaded"] = True
+        logger.info("🔌 Router enabled (%s): %s", entry["mode"], module_path)
+
+    @staticmethod
+    def _skip(module_path: str, entry: Dict[str, Any], e: Exception) -> None:
+        entry["error"] = f"{e.__class__.__name__}: {e}"
+        if entry["required"]:
+            logger.exception("💥 Required router failed: %s", module_path)
+            raise e
+        logger.error("⏭️  Router skipped (%s): %s\n%s", module_path, e, traceback.format_exc())
+
+
+class _StubEndpoint:
+    """ASGI endpoint for a lazy stub: load the router, then re-dispatch."""
+
+    def __init__(self, lazy: LazyRouters, module_path: str) -> None:
+        self.lazy = lazy
+        self.module_path = module_path
+
+    async def __call__(self, scope, receive, send) -> None:
+        import anyio
+
+        # Import off the loop; splice on it, so routing never sees a half-edited list.
+        await anyio.to_thread.run_sync(self.lazy.prepare, self.module_path)
+        self.lazy.mount(self.module_path)
+        await self.lazy.app.router(scope, receive, send)
+
+
+def router_mount_mode() -> str:
+    mode = (os.getenv("ROUTER_MOUNT") or "eager").strip().lower()
+    return mode if mode in {"eager", "lazy"} else "eager"
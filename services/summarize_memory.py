@@ -5,7 +5,7 @@
 #
 # Upstream:
 #   - ENV: —
-#   - Imports: openai, os, utils.openai_client
+#   - Imports: services.openai_client
 #
 # Downstream:
 #   - services.context_injector
@@ -13,11 +13,7 @@
 # Contents:
 #   - summarize_memory_entry()
 # ─────────────────────────────────────────────────────────────────────────────
-import os
-from openai import AsyncOpenAI
-from utils.openai_client import create_openai_client
-
-client = create_openai_client()
+from services import openai_client
 
 async def summarize_memory_entry(question: str, response: str, context: str = "") -> str:
     prompt = f"""
@@ -34,7 +30,11 @@ Context (if needed):
 
 Summary:
 """
-    result = await client.chat.completions.create(
+    # Memory summaries are background work: queued behind interactive /ask calls
+    result = await openai_client.chat_create(
+        priority="background",
+        cache="memory_summary",
+        cache_opt_in=True,  # low temperature; a repeat of the same Q/A may reuse it
         model="gpt-4o",
         messages=[{"role": "user", "content": prompt}],
         temperature=0.2
@@ -57,3 +57,37 @@ def set_circuit_state(dep: str, is_closed: bool, route: str = "mcp"):
     if not _enabled:
         return
     DEP_CIRCUIT.add(+1 if is_closed else -1, {"dep": dep, "route": route})
+
+# Lazily-created instruments for subsystem metrics (queues, caches, lag).
+# Keyed by name so callers can record without pre-declaring anything here.
+_instruments: dict = {}
+
+def _instrument(kind: str, name: str, unit: str):
+    inst = _instruments.get(name)
+    if inst is None and _enabled and _meter:
+        if kind == "histogram":
+            inst = _meter.create_histogram(name=name, unit=unit)
+        elif kind == "updown":
+            inst = _meter.create_up_down_counter(name=name, unit=unit)
+        else:
+            inst = _meter.create_counter(name=name, unit=unit)
+        _instruments[name] = inst
+    return inst
+
+def observe(name: str, value: float, attrs: Optional[dict] = None, unit: str = "ms"):
+    """Record a histogram sample (e.g. lag, latency). No-op without OTEL."""
+    inst = _instrument("histogram", name, unit)
+    if inst is not None:
+        inst.record(value, attrs or {})
+
+def incr(name: str, n: int = 1, attrs: Optional[dict] = None):
+    """Increment a monotonic counter. No-op without OTEL."""
+    inst = _instrument("counter", name, "1")
+    if inst is not None:
+        inst.add(n, attrs or {})
+
+def adjust(name: str, delta: int, attrs: Optional[dict] = None):
+    """Move an up/down gauge (e.g. queue depth) by delta. No-op without OTEL."""
+    inst = _instrument("updown", name, "1")
+    if inst is not None:
+        inst.add(delta, attrs or {})
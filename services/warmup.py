@@ -0,0 +1,224 @@
+# ─────────────────────────────────────────────────────────────────────────────
+# File: warmup.py
+# Directory: services
+# Purpose: Background pre-warm of the /ask hot path after startup, with a
+#          state (warming | ready | degraded) that gates /readyz.
+#
+# Upstream:
+#   - ENV: WARMUP (default 1), WARMUP_IMPORTS (comma list of modules),
+#          WARMUP_QUERY (default "warmup"),
+#          WARMUP_TIMEOUT_S (default 120; 0 = no deadline)
+#   - Imports: importlib, services.kb, services.token_budget, threading
+#
+# Downstream:
+#   - main (lifespan start)
+#   - routes.health (/readyz)
+#
+# Contents:
+#   - Warmup (add_step / start / run / wait / stats / state)
+#   - get_warmup()
+#
+# Notes:
+#   • Steps run in order on one daemon thread; each is timed and may fail on
+#     its own. Any failure leaves the app "degraded" (serving, but the first
+#     requests may still be cold); all passing → "ready".
+#   • Steps cannot be interrupted, so past WARMUP_TIMEOUT_S the state flips
+#     to "degraded" (the running step is marked "timed_out") and /readyz
+#     stops returning 503; the thread keeps going and the final state is
+#     still set when it finishes.
+#   • "idle" means no warmup was started (e.g. no lifespan in tests, or
+#     WARMUP=0 → reported as "ready" with every step skipped).
+# ─────────────────────────────────────────────────────────────────────────────
+
+from __future__ import annotations
+
+import importlib
+import logging
+import os
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+logger = logging.getLogger("relay.warmup")
+
+DEFAULT_IMPORTS = (
+    "llama_index.core",
+    "openai",
+    "services.kb",
+    "services.semantic_retriever",
+    "services.context_engine",
+    "agents.mcp_agent",
+)
+
+Step = Tuple[str, Callable[[], Any]]
+
+
+def _import_modules() -> Dict[str, Any]:
+    raw = os.getenv("WARMUP_IMPORTS")
+    names = [m.strip() for m in raw.split(",") if m.strip()] if raw else list(DEFAULT_IMPORTS)
+    timings: Dict[str, int] = {}
+    failed: Dict[str, str] = {}
+    for name in names:
+        t0 = time.perf_counter()
+        try:
+            importlib.import_module(name)
+        except Exception as e:
+            failed[name] = f"{e.__class__.__name__}: {e}"
+        timings[name] = int((time.perf_counter() - t0) * 1000)
+    if failed:
+        raise RuntimeError(f"imports failed: {failed}")
+    return {"modules_ms": timings}
+
+
+def _load_index() -> Dict[str, Any]:
+    from services import kb
+
+    index = kb.get_index()
+    if index is None:
+        raise RuntimeError("index unavailable")
+    return {"kind": type(index).__name__, "generation": getattr(index, "gen", None)}
+
+
+def _prime_embeddings() -> Dict[str, Any]:
+    from services import kb
+
+    return {"dim": len(kb._query_embedding(os.getenv("WARMUP_QUERY", "warmup")))}
+
+
+def _prime_tokenizer() -> Dict[str, Any]:
+    from services import token_budget
+
+    return {"tokens": token_budget.estimate_tokens("Relay warmup: prime the tokenizer cache.")}
+
+
+def _synthetic_retrieval() -> Dict[str, Any]:
+    from services import kb
+
+    rows = kb.search(query=os.getenv("WARMUP_QUERY", "warmup"), k=1)
+    return {"hits": len(rows)}
+
+
+DEFAULT_STEPS: List[Step] = [
+    ("imports", _import_modules),
+    ("index", _load_index),
+    ("query_embedding", _prime_embeddings),
+    ("tokenizer", _prime_tokenizer),
+    ("retrieval", _synthetic_retrieval),
+]
+
+
+def _timeout_from_env() -> float:
+    try:
+        return max(0.0, float(os.getenv("WARMUP_TIMEOUT_S", "120")))
+    except ValueError:
+        return 120.0
+
+
+class Warmup:
+    def __init__(self, steps: Optional[List[Step]] = None, timeout_s: Optional[float] = None) -> None:
+        self.steps = list(steps if steps is not None else DEFAULT_STEPS)
+        self.timeout_s = _timeout_from_env() if timeout_s is None else timeout_s
+        self.timed_out = False
+        self.state = "idle"
+        self.results: Dict[str, Dict[str, Any]] = {}
+        self.started_at: Optional[float] = None
+        self.finished_at: Optional[float] = None
+        self._lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+
+    def add_step(self, name: str, fn: Callable[[], Any], *, first: bool = False) -> None:
+        if any(n == name for n, _fn in self.steps):
+            return
+        self.steps.insert(0 if first else len(self.steps), (name, fn))
+
+    def start(self) -> None:
+        """Run the steps on a daemon thread (no-op if already started)."""
+        with self._lock:
+            if self.state != "idle":
+                return
+            self.state = "warming"
+            self.started_at = time.time()
+        self._thread = threading.Thread(target=self.run, name="relay-warmup", daemon=True)
+        self._thread.start()
+
+    def skip(self) -> None:
+        with self._lock:
+            self.state = "ready"
+            self.results = {name: {"status": "skipped", "ms": 0} for name, _fn in self.steps}
+
+    def wait(self, timeout: Optional[float] = None) -> str:
+        """Block until a started warmup finishes (or *timeout*); returns the state."""
+        if self._thread is not None:
+            self._thread.join(timeout)
+        return self.state
+
+    def run(self) -> str:
+        """Run every step synchronously; returns the final state."""
+        self.state = "warming"
+        self.started_at = self.started_at or time.time()
+        timer = None
+        if self.timeout_s > 0:
+            timer = threading.Timer(self.timeout_s, self._expire)
+            timer.daemon = True
+            timer.start()
+        degraded = False
+        for name, fn in self.steps:
+            self.results[name] = {"status": "running", "ms": None}
+            t0 = time.perf_counter()
+            try:
+                detail = fn()
+                res: Dict[str, Any] = {"status": "ok"}
+                if isinstance(detail, dict):
+                    res["detail"] = detail
+            except Exception as e:
+                degraded = True
+                res = {"status": "failed", "error": f"{e.__class__.__name__}: {e}"}
+                logger.warning("warmup step %s failed: %s", name, e)
+            res["ms"] = int((time.perf_counter() - t0) * 1000)
+            self.results[name] = res
+        if timer is not None:
+            timer.cancel()
+        self.finished_at = time.time()
+        self.state = "degraded" if degraded else "ready"
+        logger.info(
+            "warmup %s in %.0f ms: %s",
+            self.state,
+            (self.finished_at - self.started_at) * 1000,
+            {k: v["ms"] for k, v in self.results.items()},
+        )
+        return self.state
+
+    def _expire(self) -> None:
+        """Deadline passed: stop gating readiness on the steps still running."""
+        with self._lock:
+            if self.state != "warming":
+                return
+            self.timed_out = True
+            self.state = "degraded"
+            for name, res in self.results.items():
+                if res.get("status") == "running":
+                    self.results[name] = {"status": "timed_out", "ms": int(self.timeout_s * 1000)}
+        logger.warning("warmup exceeded %.0fs; serving as degraded while it finishes", self.timeout_s)
+
+    def stats(self) -> Dict[str, Any]:
+        total_ms = None
+        if self.started_at and self.finished_at:
+            total_ms = int((self.finished_at - self.started_at) * 1000)
+        return {
+            "state": self.state,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+            "total_ms": total_ms,
+            "timed_out": self.timed_out,
+            "steps": {k: dict(v) for k, v in self.results.items()},
+        }
+
+
+_warmup: Optional[Warmup] = None
+
+
+def get_warmup() -> Warmup:
+    global _warmup
+    if _warmup is None:
+        _warmup = Warmup()
+    return _warmup
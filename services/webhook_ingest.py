@@ -0,0 +1,447 @@
+# ──────────────────────────────────────────────────────────────────────────────
+# File: services/webhook_ingest.py
+# Purpose: Durable, bounded ingestion primitives for inbound webhooks
+#
+# Contents:
+#   • DeliveryIndex   — SQLite-backed delivery-id dedup with TTL (survives
+#                       restarts, shared across workers on the same volume);
+#                       also holds each accepted event until it is processed
+#   • EventLogWriter  — JSONL appender that keeps one handle open and flushes in
+#                       batches; fsync policy is configurable
+#   • IngestQueue     — bounded asyncio queue + single consumer task; offer()
+#                       never blocks, so callers can answer 503 when full
+#
+# Notes:
+#   • Nothing here knows about GitHub; routes/webhooks_github wires it up.
+#   • All file/DB errors are logged and swallowed — ingestion must not crash
+#     the web worker.
+# ──────────────────────────────────────────────────────────────────────────────
+
+from __future__ import annotations
+
+import asyncio
+import collections
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Any, Callable, Deque, Dict, List, Optional, Tuple
+
+from services import telemetry
+
+log = logging.getLogger("relay.webhook_ingest")
+
+
+# ╔══════════════════════════════════════════════════════════════════════════╗
+# ║ Delivery-id dedup index                                                  ║
+# ╚══════════════════════════════════════════════════════════════════════════╝
+
+class DeliveryIndex:
+    """
+    Persistent "have we accepted this delivery?" index with a TTL.
+
+    claim() is an atomic insert-if-absent, so two workers racing on the same
+    redelivery cannot both accept it. The row keeps the event and payload in
+    state "queued" until done() marks it processed, so an event lost from the
+    in-memory queue (crash, restart, undrained shutdown) is not lost: after
+    lease_s a redelivery may take the claim over, and orphans() hands the
+    stored payload back for replay. release() undoes a claim when the event
+    could not be queued (so the sender's retry is not swallowed as a dupe).
+    """
+
+    _PRUNE_EVERY = 256  # claims between opportunistic TTL sweeps
+
+    def __init__(self, path: str | Path, ttl_s: float, lease_s: float = 300.0):
+        self.path = Path(path)
+        self.ttl_s = float(ttl_s)
+        self.lease_s = float(lease_s)
+        self._lock = threading.Lock()
+        self._conn: Optional[sqlite3.Connection] = None
+        self._claims_since_prune = 0
+
+    def _db(self) -> sqlite3.Connection:
+        if self._conn is None:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            conn = sqlite3.connect(str(self.path), timeout=5.0, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS deliveries ("
+                " delivery_id TEXT PRIMARY KEY,"
+                " seen_at REAL NOT NULL)"
+            )
+            cols = {row[1] for row in conn.execute("PRAGMA table_info(deliveries)")}
+            for col, decl in (("state", "TEXT NOT NULL DEFAULT 'done'"), ("event", "TEXT"), ("payload", "TEXT")):
+                if col not in cols:
+                    conn.execute(f"ALTER TABLE deliveries ADD COLUMN {col} {decl}")
+            conn.execute("CREATE INDEX IF NOT EXISTS deliveries_seen_at ON deliveries(seen_at)")
+            conn.commit()
+            self._conn = conn
+        return self._conn
+
+    def claim(self, delivery_id: str, event: str = "", payload: Any = None) -> bool:
+        """
+        Return True if delivery_id is new (and record it as queued with its
+        payload); False if a live dupe. A claim still "queued" after lease_s
+        (its event never finished) is taken over by the redelivery.
+        """
+        if not delivery_id:
+            return True
+        now = time.time()
+        body = json.dumps(payload, separators=(",", ":")) if payload is not None else None
+        with self._lock:
+            try:
+                db = self._db()
+                # Expired rows are treated as absent
+                db.execute(
+                    "DELETE FROM deliveries WHERE delivery_id = ? AND seen_at < ?",
+                    (delivery_id, now - self.ttl_s),
+                )
+                cur = db.execute(
+                    "INSERT OR IGNORE INTO deliveries(delivery_id, seen_at, state, event, payload)"
+                    " VALUES (?, ?, 'queued', ?, ?)",
+                    (delivery_id, now, event, body),
+                )
+                if cur.rowcount != 1:
+                    cur = db.execute(
+                        "UPDATE deliveries SET seen_at = ?, event = ?, payload = ?"
+                        " WHERE delivery_id = ? AND state = 'queued' AND seen_at < ?",
+                        (now, event, body, delivery_id, now - self.lease_s),
+                    )
+                db.commit()
+                fresh = cur.rowcount == 1
+                self._claims_since_prune += 1
+                if self._claims_since_prune >= self._PRUNE_EVERY:
+                    self._prune_locked(now)
+                return fresh
+            except sqlite3.Error as e:
+                # Fail open: better to reprocess than to drop an event
+                log.warning("delivery index unavailable (%s); accepting %s", e, delivery_id)
+                return True
+
+    def done(self, delivery_id: str) -> None:
+        """The event was processed: keep only the dedup marker."""
+        if not delivery_id:
+            return
+        with self._lock:
+            try:
+                db = self._db()
+                db.execute(
+                    "UPDATE deliveries SET state = 'done', event = NULL, payload = NULL WHERE delivery_id = ?",
+                    (delivery_id,),
+                )
+                db.commit()
+            except sqlite3.Error as e:
+                log.warning("delivery index done failed: %s", e)
+
+    def orphans(self, limit: int = 100) -> List[Tuple[str, str, Any]]:
+        """
+        Take over up to *limit* events still "queued" after lease_s (their
+        process died or shut down undrained). Returns (delivery_id, event,
+        payload); each is leased to the caller, so other workers skip it.
+        """
+        now = time.time()
+        out: List[Tuple[str, str, Any]] = []
+        with self._lock:
+            try:
+                db = self._db()
+                rows = db.execute(
+                    "SELECT delivery_id, seen_at, event, payload FROM deliveries"
+                    " WHERE state = 'queued' AND seen_at < ? ORDER BY seen_at LIMIT ?",
+                    (now - self.lease_s, max(0, int(limit))),
+                ).fetchall()
+                for delivery_id, seen_at, event, body in rows:
+                    cur = db.execute(
+                        "UPDATE deliveries SET seen_at = ? WHERE delivery_id = ? AND state = 'queued' AND seen_at = ?",
+                        (now, delivery_id, seen_at),
+                    )
+                    if cur.rowcount == 1:
+                        out.append((delivery_id, event or "unknown", json.loads(body) if body else {}))
+                db.commit()
+            except (sqlite3.Error, ValueError) as e:
+                log.warning("delivery index orphan scan failed: %s", e)
+        return out
+
+    def release(self, delivery_id: str) -> None:
+        """Forget a claim (used when the event was rejected after claiming)."""
+        if not delivery_id:
+            return
+        with self._lock:
+            try:
+                db = self._db()
+                db.execute("DELETE FROM deliveries WHERE delivery_id = ?", (delivery_id,))
+                db.commit()
+            except sqlite3.Error as e:
+                log.warning("delivery index release failed: %s", e)
+
+    def prune(self) -> int:
+        """Drop expired rows; returns number removed."""
+        with self._lock:
+            return self._prune_locked(time.time())
+
+    def _prune_locked(self, now: float) -> int:
+        self._claims_since_prune = 0
+        try:
+            db = self._db()
+            cur = db.execute("DELETE FROM deliveries WHERE seen_at < ?", (now - self.ttl_s,))
+            db.commit()
+            return cur.rowcount or 0
+        except sqlite3.Error as e:
+            log.warning("delivery index prune failed: %s", e)
+            return 0
+
+    def size(self) -> int:
+        with self._lock:
+            try:
+                row = self._db().execute("SELECT COUNT(*) FROM deliveries").fetchone()
+                return int(row[0]) if row else 0
+            except sqlite3.Error:
+                return -1
+
+    def close(self) -> None:
+        with self._lock:
+            if self._conn is not None:
+                try:
+                    self._conn.close()
+                finally:
+                    self._conn = None
+
+
+# ╔══════════════════════════════════════════════════════════════════════════╗
+# ║ Batched JSONL event log                                                  ║
+# ╚══════════════════════════════════════════════════════════════════════════╝
+
+FSYNC_MODES = ("never", "batch", "always")
+
+
+class EventLogWriter:
+    """
+    Append-only JSONL writer with a persistent handle and batched flushes.
+
+    fsync:
+      • "never"  — rely on the OS page cache (fastest)
+      • "batch"  — fsync once per flushed batch (default)
+      • "always" — flush + fsync every record (slowest, strongest)
+    """
+
+    def __init__(
+        self,
+        path: str | Path,
+        *,
+        batch_size: int = 32,
+        flush_interval_s: float = 1.0,
+        fsync: str = "batch",
+    ):
+        self.path = Path(path)
+        self.batch_size = max(1, int(batch_size))
+        self.flush_interval_s = max(0.0, float(flush_interval_s))
+        self.fsync = fsync if fsync in FSYNC_MODES else "batch"
+        self._lock = threading.Lock()
+        self._fh = None
+        self._buf: List[str] = []
+        self._last_flush = time.monotonic()
+        self.records_written = 0
+        self.flushes = 0
+
+    def append(self, record: Dict[str, Any]) -> None:
+        """Buffer one record; flushes when the batch or interval is reached. Never raises."""
+        try:
+            line = json.dumps(record, separators=(",", ":"), ensure_ascii=False) + "\n"
+        except Exception as e:
+            log.warning("event log record not serializable: %s", e)
+            return
+        with self._lock:
+            self._buf.append(line)
+            due = (
+                self.fsync == "always"
+                or len(self._buf) >= self.batch_size
+                or (time.monotonic() - self._last_flush) >= self.flush_interval_s
+            )
+            if due:
+                self._flush_locked()
+
+    def flush(self) -> None:
+        with self._lock:
+            self._flush_locked()
+
+    def pending(self) -> int:
+        with self._lock:
+            return len(self._buf)
+
+    def _flush_locked(self) -> None:
+        self._last_flush = time.monotonic()
+        if not self._buf:
+            return
+        lines, self._buf = self._buf, []
+        try:
+            if self._fh is None:
+                self.path.parent.mkdir(parents=True, exist_ok=True)
+                self._fh = open(self.path, "a", encoding="utf-8")
+            self._fh.write("".join(lines))
+            self._fh.flush()
+            if self.fsync != "never":
+                os.fsync(self._fh.fileno())
+            self.records_written += len(lines)
+            self.flushes += 1
+        except Exception as e:
+            log.warning("Failed to write event log: %s", e)
+            self._close_locked()
+
+    def _close_locked(self) -> None:
+        if self._fh is not None:
+            try:
+                self._fh.close()
+            except Exception:
+                pass
+            self._fh = None
+
+    def close(self) -> None:
+        with self._lock:
+            self._flush_locked()
+            self._close_locked()
+
+
+# ╔══════════════════════════════════════════════════════════════════════════╗
+# ║ Bounded queue + consumer                                                 ║
+# ╚══════════════════════════════════════════════════════════════════════════╝
+
+class IngestQueue:
+    """
+    Bounded work queue drained by one dedicated consumer task.
+
+    • offer() is non-blocking: returns False when full so the caller can shed
+      load (503 + Retry-After) instead of piling work onto the web worker.
+    • handler is synchronous and runs in a worker thread, one item at a time.
+    • The queue binds to the running event loop on first use and rebinds if
+      the loop changes (e.g. separate TestClient sessions).
+    """
+
+    def __init__(
+        self,
+        handler: Callable[..., None],
+        *,
+        maxsize: int,
+        name: str = "webhook",
+        on_idle: Optional[Callable[[], None]] = None,
+    ):
+        self.handler = handler
+        self.maxsize = max(1, int(maxsize))
+        self.name = name
+        self.on_idle = on_idle
+        self._queue: Optional[asyncio.Queue] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._task: Optional[asyncio.Task] = None
+        self._enqueued_at: Deque[float] = collections.deque()
+        self._attrs = {"queue": name}
+        # Counters (process-local; also exported via services.telemetry)
+        self.accepted = 0
+        self.rejected = 0
+        self.processed = 0
+        self.failed = 0
+        self.last_lag_ms = 0.0
+        self.max_lag_ms = 0.0
+
+    def _ensure_started(self) -> asyncio.Queue:
+        loop = asyncio.get_running_loop()
+        if self._queue is None or self._loop is not loop:
+            self._queue = asyncio.Queue(maxsize=self.maxsize)
+            self._loop = loop
+            self._enqueued_at.clear()
+            self._task = None
+        if self._task is None or self._task.done():
+            self._task = loop.create_task(self._consume(), name=f"{self.name}-consumer")
+        return self._queue
+
+    def offer(self, *item: Any) -> bool:
+        """Enqueue item without waiting. Returns False (and counts a rejection) when full."""
+        q = self._ensure_started()
+        now = time.monotonic()
+        try:
+            q.put_nowait((now, item))
+        except asyncio.QueueFull:
+            self.rejected += 1
+            telemetry.incr("relay_ingest_rejected_total", 1, self._attrs)
+            return False
+        self._enqueued_at.append(now)
+        self.accepted += 1
+        telemetry.adjust("relay_ingest_queue_depth", +1, self._attrs)
+        return True
+
+    async def _consume(self) -> None:
+        q = self._queue
+        assert q is not None
+        while True:
+            if q.empty() and self.on_idle is not None:
+                try:
+                    self.on_idle()
+                except Exception as e:
+                    log.warning("%s on_idle hook failed: %s", self.name, e)
+            enqueued, item = await q.get()
+            if self._enqueued_at:
+                self._enqueued_at.popleft()
+            telemetry.adjust("relay_ingest_queue_depth", -1, self._attrs)
+            lag_ms = (time.monotonic() - enqueued) * 1000.0
+            self.last_lag_ms = lag_ms
+            self.max_lag_ms = max(self.max_lag_ms, lag_ms)
+            telemetry.observe("relay_ingest_lag_ms", lag_ms, self._attrs)
+            try:
+                await asyncio.to_thread(self.handler, *item)
+                self.processed += 1
+            except Exception as e:
+                self.failed += 1
+                log.exception("%s handler failed: %s", self.name, e)
+            finally:
+                q.task_done()
+
+    async def drain(self, timeout_s: float = 5.0) -> bool:
+        """Wait until queued items are processed (bounded). Returns True if drained."""
+        if self._queue is None or self._loop is not asyncio.get_running_loop():
+            return True
+        try:
+            await asyncio.wait_for(self._queue.join(), timeout=timeout_s)
+            return True
+        except asyncio.TimeoutError:
+            return False
+
+    async def stop(self, drain_timeout_s: float = 5.0) -> Tuple[bool, int]:
+        """Drain (bounded) then cancel the consumer. Returns (drained, left_behind)."""
+        drained = await self.drain(drain_timeout_s)
+        left = self.depth()
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except (asyncio.CancelledError, Exception):
+                pass
+            self._task = None
+        if self.on_idle is not None:
+            try:
+                self.on_idle()
+            except Exception:
+                pass
+        return drained, left
+
+    def depth(self) -> int:
+        return self._queue.qsize() if self._queue is not None else 0
+
+    def stats(self) -> Dict[str, Any]:
+        oldest_ms = 0.0
+        if self._enqueued_at:
+            oldest_ms = (time.monotonic() - self._enqueued_at[0]) * 1000.0
+        return {
+            "depth": self.depth(),
+            "maxsize": self.maxsize,
+            "running": bool(self._task is not None and not self._task.done()),
+            "accepted": self.accepted,
+            "rejected": self.rejected,
+            "processed": self.processed,
+            "failed": self.failed,
+            "lag_ms": {
+                "last": round(self.last_lag_ms, 2),
+                "max": round(self.max_lag_ms, 2),
+                "oldest_pending": round(oldest_ms, 2),
+            },
+        }
@@ -0,0 +1,69 @@
+# ──────────────────────────────────────────────────────────────────────────────
+# File: tests/test_admission.py
+# Purpose: admission control — queue handoff, deadlines, 429 + Retry-After.
+# ──────────────────────────────────────────────────────────────────────────────
+
+import asyncio
+
+import httpx
+import pytest
+from starlette.applications import Starlette
+from starlette.middleware import Middleware
+from starlette.responses import PlainTextResponse
+from starlette.routing import Route
+
+from services.admission import AdmissionController, AdmissionMiddleware, Overloaded
+
+
+@pytest.mark.asyncio
+async def test_queue_is_fifo_and_rejects_when_full_or_expired():
+    ctl = AdmissionController("t", max_concurrency=1, max_queue=1, queue_timeout_s=0.05)
+    held = await ctl.acquire()
+
+    waiter = asyncio.create_task(ctl.acquire())
+    await asyncio.sleep(0)
+    with pytest.raises(Overloaded) as full:
+        await ctl.acquire()
+    assert full.value.reason == "queue_full" and full.value.retry_after_s >= 1
+
+    held.release()  # slot handed straight to the queued waiter
+    (await waiter).release()
+
+    held = await ctl.acquire()
+    with pytest.raises(Overloaded) as late:
+        await ctl.acquire()
+    assert late.value.reason == "queue_timeout"
+    held.release()
+
+    st = ctl.stats()
+    assert (st["in_flight"], st["queued"], st["rejected_queue_full"], st["rejected_queue_timeout"]) == (0, 0, 1, 1)
+
+
+@pytest.mark.asyncio
+async def test_adaptive_limit_shrinks_when_latency_exceeds_target():
+    ctl = AdmissionController("t", max_concurrency=10, target_ms=1)
+    for _ in range(10):
+        ticket = await ctl.acquire()
+        await asyncio.sleep(0.005)
+        ticket.release()
+    assert ctl.limit == 8
+
+
+def test_middleware_returns_429_with_retry_after():
+    async def slow(_r):
+        await asyncio.sleep(0.2)
+        return PlainTextResponse("done")
+
+    ctl = AdmissionController("slow", max_concurrency=1, max_queue=0)
+    app = Starlette(routes=[Route("/slow", slow)], middleware=[Middleware(AdmissionMiddleware, controllers={"/slow": ctl})])
+
+    async def burst():
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://t") as client:
+            return await asyncio.gather(client.get("/slow"), client.get("/slow"))
+
+    first, second = asyncio.run(burst())
+    assert sorted([first.status_code, second.status_code]) == [200, 429]
+    rejected = first if first.status_code == 429 else second
+    assert rejected.headers["retry-after"] == "1"
+    assert rejected.json()["detail"]["reason"] == "queue_full"
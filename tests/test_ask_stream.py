@@ -0,0 +1,113 @@
+# ──────────────────────────────────────────────────────────────────────────────
+# File: tests/test_ask_stream.py
+# Purpose: /ask/stream — live LLM deltas, SSE meta/token/done framing, TTFT.
+# ──────────────────────────────────────────────────────────────────────────────
+
+import asyncio
+import json
+import types
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from routes import ask as ask_routes
+from services import openai_client
+from services.llm_governor import Governor
+
+
+def _fake_llm(monkeypatch, deltas, seen):
+    async def chat_stream(*, system, user, model, timeout_s):
+        seen.append(user)
+        for d in deltas:
+            yield d
+
+    monkeypatch.setattr(openai_client, "available", lambda: True)
+    monkeypatch.setattr(openai_client, "chat_stream", chat_stream)
+
+
+def _client():
+    app = FastAPI()
+    app.include_router(ask_routes.router)
+    return TestClient(app)
+
+
+def _events(body):
+    out = []
+    for block in body.strip().split("\n\n"):
+        lines = dict(line.split(": ", 1) for line in block.splitlines())
+        out.append((lines["event"], json.loads(lines["data"])))
+    return out
+
+
+def test_sse_frames_meta_tokens_done(monkeypatch):
+    seen = []
+    _fake_llm(monkeypatch, ["Relay ", "routes ", "requests."], seen)
+    ctx = "• **docs/relay.md** overview (score: 0.82)\nRelay routes requests."
+    r = _client().post(
+        "/ask/stream",
+        json={"query": "what does relay do", "context": ctx},
+        headers={"Accept": "text/event-stream"},
+    )
+    assert r.status_code == 200 and r.headers["content-type"].startswith("text/event-stream")
+    events = _events(r.text)
+    assert events[0][0] == "meta"
+    assert events[0][1]["retrieval"] == "provided"
+    assert events[0][1]["grounding"] == [{"path": "docs/relay.md", "score": 0.82}]
+    # Every delta is forwarded as its own frame, unmodified.
+    assert [d["text"] for e, d in events if e == "token"] == ["Relay ", "routes ", "requests."]
+    done = events[-1]
+    assert done[0] == "done" and isinstance(done[1]["timings"]["ttft_ms"], int)
+    assert "retrieval_ms" in done[1]["timings"]
+    assert "Relay routes requests." in seen[0]  # context reached the model
+
+
+def test_plain_text_default_and_fallback_without_llm(monkeypatch):
+    seen = []
+    _fake_llm(monkeypatch, ["a", "b", "c"], seen)
+    r = _client().post("/ask/stream", json={"query": "letters please", "context": "x"})
+    assert r.headers["content-type"].startswith("text/plain") and r.text == "abc"
+
+    monkeypatch.setattr(openai_client, "available", lambda: False)
+    r = _client().post("/ask/stream", json={"query": "letters please", "context": "- first line"})
+    assert r.text == "• first line"  # deterministic answer(), no synthetic pacing
+
+
+class _Stream:
+    def __init__(self, deltas, closed):
+        self.deltas, self.closed = list(deltas), closed
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        if not self.deltas:
+            raise StopAsyncIteration
+        d = self.deltas.pop(0)
+        if d is None:
+            await asyncio.sleep(1)  # stall past the idle timeout
+        delta = types.SimpleNamespace(content=d)
+        return types.SimpleNamespace(choices=[types.SimpleNamespace(delta=delta)])
+
+    async def close(self):
+        self.closed.append(self)
+
+
+@pytest.mark.asyncio
+async def test_chat_stream_closes_the_sdk_stream(monkeypatch):
+    closed = []
+    opened = [_Stream([None], closed), _Stream(["a", "b", "c"], closed)]  # first stalls, retry succeeds
+
+    async def create(**kw):
+        return opened.pop(0)
+
+    cli = types.SimpleNamespace(chat=types.SimpleNamespace(completions=types.SimpleNamespace(create=create)))
+    monkeypatch.setattr(openai_client, "get_client", lambda: cli)
+    monkeypatch.setattr(openai_client, "get_governor", lambda: Governor(max_concurrency=2))
+    monkeypatch.setattr(openai_client, "_jitter", lambda n: 0)
+
+    gen = openai_client.chat_stream(system="s", user="u", timeout_s=0.05)
+    assert await gen.__anext__() == "a"
+    assert len(closed) == 1  # the stalled stream was closed before the retry
+    await gen.aclose()  # consumer stops early
+    assert len(closed) == 2
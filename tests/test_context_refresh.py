@@ -0,0 +1,54 @@
+# ──────────────────────────────────────────────────────────────────────────────
+# File: tests/test_context_refresh.py
+# Purpose: debounced context refresh — coalescing and unchanged-tail skip.
+# ──────────────────────────────────────────────────────────────────────────────
+
+import threading
+import time
+
+import pytest
+
+from services import logs
+from services.context_refresh import ContextRefresher
+
+
+@pytest.fixture(autouse=True)
+def log_path(tmp_path, monkeypatch):
+    monkeypatch.setattr(logs, "LOG_PATH", tmp_path / "session_log.jsonl")
+
+
+def _refresher(tmp_path, **kw):
+    calls = []
+    done = threading.Event()
+
+    def summarize(text):
+        calls.append(text)
+        done.set()
+        return f"summary {len(calls)}"
+
+    r = ContextRefresher(summarize=summarize, path=tmp_path / "ctx.md", **kw)
+    return r, calls, done
+
+
+def test_requests_within_window_coalesce(tmp_path):
+    r, calls, done = _refresher(tmp_path, debounce_s=0.2, min_interval_s=0)
+    for i in range(20):
+        logs.log_entry("t", f"event {i}")
+    for _ in range(20):
+        r.request()
+    assert done.wait(2)
+    deadline = time.monotonic() + 2
+    while r.stats()["runs"] < 1 and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert len(calls) == 1 and "event 19" in calls[0]
+    assert r.stats()["coalesced"] == 19
+    assert (tmp_path / "ctx.md").read_text().strip().endswith("summary 1")
+
+
+def test_unchanged_tail_skips_llm(tmp_path):
+    r, calls, _ = _refresher(tmp_path)
+    logs.log_entry("t", "only event")
+    assert r.run_now()["status"] == "ok"
+    assert r.run_now()["status"] == "unchanged"
+    assert r.run_now(force=True)["status"] == "ok"
+    assert r.stats()["skipped_unchanged"] == 1
@@ -0,0 +1,81 @@
+# ──────────────────────────────────────────────────────────────────────────────
+# File: tests/test_conversation_history.py
+# Purpose: bounded history — token window, running summary, LRU, persistence.
+# ──────────────────────────────────────────────────────────────────────────────
+
+import asyncio
+
+from services.conversation_history import ConversationStore
+from services.token_budget import estimate_tokens
+
+
+def _msg_tokens(msgs):
+    return sum(estimate_tokens(m["content"]) for m in msgs)
+
+
+def test_prompt_size_stays_bounded():
+    store = ConversationStore(window_tokens=200, summary_tokens=80)
+    sizes = []
+    for i in range(200):
+        store.append("u", "user", f"Question {i}. " + "detail " * 30)
+        store.append("u", "assistant", f"Answer {i}. " + "words " * 30)
+        sizes.append(_msg_tokens(store.messages("u")))
+    assert max(sizes) <= 200 + 80 + 20
+    msgs = store.messages("u")
+    assert msgs[0]["role"] == "system" and "Earlier in this conversation" in msgs[0]["content"]
+    assert msgs[-1]["content"].startswith("Answer 199.")
+
+
+def test_background_summarizer_folds_evicted_turns():
+    seen = []
+
+    async def summarizer(previous, turns, max_tokens):
+        seen.append([t["content"] for t in turns])
+        return (previous + " | " if previous else "") + ",".join(t["content"] for t in turns)
+
+    async def run():
+        store = ConversationStore(window_tokens=20, summary_tokens=200, summarizer=summarizer)
+        for i in range(5):
+            store.append("u", "user", f"turn {i} " + "x " * 20)
+        await store.drain()
+        return store
+
+    store = asyncio.run(run())
+    assert seen and seen[0][0].startswith("turn 0")
+    summary = store.messages("u")[0]["content"]
+    assert "turn 0" in summary and "turn 3" in summary
+    assert store.stats()["folds"] >= 1
+
+
+def test_lru_eviction_persists_and_rehydrates(tmp_path):
+    store = ConversationStore(max_users=2, window_tokens=1000, persist_dir=tmp_path)
+    store.append("a", "user", "hello from a")
+    store.append("b", "user", "hello from b")
+    store.append("c", "user", "hello from c")  # evicts "a" from memory
+    assert store.stats()["users"] == 2 and store.stats()["evicted_users"] == 1
+    assert len(list(tmp_path.glob("a.*.history.json"))) == 1
+    assert store.messages("a")[-1]["content"] == "hello from a"
+
+
+def test_ids_that_sanitize_alike_keep_separate_files(tmp_path):
+    store = ConversationStore(window_tokens=1000, persist_dir=tmp_path)
+    store.append("a@b", "user", "from at")
+    store.append("a#b", "user", "from hash")
+    assert len(list(tmp_path.glob("*.history.json"))) == 2
+    fresh = ConversationStore(window_tokens=1000, persist_dir=tmp_path)
+    assert fresh.messages("a@b")[-1]["content"] == "from at"
+    assert fresh.messages("a#b")[-1]["content"] == "from hash"
+
+
+def test_writes_on_the_loop_are_batched_until_flush(tmp_path):
+    async def run():
+        store = ConversationStore(window_tokens=1000, persist_dir=tmp_path, flush_s=60)
+        for i in range(3):
+            store.append("u", "user", f"turn {i}")
+        assert not list(tmp_path.glob("*.history.json"))
+        await store.drain()
+        return store
+
+    asyncio.run(run())
+    fresh = ConversationStore(window_tokens=1000, persist_dir=tmp_path)
+    assert [m["content"] for m in fresh.messages("u")] == ["turn 0", "turn 1", "turn 2"]
@@ -0,0 +1,83 @@
+# ──────────────────────────────────────────────────────────────────────────────
+# File: tests/test_critic_registry.py
+# Purpose: critic registry — concurrent evaluation, timeouts, early exit, cache.
+# ──────────────────────────────────────────────────────────────────────────────
+
+import asyncio
+import time
+
+import pytest
+
+from agents.critic_agent.registry import DEFAULT_SPECS, CriticRegistry, CriticSpec
+
+PLAN = {"objective": "summarize the relay docs for users", "steps": ["read docs", "delete temp files"]}
+
+
+class _Slow:
+    name = "slow"
+
+    def evaluate(self, plan):
+        time.sleep(0.3)
+        return {"name": self.name, "passes": True, "issues": []}
+
+
+class _Pause:
+    name = "pause"
+
+    def evaluate(self, plan):
+        time.sleep(0.1)
+        return {"name": self.name, "passes": True, "issues": []}
+
+
+class _AsyncFail:
+    name = "async_fail"
+
+    async def evaluate(self, plan):
+        await asyncio.sleep(0)
+        return {"name": self.name, "passes": False, "issues": ["vague objective"]}
+
+
+def test_default_critics_run_in_order_with_timings_and_cache():
+    reg = CriticRegistry(max_workers=4)
+    first = reg.run(PLAN, query="relay docs")
+    assert [r["name"] for r in first] == [s.name for s in DEFAULT_SPECS]
+    assert all("ms" in r for r in first)
+    safety = next(r for r in first if r["name"] == "safety")
+    assert safety["passes"] is False and safety["issues"][0]["severity"] == "high"
+
+    again = reg.run(PLAN, query="relay docs")
+    assert all(r["cached"] for r in again)
+    assert reg.run(PLAN, query="other")[0].get("cached") is None  # query is part of the key
+    assert reg.stats()["cache_hits"] == 1
+
+
+def test_slow_critic_times_out_without_blocking_the_rest():
+    reg = CriticRegistry([CriticSpec(_Slow), *DEFAULT_SPECS[:2]], timeout_s=0.05)
+    t0 = time.perf_counter()
+    out = reg.run(PLAN)
+    assert time.perf_counter() - t0 < 0.25
+    slow = out[0]
+    assert slow["timed_out"] and slow["passes"] is False
+    assert len(out) == 3
+    reg.run(PLAN)
+    assert reg.stats()["cache_hits"] == 0  # timed-out runs are not cached
+
+
+def test_timeout_counts_from_each_critics_own_start():
+    second = type("_Pause2", (_Pause,), {"name": "pause2"})
+    reg = CriticRegistry([CriticSpec(_Pause), CriticSpec(second)], max_workers=1, timeout_s=0.15)
+    out = reg.run(PLAN)  # the second critic waits ~0.1s for the only worker
+    assert [r.get("timed_out", False) for r in out] == [False, False]
+    assert all(r["passes"] for r in out)
+
+
+@pytest.mark.asyncio
+async def test_arun_awaits_async_critics_and_exits_early_on_blocking_failure():
+    reg = CriticRegistry([CriticSpec(_AsyncFail, blocking=True), CriticSpec(_Slow)], timeout_s=5)
+    t0 = time.perf_counter()
+    out = await reg.arun(PLAN, fail_fast=True)
+    assert time.perf_counter() - t0 < 0.25
+    assert [r["name"] for r in out] == ["async_fail", "slow"]  # registry order and length
+    assert out[1]["skipped"] and not out[0].get("skipped")
+    assert out[0]["issues"][0]["severity"] == "medium"
+    assert reg.stats()["early_exits"] == 1
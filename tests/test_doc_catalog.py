@@ -0,0 +1,55 @@
+# ──────────────────────────────────────────────────────────────────────────────
+# File: tests/test_doc_catalog.py
+# Purpose: document catalog — header-only metadata, incremental updates.
+# ──────────────────────────────────────────────────────────────────────────────
+
+from services.doc_catalog import DocCatalog
+
+
+def _write(path, text):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(text, encoding="utf-8")
+
+
+def test_catalog_reads_header_meta_and_filters(tmp_path):
+    _write(tmp_path / "docs/imported/a.md", "<!--\ndoc_id: alpha\ntier: global\npinned: true\n-->\nbody")
+    _write(tmp_path / "docs/generated/b.md", "# B\n" + "x" * 10000 + "\ndoc_id: late")
+    _write(tmp_path / "context/notes.txt", "hello")
+    _write(tmp_path / "docs/imported/skip.json", "{}")
+
+    cat = DocCatalog(tmp_path, poll_s=3600)
+    by_rel = {e.relpath: e for e in cat.entries()}
+    assert set(by_rel) == {"docs/imported/a.md", "docs/generated/b.md", "context/notes.txt"}
+    a = by_rel["docs/imported/a.md"]
+    assert (a.doc_id, a.tier, a.pinned) == ("alpha", "global", True)
+    assert by_rel["docs/generated/b.md"].doc_id == "b"
+    assert [e.relpath for e in cat.entries("docs/imported", exts=(".md",))] == ["docs/imported/a.md"]
+
+
+def test_refresh_path_applies_changes_without_rescanning(tmp_path):
+    _write(tmp_path / "docs/a.md", "doc_id: one")
+    cat = DocCatalog(tmp_path, poll_s=3600)
+    assert [e.doc_id for e in cat.entries()] == ["one"]
+    scans = cat.stats()["scans"]
+
+    _write(tmp_path / "docs/a.md", "doc_id: two\nmore")
+    _write(tmp_path / "docs/sub/c.md", "c")
+    cat.refresh_path(tmp_path / "docs/a.md")
+    cat.refresh_path(tmp_path / "docs/sub")
+    assert {e.doc_id for e in cat.entries()} == {"two", "c"}
+
+    (tmp_path / "docs/sub/c.md").unlink()
+    (tmp_path / "docs/sub").rmdir()
+    cat.refresh_path(tmp_path / "docs/sub")
+    assert [e.relpath for e in cat.entries()] == ["docs/a.md"]
+    assert cat.stats()["scans"] == scans
+
+
+def test_unchanged_files_are_not_reread(tmp_path):
+    for i in range(5):
+        _write(tmp_path / f"docs/d{i}.md", f"doc_id: d{i}")
+    cat = DocCatalog(tmp_path, poll_s=0)
+    cat.entries()
+    reads = cat.stats()["header_reads"]
+    cat.entries()  # poll_s=0 → re-walk, stat only
+    assert cat.stats()["header_reads"] == reads == 5
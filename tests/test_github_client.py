@@ -0,0 +1,86 @@
+# ──────────────────────────────────────────────────────────────────────────────
+# File: tests/test_github_client.py
+# Purpose: Shared GitHub client — ETag revalidation, SHA disk cache, rate pacing.
+# ──────────────────────────────────────────────────────────────────────────────
+
+import asyncio
+
+import httpx
+import pytest
+
+from services.github_client import (
+    GitHubClient,
+    GitHubRateLimited,
+    RateLimitState,
+    ResponseDiskCache,
+    is_commit_sha,
+)
+
+
+def _etag_transport(seen):
+    def handler(request: httpx.Request) -> httpx.Response:
+        seen.append(request.headers.get("if-none-match"))
+        if request.headers.get("if-none-match") == '"v1"':
+            return httpx.Response(304, headers={"etag": '"v1"'})
+        return httpx.Response(
+            200,
+            json={"n": 1},
+            headers={"etag": '"v1"', "x-ratelimit-remaining": "4999", "x-ratelimit-reset": "0"},
+        )
+    return httpx.MockTransport(handler)
+
+
+def test_conditional_get_serves_304_from_cache():
+    seen = []
+    client = GitHubClient(transport=_etag_transport(seen))
+
+    async def run():
+        r1 = await client.get("https://api.github.com/x", headers={"Accept": "application/json"})
+        r2 = await client.get("https://api.github.com/x", headers={"Accept": "application/json"})
+        await client.aclose()
+        return r1, r2
+
+    r1, r2 = asyncio.run(run())
+    assert seen == [None, '"v1"']
+    assert r2.status_code == 200 and r2.json() == {"n": 1}
+    assert r2.headers["x-relay-cache"] == "etag"
+    assert client.stats()["not_modified"] == 1
+    assert client.rate.remaining == 4999
+
+
+def test_rate_state_spreads_calls_inside_reserve():
+    rate = RateLimitState(reserve=10, max_wait_s=5)
+    rate.remaining, rate.reset_unix = 100, 1000.0
+    assert rate.delay_s(now=940.0) == 0.0
+    rate.remaining = 5
+    assert rate.delay_s(now=940.0) == pytest.approx(10.0)
+    rate.remaining = 0
+    assert rate.delay_s(now=940.0) == pytest.approx(60.0)
+
+
+def test_long_throttle_raises_rate_limited():
+    client = GitHubClient(rate=RateLimitState(reserve=10, max_wait_s=1),
+                          transport=_etag_transport([]))
+    client.rate.remaining = 0
+    client.rate.reset_unix = 10**12
+    with pytest.raises(GitHubRateLimited):
+        asyncio.run(client.get("https://api.github.com/x"))
+
+
+def test_disk_cache_roundtrip_and_size_bound(tmp_path):
+    cache = ResponseDiskCache(tmp_path, max_bytes=200)
+    cache.put(("tree", "a"), {"blob": "x" * 120})
+    assert cache.get(("tree", "a")) == {"blob": "x" * 120}
+    cache.put(("tree", "b"), {"blob": "y" * 120})
+    # Over budget → oldest entry evicted
+    assert len(list(tmp_path.rglob("*.json"))) == 1
+    assert is_commit_sha("a" * 40) and not is_commit_sha("main")
+
+
+def test_disk_cache_tracks_size_without_rewalking(tmp_path):
+    cache = ResponseDiskCache(tmp_path, max_bytes=10_000)
+    for i in range(20):
+        asyncio.run(cache.aput(("tree", str(i)), {"blob": "x" * 100}))
+    assert cache.scans == 1  # only the initial walk
+    assert cache.stats()["bytes"] == sum(f.stat().st_size for f in tmp_path.rglob("*.json"))
+    assert asyncio.run(cache.aget(("tree", "3"))) == {"blob": "x" * 100}
@@ -0,0 +1,83 @@
+# ──────────────────────────────────────────────────────────────────────────────
+# File: tests/test_google_docs_sync.py
+# Purpose: incremental Drive sync — skip unchanged, rewrite only on diff, deletes.
+# ──────────────────────────────────────────────────────────────────────────────
+
+from services.google_docs_sync import DocsSyncEngine
+
+
+class FakeDrive:
+    def __init__(self):
+        self.files = {}
+        self.exports = []
+
+    def put(self, file_id, name, html, mtime):
+        self.files[file_id] = {"id": file_id, "name": name, "modifiedTime": mtime, "version": mtime, "html": html}
+
+    def list_files(self):
+        return [{k: v for k, v in f.items() if k != "html"} for f in self.files.values()]
+
+    def export_html(self, file_id):
+        self.exports.append(file_id)
+        return self.files[file_id]["html"].encode("utf-8")
+
+
+def _engine(drive, tmp_path):
+    return DocsSyncEngine(drive.list_files, drive.export_html, out_dir=tmp_path, max_workers=3, convert=lambda h: h)
+
+
+def test_only_changed_docs_are_exported_and_written(tmp_path):
+    drive = FakeDrive()
+    for i in range(5):
+        drive.put(f"id{i}", f"Doc {i}", f"<p>{i}</p>", "t1")
+    first = _engine(drive, tmp_path).run()
+    assert first.counts() == {"changed": 5, "unchanged": 0, "deleted": 0, "errors": 0}
+    mtime = (tmp_path / "doc_0.md").stat().st_mtime_ns
+
+    drive.exports.clear()
+    drive.put("id1", "Doc 1", "<p>one</p>", "t2")  # real edit
+    drive.put("id2", "Doc 2", "<p>2</p>", "t2")  # touched, same content
+    second = _engine(drive, tmp_path).run()
+    assert sorted(drive.exports) == ["id1", "id2"]
+    assert second.changed == ["doc_1.md"]
+    assert second.counts()["unchanged"] == 4
+    assert (tmp_path / "doc_0.md").stat().st_mtime_ns == mtime
+    assert (tmp_path / "doc_1.md").read_text() == "<p>one</p>"
+
+
+def test_deleted_and_failed_docs(tmp_path):
+    drive = FakeDrive()
+    drive.put("a", "Keep", "k", "t1")
+    drive.put("b", "Gone", "g", "t1")
+    _engine(drive, tmp_path).run()
+
+    del drive.files["b"]
+    drive.put("c", "Broken", "x", "t1")
+    drive.export_html = lambda fid: (_ for _ in ()).throw(RuntimeError("quota")) if fid == "c" else b""
+    report = _engine(drive, tmp_path).run()
+    assert report.deleted == ["gone.md"] and not (tmp_path / "gone.md").exists()
+    assert report.errors == {"Broken": "quota"}
+    assert report.unchanged == ["keep.md"]
+
+
+def test_rename_counts_the_old_file_as_deleted(tmp_path):
+    drive = FakeDrive()
+    drive.put("a", "Old Name", "x", "t1")
+    _engine(drive, tmp_path).run()
+
+    drive.put("a", "New Name", "x", "t2")
+    report = _engine(drive, tmp_path).run()
+    assert report.deleted == ["old_name.md"] and not (tmp_path / "old_name.md").exists()
+    assert report.counts() == {"changed": 1, "unchanged": 0, "deleted": 1, "errors": 0}
+
+
+def test_sync_result_lists_all_synced_docs_with_counts(monkeypatch):
+    from routes import docs as docs_routes
+    from services.google_docs_sync import SyncReport
+
+    report = SyncReport(changed=["a.md"], unchanged=["b.md"], deleted=["old.md"])
+    monkeypatch.setattr(docs_routes, "sync_google_docs_report", lambda: report)
+    out = docs_routes._sync_result("sync")
+    assert out["synced_docs"] == ["a.md", "b.md"]
+    assert out["changed_docs"] == ["a.md", "old.md"]
+    assert out["counts"] == {"changed": 1, "unchanged": 1, "deleted": 1, "errors": 0}
@@ -0,0 +1,68 @@
+# ──────────────────────────────────────────────────────────────────────────────
+# File: tests/test_http_middleware.py
+# Purpose: pure-ASGI core middlewares — corr-id, access log, timeout budgets.
+# ──────────────────────────────────────────────────────────────────────────────
+
+import asyncio
+import logging
+
+from starlette.applications import Starlette
+from starlette.middleware import Middleware
+from starlette.responses import PlainTextResponse, StreamingResponse
+from starlette.routing import Route
+from starlette.testclient import TestClient
+
+from services.http_middleware import AccessLogMiddleware, RequestIDMiddleware, TimeoutMiddleware
+
+
+async def _whoami(request):
+    return PlainTextResponse(request.state.corr_id, headers={"x-corr-id": "stale"})
+
+
+async def _slow(_request):
+    await asyncio.sleep(0.5)
+    return PlainTextResponse("late")
+
+
+async def _stream(_request):
+    async def gen():
+        for i in range(3):
+            await asyncio.sleep(0.1)
+            yield f"{i}"
+    return StreamingResponse(gen(), media_type="text/plain")
+
+
+def _client(timeout_s=35.0):
+    app = Starlette(
+        routes=[Route("/whoami", _whoami), Route("/slow", _slow), Route("/stream", _stream)],
+        middleware=[
+            Middleware(TimeoutMiddleware, timeout_s=timeout_s),
+            Middleware(AccessLogMiddleware),
+            Middleware(RequestIDMiddleware),
+        ],
+    )
+    return TestClient(app)
+
+
+def test_corr_id_propagates_and_access_line_is_logged(caplog):
+    client = _client()
+    with caplog.at_level(logging.INFO, logger="relay.main"):
+        r = client.get("/whoami", headers={"X-Corr-Id": "abc123"})
+    assert r.text == "abc123"
+    assert r.headers.get_list("x-corr-id") == ["abc123"]
+    assert "req method=GET path=/whoami cid=abc123 status=200" in caplog.text
+
+    generated = client.get("/whoami")
+    assert generated.headers["x-corr-id"] == generated.text and len(generated.text) == 11
+
+
+def test_timeout_covers_time_to_first_byte_only(monkeypatch):
+    monkeypatch.setenv("LONG_OP_PATHS", "/slow")
+    monkeypatch.setenv("LONG_OP_TIMEOUT_S", "0.1")
+    client = _client(timeout_s=0.05)
+    r = client.get("/slow")
+    assert r.status_code == 504 and r.text == "Request timeout"
+
+    # Once headers are sent the body may stream past the budget.
+    r = client.get("/stream")
+    assert r.status_code == 200 and r.text == "012"
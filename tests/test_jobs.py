@@ -0,0 +1,92 @@
+# ──────────────────────────────────────────────────────────────────────────────
+# File: tests/test_jobs.py
+# Purpose: durable jobs — records, progress/ETA, cooperative cancel, slot limits.
+# ──────────────────────────────────────────────────────────────────────────────
+
+import threading
+import time
+
+import pytest
+
+from services.jobs import JobBusy, JobStore, report_progress
+
+
+def _store(tmp_path, **kw):
+    return JobStore(tmp_path / "jobs", lock_dir=tmp_path / "locks", **kw)
+
+
+def _wait_state(store, job_id, states, timeout=5):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        rec = store.get(job_id)
+        if rec["state"] in states:
+            return rec
+        time.sleep(0.02)
+    raise AssertionError(f"job {job_id} stuck in {rec['state']}")
+
+
+def test_inline_job_records_result_and_progress(tmp_path):
+    store = _store(tmp_path)
+
+    def work(ctx):
+        for i in range(1, 5):
+            report_progress("embed", done=i, total=4, chunks=4)
+        return {"indexed": 4}
+
+    rec = store.run_inline("kb_reindex", work, params={"wait": True})
+    assert rec["state"] == "succeeded" and rec["result"] == {"indexed": 4}
+    assert rec["progress"]["stage"] == "embed" and rec["progress"]["done"] == 4
+    assert rec["progress"]["eta_s"] == 0
+    # Persisted: a fresh store (another worker) sees the same record.
+    assert _store(tmp_path).get(rec["id"])["result"] == {"indexed": 4}
+
+
+def test_limits_are_per_type_and_released(tmp_path):
+    store = _store(tmp_path, limits={"docs_sync": 1})
+    gate = threading.Event()
+    rec = store.submit("docs_sync", lambda ctx: gate.wait(5))
+    with pytest.raises(JobBusy):
+        _store(tmp_path, limits={"docs_sync": 1}).run_inline("docs_sync", lambda ctx: None)
+    assert store.run_inline("kb_reindex", lambda ctx: "ok")["state"] == "succeeded"
+
+    gate.set()
+    _wait_state(store, rec["id"], ("succeeded",))
+    assert store.run_inline("docs_sync", lambda ctx: "again")["result"] == "again"
+
+
+def test_cancel_from_another_store_stops_job(tmp_path):
+    store = _store(tmp_path)
+    seen = []
+
+    def work(ctx):
+        for i in range(1000):
+            seen.append(i)
+            try:
+                ctx.progress("loop", done=i, total=1000)
+            except Exception:  # never-raise wrappers must not swallow cancellation
+                pass
+            time.sleep(0.01)
+        return {"count": len(seen)}
+
+    rec = store.submit("docs_prune", work)
+    _wait_state(store, rec["id"], ("running",))
+    _store(tmp_path).request_cancel(rec["id"])
+    final = _wait_state(store, rec["id"], ("cancelled", "succeeded", "failed"))
+    assert final["state"] == "cancelled" and final["cancel_requested"]
+    assert len(seen) < 1000
+
+
+def test_stale_heartbeat_from_another_host_reads_as_interrupted(tmp_path):
+    store = _store(tmp_path, lease_s=0.2)
+    gate = threading.Event()
+    live = store.submit("kb_reindex", lambda ctx: gate.wait(5))
+    orphan = store._create("docs_sync", None)
+    store._update(orphan["id"], state="running", host="old-container", pid=1, heartbeat_at=time.time() - 1)
+
+    time.sleep(0.4)  # > lease: only the heartbeating job is still running
+    states = {r["id"]: r["state"] for r in store.list()}
+    assert states[orphan["id"]] == "interrupted"
+    assert states[live["id"]] == "running"
+    assert "heartbeat" in store.get(orphan["id"])["error"]
+    gate.set()
+    _wait_state(store, live["id"], ("succeeded",))
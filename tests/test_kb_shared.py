@@ -0,0 +1,74 @@
+# ──────────────────────────────────────────────────────────────────────────────
+# File: tests/test_kb_shared.py
+# Purpose: shared mmap KB snapshot — search, lazy records, generation remaps,
+#          SnapshotIndex stand-in for get_index().
+# ──────────────────────────────────────────────────────────────────────────────
+
+from services.kb_shared import SharedIndex, SnapshotIndex, publish
+
+
+def _rows(tag):
+    return [
+        ("n1", f"{tag} alpha", [1.0, 0.0, 0.0], {"file_path": "docs/a.md", "tier": "project_docs"}),
+        ("n2", f"{tag} beta", [0.0, 2.0, 0.0], {"file_path": "docs/b.md"}),
+        ("n3", f"{tag} gamma", [0.6, 0.8, 0.0], {"file_path": "services/c.py", "tier": "code"}),
+    ]
+
+
+def test_publish_and_search_mapped_snapshot(tmp_path):
+    rec = publish(tmp_path, _rows("v1"), model="test-embed")
+    assert rec["gen"] == 1 and rec["n"] == 3 and rec["dim"] == 3
+
+    snap = SharedIndex(tmp_path, check_s=0).current()
+    hits = snap.search([0.0, 1.0, 0.0], k=2)
+    assert [i for _s, i in hits] == [1, 2]
+    assert abs(hits[0][0] - 1.0) < 1e-6 and abs(hits[1][0] - 0.8) < 1e-6
+    assert snap.record(2) == {"id": "n3", "text": "v1 gamma", "metadata": {"file_path": "services/c.py", "tier": "code"}}
+    assert snap.search([1.0, 0.0], k=1) == []  # dimension mismatch
+
+
+def test_readers_remap_on_new_generation(tmp_path):
+    publish(tmp_path, _rows("v1"))
+    shared = SharedIndex(tmp_path, check_s=0)
+    assert shared.generation() == 1
+    held = shared.current()
+
+    publish(tmp_path, _rows("v2"), keep=1)
+    publish(tmp_path, _rows("v3"), keep=1)
+    assert shared.generation() == 3
+    assert shared.current().record(0)["text"] == "v3 alpha"
+    assert sorted(p.name for p in tmp_path.glob("kb-*.snap")) == ["kb-00000003.snap"]
+    # A reader still holding the old map keeps working after its file is unlinked.
+    assert held.record(0)["text"] == "v1 alpha"
+    assert shared.remaps == 2
+
+
+def test_snapshot_index_materializes_only_returned_nodes(tmp_path):
+    rows = _rows("v1") + [("n4", "v1 alpha 2", [0.9, 0.1, 0.0], {"file_path": "docs/a.md", "tier": "project_docs"})]
+    publish(tmp_path, rows, extra={"store_sig": [1, 2, 3]})
+    snap = SharedIndex(tmp_path, check_s=0).current()
+    assert snap.header["store_sig"] == [1, 2, 3]
+    assert snap.header["metas"] == 3  # a.md's metadata is stored once
+
+    index = SnapshotIndex(snap, embed_query=lambda q: {"alpha": [1.0, 0.0, 0.0]}[q])
+    res = index.as_query_engine(similarity_top_k=2).query("alpha")
+    assert [sn.node.metadata["file_path"] for sn in res.source_nodes] == ["docs/a.md", "docs/a.md"]
+    assert res.source_nodes[0].node.text == "v1 alpha" and res.source_nodes[0].score > res.source_nodes[1].score
+    assert sorted(index._nodes) == [0, 3]
+
+    docs = index.storage_context.docstore.docs
+    assert len(docs) == 4 and docs["n2"].text == "v1 beta"
+
+
+def test_simple_search_skips_a_stale_snapshot(tmp_path, monkeypatch):
+    from services import kb
+
+    publish(tmp_path, _rows("v1"), model="old-model", extra={"store_sig": kb._store_signature()})
+    snap = SharedIndex(tmp_path, check_s=0).current()
+    monkeypatch.setattr(kb, "_shared_snapshot", lambda: snap)
+    monkeypatch.setattr(kb, "_query_embedding", lambda q: [1.0, 0.0, 0.0])
+    monkeypatch.setattr(kb, "get_index", lambda: None)  # the JSON-store path
+
+    assert kb.simple_search("alpha") == []  # same dim, different model → not served
+    monkeypatch.setattr(kb, "MODEL_NAME", "old-model")
+    assert kb.simple_search("alpha", top_k=1)[0]["snippet"] == "v1 alpha"
@@ -0,0 +1,93 @@
+# ──────────────────────────────────────────────────────────────────────────────
+# File: tests/test_kb_watcher.py
+# Purpose: KB watcher — path filtering, coalescing, batching, generations.
+# ──────────────────────────────────────────────────────────────────────────────
+
+import time
+
+from services.kb_watcher import KBWatcher
+
+
+def _accept(path, tier):
+    return not path.endswith(".log")
+
+
+def _watcher(tmp_path, applied, **kw):
+    def apply(paths):
+        applied.append(sorted(paths))
+        return {"ok": True}
+
+    roots = [("code", tmp_path / "services"), ("project_docs", tmp_path / "docs")]
+    return KBWatcher(roots, apply=apply, accept=_accept, **kw)
+
+
+def test_notify_filters_and_coalesces(tmp_path):
+    applied = []
+    w = _watcher(tmp_path, applied, max_batch=2)
+    a, b, c = (str(tmp_path / p) for p in ("docs/a.md", "docs/b.md", "services/c.py"))
+    w.notify([a, b, a, str(tmp_path / "elsewhere/x.md"), str(tmp_path / "docs/run.log")])
+    w.notify([c])
+
+    s = w.stats()
+    assert s["pending"] == 3 and s["coalesced"] == 1 and s["ignored"] == 2
+    assert s["generation"] == 4 and s["last_applied_generation"] == 0
+
+    assert w.flush() == 2
+    assert applied == [sorted([b, a]), [c]]  # oldest generation first, max_batch=2
+    s = w.stats()
+    assert s["pending"] == 0 and s["last_applied_generation"] == 4
+
+
+def test_worker_debounces_until_quiet_then_applies_once(tmp_path):
+    applied = []
+    w = _watcher(tmp_path, applied, debounce_s=0.2, poll_s=60)
+    (tmp_path / "docs").mkdir()
+    w.start(catch_up=False)
+    try:
+        for i in range(5):
+            w.notify([tmp_path / "docs" / f"{i}.md"])
+            time.sleep(0.02)
+        assert applied == []
+        deadline = time.time() + 5
+        while w.stats()["last_applied_generation"] < 5 and time.time() < deadline:
+            time.sleep(0.02)
+        assert len(applied) == 1 and len(applied[0]) == 5
+    finally:
+        w.stop()
+
+
+def test_failed_batch_is_requeued_and_not_reported_applied(tmp_path):
+    results = [{"ok": False, "error": "embed down"}, {"ok": True}]
+    calls = []
+
+    def apply(paths):
+        calls.append(sorted(paths))
+        return results.pop(0)
+
+    w = KBWatcher([("project_docs", tmp_path / "docs")], apply=apply, accept=_accept)
+    a = str(tmp_path / "docs/a.md")
+    w.notify([a])
+    assert w.flush() == 0
+    s = w.stats()
+    assert s["pending"] == 1 and s["last_applied_generation"] == 0 and s["last_error"] == "embed down"
+
+    assert w.flush() == 1 and calls == [[a], [a]]
+    assert w.stats()["last_applied_generation"] == 1
+
+
+def test_only_one_worker_leads_and_standby_takes_over(tmp_path):
+    lock = tmp_path / "locks" / "kb_watcher.leader"
+    first = _watcher(tmp_path, [], poll_s=0.1, leader_lock=lock)
+    second = _watcher(tmp_path, [], poll_s=0.1, leader_lock=lock)
+    first.start(catch_up=False)
+    second.start(catch_up=False)
+    try:
+        assert first.stats()["leader"] and second.stats()["mode"] == "standby"
+        first.stop()
+        deadline = time.time() + 5
+        while not second.stats()["leader"] and time.time() < deadline:
+            time.sleep(0.02)
+        assert second.stats()["leader"] and second.stats()["mode"] != "standby"
+    finally:
+        first.stop()
+        second.stop()
@@ -0,0 +1,123 @@
+# ──────────────────────────────────────────────────────────────────────────────
+# File: tests/test_llm_cache.py
+# Purpose: completion cache — LRU + SQLite tiers, TTL expiry, eligibility.
+# ──────────────────────────────────────────────────────────────────────────────
+
+import types
+
+import pytest
+
+from services import llm_cache, openai_client
+from services.llm_cache import CompletionCache, cache_key
+from services.llm_governor import Governor
+
+
+def test_sqlite_tier_survives_restart_and_ttl_expires(tmp_path):
+    path = tmp_path / "c.sqlite3"
+    key = cache_key(model="m", system="s", user="u", temperature=0)
+    assert key != cache_key(model="m", system="s", user="u", temperature=0, tools=[{"name": "f"}])
+
+    c1 = CompletionCache(path, max_entries=1)
+    c1.put(key, "answer", caller="docs_summary", tokens=120)
+    c1.put("other", "x", caller="docs_summary", ttl_s=-1)  # evicts key from the LRU; already expired
+    assert c1.get(key, caller="docs_summary") == "answer"  # served from SQLite
+    assert c1.get("other", caller="docs_summary") is None
+
+    c2 = CompletionCache(path)  # a fresh process sees the persisted row
+    assert c2.get(key, caller="docs_summary") == "answer"
+    assert c2.get(key, caller="docs_summary") == "answer"
+    st = c2.stats()["callers"]["docs_summary"]
+    assert (st["hits_sqlite"], st["hits_memory"], st["saved_tokens"]) == (1, 1, 240)
+
+
+def _counting_client():
+    calls = {"chat": 0}
+
+    async def chat_create(**kw):
+        calls["chat"] += 1
+        msg = types.SimpleNamespace(content=f"reply {calls['chat']}")
+        usage = types.SimpleNamespace(total_tokens=50)
+        return types.SimpleNamespace(choices=[types.SimpleNamespace(message=msg)], usage=usage)
+
+    cli = types.SimpleNamespace(chat=types.SimpleNamespace(completions=types.SimpleNamespace(create=chat_create)))
+    return cli, calls
+
+
+@pytest.mark.asyncio
+async def test_chat_complete_caches_only_deterministic_calls(monkeypatch, tmp_path):
+    cache = CompletionCache(tmp_path / "c.sqlite3")
+    monkeypatch.setattr(llm_cache, "get_cache", lambda: cache)
+    monkeypatch.setenv("LLM_CACHE", "1")
+    monkeypatch.setenv("OPENAI_API_MODE", "chat")
+    monkeypatch.setattr(openai_client, "get_governor", lambda: Governor(max_concurrency=2))
+    cli, calls = _counting_client()
+    monkeypatch.setattr(openai_client, "get_client", lambda: cli)
+
+    for _ in range(2):
+        out = await openai_client.chat_complete(system="s", user="u", temperature=0.0, cache="codex_patch")
+        assert out["text"] == "reply 1"
+    assert out["cached"] is True and calls["chat"] == 1
+
+    # Non-zero temperature without opt-in always goes to the API.
+    for _ in range(2):
+        await openai_client.chat_complete(system="s", user="u", temperature=0.7, cache="codex_patch")
+    assert calls["chat"] == 3
+
+    stats = cache.stats()
+    assert stats["saved_tokens"] == 50
+    assert stats["callers"]["codex_patch"]["hit_rate"] == 0.5
+
+
+@pytest.mark.asyncio
+async def test_chat_create_never_caches_tool_calls(monkeypatch, tmp_path):
+    cache = CompletionCache(None)
+    monkeypatch.setattr(llm_cache, "get_cache", lambda: cache)
+    monkeypatch.setattr(openai_client, "get_governor", lambda: Governor(max_concurrency=2))
+    calls = {"n": 0}
+
+    async def create(**kw):
+        calls["n"] += 1
+        msg = types.SimpleNamespace(content=None, function_call={"name": "f"}, tool_calls=None)
+        return types.SimpleNamespace(choices=[types.SimpleNamespace(message=msg)], usage=None)
+
+    cli = types.SimpleNamespace(chat=types.SimpleNamespace(completions=types.SimpleNamespace(create=create)))
+    monkeypatch.setattr(openai_client, "get_client", lambda: cli)
+
+    kwargs = dict(model="m", messages=[{"role": "user", "content": "q"}], functions=[{"name": "f"}], temperature=0)
+    for _ in range(2):
+        await openai_client.chat_create(cache="agent", **kwargs)
+    assert calls["n"] == 2
+    assert cache.stats()["callers"]["agent"]["stores"] == 0
+
+
+@pytest.mark.asyncio
+async def test_empty_replies_are_not_cached(monkeypatch, tmp_path):
+    cache = CompletionCache(tmp_path / "c.sqlite3")
+    monkeypatch.setattr(llm_cache, "get_cache", lambda: cache)
+    monkeypatch.setenv("OPENAI_API_MODE", "chat")
+    monkeypatch.setattr(openai_client, "get_governor", lambda: Governor(max_concurrency=2))
+    calls = {"n": 0}
+
+    async def create(**kw):
+        calls["n"] += 1
+        msg = types.SimpleNamespace(content="   ", function_call=None, tool_calls=None)
+        return types.SimpleNamespace(choices=[types.SimpleNamespace(message=msg)], usage=None)
+
+    cli = types.SimpleNamespace(chat=types.SimpleNamespace(completions=types.SimpleNamespace(create=create)))
+    monkeypatch.setattr(openai_client, "get_client", lambda: cli)
+
+    for _ in range(2):
+        assert (await openai_client.chat_complete(system="s", user="u", temperature=0, cache="docs_summary"))["text"] == ""
+        await openai_client.chat_create(cache="agent", model="m", messages=[{"role": "user", "content": "q"}], temperature=0)
+    assert calls["n"] == 4
+    assert cache.stats()["callers"]["docs_summary"]["stores"] == 0
+    assert cache.stats()["callers"]["agent"]["stores"] == 0
+
+
+@pytest.mark.asyncio
+async def test_memory_hits_do_not_wait_on_sqlite_io(tmp_path):
+    cache = CompletionCache(tmp_path / "c.sqlite3")
+    cache.put("k", "v", caller="agent")
+    with cache._db_lock:  # a worker thread stuck on a busy database
+        assert await cache.aget("k", caller="agent") == "v"
+        assert cache.stats()["callers"]["agent"]["hits_memory"] == 1
@@ -0,0 +1,137 @@
+# ──────────────────────────────────────────────────────────────────────────────
+# File: tests/test_llm_governor.py
+# Purpose: shared OpenAI layer — priority admission, TPM bucket, capability cache.
+# ──────────────────────────────────────────────────────────────────────────────
+
+import asyncio
+import time
+import types
+
+import pytest
+
+from services import openai_client
+from services.llm_governor import Governor, priority, user
+
+
+@pytest.mark.asyncio
+async def test_interactive_is_admitted_before_queued_background():
+    gov = Governor(max_concurrency=1, background_max=1)
+    held = await gov.acquire(prio="interactive")
+    order = []
+
+    async def call(name, prio):
+        lease = await gov.acquire(prio=prio)
+        order.append(name)
+        lease.release()
+
+    bg = asyncio.create_task(call("bg", "background"))
+    await asyncio.sleep(0.01)
+    with priority("interactive"):
+        ia = asyncio.create_task(call("ask", None))
+    await asyncio.sleep(0.01)
+    assert gov.stats()["queued"] == {"interactive": 1, "background": 1}
+
+    held.release()
+    await asyncio.gather(bg, ia)
+    assert order == ["ask", "bg"]
+    assert gov.stats()["queue_wait_ms"]["background"]["count"] == 1
+
+
+def test_tpm_bucket_delays_until_refill_and_reconciles_usage():
+    gov = Governor(max_concurrency=4, tpm=600)  # 10 tokens/s
+    first = gov.acquire_sync(tokens=600)
+    first.release(used_tokens=590)  # estimate was 10 too high → refunded
+    t0 = time.perf_counter()
+    gov.acquire_sync(tokens=15).release()  # needs ~0.5 s of refill
+    waited = time.perf_counter() - t0
+    assert 0.25 < waited < 2.0
+
+
+class _NotFound(Exception):
+    status_code = 404
+
+
+def _fake_client(responses_exc):
+    calls = {"responses": 0, "chat": 0}
+
+    async def responses_create(**kw):
+        calls["responses"] += 1
+        raise responses_exc
+
+    async def chat_create(**kw):
+        calls["chat"] += 1
+        msg = types.SimpleNamespace(content="hi")
+        return types.SimpleNamespace(choices=[types.SimpleNamespace(message=msg)], usage=None)
+
+    cli = types.SimpleNamespace(
+        responses=types.SimpleNamespace(create=responses_create),
+        chat=types.SimpleNamespace(completions=types.SimpleNamespace(create=chat_create)),
+    )
+    return cli, calls
+
+
+@pytest.mark.asyncio
+async def test_capability_probe_is_cached_and_errors_are_not_doubled(monkeypatch):
+    monkeypatch.setattr(openai_client, "_CAPS", {"responses": None})
+    monkeypatch.setattr(openai_client, "get_governor", lambda: Governor(max_concurrency=2))
+    cli, calls = _fake_client(_NotFound("no such endpoint"))
+    monkeypatch.setattr(openai_client, "get_client", lambda: cli)
+
+    for _ in range(3):
+        out = await openai_client.chat_complete(system="s", user="u")
+        assert out["text"] == "hi"
+    assert calls == {"responses": 1, "chat": 3}
+    assert openai_client.stats()["capabilities"] == {"responses": False}
+
+    # A plain failure on a supported API is raised, not retried on the other API.
+    monkeypatch.setattr(openai_client, "_CAPS", {"responses": True})
+    cli, calls = _fake_client(ValueError("bad input"))
+    monkeypatch.setattr(openai_client, "get_client", lambda: cli)
+    with pytest.raises(RuntimeError):
+        await openai_client.chat_complete(system="s", user="u")
+    assert calls == {"responses": 1, "chat": 0}
+
+
+@pytest.mark.asyncio
+async def test_model_not_found_is_not_a_capability_miss_and_misses_expire(monkeypatch):
+    monkeypatch.setattr(openai_client, "_CAPS", {"responses": None})
+    monkeypatch.setattr(openai_client, "get_governor", lambda: Governor(max_concurrency=2))
+    missing_model = _NotFound("The model `gpt-nope` does not exist")
+    missing_model.code = "model_not_found"
+    cli, calls = _fake_client(missing_model)
+    monkeypatch.setattr(openai_client, "get_client", lambda: cli)
+    with pytest.raises(RuntimeError):
+        await openai_client.chat_complete(system="s", user="u", model="gpt-nope")
+    assert openai_client.stats()["capabilities"] == {"responses": None} and calls["chat"] == 0
+
+    # A real miss falls back to chat, and is re-probed once the TTL has passed.
+    monkeypatch.setenv("OPENAI_CAPS_TTL_S", "0.01")
+    cli, calls = _fake_client(_NotFound("no such endpoint"))
+    monkeypatch.setattr(openai_client, "get_client", lambda: cli)
+    await openai_client.chat_complete(system="s", user="u")
+    await asyncio.sleep(0.02)
+    await openai_client.chat_complete(system="s", user="u")
+    assert calls == {"responses": 2, "chat": 2}
+
+
+@pytest.mark.asyncio
+async def test_users_are_served_fairly_within_a_priority():
+    gov = Governor(max_concurrency=1, weights={"heavy": 1.0})
+    held = await gov.acquire()
+    order = []
+
+    async def call(name):
+        with user(name):
+            lease = await gov.acquire(tokens=100)
+        order.append(name)
+        lease.release()
+
+    tasks = [asyncio.create_task(call("heavy")) for _ in range(4)]
+    await asyncio.sleep(0.01)
+    tasks.append(asyncio.create_task(call("light")))
+    await asyncio.sleep(0.01)
+    assert gov.stats()["queued_users"] == 2
+
+    held.release()
+    await asyncio.gather(*tasks)
+    assert order == ["heavy", "light", "heavy", "heavy", "heavy"]
@@ -0,0 +1,72 @@
+# ──────────────────────────────────────────────────────────────────────────────
+# File: tests/test_logs_reader.py
+# Purpose: services.logs — level-filtered tail reads, legacy fallback, rotation.
+# ──────────────────────────────────────────────────────────────────────────────
+
+import json
+
+import pytest
+
+from services import logs
+
+
+@pytest.fixture
+def log_path(tmp_path, monkeypatch):
+    path = tmp_path / "session_log.jsonl"
+    monkeypatch.setattr(logs, "LOG_PATH", path)
+    return path
+
+
+def test_level_filter_returns_n_matches(log_path):
+    for i in range(500):
+        logs.log_entry("t", f"m{i}", level="ERROR" if i % 50 == 0 else "INFO")
+    got = logs.get_recent_logs(5, level_filter="ERROR")
+    assert [l["message"] for l in got] == ["m250", "m300", "m350", "m400", "m450"]
+    assert [l["message"] for l in logs.get_recent_logs(3)] == ["m497", "m498", "m499"]
+
+
+def test_legacy_unindexed_lines_are_found(log_path):
+    with log_path.open("w") as f:
+        for i in range(20):
+            f.write(json.dumps({"level": "ERROR" if i % 2 else "INFO", "message": f"old{i}", "source": "t"}) + "\n")
+    logs.log_entry("t", "new", level="ERROR")
+    got = logs.get_recent_logs(3, level_filter="ERROR")
+    assert [l["message"] for l in got] == ["old17", "old19", "new"]
+
+
+def test_rotation_keeps_reads_across_backups(log_path, monkeypatch):
+    monkeypatch.setattr(logs, "LOG_MAX_BYTES", 2000)
+    monkeypatch.setattr(logs, "LOG_BACKUPS", 2)
+    for i in range(60):
+        logs.log_entry("t", f"m{i}", level="WARN" if i % 7 == 0 else "INFO")
+    assert (log_path.parent / "session_log.1.jsonl").exists()
+    assert not (log_path.parent / "session_log.3.jsonl").exists()
+    assert [l["message"] for l in logs.get_recent_logs(2, level_filter="WARN")] == ["m49", "m56"]
+    assert logs.get_recent_logs(1)[0]["message"] == "m59"
+
+
+def test_writer_blocked_during_rotation_appends_to_the_new_file(log_path):
+    fcntl = pytest.importorskip("fcntl")
+    import os
+    import threading
+    import time
+
+    from utils.locked_append import open_locked_append
+
+    log_path.write_bytes(b"")
+    rotator = open(log_path, "ab")
+    fcntl.flock(rotator.fileno(), fcntl.LOCK_EX)  # another worker mid-rotation
+    got = {}
+
+    def writer():
+        with open_locked_append(log_path) as f:
+            got["ino"] = os.fstat(f.fileno()).st_ino
+
+    t = threading.Thread(target=writer)
+    t.start()
+    time.sleep(0.05)
+    os.replace(log_path, log_path.with_name("session_log.1.jsonl"))
+    log_path.write_bytes(b"")
+    rotator.close()  # releases the lock on the old inode
+    t.join(5)
+    assert got["ino"] == os.stat(log_path).st_ino
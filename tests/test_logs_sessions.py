@@ -0,0 +1,110 @@
+# ──────────────────────────────────────────────────────────────────────────────
+# File: tests/test_logs_sessions.py
+# Purpose: /logs/sessions/all — k-way merge order, cursor pages, filters, NDJSON.
+# ──────────────────────────────────────────────────────────────────────────────
+
+import json
+from datetime import datetime, timedelta
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from services import session_store
+from services.session_store import SessionStore
+
+T0 = datetime(2025, 1, 1)
+H = {"X-Api-Key": "k"}
+
+
+@pytest.fixture
+def client(tmp_path, monkeypatch):
+    monkeypatch.setenv("RELAY_API_KEY", "k")
+    store = SessionStore(tmp_path, segment_bytes=4096, index_bytes=256)
+    for i in range(60):
+        for user in ("alice", "bob", "carol"):
+            if i % 3 == ("alice", "bob", "carol").index(user) or i % 10 == 0:
+                ts = (T0 + timedelta(minutes=i)).isoformat()
+                store.append(user, {"timestamp": ts, "user": user, "query": f"{user}-{i}"})
+    monkeypatch.setattr(session_store, "_store", store)
+    from routes import logs_sessions
+
+    app = FastAPI()
+    app.include_router(logs_sessions.router)
+    return TestClient(app)
+
+
+def _all_pages(client, **params):
+    out, cursor = [], None
+    while True:
+        p = dict(params, **({"cursor": cursor} if cursor else {}))
+        body = client.get("/logs/sessions/all", params=p, headers=H).json()
+        out.extend(body["entries"])
+        cursor = body["next_cursor"]
+        if not cursor:
+            return out
+
+
+def test_pages_cover_everything_in_order_including_ties(client):
+    full = client.get("/logs/sessions/all", params={"limit": 1000}, headers=H).json()
+    assert full["next_cursor"] is None
+    keys = [(e["timestamp"], e["user"]) for e in full["entries"]]
+    assert keys == sorted(keys, reverse=True)
+
+    paged = _all_pages(client, limit=7)
+    assert [e["query"] for e in paged] == [e["query"] for e in full["entries"]]
+
+
+def test_filters(client):
+    body = client.get(
+        "/logs/sessions/all",
+        params={"user": "bob", "since": "2025-01-01T00:10:00", "until": "2025-01-01T00:20:00", "limit": 1000},
+        headers=H,
+    ).json()
+    queries = [e["query"] for e in body["entries"]]
+    assert queries and all(q.startswith("bob-") for q in queries)
+    assert all(10 <= int(q.split("-")[1]) <= 20 for q in queries)
+
+    hits = client.get("/logs/sessions/all", params={"q": "CAROL-5"}, headers=H).json()["entries"]
+    assert {e["query"] for e in hits} == {"carol-5", "carol-50", "carol-53", "carol-56", "carol-59"}
+
+
+def test_ndjson_stream_ends_with_cursor(client):
+    r = client.get("/logs/sessions/all", params={"limit": 5, "format": "ndjson"}, headers=H)
+    lines = [json.loads(l) for l in r.text.splitlines()]
+    assert r.headers["content-type"].startswith("application/x-ndjson")
+    assert len(lines) == 6 and lines[-1]["next_cursor"]
+
+
+def test_text_filter_pages_across_same_ms_ties(tmp_path, monkeypatch):
+    monkeypatch.setenv("RELAY_API_KEY", "k")
+    store = SessionStore(tmp_path)
+    ts = T0.isoformat()
+    for i in range(9):  # one millisecond, hits interleaved with misses
+        store.append("dan", {"timestamp": ts, "query": f"{'hit' if i % 2 else 'miss'}-{i}"})
+    monkeypatch.setattr(session_store, "_store", store)
+    from routes import logs_sessions
+
+    app = FastAPI()
+    app.include_router(logs_sessions.router)
+    paged = _all_pages(TestClient(app), q="hit", limit=1)
+    assert [e["query"] for e in paged] == ["hit-7", "hit-5", "hit-3", "hit-1"]
+
+
+def test_untimestamped_entries_page_in_stable_order(tmp_path, monkeypatch):
+    monkeypatch.setenv("RELAY_API_KEY", "k")
+    store = SessionStore(tmp_path)
+    for i in range(3):
+        store.append("eve", {"query": f"legacy-{i}"})
+    store.append("eve", {"timestamp": T0.isoformat(), "query": "stamped"})
+    monkeypatch.setattr(session_store, "_store", store)
+    from routes import logs_sessions
+
+    app = FastAPI()
+    app.include_router(logs_sessions.router)
+    client = TestClient(app)
+    first = client.get("/logs/sessions/all", params={"limit": 2}, headers=H).json()
+    store.append("eve", {"query": "legacy-late"})  # must not shift the cursor
+    rest = _all_pages(client, limit=1, cursor=first["next_cursor"])
+    queries = [e["query"] for e in first["entries"] + rest]
+    assert queries == ["stamped", "legacy-0", "legacy-1", "legacy-2", "legacy-late"]
@@ -0,0 +1,93 @@
+# ──────────────────────────────────────────────────────────────────────────────
+# File: tests/test_rate_limit.py
+# Purpose: per-user token buckets, rate limit headers, user attribution, redis.
+# ──────────────────────────────────────────────────────────────────────────────
+
+import pytest
+from starlette.applications import Starlette
+from starlette.middleware import Middleware
+from starlette.responses import PlainTextResponse
+from starlette.routing import Route
+from starlette.testclient import TestClient
+
+from services.llm_governor import current_user
+from services.rate_limit import MemoryBackend, RateLimiter, RateLimitMiddleware, RedisBackend
+
+
+def _app(limiter):
+    async def ask(request):
+        body = await request.json()  # the peeked body must still be readable
+        return PlainTextResponse(f"{current_user()}|{body['query']}")
+
+    return Starlette(
+        routes=[Route("/ask", ask, methods=["POST"])],
+        middleware=[Middleware(RateLimitMiddleware, limiter=limiter, enforce=True)],
+    )
+
+
+def test_bucket_per_user_with_headers_and_429(monkeypatch):
+    monkeypatch.setenv("RELAY_API_KEY", "k")
+    limiter = RateLimiter(MemoryBackend(), {"ask": (60, 2), "kb_search": (60, 2), "control": (60, 2)})
+    client = TestClient(_app(limiter))
+    key = {"X-Api-Key": "k"}
+
+    r1 = client.post("/ask", json={"query": "q1", "user_id": "alice"}, headers=key)
+    r2 = client.post("/ask", json={"query": "q2", "user_id": "alice"}, headers=key)
+    assert (r1.text, r2.text) == ("key:relay_api_key/alice|q1", "key:relay_api_key/alice|q2")
+    assert [r.headers["x-ratelimit-remaining"] for r in (r1, r2)] == ["1", "0"]
+    assert r1.headers["x-ratelimit-limit"] == "2"
+
+    r3 = client.post("/ask", json={"query": "q3", "user_id": "alice"}, headers=key)
+    assert r3.status_code == 429 and r3.headers["retry-after"] == "1"
+    assert r3.json()["detail"]["code"] == "rate_limited"
+
+    # The header identity wins over the body and has its own bucket under the key.
+    r4 = client.post("/ask", json={"query": "q4", "user_id": "alice"}, headers={**key, "X-User-Id": "bob"})
+    assert r4.status_code == 200 and r4.text == "key:relay_api_key/bob|q4"
+    assert limiter.stats()["routes"]["ask"] == {"rpm": 60, "burst": 2, "allowed": 3, "limited": 1}
+
+
+def test_unauthenticated_callers_cannot_spend_or_mint_user_buckets(monkeypatch):
+    monkeypatch.setenv("RELAY_API_KEY", "k")
+    limiter = RateLimiter(MemoryBackend(), {"ask": (60, 2), "kb_search": (60, 1), "control": (60, 2)})
+
+    async def search(request):
+        return PlainTextResponse("ok")
+
+    client = TestClient(Starlette(
+        routes=[Route("/kb/search", search, methods=["POST"])],
+        middleware=[Middleware(RateLimitMiddleware, limiter=limiter, enforce=True)],
+    ))
+    # A bad key on an authenticated route is never charged (the route's auth rejects it).
+    for _ in range(3):
+        r = client.post("/kb/search", json={}, headers={"X-Api-Key": "wrong", "X-User-Id": "alice"})
+        assert "x-ratelimit-limit" not in r.headers
+    assert client.post("/kb/search", json={}, headers={"X-Api-Key": "k", "X-User-Id": "alice"}).status_code == 200
+
+    # Without a key, rotating X-User-Id still lands in the one anon:<ip> bucket.
+    app = TestClient(_app(limiter))
+    codes = [app.post("/ask", json={"query": "q"}, headers={"X-User-Id": f"u{i}"}).status_code for i in range(3)]
+    assert codes == [200, 200, 429]
+
+
+def test_unlimited_mode_only_tags_the_user(monkeypatch):
+    monkeypatch.setenv("RELAY_API_KEY", "k")
+    client = TestClient(Starlette(
+        routes=[Route("/ask", lambda r: PlainTextResponse(current_user()), methods=["POST"])],
+        middleware=[Middleware(RateLimitMiddleware, enforce=False)],
+    ))
+    r = client.post("/ask", json={"query": "q"}, headers={"X-User-Id": "carol", "X-Api-Key": "k"})
+    assert r.text == "key:relay_api_key/carol" and "x-ratelimit-limit" not in r.headers
+    assert client.post("/ask", json={"query": "q"}, headers={"X-User-Id": "carol"}).text.startswith("anon:")
+
+
+@pytest.mark.asyncio
+async def test_redis_backend_shares_buckets():
+    fakeredis = pytest.importorskip("fakeredis")  # fakeredis[lua] in requirements-dev.txt
+    redis = fakeredis.FakeAsyncRedis()
+    a, b = RedisBackend(redis), RedisBackend(redis)  # two replicas, one budget
+    assert (await a.take("ask:u", 1.0, 2.0))[0] is True
+    assert (await b.take("ask:u", 1.0, 2.0))[0] is True
+    allowed, tokens = await a.take("ask:u", 1.0, 2.0)
+    assert allowed is False and tokens < 1
+    assert a.errors == 0
@@ -0,0 +1,65 @@
+# ──────────────────────────────────────────────────────────────────────────────
+# File: tests/test_serialization.py
+# Purpose: fast JSON path (orjson + stdlib fallback) and selective compression.
+# ──────────────────────────────────────────────────────────────────────────────
+
+import json
+
+import pytest
+from starlette.applications import Starlette
+from starlette.middleware import Middleware
+from starlette.responses import PlainTextResponse, StreamingResponse
+from starlette.routing import Route
+from starlette.testclient import TestClient
+
+from services import serialization
+from services.http_middleware import CompressionMiddleware
+from services.serialization import FastJSONResponse, dumps
+
+
+class _Thing:
+    def __str__(self):
+        return "thing"
+
+
+@pytest.mark.parametrize("use_orjson", [True, False])
+def test_dumps_applies_the_normalization_rule(monkeypatch, use_orjson):
+    if not use_orjson:
+        monkeypatch.setattr(serialization, "orjson", None)
+    elif serialization.orjson is None:
+        pytest.skip("orjson not installed")
+    payload = {"a": (1, 2), "s": {3}, 4: "int key", "obj": _Thing(), "nan": float("nan"), "txt": "héllo"}
+    out = json.loads(dumps(payload))
+    assert out == {"a": [1, 2], "s": [3], "4": "int key", "obj": "thing", "nan": None, "txt": "héllo"}
+    assert FastJSONResponse({"k": "v"}).body == b'{"k":"v"}'
+
+
+def test_compression_skips_small_and_streaming_bodies():
+    big = "x" * 5000
+
+    async def large(_r):
+        return FastJSONResponse({"data": big})
+
+    async def small(_r):
+        return PlainTextResponse("ok")
+
+    async def stream(_r):
+        async def gen():
+            yield big
+            yield big
+        return StreamingResponse(gen(), media_type="text/plain")
+
+    app = Starlette(
+        routes=[Route("/large", large), Route("/small", small), Route("/stream", stream)],
+        middleware=[Middleware(CompressionMiddleware, minimum_size=1024)],
+    )
+    client = TestClient(app)
+    headers = {"Accept-Encoding": "gzip"}
+
+    r = client.get("/large", headers=headers)
+    assert r.headers["content-encoding"] == "gzip" and r.json() == {"data": big}
+    assert int(r.headers["content-length"]) < 1024  # compressed length, not the original
+
+    assert "content-encoding" not in client.get("/small", headers=headers).headers
+    r = client.get("/stream", headers=headers)
+    assert "content-encoding" not in r.headers and r.text == big * 2
@@ -0,0 +1,57 @@
+# ──────────────────────────────────────────────────────────────────────────────
+# File: tests/test_session_store.py
+# Purpose: session memory store — tail reads, index-assisted ranges, rotation.
+# ──────────────────────────────────────────────────────────────────────────────
+
+import json
+from datetime import datetime, timedelta
+
+from services.session_store import SessionStore
+
+T0 = datetime(2025, 1, 1)
+
+
+def _fill(store, n, user="u"):
+    for i in range(n):
+        store.append(user, {"timestamp": (T0 + timedelta(seconds=i)).isoformat(), "query": f"q{i}", "summary": "s" * 40})
+
+
+def test_tail_returns_last_entries_in_order(tmp_path):
+    store = SessionStore(tmp_path, index_bytes=512)
+    _fill(store, 50)
+    assert [e["query"] for e in store.tail("u", 3)] == ["q47", "q48", "q49"]
+    assert store.tail("nobody", 3) == []
+
+
+def test_rotation_and_range_span_segments(tmp_path):
+    store = SessionStore(tmp_path, segment_bytes=2048, index_bytes=256)
+    _fill(store, 200)
+    segs = store.segments("u")
+    assert len(segs) > 3 and segs[-1].name == "u.jsonl"
+
+    got = list(store.range("u", T0 + timedelta(seconds=57), T0 + timedelta(seconds=143)))
+    assert [e["query"] for e in got] == [f"q{i}" for i in range(57, 143)]
+    assert [e["query"] for e in store.tail("u", 120)][0] == "q80"
+
+
+def test_compact_keeps_newest_segments(tmp_path):
+    store = SessionStore(tmp_path, segment_bytes=2048, max_segments=2, index_bytes=256)
+    _fill(store, 200)
+    assert len(store.segments("u")) <= 3
+    assert store.tail("u", 1)[0]["query"] == "q199"
+
+
+def test_legacy_file_without_index_stays_queryable(tmp_path):
+    lines = [{"timestamp": (T0 + timedelta(days=i)).isoformat(), "query": f"old{i}"} for i in range(5)]
+    body = "".join(json.dumps(e) + "\n" for e in lines)
+    (tmp_path / "u.jsonl").write_text(body)
+    (tmp_path / "a b.jsonl").write_text(body)  # raw id from before safe_user()
+
+    store = SessionStore(tmp_path, index_bytes=64)
+    store.append("u", {"timestamp": datetime(2026, 6, 1).isoformat(), "query": "new"})
+    cutoff = int(datetime(2026, 1, 1).timestamp() * 1000)
+    assert [e["query"] for e in store.iter_reverse("u", before_ms=cutoff)] == [f"old{i}" for i in range(4, -1, -1)]
+    assert len(list(store.range("u", datetime(2025, 1, 1), datetime(2026, 1, 1)))) == 5
+
+    store.append("a b", {"timestamp": datetime(2026, 6, 1).isoformat(), "query": "new"})
+    assert [e["query"] for e in store.tail("a b", 2)] == ["old4", "new"]
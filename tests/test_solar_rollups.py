@@ -0,0 +1,92 @@
+# ──────────────────────────────────────────────────────────────────────────────
+# File: tests/test_solar_rollups.py
+# Purpose: plant_flow rollups — pure aggregation, grain selection, cached route.
+# ──────────────────────────────────────────────────────────────────────────────
+
+import sys
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "backend" / "solark_browser"))
+import plant_flow_rollups as pfr  # noqa: E402
+
+from services import solar_rollups  # noqa: E402
+
+T0 = datetime(2025, 1, 1, tzinfo=timezone.utc)
+
+
+def test_aggregate_buckets_and_energy():
+    samples = [
+        (1, T0 + timedelta(seconds=10), {"pvPower": 1000, "soc": 50}),
+        (1, T0 + timedelta(seconds=40), {"pvPower": 2000, "soc": 51}),
+        (1, T0 + timedelta(seconds=70), {"pvPower": 3000, "soc": 52}),
+    ]
+    out = pfr.aggregate(samples, prev_ts={1: T0})
+
+    m0 = out["1m"][(1, T0)]
+    assert m0["n"] == 2 and m0["pv_power_min"] == 1000 and m0["pv_power_max"] == 2000
+    assert m0["soc_last"] == 51
+    # 1000 W held 10 s + 2000 W held 30 s
+    assert m0["pv_wh"] == pytest.approx((1000 * 10 + 2000 * 30) / 3600)
+
+    h0 = out["1h"][(1, T0)]
+    assert h0["n"] == 3 and h0["pv_power_sum"] == 6000 and h0["soc_last"] == 52
+    assert sum(a["pv_wh"] for a in out["1m"].values()) == pytest.approx(h0["pv_wh"])
+
+
+def test_rebuild_range_covers_whole_days_through_successor():
+    start, end = pfr.rebuild_range(T0 + timedelta(hours=23, minutes=59), T0 + timedelta(days=1, seconds=5))
+    assert start == T0 and end == T0 + timedelta(days=2)
+    for width in pfr.GRAINS.values():
+        assert pfr.bucket_start(start, width) == start and pfr.bucket_start(end, width) == end
+
+
+def test_pick_grain_stays_under_max_points():
+    assert solar_rollups.pick_grain(T0, T0 + timedelta(hours=6), 1000) == "1m"
+    assert solar_rollups.pick_grain(T0, T0 + timedelta(days=7), 1000) == "15m"
+    assert solar_rollups.pick_grain(T0, T0 + timedelta(days=30), 1000) == "1h"
+    assert solar_rollups.pick_grain(T0, T0 + timedelta(days=365), 1000) == "1d"
+
+
+@pytest.fixture
+def client(monkeypatch):
+    monkeypatch.setenv("RELAY_API_KEY", "k")
+    calls = []
+
+    def fake_fetch(plant_id, grain, start, end, metrics):
+        calls.append((plant_id, grain, start, end))
+        return [{"bucket": start.isoformat(), "n": 1}]
+
+    monkeypatch.setattr(solar_rollups, "_fetch_rows", fake_fetch)
+    solar_rollups._cache.clear()
+    from routes import solar
+
+    app = FastAPI()
+    app.include_router(solar.router)
+    with TestClient(app) as c:
+        c.calls = calls
+        yield c
+
+
+def test_historical_window_is_cached(client):
+    params = {"plant_id": 1, "start": "2025-01-01T00:00:10Z", "end": "2025-01-02T00:00:00Z"}
+    r1 = client.get("/solar/plant_flow", params=params, headers={"X-Api-Key": "k"})
+    r2 = client.get("/solar/plant_flow", params=params, headers={"X-Api-Key": "k"})
+    assert r1.status_code == 200 and r2.status_code == 200
+    assert r1.json()["grain"] == "15m" and r1.json()["start"].startswith("2025-01-01T00:00:00")
+    assert r1.json()["cached"] is False and r2.json()["cached"] is True
+    assert len(client.calls) == 1
+    assert "max-age=300" in r1.headers["cache-control"]
+
+
+def test_unavailable_db_is_503(client, monkeypatch):
+    def down(*a, **k):
+        raise solar_rollups.SolarDataUnavailable("not configured")
+
+    monkeypatch.setattr(solar_rollups, "_fetch_rows", down)
+    r = client.get("/solar/plant_flow", params={"plant_id": 1}, headers={"X-Api-Key": "k"})
+    assert r.status_code == 503
@@ -0,0 +1,108 @@
+# ──────────────────────────────────────────────────────────────────────────────
+# File: tests/test_solark_ingest.py
+# Purpose: plant_flow ingester — batching, spool on outage, in-order replay.
+# ──────────────────────────────────────────────────────────────────────────────
+
+import sys
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+
+import pytest
+
+psycopg2 = pytest.importorskip("psycopg2")
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "backend" / "solark_browser"))
+import plant_flow_ingest as pfi  # noqa: E402
+
+T0 = datetime(2025, 1, 1, tzinfo=timezone.utc)
+
+
+class FlakyDB:
+    """Stands in for PlantFlowIngester._insert: down until .up is set."""
+
+    def __init__(self):
+        self.up = False
+        self.rows = []
+
+    def __call__(self, samples):
+        if not self.up:
+            raise psycopg2.OperationalError("connection refused")
+        if any(s[2].get("pvPower") == "bad" for s in samples):
+            raise psycopg2.DataError("invalid input syntax for type numeric")
+        self.rows.extend(samples)
+
+
+def _ingester(tmp_path, db, batch_size=2):
+    ing = pfi.PlantFlowIngester({}, batch_size=batch_size, spool_path=tmp_path / "s.jsonl")
+    ing._insert = db
+    return ing
+
+
+def test_batches_flush_when_full(tmp_path):
+    db = FlakyDB()
+    db.up = True
+    ing = _ingester(tmp_path, db, batch_size=3)
+    for i in range(2):
+        ing.add({"pvPower": i}, plant_id=1, ts=T0 + timedelta(minutes=i))
+    assert db.rows == []
+    ing.add({"pvPower": 2}, plant_id=1, ts=T0 + timedelta(minutes=2))
+    assert [s[2]["pvPower"] for s in db.rows] == [0, 1, 2]
+    assert ing.stats()["flushes"] == 1
+
+
+def test_outage_spools_then_replays_in_order(tmp_path):
+    db = FlakyDB()
+    ing = _ingester(tmp_path, db)
+    for i in range(5):
+        ing.add({"pvPower": i}, plant_id=1, ts=T0 + timedelta(minutes=i))
+    ing.flush()
+    assert db.rows == [] and ing.spool.pending()
+
+    db.up = True
+    ing.add({"pvPower": 5}, plant_id=1, ts=T0 + timedelta(minutes=5))
+    ing.flush()
+    assert [s[2]["pvPower"] for s in db.rows] == [0, 1, 2, 3, 4, 5]
+    assert [s[1] for s in db.rows] == [T0 + timedelta(minutes=i) for i in range(6)]
+    assert not ing.spool.pending()
+    assert not (tmp_path / "s.jsonl").exists()
+
+
+def test_bad_row_is_quarantined_and_does_not_block_replay(tmp_path):
+    db = FlakyDB()
+    ing = _ingester(tmp_path, db, batch_size=4)
+    for i, v in enumerate([0, "bad", 2]):
+        ing.add({"pvPower": v}, plant_id=1, ts=T0 + timedelta(minutes=i))
+    ing.flush()  # outage: everything spooled, bad row included
+    db.up = True
+    ing.add({"pvPower": 3}, plant_id=1, ts=T0 + timedelta(minutes=3))
+    ing.flush()
+    assert [s[2]["pvPower"] for s in db.rows] == [0, 2, 3]
+    assert not ing.spool.pending()
+    assert [s[2]["pvPower"] for b, _ in ing.quarantine.batches(10) for s in b] == ["bad"]
+    assert ing.stats()["rows_quarantined"] == 1
+
+
+def test_hook_failure_spools_instead_of_dropping(tmp_path):
+    def broken(samples):
+        raise ValueError("rollup bug")
+
+    ing = _ingester(tmp_path, broken)
+    ing.add({"pvPower": 1}, plant_id=1, ts=T0)
+    ing.flush()
+    assert ing.spool.pending() and ing.stats()["rows_spooled"] == 1
+
+
+def test_spool_resumes_from_committed_offset(tmp_path):
+    spool = pfi.Spool(tmp_path / "s.jsonl")
+    spool.append([(1, T0 + timedelta(minutes=i), {"i": i}) for i in range(4)])
+    first, end = next(spool.batches(2))
+    spool.commit(end)
+    rest = [s for batch, _ in spool.batches(2) for s in batch]
+    assert [s[2]["i"] for s in first] == [0, 1]
+    assert [s[2]["i"] for s in rest] == [2, 3]
+
+
+def test_row_matches_column_order():
+    row = pfi.snapshot_to_row(7, T0, {"pvPower": 10, "soc": 55})
+    assert len(row) == len(pfi.COLUMNS)
+    assert row[pfi.COLUMNS.index("pv_power")] == 10
+    assert row[pfi.COLUMNS.index("soc")] == 55
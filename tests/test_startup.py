@@ -0,0 +1,106 @@
+# ──────────────────────────────────────────────────────────────────────────────
+# File: tests/test_startup.py
+# Purpose: startup tooling — lazy router stubs and import-time profiling.
+# ──────────────────────────────────────────────────────────────────────────────
+
+import sys
+
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from services.startup import ImportProfiler, LazyRouters
+
+
+def _write_router_module(tmp_path, monkeypatch, name):
+    (tmp_path / f"{name}.py").write_text(
+        "from fastapi import APIRouter\n"
+        "router = APIRouter(prefix='/lazy')\n"
+        "@router.get('')\n"
+        "def root():\n"
+        "    return {'root': True}\n"
+        "@router.get('/item/{item_id}')\n"
+        "def item(item_id: int):\n"
+        "    return {'item': item_id}\n",
+        encoding="utf-8",
+    )
+    monkeypatch.syspath_prepend(str(tmp_path))
+    monkeypatch.delitem(sys.modules, name, raising=False)
+
+
+def test_lazy_router_imports_on_first_request(tmp_path, monkeypatch):
+    _write_router_module(tmp_path, monkeypatch, "lazy_router_mod")
+    app = FastAPI()
+    routers = LazyRouters(app)
+    stub_at = len(app.router.routes)
+    routers.add("lazy_router_mod", ["/lazy"])
+
+    @app.get("/after")
+    def after():
+        return {"after": True}
+
+    assert "lazy_router_mod" not in sys.modules
+    assert routers.pending() == ["lazy_router_mod"]
+    client = TestClient(app)
+
+    r = client.get("/lazy/item/7")
+    assert r.status_code == 200 and r.json() == {"item": 7}
+    assert "lazy_router_mod" in sys.modules and routers.pending() == []
+    assert client.get("/lazy").json() == {"root": True}
+    assert client.get("/after").json() == {"after": True}
+    # The stub is gone and the real routes took its slot (still before /after).
+    assert not any(hasattr(route, "lazy_router") for route in app.router.routes)
+    assert getattr(app.router.routes[stub_at], "path", None) != "/after"
+    assert getattr(app.router.routes[-1], "path", None) == "/after"
+    assert routers.report()["lazy_router_mod"]["import_ms"] is not None
+
+
+def test_failed_lazy_router_404s_and_reports(monkeypatch):
+    app = FastAPI()
+    routers = LazyRouters(app)
+    routers.add("no_such_router_mod", ["/nope"])
+    r = TestClient(app).get("/nope/x")
+    assert r.status_code == 404
+    assert "ModuleNotFoundError" in routers.report()["no_such_router_mod"]["error"]
+
+
+def test_import_profiler_records_self_and_cumulative(tmp_path, monkeypatch):
+    (tmp_path / "prof_child_mod.py").write_text("X = 1\n", encoding="utf-8")
+    (tmp_path / "prof_parent_mod.py").write_text("import prof_child_mod\n", encoding="utf-8")
+    monkeypatch.syspath_prepend(str(tmp_path))
+    prof = ImportProfiler()
+    prof.install()
+    try:
+        exec("import prof_parent_mod", {})
+    finally:
+        prof.uninstall()
+        sys.modules.pop("prof_parent_mod", None)
+        sys.modules.pop("prof_child_mod", None)
+
+    rows = {r["module"]: r for r in prof.report(limit=100)["modules"]}
+    parent, child = rows["prof_parent_mod"], rows["prof_child_mod"]
+    assert child["parent"] == "prof_parent_mod" and parent["parent"] is None
+    assert parent["cumulative_ms"] >= child["cumulative_ms"]
+    assert parent["self_ms"] <= parent["cumulative_ms"]
+
+
+def test_import_profiler_sees_from_package_imports_and_expires(tmp_path, monkeypatch):
+    pkg = tmp_path / "prof_pkg"
+    pkg.mkdir()
+    (pkg / "__init__.py").write_text("", encoding="utf-8")
+    (pkg / "sub.py").write_text("Y = 2\n", encoding="utf-8")
+    monkeypatch.syspath_prepend(str(tmp_path))
+    import builtins
+    import prof_pkg  # noqa: F401  (package already loaded, like `services`)
+
+    prof = ImportProfiler(max_s=60)
+    prof.install()
+    try:
+        exec("from prof_pkg import sub", {})
+        assert "prof_pkg.sub" in {r["module"] for r in prof.report()["modules"]}
+        prof.t0 -= 120  # past max_s → the next import removes the hook
+        exec("import json", {})
+        assert not prof.installed and builtins.__import__ is not prof._import
+    finally:
+        prof.uninstall()
+        for name in ("prof_pkg", "prof_pkg.sub"):
+            sys.modules.pop(name, None)
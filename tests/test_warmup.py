@@ -0,0 +1,73 @@
+# ──────────────────────────────────────────────────────────────────────────────
+# File: tests/test_warmup.py
+# Purpose: startup warmup — step timings, ready vs degraded, /readyz gating.
+# ──────────────────────────────────────────────────────────────────────────────
+
+import threading
+
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+import services.warmup as warmup_mod
+from routes import health
+from services.warmup import Warmup
+
+
+def _step_raises():
+    raise RuntimeError("no embed model")
+
+
+def test_steps_are_timed_and_failures_degrade():
+    w = Warmup(steps=[("imports", lambda: {"n": 1}), ("index", lambda: None)])
+    assert w.state == "idle"
+    assert w.run() == "ready"
+    stats = w.stats()
+    assert stats["state"] == "ready" and stats["total_ms"] is not None
+    assert stats["steps"]["imports"]["detail"] == {"n": 1}
+    assert all(isinstance(s["ms"], int) for s in stats["steps"].values())
+
+    w = Warmup(steps=[("embed", _step_raises), ("tokenizer", lambda: None)])
+    assert w.run() == "degraded"
+    steps = w.stats()["steps"]
+    assert steps["embed"]["status"] == "failed" and "no embed model" in steps["embed"]["error"]
+    assert steps["tokenizer"]["status"] == "ok"  # later steps still run
+
+
+def test_readyz_gates_while_warming(monkeypatch):
+    gate = threading.Event()
+    w = Warmup(steps=[("index", lambda: gate.wait(5))])
+    monkeypatch.setattr(warmup_mod, "_warmup", w)
+    app = FastAPI()
+    app.include_router(health.router)
+    client = TestClient(app)
+
+    w.start()
+    r = client.get("/readyz")
+    assert r.status_code == 503
+    assert r.json()["state"] == "warming" and "warming" in r.json()["problems"]
+
+    gate.set()
+    w._thread.join(5)
+    r = client.get("/readyz")
+    assert r.status_code == 200
+    assert r.json()["state"] == "ready"
+    assert r.json()["warmup"]["steps"]["index"]["status"] == "ok"
+
+
+def test_hung_step_degrades_after_timeout(monkeypatch):
+    gate = threading.Event()
+    w = Warmup(steps=[("index", lambda: gate.wait(5))], timeout_s=0.05)
+    monkeypatch.setattr(warmup_mod, "_warmup", w)
+    app = FastAPI()
+    app.include_router(health.router)
+    client = TestClient(app)
+
+    w.start()
+    w.wait(0.5)  # still blocked on the gate; the deadline has passed
+    r = client.get("/readyz")
+    assert r.status_code == 200
+    assert r.json()["warmup"]["timed_out"] is True
+    assert r.json()["warmup"]["steps"]["index"]["status"] == "timed_out"
+
+    gate.set()
+    assert w.wait(5) == "ready"
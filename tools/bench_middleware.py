@@ -0,0 +1,143 @@
+# ──────────────────────────────────────────────────────────────────────────────
+# File: tools/bench_middleware.py
+# Purpose: Per-request overhead of the core middleware stack (RequestID +
+#          AccessLog + Timeout) on a trivial endpoint: the previous
+#          BaseHTTPMiddleware implementations vs services.http_middleware.
+# Usage:
+#   python tools/bench_middleware.py
+#   python tools/bench_middleware.py --requests 20000 --rounds 5
+# Notes:
+#   Requests are driven straight through the ASGI callable (no sockets, no
+#   HTTP client), so the numbers isolate middleware cost. The "bare" row is
+#   the app with no middleware at all; overhead = stack − bare.
+# ──────────────────────────────────────────────────────────────────────────────
+
+from __future__ import annotations
+import argparse
+import asyncio
+import logging
+import os
+import statistics
+import sys
+import time
+import uuid
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import anyio
+from starlette.applications import Starlette
+from starlette.middleware import Middleware
+from starlette.middleware.base import BaseHTTPMiddleware
+from starlette.requests import Request
+from starlette.responses import PlainTextResponse, Response
+from starlette.routing import Route
+
+from services import http_middleware
+
+_log = logging.getLogger("relay.main")
+
+
+# ── Baseline: the BaseHTTPMiddleware versions previously in main.py ─────────
+
+class LegacyRequestID(BaseHTTPMiddleware):
+    async def dispatch(self, request: Request, call_next):
+        cid = request.headers.get("x-corr-id") or f"{uuid.uuid4().hex[:8]}{int(time.time())%1000:03d}"
+        request.state.corr_id = cid
+        response = await call_next(request)
+        response.headers["x-corr-id"] = cid
+        return response
+
+
+class LegacyAccessLog(BaseHTTPMiddleware):
+    async def dispatch(self, request: Request, call_next):
+        t0 = time.perf_counter()
+        status = None
+        try:
+            response = await call_next(request)
+            status = response.status_code
+            return response
+        finally:
+            dur_ms = int((time.perf_counter() - t0) * 1000)
+            cid = getattr(getattr(request, "state", None), "corr_id", "-")
+            _log.info("req method=%s path=%s cid=%s status=%s dur_ms=%s",
+                      request.method, request.url.path, cid, status if status is not None else "ERR", dur_ms)
+
+
+class LegacyTimeout(BaseHTTPMiddleware):
+    def __init__(self, app, timeout_s: float = 35.0):
+        super().__init__(app)
+        self.timeout_s = timeout_s
+
+    async def dispatch(self, request: Request, call_next):
+        response = None
+        with anyio.move_on_after(self.timeout_s) as scope:
+            response = await call_next(request)
+        if scope.cancel_called or response is None:
+            return Response("Request timeout", status_code=504)
+        return response
+
+
+# ── Harness ──────────────────────────────────────────────────────────────────
+
+async def _ping(_request):
+    return PlainTextResponse("pong")
+
+
+def build(kind: str) -> Starlette:
+    # Listed outermost-first, the same order main.create_app ends up with.
+    stacks = {
+        "bare": [],
+        "legacy": [Middleware(LegacyTimeout), Middleware(LegacyAccessLog), Middleware(LegacyRequestID)],
+        "asgi": [
+            Middleware(http_middleware.TimeoutMiddleware),
+            Middleware(http_middleware.AccessLogMiddleware),
+            Middleware(http_middleware.RequestIDMiddleware),
+        ],
+    }
+    return Starlette(routes=[Route("/ping", _ping)], middleware=stacks[kind])
+
+
+async def _drive(app, n: int) -> float:
+    scope = {
+        "type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1", "method": "GET",
+        "scheme": "http", "path": "/ping", "raw_path": b"/ping", "root_path": "", "query_string": b"",
+        "headers": [(b"host", b"bench")], "client": ("127.0.0.1", 1), "server": ("bench", 80),
+    }
+
+    async def receive():
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    async def send(message):
+        pass
+
+    t0 = time.perf_counter()
+    for _ in range(n):
+        await app(dict(scope, state={}), receive, send)
+    return (time.perf_counter() - t0) / n * 1e6
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Benchmark core middleware overhead.")
+    parser.add_argument("--requests", type=int, default=5000, help="Requests per round")
+    parser.add_argument("--rounds", type=int, default=5, help="Rounds per stack (median reported)")
+    args = parser.parse_args()
+
+    logging.getLogger("relay.main").setLevel(logging.WARNING)  # measure the code path, not log I/O
+    results = {}
+    for kind in ("bare", "legacy", "asgi"):
+        app = build(kind)
+        asyncio.run(_drive(app, 200))  # warm routing/imports
+        results[kind] = statistics.median(asyncio.run(_drive(app, args.requests)) for _ in range(args.rounds))
+
+    bare = results["bare"]
+    print(f"{'stack':<8} {'us/req':>9} {'overhead':>10}")
+    for kind, us in results.items():
+        print(f"{kind:<8} {us:>9.1f} {us - bare:>9.1f}us")
+    legacy_over, asgi_over = results["legacy"] - bare, results["asgi"] - bare
+    if legacy_over > 0:
+        print(f"middleware overhead reduced by {100 * (1 - asgi_over / legacy_over):.0f}%")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,129 @@
+# ──────────────────────────────────────────────────────────────────────────────
+# File: tools/bench_serialization.py
+# Purpose: Microseconds per response for the old vs new JSON paths:
+#          • /ask       — _json_safe walks + AskResponse + response_model
+#                         validation/dump  vs  one FastJSONResponse render
+#          • /kb/search — jsonable_encoder + JSONResponse  vs  FastJSONResponse
+# Usage:
+#   python tools/bench_serialization.py
+#   python tools/bench_serialization.py --iterations 5000
+# Notes:
+#   The /ask payload mirrors a real answer: ~2400-token context, 8 grounding
+#   sources, 14 critic results, plan, meta. Prints whether orjson was used.
+# ──────────────────────────────────────────────────────────────────────────────
+
+from __future__ import annotations
+import argparse
+import os
+import sys
+import time
+from typing import Any, Callable
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fastapi.encoders import jsonable_encoder
+from pydantic import TypeAdapter
+from starlette.responses import JSONResponse
+
+from services import serialization
+from services.serialization import FastJSONResponse
+from routes.ask import AskResponse
+
+
+def _json_safe(obj: Any) -> Any:
+    """The per-field walk routes/ask used to apply before building AskResponse."""
+    try:
+        if isinstance(obj, (str, int, float, bool)) or obj is None:
+            return obj
+        if isinstance(obj, dict):
+            return {str(k): _json_safe(v) for k, v in obj.items()}
+        if isinstance(obj, (list, tuple, set)):
+            return [_json_safe(x) for x in obj]
+        return str(obj)
+    except Exception:
+        return "[unserializable]"
+
+
+def ask_payload() -> dict:
+    words = "relay answers questions from the knowledge base using grounded context".split()
+    context = " ".join(words[i % len(words)] for i in range(1800))  # ≈ 2400 tokens
+    grounding = [
+        {"path": f"docs/imported/section_{i}.md", "score": 0.9 - i * 0.05, "tier": "project_docs",
+         "snippet": context[i * 200:(i + 1) * 200]}
+        for i in range(8)
+    ]
+    critics = [
+        {"name": f"critic_{i}", "passes": i % 3 != 0, "ms": 0.02,
+         "issues": [{"message": f"issue {j} for critic {i}", "severity": "low"} for j in range(i % 3)]}
+        for i in range(14)
+    ]
+    return {
+        "plan": {"objective": "answer the question", "steps": [f"step {i}" for i in range(6)],
+                 "route": "echo", "_diag": {"final_answer_origin": "model"}},
+        "routed_result": {"response": context[:2000], "route": "echo", "grounding": grounding},
+        "critics": critics,
+        "context": context,
+        "files_used": [{"path": g["path"]} for g in grounding],
+        "meta": {"role": "planner", "debug": False, "corr_id": "abc123", "route": "echo",
+                 "kb": {"hits": 8, "max_score": 0.9, "sources": [g["path"] for g in grounding]},
+                 "timings_ms": {"context_ms": 120, "mcp_ms": 900}, "no_answer": False},
+        "final_text": context[:2000],
+    }
+
+
+def _old_ask(payload: dict, adapter: TypeAdapter) -> bytes:
+    resp = AskResponse(
+        plan=_json_safe(payload["plan"]),
+        routed_result=_json_safe(payload["routed_result"]),
+        critics=_json_safe(payload["critics"]),
+        context=payload["context"],
+        files_used=_json_safe(payload["files_used"]),
+        meta=_json_safe(payload["meta"]),
+        final_text=payload["final_text"],
+    )
+    # What FastAPI does with response_model + response_model_exclude_none.
+    value = adapter.validate_python(resp)
+    return adapter.dump_json(value, exclude_none=True)
+
+
+def _new_ask(payload: dict, _adapter: TypeAdapter) -> bytes:
+    return FastJSONResponse({k: v for k, v in payload.items() if v is not None}).body
+
+
+def _old_kb(payload: dict, _adapter: Any) -> bytes:
+    return JSONResponse(jsonable_encoder(payload)).body
+
+
+def _new_kb(payload: dict, _adapter: Any) -> bytes:
+    return FastJSONResponse(payload).body
+
+
+def _time(fn: Callable, payload: dict, adapter: Any, n: int) -> float:
+    fn(payload, adapter)
+    t0 = time.perf_counter()
+    for _ in range(n):
+        fn(payload, adapter)
+    return (time.perf_counter() - t0) / n * 1e6
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Benchmark JSON response serialization.")
+    parser.add_argument("--iterations", type=int, default=2000)
+    args = parser.parse_args()
+
+    ask = ask_payload()
+    kb = {"ok": True, "threshold": 0.35, "count": 8, "results": ask["routed_result"]["grounding"]}
+    adapter = TypeAdapter(AskResponse)
+
+    print(f"orjson: {'yes' if serialization.orjson is not None else 'no (stdlib fallback)'}")
+    print(f"/ask payload: {len(_new_ask(ask, adapter))} bytes")
+    print(f"{'endpoint':<11} {'old us':>9} {'new us':>9} {'saved us':>9}")
+    for name, old, new, payload in (("/ask", _old_ask, _new_ask, ask), ("/kb/search", _old_kb, _new_kb, kb)):
+        t_old = _time(old, payload, adapter, args.iterations)
+        t_new = _time(new, payload, adapter, args.iterations)
+        print(f"{name:<11} {t_old:>9.1f} {t_new:>9.1f} {t_old - t_new:>9.1f}")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,44 @@
+# ──────────────────────────────────────────────────────────────────────────────
+# File: utils/locked_append.py
+# Purpose: Open a rotating log for append under an exclusive flock that is
+#          guaranteed to be on the file currently at the path.
+# ──────────────────────────────────────────────────────────────────────────────
+from __future__ import annotations
+
+import os
+from typing import BinaryIO, Union
+
+try:  # POSIX only; elsewhere callers rely on their in-process locks
+    import fcntl  # type: ignore
+except Exception:  # pragma: no cover
+    fcntl = None  # type: ignore
+
+PathLike = Union[str, "os.PathLike[str]"]
+
+
+def open_locked_append(path: PathLike) -> BinaryIO:
+    """
+    Return path opened "ab" with LOCK_EX held; closing the file releases it.
+
+    A writer that blocked on the lock while another process rotated (renamed)
+    the file would otherwise append to the rotated copy. After locking, the
+    open inode is compared with the one at path and the open is retried
+    until they match.
+    """
+    while True:
+        f = open(path, "ab")
+        if fcntl is None:
+            return f
+        try:
+            fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+            held = os.fstat(f.fileno())
+            try:
+                cur = os.stat(path)
+            except FileNotFoundError:
+                cur = None
+        except BaseException:
+            f.close()
+            raise
+        if cur is not None and (cur.st_ino, cur.st_dev) == (held.st_ino, held.st_dev):
+            return f
+        f.close()  # rotated while we waited; lock the new file instead
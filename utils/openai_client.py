@@ -4,6 +4,7 @@
 #
 # Upstream:
 #   - ENV (required): OPENAI_API_KEY
+#   - ENV (optional): OPENAI_BASE_URL (Azure/proxy)
 #   - ENV (optional, granular timeouts):
 #       OPENAI_CONNECT_TIMEOUT   (seconds, default 10)
 #       OPENAI_READ_TIMEOUT      (seconds, default 45)
@@ -16,30 +17,27 @@
 #       OPENAI_MAX_CONNECTIONS   (default 100)
 #       OPENAI_KEEPALIVE_EXPIRY  (seconds, default 30)
 #   - ENV (optional, logical retries at call sites):
-#       OPENAI_MAX_RETRIES       (default 2)  # NOTE: Not applied at transport level; callers should implement retries.
+#       OPENAI_MAX_RETRIES       (default 2)  # SDK-level retries; never at the transport level.
 #   - Imports: httpx, openai, os
 #
 # Downstream:
-#   - agents.codex_agent
-#   - agents.docs_agent
-#   - agents.echo_agent
-#   - agents.planner_agent
-#   - routes.ask
-#   - services.agent
-#   - services.summarize_memory
+#   - services.openai_client (builds the ONE shared client per process; all
+#     other modules go through it)
 #
 # Contents:
 #   - create_openai_client()
+#   - create_sync_openai_client()
 #
 # Notes:
 #   - httpx does NOT support `AsyncHTTPTransport(retries=...)`. Using that silently does nothing.
 #     We configure proper timeouts and connection limits here and expect callers to implement
 #     their own logical retry/backoff (e.g., planner/echo agents).
 #   - Keep a single AsyncClient for connection reuse/keep-alive. The OpenAI SDK will use it.
+#     Call these factories only from services.openai_client, which caches the result.
 
 import os
 import httpx
-from openai import AsyncOpenAI
+from openai import AsyncOpenAI, OpenAI
 
 
 def _get_float(name: str, default: float) -> float:
@@ -58,6 +56,28 @@ def _get_int(name: str, default: int) -> int:
         return default
 
 
+def _timeout() -> httpx.Timeout:
+    """Timeouts with the legacy single-knob OPENAI_TIMEOUT taking precedence."""
+    legacy_timeout = os.getenv("OPENAI_TIMEOUT")
+    if legacy_timeout is not None:
+        t = _get_float("OPENAI_TIMEOUT", 30.0)
+        return httpx.Timeout(connect=t, read=t, write=t, pool=t)
+    return httpx.Timeout(
+        connect=_get_float("OPENAI_CONNECT_TIMEOUT", 10.0),
+        read=_get_float("OPENAI_READ_TIMEOUT", 45.0),
+        write=_get_float("OPENAI_WRITE_TIMEOUT", 45.0),
+        pool=_get_float("OPENAI_POOL_TIMEOUT", 45.0),
+    )
+
+
+def _limits() -> httpx.Limits:
+    return httpx.Limits(
+        max_keepalive_connections=_get_int("OPENAI_MAX_KEEPALIVE", 20),
+        max_connections=_get_int("OPENAI_MAX_CONNECTIONS", 100),
+        keepalive_expiry=_get_float("OPENAI_KEEPALIVE_EXPIRY", 30.0),
+    )
+
+
 def create_openai_client() -> AsyncOpenAI:
     """
     Return a configured AsyncOpenAI client using httpx.AsyncClient with sane timeouts and limits.
@@ -71,32 +91,25 @@ def create_openai_client() -> AsyncOpenAI:
       - Callers (e.g., planner_agent, echo_agent) should implement logical retries/backoff
         using their own loops and asyncio.sleep().
     """
-    # ---- timeouts (with legacy single-knob fallback) ------------------------------------------
-    legacy_timeout = os.getenv("OPENAI_TIMEOUT")
-    if legacy_timeout is not None:
-        t = _get_float("OPENAI_TIMEOUT", 30.0)
-        timeout = httpx.Timeout(connect=t, read=t, write=t, pool=t)
-    else:
-        connect = _get_float("OPENAI_CONNECT_TIMEOUT", 10.0)
-        read = _get_float("OPENAI_READ_TIMEOUT", 45.0)
-        write = _get_float("OPENAI_WRITE_TIMEOUT", 45.0)
-        pool = _get_float("OPENAI_POOL_TIMEOUT", 45.0)
-        timeout = httpx.Timeout(connect=connect, read=read, write=write, pool=pool)
-
-    # ---- connection limits / keepalive --------------------------------------------------------
-    limits = httpx.Limits(
-        max_keepalive_connections=_get_int("OPENAI_MAX_KEEPALIVE", 20),
-        max_connections=_get_int("OPENAI_MAX_CONNECTIONS", 100),
-        keepalive_expiry=_get_float("OPENAI_KEEPALIVE_EXPIRY", 30.0),
-    )
-
     # ---- shared async HTTP client -------------------------------------------------------------
     # NOTE: Do not pass a retries parameter to transports; httpx ignores it for AsyncHTTPTransport.
-    http_client = httpx.AsyncClient(timeout=timeout, limits=limits)
+    http_client = httpx.AsyncClient(timeout=_timeout(), limits=_limits())
 
     # ---- OpenAI async client ------------------------------------------------------------------
     # The SDK will reuse the httpx client for all requests, benefiting from keep-alive pooling.
     return AsyncOpenAI(
         api_key=os.getenv("OPENAI_API_KEY"),
+        base_url=os.getenv("OPENAI_BASE_URL") or None,
+        max_retries=_get_int("OPENAI_MAX_RETRIES", 2),
         http_client=http_client,
     )
+
+
+def create_sync_openai_client() -> OpenAI:
+    """Blocking twin of create_openai_client() for thread-based callers (same knobs)."""
+    return OpenAI(
+        api_key=os.getenv("OPENAI_API_KEY"),
+        base_url=os.getenv("OPENAI_BASE_URL") or None,
+        max_retries=_get_int("OPENAI_MAX_RETRIES", 2),
+        http_client=httpx.Client(timeout=_timeout(), limits=_limits()),
+    )
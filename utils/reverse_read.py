@@ -0,0 +1,70 @@
+# ──────────────────────────────────────────────────────────────────────────────
+# File: utils/reverse_read.py
+# Purpose: Read line-oriented files backwards from EOF in fixed-size blocks, so
+#          "last N lines" costs O(N) regardless of file size.
+# ──────────────────────────────────────────────────────────────────────────────
+from __future__ import annotations
+
+import json
+import os
+from typing import Any, Dict, Iterator, Optional, Union
+
+PathLike = Union[str, "os.PathLike[str]"]
+
+BLOCK_SIZE = 64 * 1024
+
+
+def reverse_lines(path: PathLike, *, end: Optional[int] = None, block_size: int = BLOCK_SIZE) -> Iterator[bytes]:
+    """
+    Yield the lines of a file newest-first (without trailing newline).
+
+    end bounds the read to bytes [0, end) — useful when a writer may be
+    appending concurrently. A trailing partial line (no newline yet) is
+    skipped when end is None, since it is still being written.
+    """
+    try:
+        f = open(path, "rb")
+    except FileNotFoundError:
+        return
+    with f:
+        pos = os.fstat(f.fileno()).st_size if end is None else end
+        if pos <= 0:
+            return
+        tail = b""
+        if end is None:
+            # Drop an in-progress final line.
+            f.seek(pos - 1)
+            if f.read(1) != b"\n":
+                while pos > 0:
+                    step = min(block_size, pos)
+                    f.seek(pos - step)
+                    chunk = f.read(step)
+                    nl = chunk.rfind(b"\n")
+                    if nl >= 0:
+                        pos = pos - step + nl + 1
+                        break
+                    pos -= step
+        while pos > 0:
+            step = min(block_size, pos)
+            pos -= step
+            f.seek(pos)
+            buf = f.read(step) + tail
+            lines = buf.split(b"\n")
+            # lines[0] may be a partial line continuing into the previous block.
+            tail = lines[0]
+            for line in reversed(lines[1:]):
+                if line:
+                    yield line
+        if tail:
+            yield tail
+
+
+def reverse_jsonl(path: PathLike, **kw: Any) -> Iterator[Dict[str, Any]]:
+    """reverse_lines() parsed as JSON objects; malformed lines are skipped."""
+    for line in reverse_lines(path, **kw):
+        try:
+            obj = json.loads(line)
+        except (ValueError, UnicodeDecodeError):
+            continue
+        if isinstance(obj, dict):
+            yield obj